@@ -1,38 +1,238 @@
 """
 REST API Server using http.server with Basic Authentication
 Endpoints:
-  GET    /transactions          - Get all transactions
+  GET    /transactions          - Get all transactions (filter/paginate/project)
   GET    /transactions/{id}     - Get single transaction
   POST   /transactions          - Create new transaction
   PUT    /transactions/{id}     - Update transaction
   DELETE /transactions/{id}     - Delete transaction
+  GET    /stats                 - Totals and per-type breakdown
+  GET    /stats/timeseries      - Daily/monthly volume
+  GET    /stats/top             - Top senders/receivers
+  GET    /stats/histogram       - Amount histogram
+  GET    /stats/buckets         - Hour/day/week/month volume over a time range or last N days
+  GET    /stats/ledger          - Reconstructed balance vs the balances the SMS stated
+  GET    /stats/balance?at=     - Account balance at a moment
+  GET    /metrics               - Prometheus metrics (latency, sizes, errors)
+  GET    /search?q=             - Counterparty / SMS text search (prefix + fuzzy)
+  POST   /transactions/bulk     - Create many (JSON array or NDJSON, streamed)
+  PUT    /transactions/bulk     - Update many ([{"id": ..., fields}])
+  DELETE /transactions/bulk     - Delete many (ids in the body or ?ids=1,2,3)
+  POST   /auth/token            - Exchange credentials for a bearer token (--sessions)
+  DELETE /auth/token            - Revoke the bearer token in use
 """
 
+import argparse
+import functools
+import http.client
 import json
-import base64
 import re
 import os
+import signal
+import sys
+import threading
+import time
+import zlib
 from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse
-from datetime import datetime
+from urllib.parse import urlparse, parse_qs
 
-# Global transactions
-TRANSACTIONS = []
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dsa'))
 
-# Auth credentials
+from auth import Authenticator, AuthError
+from bulk import BodyReader, iter_items, batched, check_new, check_update, check_id
+from checkpoint import Checkpoint, checkpoint_path
+from columnar import TransactionColumns, load_columns, ms_to_iso
+from dedup import BloomFilter, DedupIndex, MIN_CAPACITY, txid_key
+from ledger import Ledger
+from ingest import Ingestor, DEFAULT_INTERVAL, DEFAULT_BATCH
+from journal import Journal, LoggedStore, recover, journal_files, SYNC_MODES, DEFAULT_WINDOW, DEFAULT_COMPACT_BYTES
+from mapped_store import MappedStore
+from metrics import Metrics, AccessLog, RequestProfiler, SIZE_BUCKETS, CONTENT_TYPE
+from parse_xml import iter_ndjson
+from prefork import (Prefork, Replicator, Follower, WriterClient, UnixHTTPServer, VERSION_HEADER,
+                     WRITER_CONNECTIONS, adopt, relayed_headers)
+from response_cache import ResponseCache, DEFAULT_MAX_BYTES
+from search_index import SearchIndex
+from server import PooledHTTPServer, DEFAULT_THREADS
+from sqlite_store import open_store
+from stats import Rollups
+from time_index import TimeIndex, INTERVALS, to_ms, window, in_range
+from store import TransactionStore, FIELDS
+
+# Global transaction store and the aggregates derived from it
+# (rollups are built on the first /stats request, see get_rollups; the
+# search index on the first /search request, see get_search_index; the
+# epoch-ms time index on the first /stats/buckets request, see get_time_index;
+# the provider txid index on the first create, see get_txid_index; the
+# ledger on the first ledger request after a write, see get_ledger).
+# Under --workers, FOLLOWER keeps a worker's copy of the store in step with
+# the writer process and WRITER forwards writes to it (see run_prefork);
+# with --journal, JOURNAL makes each write durable before it is answered
+STORE = TransactionStore()
+ROLLUPS = None
+SEARCH = None
+TIMES = None
+RESPONSES = None
+TXIDS = None
+LEDGER = None
+FOLLOWER = None
+WRITER = None
+JOURNAL = None
+RESPONSE_CACHE_BYTES = DEFAULT_MAX_BYTES    # --cache-mb; 0 turns the response cache off
+ROLLUPS_LOCK = threading.Lock()
+CREATE_LOCK = threading.Lock()      # duplicate check + create, for every path that adds rows
+LEDGER_LOCK = threading.Lock()      # one rebuild at a time, without holding up the other indexes
+SEARCH_MAX_LIMIT = 100
+LEDGER_MAX_LIMIT = 1000             # divergences listed by /stats/ledger
+
+# Auth credentials: the default user, admin/admin123, stored as a PBKDF2 hash
+# (replace with --users FILE; see auth.py for generating hashes)
 AUTH_USERNAME = "admin"
-AUTH_PASSWORD = "admin123"
+AUTH_PASSWORD_HASH = "pbkdf2_sha256$600000$bW9tby1hcGktZGVmYXVsdA==$y8rRWmBCmURplir/PSVE1OwYBOFt6tR+Y2pbfQ5kXVo="
+AUTH = Authenticator({AUTH_USERNAME: AUTH_PASSWORD_HASH})
+
+# Response encoding
+GZIP_MIN_SIZE = 1024        # smaller bodies are not worth compressing
+GZIP_LEVEL = 6
+STREAM_BATCH = 1000         # rows serialized per chunk when streaming lists
+CACHE_MAX_ROWS = 1000       # list pages up to this limit are built whole and cached
+
+# Route templates used as the metrics `endpoint` label; anything else is
+# counted as "other" so unknown paths cannot blow up label cardinality
+ENDPOINTS = {'/transactions', '/transactions/{id}', '/transactions/bulk', '/stats', '/stats/timeseries',
+             '/stats/top', '/stats/histogram', '/stats/buckets', '/stats/ledger',
+             '/stats/balance', '/metrics', '/search', '/auth/token'}
+ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def format_access(entry):
+    """Access log line: [date] client METHOD path - auth status bytes duration"""
+    when, client, command, path, auth, message = entry
+    year, month, day, hh, mm, ss, *_ = time.localtime(when)
+    date = "%02d/%3s/%04d %02d:%02d:%02d" % (day, BaseHTTPRequestHandler.monthname[month], year, hh, mm, ss)
+    return f"[{date}] {client} {command} {path} - {auth} {message}"
+
+
+# Instrumentation (see metrics.py); PROFILER is set by --profile-every
+METRICS = Metrics()
+METRICS.counter('momo_http_requests_total', "HTTP requests by method, endpoint and status")
+METRICS.counter('momo_http_errors_total', "HTTP requests answered with status >= 400")
+METRICS.histogram('momo_http_request_duration_seconds', "Time from parsing the request to the last byte written")
+METRICS.histogram('momo_http_request_size_bytes', "Request body size", SIZE_BUCKETS)
+METRICS.histogram('momo_http_response_size_bytes', "Response body size as sent (after gzip)", SIZE_BUCKETS)
+METRICS.gauge('momo_store_transactions', "Transactions in the store", lambda: len(STORE))
+METRICS.gauge('momo_store_version', "Store mutation counter", lambda: STORE.version)
+METRICS.gauge('momo_store_load_seconds', "Time taken to load the store at startup")
+METRICS.gauge('momo_access_log_pending', "Access log lines waiting to be written", lambda: len(ACCESS_LOG))
+METRICS.counter('momo_access_log_dropped_total', "Access log lines dropped because the queue was full",
+                lambda: ACCESS_LOG.dropped)
+METRICS.counter('momo_auth_cache_hits_total', "Basic credentials served from the verified-credential cache",
+                lambda: AUTH.cache.hits)
+METRICS.counter('momo_auth_cache_misses_total', "Basic credentials that needed a password hash check",
+                lambda: AUTH.cache.misses)
+METRICS.counter('momo_response_cache_hits_total', "GET responses served from the response cache",
+                lambda: RESPONSES.hits if RESPONSES else 0)
+METRICS.counter('momo_response_cache_misses_total', "Cacheable GET responses that had to be built",
+                lambda: RESPONSES.misses if RESPONSES else 0)
+METRICS.counter('momo_response_cache_evictions_total', "Cached responses dropped to stay under the size limit",
+                lambda: RESPONSES.evictions if RESPONSES else 0)
+METRICS.counter('momo_response_cache_invalidations_total', "Cached responses dropped because a write changed them",
+                lambda: RESPONSES.invalidations if RESPONSES else 0)
+METRICS.gauge('momo_response_cache_bytes', "Bytes held by the response cache", lambda: RESPONSES.bytes if RESPONSES else 0)
+METRICS.counter('momo_dedup_duplicates_total', "Creates rejected because their provider txid was taken",
+                lambda: TXIDS.duplicates if TXIDS is not None else 0)
+METRICS.counter('momo_dedup_lookups_total', "Duplicate checks the Bloom filter passed on to the database",
+                lambda: TXIDS.lookups if TXIDS is not None else 0)
+METRICS.counter('momo_dedup_false_positives_total', "Bloom filter positives the database did not confirm",
+                lambda: TXIDS.false_positives if TXIDS is not None else 0)
+METRICS.counter('momo_journal_ops_total', "Writes appended to the journal (--journal)",
+                lambda: JOURNAL.ops if JOURNAL is not None else 0)
+METRICS.counter('momo_journal_commits_total', "Journal fsyncs, each covering every write queued before it",
+                lambda: JOURNAL.commits if JOURNAL is not None else 0)
+METRICS.gauge('momo_journal_bytes', "Journal bytes since the last snapshot", lambda: JOURNAL.bytes if JOURNAL is not None else 0)
+METRICS.counter('momo_journal_compactions_total', "Snapshots written by journal compaction",
+                lambda: JOURNAL.compactions if JOURNAL is not None else 0)
+METRICS.counter('momo_replica_ops_total', "Writes applied from the writer process (--workers)",
+                lambda: FOLLOWER.applied if FOLLOWER is not None else 0)
+ACCESS_LOG = AccessLog(format_access)
+PROFILER = None
+INGESTOR = None             # set by --watch (see start_ingest)
+
+
+def endpoint_label(path):
+    """Route template for a request path (ids become {id}), or 'other'"""
+    label = ID_SEGMENT.sub('/{id}', path)
+    return label if label in ENDPOINTS else 'other'
+
+
+def profiled(handler):
+    """Run a do_* method under PROFILER when profiling is enabled"""
+    @functools.wraps(handler)
+    def wrapper(self):
+        if PROFILER is None:
+            return handler(self)
+        return PROFILER.run(lambda: handler(self))
+    return wrapper
 
 
 class TransactionHandler(BaseHTTPRequestHandler):
     """HTTP Request Handler for Transaction API"""
     
+    # HTTP/1.1 keeps connections alive; idle ones are closed after `timeout`.
+    # Headers and body are separate writes, so Nagle would stall each
+    # keep-alive response on the client's delayed ACK.
+    protocol_version = 'HTTP/1.1'
+    timeout = 15
+    disable_nagle_algorithm = True
+    
+    def handle_one_request(self):
+        """Handle one request, then record its metrics and access log line"""
+        self._started = None
+        self._status = None
+        self._response_bytes = 0
+        try:
+            super().handle_one_request()
+        finally:
+            if self._started is not None:
+                self._record_request()
+    
+    def parse_request(self):
+        """Parse request line and headers, noting any request body"""
+        started = time.perf_counter()
+        if not super().parse_request():
+            return False
+        self._chunked = self.headers.get('Transfer-Encoding', '').lower() == 'chunked'
+        try:
+            self._unread_body = 1 if self._chunked else int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            self._unread_body = 0
+            self.close_connection = True
+        self._request_bytes = 0 if self._chunked else self._unread_body
+        self._started = started
+        return True
+    
+    def _record_request(self):
+        """Update request metrics and queue the access log line"""
+        seconds = time.perf_counter() - self._started
+        status = self._status or 500
+        labels = (('method', self.command), ('endpoint', endpoint_label(self.path.partition('?')[0])))
+        METRICS.inc('momo_http_requests_total', labels + (('status', str(status)),))
+        if status >= 400:
+            METRICS.inc('momo_http_errors_total', labels)
+        METRICS.observe('momo_http_request_duration_seconds', labels, seconds)
+        if self._request_bytes:
+            METRICS.observe('momo_http_request_size_bytes', labels, self._request_bytes)
+        METRICS.observe('momo_http_response_size_bytes', labels, self._response_bytes)
+        self.log_message('%d %d %.2fms', status, self._response_bytes, seconds * 1000)
+    
+    @profiled
     def do_GET(self):
         """Handle GET requests"""
         if not self._check_auth():
             return
         
-        path = urlparse(self.path).path
+        url = urlparse(self.path)
+        path = url.path
         
         # GET /transactions/{id}
         match = re.match(r'^/transactions/(\d+)$', path)
@@ -42,10 +242,23 @@ class TransactionHandler(BaseHTTPRequestHandler):
         
         # GET /transactions
         if path == '/transactions':
-            return self._get_all_transactions()
+            return self._get_all_transactions(url.query)
+        
+        # GET /stats, /stats/{report}
+        if path == '/stats' or path.startswith('/stats/'):
+            return self._get_stats(path[len('/stats/'):], url.query)
+        
+        # GET /metrics
+        if path == '/metrics':
+            return self._get_metrics()
+        
+        # GET /search?q=
+        if path == '/search':
+            return self._search(url.query)
         
         self._send_json(404, {"error": "Not Found"})
     
+    @profiled
     def do_POST(self):
         """Handle POST requests"""
         if not self._check_auth():
@@ -56,8 +269,15 @@ class TransactionHandler(BaseHTTPRequestHandler):
         if path == '/transactions':
             return self._create_transaction()
         
+        if path == '/transactions/bulk':
+            return self._bulk('POST')
+        
+        if path == '/auth/token' and AUTH.sessions:
+            return self._create_token()
+        
         self._send_json(404, {"error": "Not Found"})
     
+    @profiled
     def do_PUT(self):
         """Handle PUT requests"""
         if not self._check_auth():
@@ -70,84 +290,229 @@ class TransactionHandler(BaseHTTPRequestHandler):
             tx_id = int(match.group(1))
             return self._update_transaction(tx_id)
         
+        if path == '/transactions/bulk':
+            return self._bulk('PUT')
+        
         self._send_json(404, {"error": "Not Found"})
     
+    @profiled
     def do_DELETE(self):
         """Handle DELETE requests"""
         if not self._check_auth():
             return
         
-        path = urlparse(self.path).path
+        url = urlparse(self.path)
+        path = url.path
         
         match = re.match(r'^/transactions/(\d+)$', path)
         if match:
             tx_id = int(match.group(1))
             return self._delete_transaction(tx_id)
         
+        if path == '/transactions/bulk':
+            return self._bulk('DELETE', url.query)
+        
+        if path == '/auth/token' and AUTH.sessions:
+            return self._revoke_token()
+        
         self._send_json(404, {"error": "Not Found"})
     
     def _check_auth(self):
-        """Verify Basic Authentication"""
-        auth_header = self.headers.get('Authorization', '')
-        
-        if not auth_header.startswith('Basic '):
-            self._send_json(401, {"error": "Unauthorized", "message": "Missing Authorization header"})
-            return False
-        
+        """Verify Basic credentials (cached once verified) or a bearer session token"""
         try:
-            encoded = auth_header[6:]
-            decoded = base64.b64decode(encoded).decode('utf-8')
-            username, password = decoded.split(':', 1)
-            
-            if username == AUTH_USERNAME and password == AUTH_PASSWORD:
-                return True
-            else:
-                self._send_json(401, {"error": "Unauthorized", "message": "Invalid credentials"})
-                return False
-        except:
-            self._send_json(401, {"error": "Unauthorized", "message": "Invalid Authorization header"})
+            self.user = AUTH.authenticate(self.headers.get('Authorization', ''))
+            return True
+        except AuthError as e:
+            self._send_json(401, {"error": "Unauthorized", "message": str(e)})
             return False
     
-    def _get_all_transactions(self):
-        """GET /transactions - Return all transactions"""
-        self._send_json(200, {"count": len(TRANSACTIONS), "data": TRANSACTIONS})
+    def _create_token(self):
+        """POST /auth/token - Start a session: returns a bearer token for the authenticated user"""
+        token, ttl = AUTH.issue_token(self.user)
+        self._send_json(201, {"token": token, "token_type": "Bearer", "expires_in": ttl})
+    
+    def _revoke_token(self):
+        """DELETE /auth/token - End the session of the bearer token used for this request"""
+        header = self.headers.get('Authorization', '')
+        if not header.startswith('Bearer '):
+            return self._send_json(400, {"error": "Bad Request", "message": "Send the token to revoke as Bearer"})
+        AUTH.revoke_token(header[7:].strip())
+        self._send_json(200, {"message": "Token revoked"})
+    
+    def _get_all_transactions(self, query=''):
+        """
+        GET /transactions - Return transactions
+        Optional query parameters:
+          transaction_type, sender, receiver, counterparty  - exact match
+          min_amount, max_amount                            - inclusive range
+          start, end                                        - start <= timestamp < end
+          days, until                                       - the last N days up to until (default now)
+          limit, offset, after (cursor: last id of previous page)
+          fields=id,amount,...                              - projection
+        """
+        try:
+            params = parse_query(query)
+        except ValueError as e:
+            return self._send_json(400, {"error": "Bad Request", "message": str(e)})
+        
+        etag = self._etag()
+        limit = params.get('limit')
+        cacheable = limit is not None and limit <= CACHE_MAX_ROWS and not relative_to_now(query)
+        if cacheable and self._send_cached(etag):
+            return
+        if self._not_modified(etag):
+            return
+        
+        generation = cache_generation()
+        fields = params.pop('fields', None)
+        total, page = STORE.query(**params)
+        
+        head = {"count": total}
+        if limit is not None:
+            full = page and len(page) == limit
+            head["next_cursor"] = page[-1]['id'] if full else None
+        if fields:
+            page = [{field: tx.get(field) for field in fields} for tx in page]
+        if cacheable:
+            filters = {name: value for name, value in params.items() if name not in QUERY_INTS}
+            return self._send_cacheable({**head, "data": page}, etag, generation, filters=filters)
+        self._stream_json(200, head, page, etag=etag)
+    
+    def _get_stats(self, report, query=''):
+        """
+        GET /stats[/{report}] - Aggregates from incrementally maintained rollups
+          /stats                                         - totals and by_type
+          /stats/timeseries?interval=day|month&start=&end=
+          /stats/top?role=sender|receiver&metric=amount|count&limit=10
+          /stats/histogram
+          /stats/buckets?interval=hour|day|week|month&start=&end= (or &days=N&until=)
+          /stats/ledger?limit=20                          - reconciliation and first divergences
+          /stats/balance?at=                              - balance at a moment (default: latest)
+        """
+        params = {name: values[-1] for name, values in parse_qs(query).items()}
+        rollups = get_rollups()
+        etag = self._etag()
+        cacheable = not relative_to_now(query)
+        if cacheable and self._send_cached(etag):
+            return
+        
+        if report == '':
+            build = rollups.summary
+        elif report == 'timeseries':
+            interval = params.get('interval', 'day')
+            if interval not in ('day', 'month'):
+                return self._send_json(400, {"error": "Bad Request", "message": "interval must be day or month"})
+            build = lambda: rollups.timeseries(interval, params.get('start'), params.get('end'))
+        elif report == 'top':
+            role = params.get('role', 'receiver')
+            metric = params.get('metric', 'amount')
+            limit = params.get('limit', '10')
+            if role not in ('sender', 'receiver') or metric not in ('amount', 'count') or not limit.isdigit():
+                return self._send_json(400, {"error": "Bad Request",
+                                             "message": "role=sender|receiver, metric=amount|count, limit=integer"})
+            build = lambda: rollups.top(role, metric, int(limit))
+        elif report == 'histogram':
+            build = rollups.amount_histogram
+        elif report == 'buckets':
+            interval = params.get('interval', 'day')
+            try:
+                start, end = time_window(params)
+            except ValueError as e:
+                return self._send_json(400, {"error": "Bad Request", "message": str(e)})
+            if interval not in INTERVALS:
+                return self._send_json(400, {"error": "Bad Request",
+                                             "message": f"interval must be one of {', '.join(INTERVALS)}"})
+            build = lambda: time_buckets(get_time_index(), interval, start, end)
+        elif report == 'ledger':
+            limit = params.get('limit', '20')
+            if not limit.isdigit():
+                return self._send_json(400, {"error": "Bad Request", "message": "limit must be an integer"})
+            build = lambda: get_ledger().summary(min(int(limit), LEDGER_MAX_LIMIT))
+        elif report == 'balance':
+            try:
+                at = to_ms(params['at']) if 'at' in params else None
+            except ValueError as e:
+                return self._send_json(400, {"error": "Bad Request", "message": f"at: {e}"})
+            build = lambda: balance_report(get_ledger(), at)
+        else:
+            return self._send_json(404, {"error": "Not Found"})
+        
+        if self._not_modified(etag):
+            return
+        generation = cache_generation()
+        if cacheable:
+            return self._send_cacheable(build(), etag, generation)
+        self._send_json(200, build(), etag=etag)
+    
+    def _search(self, query=''):
+        """
+        GET /search?q=jane+smi - Counterparties and transactions matching a query
+          q       words matched as prefixes of name / SMS body terms, all required;
+                  a word with no prefix match is matched fuzzily (n-gram overlap)
+          scope   all (default), counterparties (typeahead) or transactions
+          limit   results per list (default 10, max 100)
+          fuzzy   false to disable fuzzy matching
+        """
+        params = {name: values[-1] for name, values in parse_qs(query).items()}
+        q = params.get('q', '').strip()
+        scope = params.get('scope', 'all')
+        limit = params.get('limit', '10')
+        if not q or scope not in ('all', 'counterparties', 'transactions') or not limit.isdigit():
+            return self._send_json(400, {"error": "Bad Request",
+                                         "message": "q is required; scope=all|counterparties|transactions, limit=integer"})
+        limit = min(int(limit), SEARCH_MAX_LIMIT)
+        fuzzy = params.get('fuzzy', 'true').lower() not in ('false', '0', 'no')
+        
+        index = get_search_index()
+        etag = self._etag()
+        if self._send_cached(etag) or self._not_modified(etag):
+            return
+        
+        generation = cache_generation()
+        result = {"query": q}
+        if scope != 'transactions':
+            result["counterparties"] = index.counterparties(q, limit, fuzzy)
+        if scope != 'counterparties':
+            total, ids = index.transaction_ids(q, limit, fuzzy)
+            result["count"] = total
+            result["data"] = [tx for tx in map(STORE.get, ids) if tx is not None]
+        self._send_cacheable(result, etag, generation)
+    
+    def _get_metrics(self):
+        """GET /metrics - Request, store and access log metrics in Prometheus text format"""
+        body = METRICS.render().encode('utf-8')
+        self._send_bytes(200, body, content_type=CONTENT_TYPE)
     
     def _get_transaction(self, tx_id):
         """GET /transactions/{id} - Return single transaction"""
-        for tx in TRANSACTIONS:
-            if tx['id'] == tx_id:
-                return self._send_json(200, tx)
+        etag = self._etag()
+        if self._send_cached(etag):
+            return
+        generation = cache_generation()
+        transaction = STORE.get(tx_id)
+        if transaction:
+            if self._not_modified(etag):
+                return
+            return self._send_cacheable(transaction, etag, generation, tx_id=tx_id)
         
         self._send_json(404, {"error": "Not Found", "message": f"Transaction {tx_id} not found"})
     
     def _create_transaction(self):
         """POST /transactions - Create new transaction"""
         try:
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length).decode('utf-8')
-            payload = json.loads(body)
+            payload = self._read_json()
             
             # Validate required fields
-            required = ['transaction_type', 'amount', 'sender', 'receiver']
-            for field in required:
-                if field not in payload:
-                    return self._send_json(400, {"error": "Bad Request", "message": f"Missing field: {field}"})
-            
-            # Generate new ID
-            new_id = max([tx['id'] for tx in TRANSACTIONS], default=0) + 1
+            error = check_new(payload)
+            if error:
+                return self._send_json(400, {"error": "Bad Request", "message": error})
             
-            # Create transaction
-            transaction = {
-                'id': new_id,
-                'transaction_type': payload['transaction_type'],
-                'amount': payload['amount'],
-                'sender': payload['sender'],
-                'receiver': payload['receiver'],
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            TRANSACTIONS.append(transaction)
-            self._send_json(201, {"message": "Transaction created", "data": transaction})
+            created, duplicates = create_unique([payload])
+            if duplicates:
+                existing = duplicates[0][1]
+                return self._send_json(409, {"error": "Conflict", "message": f"Duplicate of transaction {existing}",
+                                             "duplicate_of": existing})
+            self._send_json(201, {"message": "Transaction created", "data": created[0]})
         
         except json.JSONDecodeError:
             self._send_json(400, {"error": "Bad Request", "message": "Invalid JSON"})
@@ -157,27 +522,17 @@ class TransactionHandler(BaseHTTPRequestHandler):
     def _update_transaction(self, tx_id):
         """PUT /transactions/{id} - Update transaction"""
         try:
-            # Find transaction
-            transaction = None
-            for tx in TRANSACTIONS:
-                if tx['id'] == tx_id:
-                    transaction = tx
-                    break
-            
-            if not transaction:
-                return self._send_json(404, {"error": "Not Found", "message": f"Transaction {tx_id} not found"})
-            
             # Parse request body
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length).decode('utf-8')
-            payload = json.loads(body)
-            
-            # Update fields
-            updateable = ['transaction_type', 'amount', 'sender', 'receiver']
-            for field in updateable:
-                if field in payload:
-                    transaction[field] = payload[field]
+            payload = self._read_json()
+            error = check_update(dict(payload, id=tx_id) if isinstance(payload, dict) else payload)
+            if error:
+                return self._send_json(400, {"error": "Bad Request", "message": error})
             
+            # update() looks the row up under the store's lock: a separate get()
+            # first could pass just before a concurrent DELETE removed it
+            transaction = STORE.update(tx_id, payload)
+            if transaction is None:
+                return self._send_json(404, {"error": "Not Found", "message": f"Transaction {tx_id} not found"})
             self._send_json(200, {"message": "Transaction updated", "data": transaction})
         
         except json.JSONDecodeError:
@@ -187,80 +542,870 @@ class TransactionHandler(BaseHTTPRequestHandler):
     
     def _delete_transaction(self, tx_id):
         """DELETE /transactions/{id} - Delete transaction"""
-        global TRANSACTIONS
-        
-        for i, tx in enumerate(TRANSACTIONS):
-            if tx['id'] == tx_id:
-                deleted = TRANSACTIONS.pop(i)
-                return self._send_json(200, {"message": "Transaction deleted", "data": deleted})
+        deleted = STORE.delete(tx_id)
+        if deleted:
+            return self._send_json(200, {"message": "Transaction deleted", "data": deleted})
         
         self._send_json(404, {"error": "Not Found", "message": f"Transaction {tx_id} not found"})
     
-    def _send_json(self, status_code, data):
-        """Send JSON response"""
-        response = json.dumps(data, indent=2)
+    def _bulk(self, method, query=''):
+        """
+        POST/PUT/DELETE /transactions/bulk - Apply many items in one request
+        Body: a JSON array or NDJSON (one item per line), streamed from rfile
+          POST    transactions, with the same fields as POST /transactions
+          PUT     {"id": ..., fields to change}
+          DELETE  ids (or ?ids=1,2,3 instead of a body)
+        Valid items are applied BATCH_SIZE at a time; invalid or missing ones
+        are reported in "errors" by index and do not stop the rest.
+        """
+        reader = self._body()
+        ids_param = parse_qs(query).get('ids') if method == 'DELETE' else None
+        if ids_param:
+            values = ids_param[-1].split(',')
+            items = ((i, int(v) if v.strip().isdigit() else v, None) for i, v in enumerate(values))
+        else:
+            items = iter_items(reader)
+        check = {'POST': check_new, 'PUT': check_update, 'DELETE': check_id}[method]
+        done = []
+        errors = []
+        try:
+            for batch, rejected in batched(items, check):
+                errors += rejected
+                if method == 'POST':
+                    created, duplicates = create_unique([item for _, item in batch])
+                    done += [tx['id'] for tx in created]
+                    errors += [{"index": batch[i][0], "message": f"Duplicate of transaction {existing}",
+                                "duplicate_of": existing} for i, existing in duplicates]
+                    continue
+                if method == 'PUT':
+                    results = STORE.update_many([(item['id'], item) for _, item in batch])
+                else:
+                    results = STORE.delete_many([item for _, item in batch])
+                for (index, item), result in zip(batch, results):
+                    tx_id = item['id'] if method == 'PUT' else item
+                    if result is None:
+                        errors.append({"index": index, "message": f"Transaction {tx_id} not found"})
+                    else:
+                        done.append(tx_id)
+        except ValueError as e:
+            # Broken body framing: the stream position is lost
+            self.close_connection = True
+            return self._send_json(400, {"error": "Bad Request", "message": str(e), "applied": len(done)})
+        except Exception as e:
+            return self._send_json(500, {"error": "Server Error", "message": str(e), "applied": len(done)})
+        finally:
+            self._unread_body = 0 if reader.done else 1
+            self._request_bytes = reader.bytes_read
         
+        errors.sort(key=lambda error: error['index'])
+        key = {'POST': 'created', 'PUT': 'updated', 'DELETE': 'deleted'}[method]
+        status = 201 if method == 'POST' and not errors else 200
+        self._send_json(status, {key: len(done), "ids": done, "errors": errors})
+    
+    def _body(self):
+        """BodyReader over the request body (Content-Length or chunked)"""
+        return BodyReader(self.rfile, self._unread_body if not self._chunked else 0, self._chunked)
+    
+    def _read_json(self):
+        """Read and decode the JSON request body"""
+        reader = self._body()
+        body = b''.join(reader).decode('utf-8')
+        self._unread_body = 0
+        self._request_bytes = reader.bytes_read
+        return json.loads(body)
+    
+    def _etag(self):
+        """Weak ETag for the current store version (read before the data)"""
+        return f'W/"{STORE.version}"'
+    
+    def _not_modified(self, etag):
+        """Send 304 if the client's If-None-Match covers etag"""
+        header = self.headers.get('If-None-Match')
+        if not header:
+            return False
+        tags = [tag.strip() for tag in header.split(',')]
+        if '*' not in tags and etag not in tags and etag[2:] not in tags:
+            return False
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        return True
+    
+    def _accepts_gzip(self):
+        """True if Accept-Encoding allows gzip"""
+        for coding in self.headers.get('Accept-Encoding', '').split(','):
+            name, _, params = coding.partition(';')
+            if name.strip().lower() == 'gzip':
+                return params.replace(' ', '') not in ('q=0', 'q=0.0')
+        return False
+    
+    def send_response(self, code, message=None):
+        """Send the status line, remembering the status for metrics"""
+        self._status = code
+        super().send_response(code, message)
+    
+    def _send_headers(self, status_code, etag=None, gzip=False, length=None, content_type='application/json'):
+        """Status line and headers; length=None means a streamed body"""
         self.send_response(status_code)
-        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Type', content_type)
         self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Content-Length', str(len(response)))
+        self.send_header('Vary', 'Accept-Encoding')
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        if length is not None:
+            self.send_header('Content-Length', str(length))
+        elif self.request_version == 'HTTP/1.1':
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            # HTTP/1.0 has no chunking: the body ends when we close
+            self.close_connection = True
+        if self._unread_body:
+            # Body was never read (auth failure, 404, ...): the connection
+            # cannot be reused because the stream is not at a request boundary
+            self.send_header('Connection', 'close')
+            self.close_connection = True
         self.end_headers()
+    
+    def _send_json(self, status_code, data, etag=None):
+        """Send compact JSON response, gzipped when negotiated"""
+        self._send_bytes(status_code, encode_json(data), etag)
+    
+    def _send_bytes(self, status_code, response, etag=None, content_type='application/json'):
+        """Send an encoded body, gzipped when negotiated"""
+        gzip = len(response) >= GZIP_MIN_SIZE and self._accepts_gzip()
+        if gzip:
+            response = gzip_bytes(response)
+        
+        self._send_headers(status_code, etag, gzip, len(response), content_type)
+        self.wfile.write(response)
+        self._response_bytes += len(response)
+    
+    def _send_cached(self, etag):
+        """Answer this GET from the response cache (200 or 304); False on a miss"""
+        cache = get_response_cache()
+        entry = cache.get(self.path) if cache is not None else None
+        if entry is None:
+            return False
+        if not self._not_modified(etag):
+            self._send_entry(cache, entry, etag)
+        return True
+    
+    def _send_cacheable(self, data, etag, generation, **depends):
+        """
+        Send a 200 JSON body and keep it in the response cache
+        `generation` is cache_generation() read before the store was; see
+        ResponseCache.put for `depends` (tx_id= or filters=).
+        """
+        body = encode_json(data)
+        cache = get_response_cache()
+        entry = cache.put(self.path, body, generation, **depends) if cache is not None else None
+        if entry is None:
+            return self._send_bytes(200, body, etag)
+        self._send_entry(cache, entry, etag)
+    
+    def _send_entry(self, cache, entry, etag):
+        """Send a cached body, gzipping it at most once per entry"""
+        response = entry.body
+        gzip = len(response) >= GZIP_MIN_SIZE and self._accepts_gzip()
+        if gzip:
+            response = entry.gzipped or cache.set_gzipped(entry, gzip_bytes(response))
         
-        self.wfile.write(response.encode('utf-8'))
+        self._send_headers(200, etag, gzip, len(response))
+        self.wfile.write(response)
+        self._response_bytes += len(response)
+    
+    def _stream_json(self, status_code, head, rows, etag=None):
+        """
+        Send {**head, "data": rows} without materializing the whole body
+        Rows are serialized STREAM_BATCH at a time and written as HTTP/1.1
+        chunks, compressed incrementally when gzip is negotiated.
+        """
+        chunked = self.request_version == 'HTTP/1.1'
+        gzip = self._accepts_gzip()
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if gzip else None
+        self._send_headers(status_code, etag, gzip)
+        
+        def send(data):
+            if not data:
+                return
+            self._response_bytes += len(data)
+            if chunked:
+                self.wfile.write(b'%X\r\n%s\r\n' % (len(data), data))
+            else:
+                self.wfile.write(data)
+        
+        def write(data):
+            send(compressor.compress(data) if compressor else data)
+        
+        prefix = json.dumps(head, separators=(',', ':'), ensure_ascii=False)[:-1]
+        write((prefix + (',"data":[' if head else '"data":[')).encode('utf-8'))
+        for i in range(0, len(rows), STREAM_BATCH):
+            batch = json.dumps(rows[i:i + STREAM_BATCH], separators=(',', ':'), ensure_ascii=False)
+            write(((',' if i else '') + batch[1:-1]).encode('utf-8'))
+        write(b']}')
+        
+        if compressor:
+            send(compressor.flush())
+        if chunked:
+            self.wfile.write(b'0\r\n\r\n')
+    
+    def log_request(self, code='-', size='-'):
+        """Requests are logged once complete, by _record_request"""
     
     def log_message(self, format, *args):
-        """Custom logging"""
-        auth = self.headers.get('Authorization', 'No Auth')
+        """Custom logging: queued on ACCESS_LOG, written off the request path"""
+        headers = getattr(self, 'headers', None)
+        auth = headers.get('Authorization', 'No Auth') if headers else 'No Auth'
         if auth.startswith('Basic '):
             auth = '[Auth]'
-        print(f"[{self.log_date_time_string()}] {self.client_address[0]} {self.command} {self.path} - {auth}")
+        elif auth.startswith('Bearer '):
+            auth = '[Token]'
+        ACCESS_LOG.log((time.time(), self.client_address[0], self.command, getattr(self, 'path', '-'),
+                        auth, format % args))
+
+
+class WriterHandler(TransactionHandler):
+    """--workers writer process: applies the writes workers forward over its Unix socket"""
+    
+    # Unix socket, no Nagle to turn off. The connections are the workers'
+    # pools (WRITER_CONNECTIONS each), so they stay open while idle.
+    disable_nagle_algorithm = False
+    timeout = None
+    
+    def end_headers(self):
+        """Tell the worker which store version its replica must reach before it answers"""
+        self.send_header(VERSION_HEADER, str(STORE.version))
+        super().end_headers()
+    
+    def log_message(self, format, *args):
+        """Logged by the worker that forwarded the request"""
+
+
+class WorkerHandler(TransactionHandler):
+    """--workers worker process: reads from this process's replica, writes forwarded to the writer"""
+    
+    @profiled
+    def do_POST(self):
+        """Forward to the writer"""
+        self._forward()
+    
+    @profiled
+    def do_PUT(self):
+        """Forward to the writer"""
+        self._forward()
+    
+    @profiled
+    def do_DELETE(self):
+        """Forward to the writer"""
+        self._forward()
+    
+    def _forward(self):
+        """Relay the request (body streamed) to the writer, answer once the replica applied the write"""
+        if not self._check_auth():
+            return
+        
+        reader = self._body()
+        try:
+            status, headers, body = WRITER.request(self.command, self.path, self.headers.items(),
+                                                   reader if not reader.done else None)
+        except ValueError as e:
+            # Broken body framing: the stream position is lost
+            self.close_connection = True
+            return self._send_json(400, {"error": "Bad Request", "message": str(e)})
+        except (OSError, http.client.HTTPException):
+            return self._send_json(503, {"error": "Service Unavailable", "message": "Writer process unavailable"})
+        finally:
+            self._unread_body = 0 if reader.done else 1
+            self._request_bytes = reader.bytes_read
+        
+        version = next((value for name, value in headers if name.lower() == VERSION_HEADER.lower()), None)
+        if version is not None and not FOLLOWER.wait_for(int(version)):
+            # Committed, but a read on this worker would not see it yet: say so rather than relay success
+            return self._send_json(503, {"error": "Service Unavailable",
+                                         "message": f"Write committed at version {version}, but this worker "
+                                                    f"has not applied it yet; do not repeat it",
+                                         "version": int(version)})
+        self.send_response(status)
+        for name, value in relayed_headers(headers):
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self._response_bytes += len(body)
+
+
+def encode_json(data):
+    """Compact UTF-8 JSON, as every response body is sent"""
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def gzip_bytes(data):
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def relative_to_now(query):
+    """True if the answer moves with the clock (days=N without until), so it cannot be cached"""
+    params = parse_qs(query)
+    return 'days' in params and 'until' not in params
+
+
+QUERY_STRINGS = ('transaction_type', 'sender', 'receiver', 'counterparty', 'start', 'end')
+QUERY_NUMBERS = ('min_amount', 'max_amount')
+QUERY_INTS = ('limit', 'offset', 'after')
+
+
+def parse_query(query):
+    """Parse GET /transactions query parameters into TransactionStore.query kwargs"""
+    params = {}
+    window_params = {}
+    for name, values in parse_qs(query).items():
+        value = values[-1]
+        if name in QUERY_STRINGS:
+            params[name] = value
+        elif name in QUERY_NUMBERS:
+            try:
+                params[name] = float(value) if '.' in value else int(value)
+            except ValueError:
+                raise ValueError(f"{name} must be a number")
+        elif name in QUERY_INTS:
+            if not value.isdigit():
+                raise ValueError(f"{name} must be a non-negative integer")
+            params[name] = int(value)
+        elif name == 'fields':
+            fields = [f for f in value.split(',') if f]
+            unknown = [f for f in fields if f != 'id' and f not in FIELDS]
+            if unknown:
+                raise ValueError(f"Unknown field: {unknown[0]}")
+            params[name] = fields
+        elif name in ('days', 'until'):
+            window_params[name] = value
+        else:
+            raise ValueError(f"Unknown parameter: {name}")
+    if window_params:
+        if 'start' in params or 'end' in params:
+            raise ValueError("days/until cannot be combined with start/end")
+        start, end = time_window(window_params)
+        params['start'], params['end'] = ms_to_iso(start), ms_to_iso(end)
+    return params
+
+
+def time_window(params):
+    """
+    (start, end) epoch ms from start/end (ISO timestamps or date prefixes)
+    or days=N with an optional until (default now); None = unbounded
+    """
+    days = params.get('days')
+    try:
+        if days is not None:
+            if not days.isdigit() or not int(days):
+                raise ValueError("days must be a positive integer")
+            until = params.get('until')
+            bounds = window(int(days), None if until is None else to_ms(until))
+        elif 'until' in params:
+            raise ValueError("until needs days")
+        else:
+            start, end = params.get('start'), params.get('end')
+            bounds = (None if start is None else to_ms(start)), (None if end is None else to_ms(end))
+    except (OverflowError, OSError):
+        raise ValueError("Timestamp out of range")
+    # The index works in calendar days: a bound past year 9999 has none
+    if not all(bound is None or in_range(bound) for bound in bounds):
+        raise ValueError("Timestamp out of range")
+    return bounds
+
+
+def use_store(store):
+    """Install a store (TransactionStore, SQLiteStore or TransactionColumns) and reset derived state"""
+    global STORE, ROLLUPS, SEARCH, TIMES, RESPONSES, TXIDS, LEDGER
+    if isinstance(store, TransactionColumns):
+        store = TransactionStore(store)
+    with ROLLUPS_LOCK:
+        STORE = store
+        ROLLUPS = None
+        SEARCH = None
+        TIMES = None
+        RESPONSES = None
+        TXIDS = None
+        LEDGER = None
+
+
+def get_rollups():
+    """Rollups for the current store, subscribed on first use"""
+    global ROLLUPS
+    with ROLLUPS_LOCK:
+        if ROLLUPS is None:
+            rollups = Rollups()
+            STORE.subscribe(rollups)
+            ROLLUPS = rollups
+        return ROLLUPS
+
+
+def get_search_index():
+    """Search index for the current store, subscribed on first use"""
+    global SEARCH
+    with ROLLUPS_LOCK:
+        if SEARCH is None:
+            index = SearchIndex()
+            STORE.subscribe(index)
+            SEARCH = index
+        return SEARCH
+
+
+def get_time_index():
+    """Epoch-ms time index for the current store, subscribed on first use"""
+    global TIMES
+    with ROLLUPS_LOCK:
+        if TIMES is None:
+            index = TimeIndex()
+            STORE.subscribe(index)
+            TIMES = index
+        return TIMES
+
+
+def get_response_cache():
+    """Response cache for the current store (None when disabled), subscribed on first use"""
+    global RESPONSES
+    if not RESPONSE_CACHE_BYTES:
+        return None
+    with ROLLUPS_LOCK:
+        if RESPONSES is None:
+            cache = ResponseCache(RESPONSE_CACHE_BYTES)
+            # Only writes from now on matter: there is nothing cached to replay into
+            STORE.subscribe(cache, replay=False)
+            RESPONSES = cache
+        return RESPONSES
+
+
+def get_txid_index():
+    """
+    Provider txids already in the current store, subscribed on first use
+    In memory every row's txid is in the exact map. A SQLite table can be
+    much bigger than what should live in the heap: a Bloom filter is built
+    over its txid column, and only the filter's positives query idx_txid.
+    """
+    global TXIDS
+    with ROLLUPS_LOCK:
+        if TXIDS is None:
+            find = getattr(STORE, 'find_txid', None)
+            if find is None:
+                index = DedupIndex()
+                STORE.subscribe(index)
+            else:
+                index = DedupIndex(BloomFilter(max(MIN_CAPACITY, 2 * len(STORE))), find)
+                # Subscribe first: a row committed while the filter fills is in the exact map
+                STORE.subscribe(index, replay=False)
+                for txid in STORE.txids():
+                    index.bloom.add(txid_key(txid))
+            TXIDS = index
+        return TXIDS
+
+
+def get_ledger():
+    """
+    Ledger of the current store, rebuilt on the first request after a write
+    A rebuild reads every row, so a write-heavy period costs one rebuild per
+    ledger request, not one per write.
+    """
+    global LEDGER
+    with LEDGER_LOCK:
+        version = STORE.version
+        if LEDGER is None or LEDGER.version != version:
+            ledger = Ledger.from_records(STORE.all())
+            # Tagged with the version read before the scan: a write during it forces a rebuild
+            ledger.version = version
+            LEDGER = ledger
+        return LEDGER
+
+
+def create_unique(items):
+    """
+    Create the field dicts whose txid is not taken; returns (created, duplicates)
+    duplicates are (position in items, id of the transaction that has the
+    txid), including repeats within items. Items without a txid are always
+    created.
+    """
+    index = get_txid_index()
+    store = STORE
+    tickets = None
+    with CREATE_LOCK:
+        fresh = []
+        duplicates = []
+        repeats = []
+        pending = {}                # txid -> position in fresh
+        for position, fields in enumerate(items):
+            txid = fields.get('txid')
+            if txid is not None:
+                if txid in pending:
+                    repeats.append((position, pending[txid]))
+                    continue
+                existing = index.find(txid)
+                if existing is not None:
+                    duplicates.append((position, existing))
+                    continue
+                pending[txid] = len(fresh)
+            fresh.append(fields)
+        if not fresh:
+            created = []
+        elif isinstance(store, LoggedStore):
+            # The rows are in the store (and the index) now; waiting for the fsync / replicas
+            # happens after releasing the lock, so concurrent creates share it
+            created, tickets = store.apply('create_many', fresh)
+        else:
+            created = store.create_many(fresh)
+        # Repeats within items point at the row created from their first copy
+        duplicates += [(position, created[first]['id']) for position, first in repeats]
+        index.duplicates += len(duplicates)
+    if tickets:
+        store.sync(tickets)
+    return created, sorted(duplicates)
+
+
+def cache_generation():
+    """Response cache generation, read before the store when building a cacheable body"""
+    cache = get_response_cache()
+    return cache.generation if cache is not None else None
+
+
+def time_buckets(index, interval, start, end):
+    """GET /stats/buckets body: totals for the range plus one entry per period"""
+    count, total = index.count(start, end)
+    return {
+        'interval': interval,
+        'start': None if start is None else ms_to_iso(start),
+        'end': None if end is None else ms_to_iso(end),
+        'count': count,
+        'total_amount': total,
+        'buckets': index.buckets(interval, start, end),
+    }
+
+
+def balance_report(ledger, at=None):
+    """/stats/balance body: balance at epoch ms `at`, or after the latest transaction"""
+    if at is None:
+        at = ledger.times[-1] if len(ledger) else 0
+    return {'at': ms_to_iso(at), **ledger.balance_at(at)}
+
+
+def export_columns():
+    """Snapshot the current store as a TransactionColumns table"""
+    return TransactionColumns.from_records(STORE.all())
 
 
 def load_transactions(json_file):
-    """Load transactions from JSON file"""
-    global TRANSACTIONS
+    """Load transactions from the ETL output (.json, .ndjson, or mmapped .col)"""
+    started = time.perf_counter()
     try:
-        with open(json_file, 'r') as f:
-            TRANSACTIONS = json.load(f)
-        print(f"✓ Loaded {len(TRANSACTIONS)} transactions")
+        if json_file.endswith('.col'):
+            use_store(MappedStore(load_columns(json_file)))
+        elif json_file.endswith('.ndjson'):
+            use_store(TransactionStore(iter_ndjson(json_file)))
+        else:
+            with open(json_file, 'r') as f:
+                use_store(TransactionStore(json.load(f)))
+        print(f"✓ Loaded {len(STORE)} transactions")
     except FileNotFoundError:
         print(f"✗ {json_file} not found")
-        TRANSACTIONS = []
+        use_store(TransactionStore())
     except json.JSONDecodeError:
         print(f"✗ Invalid JSON in {json_file}")
-        TRANSACTIONS = []
+        use_store(TransactionStore())
+    except ValueError as e:
+        print(f"✗ {e}")
+        use_store(TransactionStore())
+    METRICS.set('momo_store_load_seconds', value=time.perf_counter() - started)
 
 
-def run_server(host='localhost', port = 8000):
-    """Run HTTP server"""
-    server_address = (host, port)
-    httpd = HTTPServer(server_address, TransactionHandler)
-    
+def load_database(db_file, json_file=None):
+    """Serve from a SQLite database, importing the ETL JSON once if it is new"""
+    started = time.perf_counter()
+    use_store(open_store(db_file, json_file))
+    METRICS.set('momo_store_load_seconds', value=time.perf_counter() - started)
+    print(f"✓ Opened {db_file} ({len(STORE)} transactions)")
+
+
+def load_journal(directory, json_file):
+    """
+    Serve what a journal directory kept: its latest snapshot plus the journal after it
+    The first time (no snapshot yet) the journal starts from json_file,
+    the ETL output; from then on the directory alone is the data.
+    """
+    started = time.perf_counter()
+    if not journal_files(directory)['snapshot']:
+        load_transactions(json_file)
+    try:
+        store, replayed = recover(directory, STORE)
+    except ValueError as e:
+        sys.exit(f"✗ Cannot recover {directory}: {e}")
+    use_store(store)
+    METRICS.set('momo_store_load_seconds', value=time.perf_counter() - started)
+    print(f"✓ Recovered {len(STORE)} transactions from {directory} ({replayed} journal writes replayed "
+          f"in {time.perf_counter() - started:.2f}s)")
+
+
+def open_journal(directory, sync='group', window=DEFAULT_WINDOW, compact_bytes=DEFAULT_COMPACT_BYTES,
+                 snapshot_format='.json'):
+    """Journal every write to the current STORE from now on; wrap STORE in LoggedStore with it"""
+    global JOURNAL
+    JOURNAL = Journal(directory, STORE, sync, window, compact_bytes, snapshot_format)
+    return JOURNAL
+
+
+def start_ingest(directory, checkpoint=None, state_file=None, interval=DEFAULT_INTERVAL, batch_size=DEFAULT_BATCH):
+    """
+    Watch directory for new SMS backups and commit them to the current STORE as they arrive
+    Rows go through create_unique, so a message whose txid is already in
+    the store (an overlapping backup from another phone) is skipped.
+    """
+    global INGESTOR
+    INGESTOR = Ingestor(directory, lambda items: create_unique(items)[0], checkpoint, state_file,
+                        interval=interval, batch_size=batch_size)
+    METRICS.counter('momo_ingest_files_total', "Backup files ingested from the watched directory",
+                    lambda: INGESTOR.files)
+    METRICS.counter('momo_ingest_messages_total', "Transactions added by the ingestor", lambda: INGESTOR.messages)
+    METRICS.counter('momo_ingest_batches_total', "Ingest batches committed", lambda: INGESTOR.batches)
+    METRICS.counter('momo_ingest_errors_total', "Backup files or batches that failed", lambda: INGESTOR.errors)
+    METRICS.gauge('momo_ingest_pending', "Transactions parsed but not committed yet", lambda: len(INGESTOR))
+    METRICS.histogram('momo_ingest_lag_seconds', "Time from a file's last write to its last row being committed")
+    INGESTOR.on_file = lambda name, messages, lag: METRICS.observe('momo_ingest_lag_seconds', (), lag)
+    INGESTOR.start()
+
+
+def watch_state_path(db=None, journal=None):
+    """Default --watch-state of a durable store: next to the database or in the journal directory"""
+    if db:
+        return os.path.splitext(db)[0] + '.watch.checkpoint.json'
+    if journal:
+        return os.path.join(journal, 'watch.checkpoint.json')
+    return None
+
+
+def enable_profiling(every, path):
+    """cProfile one request in every `every`, dumping merged stats to path"""
+    global PROFILER
+    PROFILER = RequestProfiler(every, path) if every else None
+
+
+def print_banner(host, port, workers):
+    """Startup summary: address, store, auth, serving mode and endpoints"""
     print("\n" + "="*70)
     print("REST API SERVER")
     print("="*70)
     print(f"\nServer: http://{host}:{port}")
-    print(f"Transactions: {len(TRANSACTIONS)} loaded")
-    print(f"Auth: Basic (admin/admin123)")
+    print(f"Transactions: {len(STORE)} loaded")
+    print(f"Auth: Basic ({', '.join(sorted(AUTH.users))})" + (", Bearer sessions" if AUTH.sessions else ""))
+    print(f"Workers: {workers}")
+    print(f"Response cache: {f'{RESPONSE_CACHE_BYTES / 2**20:g} MiB' if RESPONSE_CACHE_BYTES else 'off'}")
     print("\nEndpoints:")
     print(f"  GET    /transactions         - Get all")
     print(f"  GET    /transactions/{{id}}    - Get one")
     print(f"  POST   /transactions         - Create")
     print(f"  PUT    /transactions/{{id}}    - Update")
     print(f"  DELETE /transactions/{{id}}    - Delete")
+    print(f"  POST|PUT|DELETE /transactions/bulk - Batch create/update/delete (JSON array or NDJSON)")
+    print(f"  GET    /stats[/timeseries|/top|/histogram|/buckets] - Aggregates")
+    print(f"  GET    /search?q=            - Counterparty / SMS text search")
+    print(f"  GET    /metrics              - Prometheus metrics")
+    if AUTH.sessions:
+        print(f"  POST   /auth/token           - Start a session (DELETE to end it)")
+    if PROFILER:
+        print(f"\nProfiling 1 in {PROFILER.every} requests -> {PROFILER.path}")
+    if INGESTOR:
+        print(f"\nWatching {INGESTOR.directory} for *.xml backups (every {INGESTOR.interval:g}s, "
+              f"batches of {INGESTOR.batch_size})")
     print("\nPress Ctrl+C to stop")
     print("="*70 + "\n")
+
+
+def run_server(host='localhost', port = 8000, threads=DEFAULT_THREADS):
+    """Run HTTP server (threads=0 serves one connection at a time)"""
+    server_address = (host, port)
+    if threads > 0:
+        httpd = PooledHTTPServer(server_address, TransactionHandler, max_workers=threads)
+    else:
+        httpd = HTTPServer(server_address, TransactionHandler)
     
+    print_banner(host, port, threads if threads > 0 else 'single-threaded')
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
         print("\n✓ Server stopped")
+        if INGESTOR:
+            INGESTOR.stop()
+        httpd.server_close()
+        if JOURNAL:
+            JOURNAL.close()
+        ACCESS_LOG.close()
+
+
+def run_prefork(host='localhost', port=8000, threads=DEFAULT_THREADS, workers=2, journal=None, on_writer_start=None):
+    """
+    Serve from `workers` forked processes plus one writer process (see prefork.py)
+    The indexes behind /stats and /search are built before forking, so the
+    workers share them copy-on-write instead of each building its own.
+    journal (open_journal with its arguments bound) and on_writer_start
+    (the --watch ingestor) run in the writer process. Returns the exit status.
+    """
+    get_rollups()
+    get_search_index()
+    get_time_index()
+    cluster = Prefork((host, port), workers)
+    pool = f"{threads} threads each" if threads > 0 else "single-threaded"
+    print_banner(host, cluster.address[1], f"{workers} processes ({pool}) + 1 writer process")
+    status = cluster.run(functools.partial(_run_writer, journal=journal, on_start=on_writer_start),
+                         functools.partial(_run_worker, threads=threads))
+    print("\n✓ Server stopped")
+    return status
+
+
+def _run_writer(cluster, journal=None, on_start=None):
+    """--workers writer process: the only one that changes the store, broadcasting each write"""
+    global STORE
+    cluster.listener.close()
+    replicator = Replicator(STORE)
+    # Journal first: its flush queues the write before workers are sent it
+    STORE = LoggedStore(STORE, *([journal()] if journal else []), replicator)
+    httpd = UnixHTTPServer(cluster.writer_path, WriterHandler, max_workers=cluster.workers * WRITER_CONNECTIONS)
+    # Followers connect once this exists, and then find the writer socket ready
+    replicator.serve(cluster.replica_path)
+    if on_start:
+        on_start()
+    try:
+        httpd.serve_forever()
+    finally:
+        if INGESTOR:
+            INGESTOR.stop()
+        replicator.close()
         httpd.server_close()
+        if JOURNAL:
+            JOURNAL.close()
+        ACCESS_LOG.close()
+
+
+def _run_worker(cluster, slot, threads=DEFAULT_THREADS):
+    """--workers worker process: catch up with the writer, then serve on the shared socket"""
+    global FOLLOWER, WRITER
+    # Losing the writer ends this worker: the master restarts it, or stops if the writer is gone
+    FOLLOWER = Follower(STORE, cluster.replica_path, on_lost=lambda: os.kill(os.getpid(), signal.SIGTERM))
+    FOLLOWER.start()
+    if FOLLOWER.store is not STORE:
+        # Restarted after the writer dropped the ops since the fork: serve the rows it sent
+        use_store(FOLLOWER.store)
+    WRITER = WriterClient(cluster.writer_path)
+    if threads > 0:
+        httpd = adopt(PooledHTTPServer, cluster.listener, WorkerHandler, max_workers=threads)
+    else:
+        httpd = adopt(HTTPServer, cluster.listener, WorkerHandler)
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        ACCESS_LOG.close()
 
 
 if __name__ == '__main__':
-    import os
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    json_file = os.path.join(base_dir, 'data', 'transactions.json')
-    load_transactions(json_file)
-    run_server()
+    
+    parser = argparse.ArgumentParser(description="Transactions REST API server")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS,
+                        help=f"worker pool size, 0 = single-threaded (default: {DEFAULT_THREADS})")
+    parser.add_argument('--workers', type=int, default=0, metavar='N',
+                        help="serve from N forked processes sharing the port, writes going through one "
+                             "writer process (default: 0, serve from this process)")
+    parser.add_argument('--data', default=os.path.join(base_dir, 'data', 'transactions.json'),
+                        help="ETL output: transactions .json, .ndjson or binary .col")
+    parser.add_argument('--db', help="persist to this SQLite database instead of serving the JSON "
+                                     "from memory (imports --data on first use)")
+    parser.add_argument('--journal', metavar='DIR',
+                        help="keep the in-memory store durable: journal every write to DIR and snapshot it "
+                             "there; restarts recover from DIR (--data only seeds a new DIR)")
+    parser.add_argument('--journal-sync', choices=SYNC_MODES, default='group',
+                        help="group: one fsync per batch of concurrent writes, write: fsync each write, "
+                             "none: leave flushing to the OS (default: group)")
+    parser.add_argument('--journal-window', type=float, default=DEFAULT_WINDOW * 1000, metavar='MS',
+                        help="milliseconds a group commit waits for more writes to join it "
+                             f"(default: {DEFAULT_WINDOW * 1000:g})")
+    parser.add_argument('--compact-mb', type=float, default=DEFAULT_COMPACT_BYTES / 2**20,
+                        help="snapshot the store once the journal since the last snapshot passes this "
+                             f"(default: {DEFAULT_COMPACT_BYTES // 2**20})")
+    parser.add_argument('--users', help="JSON file of {username: password hash} (default: admin/admin123)")
+    parser.add_argument('--sessions', action='store_true',
+                        help="enable POST /auth/token and Bearer token authentication")
+    parser.add_argument('--token-ttl', type=int, default=AUTH.token_ttl,
+                        help=f"bearer token lifetime in seconds (default: {AUTH.token_ttl})")
+    parser.add_argument('--auth-cache-size', type=int, default=AUTH.cache.size,
+                        help=f"verified credentials kept, 0 = hash every request (default: {AUTH.cache.size})")
+    parser.add_argument('--auth-cache-ttl', type=float, default=AUTH.cache.ttl,
+                        help=f"seconds a verified credential is trusted (default: {AUTH.cache.ttl})")
+    parser.add_argument('--cache-mb', type=float, default=DEFAULT_MAX_BYTES / 2**20,
+                        help=f"response cache size in MiB, 0 = off (default: {DEFAULT_MAX_BYTES // 2**20})")
+    parser.add_argument('--access-log', help="append access log lines to this file (default: stdout)")
+    parser.add_argument('--profile-every', type=int, default=0, metavar='N',
+                        help="cProfile one request in every N (default: off)")
+    parser.add_argument('--profile-out', default=os.path.join(base_dir, 'data', 'api.prof'),
+                        help="merged profile dump, readable with pstats (default: data/api.prof)")
+    parser.add_argument('--watch', metavar='DIR',
+                        help="ingest SMS backup .xml files dropped into DIR while serving")
+    parser.add_argument('--watch-interval', type=float, default=DEFAULT_INTERVAL,
+                        help=f"seconds between directory polls (default: {DEFAULT_INTERVAL:g})")
+    parser.add_argument('--watch-batch', type=int, default=DEFAULT_BATCH,
+                        help=f"transactions per store commit (default: {DEFAULT_BATCH})")
+    parser.add_argument('--watch-state', metavar='FILE',
+                        help="checkpoint of what --watch has ingested, kept across restarts (needs --db or "
+                             "--journal; default: next to the database / in the journal directory)")
+    args = parser.parse_args()
+    if args.watch_state and not (args.db or args.journal):
+        parser.error("--watch-state needs --db or --journal: the in-memory store forgets ingested rows on restart")
+    if args.journal and args.db:
+        parser.error("--journal makes the in-memory store durable; --db is durable already")
+    if args.workers and args.db:
+        parser.error("--workers serves the in-memory store (--data), not --db")
+    if args.workers and args.sessions:
+        parser.error("--sessions keeps bearer tokens in one process: not available with --workers")
+    
+    if args.users:
+        AUTH.load_users(args.users)
+    AUTH.sessions = args.sessions
+    AUTH.token_ttl = args.token_ttl
+    AUTH.cache.size = args.auth_cache_size
+    AUTH.cache.ttl = args.auth_cache_ttl
+    RESPONSE_CACHE_BYTES = int(args.cache_mb * 2**20)
+    if args.access_log:
+        ACCESS_LOG.stream = open(args.access_log, 'a', encoding='utf-8')
+    enable_profiling(args.profile_every, args.profile_out)
+    if args.db:
+        load_database(args.db, args.data)
+    elif args.journal:
+        load_journal(args.journal, args.data)
+    else:
+        load_transactions(args.data)
+    journal = None
+    if args.journal:
+        snapshot_format = os.path.splitext(args.data)[1] if args.data.endswith(('.ndjson', '.col')) else '.json'
+        journal = functools.partial(open_journal, args.journal, args.journal_sync, args.journal_window / 1000,
+                                    int(args.compact_mb * 2**20), snapshot_format)
+    if args.watch:
+        # A durable store keeps its watch state, or a restart would ingest
+        # every file in DIR again. Without saved state, start from the ETL's
+        # checkpoint for the loaded data so backups it covered are not added twice
+        state_file = args.watch_state or watch_state_path(args.db, args.journal)
+        checkpoint = Checkpoint.load(state_file) if state_file else None
+        if checkpoint is None:
+            checkpoint = Checkpoint.load(checkpoint_path(args.data))
+        ingest = functools.partial(start_ingest, args.watch, checkpoint, state_file,
+                                   args.watch_interval, args.watch_batch)
+    if args.workers:
+        # The ingestor writes, so it runs in the writer process
+        sys.exit(run_prefork(args.host, args.port, args.threads, args.workers, journal,
+                             ingest if args.watch else None))
+    if journal:
+        use_store(LoggedStore(STORE, journal()))
+    if args.watch:
+        ingest()
+    run_server(args.host, args.port, args.threads)
@@ -0,0 +1,239 @@
+"""
+Auth: Password hashing, a verified-credential cache and bearer token sessions
+
+Passwords are stored as salted KDF hashes (stdlib hashlib):
+  pbkdf2_sha256$<iterations>$<salt>$<hash>
+  scrypt$<n>$<r>$<p>$<salt>$<hash>
+A realistic work factor makes one verification cost tens to hundreds of
+milliseconds, far too much to pay on every request, so:
+  - CredentialCache: maps a successfully verified Authorization header to
+    its user. TTL + LRU eviction; keys are SHA-256 digests of the header, so
+    no credentials are kept in memory. Only successes are cached.
+  - Sessions: POST /auth/token exchanges Basic credentials for a random
+    bearer token; later requests are a single dict lookup.
+Changing or removing a user clears the cache and that user's tokens.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+PBKDF2_ITERATIONS = 600_000
+SCRYPT_PARAMS = (2**14, 8, 1)      # n, r, p
+SALT_BYTES = 16
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL = 300            # seconds a verified header is trusted
+DEFAULT_TOKEN_TTL = 3600
+
+
+class AuthError(ValueError):
+    """Authentication failed; the message is safe to return to the client"""
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def hash_password(password, algorithm='pbkdf2_sha256', salt=None):
+    """Encode a password as an algorithm$params$salt$hash string"""
+    salt = salt or os.urandom(SALT_BYTES)
+    if algorithm == 'pbkdf2_sha256':
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, PBKDF2_ITERATIONS)
+        return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${_b64(salt)}${_b64(digest)}"
+    if algorithm == 'scrypt':
+        n, r, p = SCRYPT_PARAMS
+        digest = hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p)
+        return f"scrypt${n}${r}${p}${_b64(salt)}${_b64(digest)}"
+    raise ValueError(f"Unknown password hash algorithm: {algorithm}")
+
+
+def verify_password(password, encoded):
+    """True if password matches an encoded hash (constant-time compare)"""
+    algorithm, *params = encoded.split('$')
+    secret = password.encode('utf-8')
+    if algorithm == 'pbkdf2_sha256':
+        iterations, salt, expected = params
+        digest = hashlib.pbkdf2_hmac('sha256', secret, base64.b64decode(salt), int(iterations))
+    elif algorithm == 'scrypt':
+        n, r, p, salt, expected = params
+        digest = hashlib.scrypt(secret, salt=base64.b64decode(salt), n=int(n), r=int(r), p=int(p))
+    else:
+        raise ValueError(f"Unknown password hash algorithm: {algorithm}")
+    return hmac.compare_digest(digest, base64.b64decode(expected))
+
+
+class CredentialCache:
+    """LRU of header digest -> (user, expiry); size 0 disables caching"""
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL, clock=time.monotonic):
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= self.clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, user):
+        if not self.size:
+            return
+        with self._lock:
+            self._entries[key] = (user, self.clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class Authenticator:
+    """
+    Users with hashed passwords, checked via Basic or Bearer headers
+    authenticate(header) returns the username or raises AuthError.
+    Bearer tokens are only accepted when sessions are enabled.
+    """
+
+    def __init__(self, users=None, cache_size=DEFAULT_CACHE_SIZE, cache_ttl=DEFAULT_CACHE_TTL,
+                 sessions=False, token_ttl=DEFAULT_TOKEN_TTL, clock=time.monotonic):
+        self.users = dict(users or {})          # username -> encoded hash
+        self.cache = CredentialCache(cache_size, cache_ttl, clock)
+        self.sessions = sessions
+        self.token_ttl = token_ttl
+        self.clock = clock
+        self._tokens = {}                       # token -> (username, expiry)
+        self._sweep_at = 1024
+        self._lock = threading.Lock()
+        self._dummy = None
+        self._generation = 0                    # bumped on user changes
+
+    # ========== USERS ==========
+
+    def set_user(self, username, encoded):
+        """Add or replace a user's password hash; drops cached logins and tokens"""
+        with self._lock:
+            self.users[username] = encoded
+            self._forget(username)
+
+    def remove_user(self, username):
+        with self._lock:
+            self.users.pop(username, None)
+            self._forget(username)
+
+    def _forget(self, username):
+        self._generation += 1
+        self.cache.clear()
+        for token in [t for t, (user, _) in self._tokens.items() if user == username]:
+            del self._tokens[token]
+
+    def load_users(self, path):
+        """Replace users with {"username": "<encoded hash>"} from a JSON file"""
+        with open(path, 'r', encoding='utf-8') as f:
+            users = json.load(f)
+        with self._lock:
+            self.users = dict(users)
+            self._generation += 1
+            self.cache.clear()
+            self._tokens.clear()
+
+    # ========== CHECKS ==========
+
+    def authenticate(self, header):
+        """Return the username for an Authorization header, or raise AuthError"""
+        if header.startswith('Bearer '):
+            if not self.sessions:
+                raise AuthError("Bearer tokens are not enabled")
+            return self._check_token(header[7:].strip())
+        if not header.startswith('Basic '):
+            raise AuthError("Missing Authorization header")
+
+        key = hashlib.sha256(header.encode('utf-8', 'surrogateescape')).digest()
+        user = self.cache.get(key)
+        if user is not None:
+            return user
+        generation = self._generation
+        try:
+            username, password = base64.b64decode(header[6:], validate=True).decode('utf-8').split(':', 1)
+        except ValueError:
+            raise AuthError("Invalid Authorization header")
+        if not self.check_password(username, password):
+            raise AuthError("Invalid credentials")
+        if generation == self._generation:
+            # Not if the user changed while the KDF ran
+            self.cache.put(key, username)
+        return username
+
+    def check_password(self, username, password):
+        """Run the KDF; unknown users are checked against a dummy hash so timing does not reveal them"""
+        encoded = self.users.get(username)
+        if encoded is None:
+            if self._dummy is None:
+                self._dummy = hash_password(secrets.token_hex(8))
+            verify_password(password, self._dummy)
+            return False
+        return verify_password(password, encoded)
+
+    # ========== SESSIONS ==========
+
+    def issue_token(self, username):
+        """New bearer token for an authenticated user; returns (token, ttl seconds)"""
+        token = secrets.token_urlsafe(32)
+        now = self.clock()
+        with self._lock:
+            if len(self._tokens) >= self._sweep_at:
+                # Sweep when the table doubles, so abandoned sessions do not pile up
+                for expired in [t for t, (_, expiry) in self._tokens.items() if expiry <= now]:
+                    del self._tokens[expired]
+                self._sweep_at = max(1024, 2 * len(self._tokens))
+            self._tokens[token] = (username, now + self.token_ttl)
+        return token, self.token_ttl
+
+    def revoke_token(self, token):
+        """End a session; returns True if the token existed"""
+        with self._lock:
+            return self._tokens.pop(token, None) is not None
+
+    def _check_token(self, token):
+        session = self._tokens.get(token)
+        if session is None:
+            raise AuthError("Invalid or expired token")
+        username, expiry = session
+        if expiry <= self.clock():
+            self.revoke_token(token)
+            raise AuthError("Invalid or expired token")
+        return username
+
+
+def main(argv=None):
+    """Print a password hash for a users file: python api/auth.py [--scrypt]"""
+    import getpass
+    algorithm = 'scrypt' if '--scrypt' in (argv or sys.argv[1:]) else 'pbkdf2_sha256'
+    print(hash_password(getpass.getpass("Password: "), algorithm))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
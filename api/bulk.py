@@ -0,0 +1,263 @@
+"""
+Bulk: Streaming request bodies for the batch endpoints
+
+POST/PUT/DELETE /transactions/bulk take many items in one request. Bodies
+are read from rfile in blocks and decoded item by item, so a large upload
+is never held in memory as one bytes object or one parsed list:
+  - BodyReader:  Content-Length or chunked transfer encoding -> byte blocks
+  - iter_items:  a JSON array ([{...}, {...}]) or NDJSON (one value per
+                 line), detected from the first byte; yields
+                 (index, item, error) so a bad NDJSON line fails alone
+  - batched:     groups valid items for one store call per batch
+"""
+import codecs
+import json
+import math
+
+BLOCK_SIZE = 64 * 1024
+BATCH_SIZE = 1000
+MAX_ITEM_SIZE = 1024 * 1024         # characters buffered for one item before giving up
+REQUIRED = ('transaction_type', 'amount', 'sender', 'receiver')
+TEXT_FIELDS = ('transaction_type', 'sender', 'receiver')
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\r\n'
+
+
+class BodyReader:
+    """Iterate a request body in blocks; `done` is True once it was read to the end"""
+
+    def __init__(self, rfile, length=0, chunked=False, block_size=BLOCK_SIZE):
+        self.rfile = rfile
+        self.remaining = length
+        self.chunked = chunked
+        self.block_size = block_size
+        self.bytes_read = 0
+        self.done = not chunked and not length
+
+    def __iter__(self):
+        return self._chunks() if self.chunked else self._sized()
+
+    def _sized(self):
+        while self.remaining > 0:
+            block = self.rfile.read(min(self.block_size, self.remaining))
+            if not block:
+                raise ValueError("Request body ended early")
+            self.remaining -= len(block)
+            self.bytes_read += len(block)
+            yield block
+        self.done = True
+
+    def _chunks(self):
+        while True:
+            line = self.rfile.readline(1024)
+            try:
+                size = int(line.split(b';', 1)[0], 16)
+            except ValueError:
+                raise ValueError("Invalid chunk size")
+            if size == 0:
+                # Skip trailer headers up to the blank line
+                while self.rfile.readline(1024) not in (b'\r\n', b'\n', b''):
+                    pass
+                self.done = True
+                return
+            while size > 0:
+                block = self.rfile.read(min(self.block_size, size))
+                if not block:
+                    raise ValueError("Request body ended early")
+                size -= len(block)
+                self.bytes_read += len(block)
+                yield block
+            self.rfile.readline(1024)
+
+
+def iter_items(blocks):
+    """
+    Yield (index, item, error) for each value in a JSON array or NDJSON body
+    error is None or a message. A malformed NDJSON line is reported and
+    skipped; in an array the position is lost, so a syntax error is
+    reported once and iteration stops.
+    """
+    text = _text(blocks)
+    buffer = ''
+    for piece in text:
+        buffer += piece
+        start = _skip(buffer, 0)
+        if start < len(buffer):
+            break
+    else:
+        return
+    if buffer[start] == '[':
+        yield from _array_items(buffer, start + 1, text)
+    else:
+        yield from _ndjson_items(buffer, text)
+
+
+def _text(blocks):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for block in blocks:
+        yield decoder.decode(block)
+    yield decoder.decode(b'', final=True)
+
+
+def _skip(buffer, pos, chars=_WHITESPACE):
+    while pos < len(buffer) and buffer[pos] in chars:
+        pos += 1
+    return pos
+
+
+def _array_items(buffer, pos, text):
+    index = 0
+    expect_value = True
+    exhausted = False
+    while True:
+        pos = _skip(buffer, pos)
+        # Keep at least one complete value (or the closing bracket) in the buffer
+        if pos >= len(buffer) and not exhausted:
+            buffer, pos, exhausted = _refill(buffer, pos, text)
+            continue
+        if pos >= len(buffer):
+            yield index, None, "Invalid JSON: unterminated array"
+            return
+        char = buffer[pos]
+        if char == ']' and (not expect_value or index == 0):
+            if _skip(buffer, pos + 1) < len(buffer) or any(p.strip() for p in text):
+                yield index, None, "Invalid JSON: data after the array"
+            return
+        if not expect_value:
+            if char != ',':
+                yield index, None, f"Invalid JSON: expected ',' or ']' at item {index}"
+                return
+            pos += 1
+            expect_value = True
+            continue
+        try:
+            item, end = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            if not exhausted and len(buffer) - pos < MAX_ITEM_SIZE:
+                buffer, pos, exhausted = _refill(buffer, pos, text)
+                continue
+            yield index, None, f"Invalid JSON: {e.msg}"
+            return
+        if end == len(buffer) and not exhausted and isinstance(item, (int, float)):
+            # A number at the end of the buffer may continue in the next block
+            buffer, pos, exhausted = _refill(buffer, pos, text)
+            continue
+        yield index, item, None
+        index += 1
+        pos = end
+        expect_value = False
+
+
+def _refill(buffer, pos, text):
+    """Drop consumed text and append the next block; returns (buffer, pos, exhausted)"""
+    buffer = buffer[pos:]
+    for piece in text:
+        if piece:
+            return buffer + piece, 0, False
+    return buffer, 0, True
+
+
+def _ndjson_items(buffer, text):
+    index = 0
+    oversized = False
+    for piece in text:
+        buffer += piece
+        *lines, buffer = buffer.split('\n')
+        if oversized and lines:
+            lines[0] = ''               # tail of the line already reported
+            oversized = False
+        for line in lines:
+            if line.strip():
+                yield _ndjson_line(index, line)
+                index += 1
+        if len(buffer) > MAX_ITEM_SIZE and not oversized:
+            yield index, None, "Item too large"
+            index += 1
+            oversized = True
+        if oversized:
+            buffer = ''
+    if buffer.strip() and not oversized:
+        yield _ndjson_line(index, buffer)
+
+
+def _ndjson_line(index, line):
+    try:
+        return index, json.loads(line), None
+    except json.JSONDecodeError as e:
+        return index, None, f"Invalid JSON: {e.msg}"
+
+
+def check_new(item):
+    """Error message for an item that cannot be created, or None"""
+    if not isinstance(item, dict):
+        return "Item must be a JSON object"
+    for field in REQUIRED:
+        if field not in item:
+            return f"Missing field: {field}"
+    return check_fields(item)
+
+
+def check_update(item):
+    """Error message for a bulk update item ({"id": ..., fields...}), or None"""
+    if not isinstance(item, dict):
+        return "Item must be a JSON object"
+    tx_id = item.get('id')
+    if not isinstance(tx_id, int) or isinstance(tx_id, bool):
+        return "Missing or invalid id"
+    return check_fields(item)
+
+
+def check_fields(item):
+    """Error message for a field of the wrong type, or None (absent fields are not checked)"""
+    for field in TEXT_FIELDS:
+        if field in item and not isinstance(item[field], str):
+            return f"{field} must be a string"
+    if 'amount' in item and not _is_number(item['amount']):
+        return "amount must be a number"
+    timestamp = item.get('timestamp')
+    if timestamp is not None and not isinstance(timestamp, str):
+        return "timestamp must be an ISO 8601 string"
+    txid = item.get('txid')
+    if txid is not None and (not isinstance(txid, str) or not txid):
+        return "txid must be a non-empty string"
+    for field in ('fee', 'balance'):
+        value = item.get(field)
+        if value is not None and (not _is_number(value) or value < 0):
+            return f"{field} must be a non-negative number"
+    return None
+
+
+def _is_number(value):
+    """int or finite float; bool and NaN / Infinity (which json accepts) are not"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return False
+    return math.isfinite(value)
+
+
+def check_id(item):
+    """Error message for a bulk delete item (an integer id), or None"""
+    if not isinstance(item, int) or isinstance(item, bool):
+        return "Item must be an integer id"
+    return None
+
+
+def batched(items, check, size=BATCH_SIZE):
+    """
+    Group (index, item, error) into lists of (index, item) for valid items
+    Yields (batch, errors) where errors are [{"index", "message"}] for the
+    items rejected since the previous batch.
+    """
+    batch = []
+    errors = []
+    for index, item, error in items:
+        error = error or check(item)
+        if error:
+            errors.append({"index": index, "message": error})
+            continue
+        batch.append((index, item))
+        if len(batch) >= size:
+            yield batch, errors
+            batch, errors = [], []
+    if batch or errors:
+        yield batch, errors
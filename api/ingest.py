@@ -0,0 +1,218 @@
+"""
+Ingestor: Watch a drop directory and stream new SMS backups into the store
+
+The ETL (dsa/run.py) is a one-shot job; this runs inside the API process
+(app.py --watch DIR) so a new phone backup becomes queryable without a
+re-ETL or a restart. Two daemon threads joined by a bounded queue:
+  - watcher:    polls the directory every `interval` seconds (the stdlib
+                has no inotify). A file is picked up once its size and
+                mtime are unchanged between two polls, so a backup that is
+                still being copied is not read half-way. It is parsed with
+                iter_parse_xml and each transaction is put on the queue,
+                blocking while the queue is full: parsing never runs more
+                than `max_pending` rows ahead of the store (backpressure).
+  - committer:  takes rows off the queue and commits them with
+                store.create_many in batches of up to `batch_size` (or what
+                arrived within `linger` seconds), so the store lock, the
+                index listeners and SQLite's transaction are paid per batch.
+                The end of a file commits at once.
+Backups are cumulative, so a Checkpoint (see checkpoint.py) drops messages
+already ingested. It is advanced after each file and, with `state_file`,
+saved once the file's last batch is committed. A batch whose commit
+fails is retried; if it still fails, the rest of the file is not
+committed, the checkpoint is rewound and the file is taken up again at
+the next poll, from the first row that was not committed.
+"""
+import os
+import queue
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from itertools import islice
+
+from checkpoint import Checkpoint
+from parse_xml import iter_parse_xml
+
+SUFFIXES = ('.xml',)
+DEFAULT_INTERVAL = 1.0
+DEFAULT_BATCH = 1000
+DEFAULT_LINGER = 0.05
+DEFAULT_PENDING = 10000
+COMMIT_RETRIES = 3
+RETRY_DELAY = 0.5       # seconds before the first retry of a failed commit, doubled for each next one
+
+_FLUSH = object()       # queue marker: end of a file, commit what is batched
+
+
+class Ingestor:
+    """Polls a directory and feeds new transactions to `commit` in batches"""
+
+    def __init__(self, directory, commit, checkpoint=None, state_file=None, interval=DEFAULT_INTERVAL,
+                 batch_size=DEFAULT_BATCH, linger=DEFAULT_LINGER, max_pending=DEFAULT_PENDING):
+        self.directory = directory
+        self.commit = commit                # list of field dicts -> created rows (store.create_many)
+        self.checkpoint = checkpoint or Checkpoint()
+        self.state_file = state_file
+        self.interval = interval
+        self.batch_size = batch_size
+        self.linger = linger
+        self.on_file = None                 # callback(name, messages, lag seconds) after each file
+
+        self.files = 0
+        self.messages = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_id = 0
+
+        self._queue = queue.Queue(max_pending)
+        self._stop = threading.Event()
+        self._done = {}                     # name -> (size, mtime_ns) when it was ingested
+        self._partial = {}                  # name -> ((size, mtime_ns), rows committed) of a failed file
+        self._file_rows = 0                 # rows of the file in progress committed so far
+        self._file_failed = False           # a batch of the file in progress could not be committed
+        self._stats = {}                    # name -> (size, mtime_ns) at the previous poll
+        self._threads = []
+
+    def __len__(self):
+        """Rows parsed but not committed yet"""
+        return self._queue.qsize()
+
+    def start(self):
+        for target, name in ((self._commit_loop, 'ingest-commit'), (self._watch, 'ingest-watch')):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop polling once the file in progress is committed, and wait for both threads"""
+        self._stop.set()
+        committer, watcher = self._threads
+        watcher.join()
+        self._queue.put(None)
+        committer.join()
+        self._threads = []
+
+    # ========== WATCHER ==========
+
+    def poll(self):
+        """Files ready to ingest, oldest first: unchanged since the previous poll and not ingested as they are"""
+        stats = {}
+        ready = []
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            name = entry.name
+            # Dotfiles and other suffixes (.tmp, .part) are drops in progress
+            if name.startswith('.') or not name.lower().endswith(SUFFIXES):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            key = (stat.st_size, stat.st_mtime_ns)
+            stats[name] = key
+            if self._stats.get(name) == key and self._done.get(name) != key:
+                ready.append((stat.st_mtime_ns, name))
+        self._stats = stats
+        return [name for _, name in sorted(ready)]
+
+    def _watch(self):
+        while True:
+            for name in self.poll():
+                if self._stop.is_set():
+                    return
+                self._ingest(name)
+            if self._stop.wait(self.interval):
+                return
+
+    def _ingest(self, name):
+        """Parse one file onto the queue, then wait for its rows to be committed"""
+        key = self._stats[name]
+        put = self._queue.put
+        committed = self.messages
+        # After a failed attempt the same rows are accepted again, in the same order: skip those committed
+        partial_key, skip = self._partial.pop(name, (None, 0))
+        if partial_key != key:
+            skip = 0
+        self._file_rows = skip
+        self._file_failed = False
+        try:
+            transactions = iter_parse_xml(os.path.join(self.directory, name), accept=self.checkpoint.accept)
+            for transaction in islice(transactions, skip, None):
+                del transaction['id']       # the store assigns ids
+                put(transaction)            # blocks while the queue is full
+        except (ET.ParseError, OSError) as e:
+            self.errors += 1
+            print(f"✗ Ingest {name}: {e}", file=sys.stderr)
+        put(_FLUSH)
+        self._queue.join()
+        if self._file_failed:
+            # Not done and the checkpoint not moved past it: the next poll takes it up again
+            self._partial[name] = (key, self._file_rows)
+            self.checkpoint.discard()
+            return
+        self._done[name] = key
+        self.files += 1
+        self.checkpoint.advance()
+        if self.state_file:
+            self.checkpoint.save(self.state_file, self.last_id)
+        if self.on_file:
+            self.on_file(name, self.messages - committed, time.time() - key[1] / 1e9)
+
+    # ========== COMMITTER ==========
+
+    def _commit_loop(self):
+        get = self._queue.get
+        while True:
+            item = get()
+            batch = []
+            taken = 1
+            deadline = time.monotonic() + self.linger
+            while item is not None and item is not _FLUSH:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                taken += 1
+            if batch:
+                self._flush(batch)
+            for _ in range(taken):
+                self._queue.task_done()
+            if item is None:
+                return
+
+    def _flush(self, batch):
+        if self._file_failed:
+            # Nothing after a failed batch is committed, so the rows committed are a prefix of the file's
+            return
+        for attempt in range(COMMIT_RETRIES + 1):
+            try:
+                created = self.commit(batch)
+                break
+            except Exception as e:
+                if attempt == COMMIT_RETRIES or self._stop.is_set():
+                    self.errors += 1
+                    self._file_failed = True
+                    print(f"✗ Ingest commit of {len(batch)} rows failed, the file is retried at the next poll: {e}",
+                          file=sys.stderr)
+                    return
+                time.sleep(RETRY_DELAY * 2 ** attempt)
+        self._file_rows += len(batch)
+        self.batches += 1
+        self.messages += len(created)
+        if created:
+            self.last_id = created[-1]['id']
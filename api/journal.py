@@ -0,0 +1,444 @@
+"""
+Journal: Durable writes for the in-memory store, without a database
+
+Every committed write is appended to a journal as an op: one NDJSON line
+per store version, {"v": 12, "op": "add" | "update" | "delete", "tx": row
+| "id": id} (the ops prefork.py replicates). A journal directory holds:
+  - journal-<V>.ndjson:  a header {"base": V, "next_id": ...}, then the
+                         ops for versions V+1, V+2, ...
+  - snapshot-<V>.<ext>:  the store at version V in the ETL output format
+                         of --data (.json, .ndjson or .col), so it can be
+                         served or analysed on its own. Rows created through
+                         the API do not always fit .col columns (fractional
+                         amounts, microsecond timestamps): such a store is
+                         snapshotted as .ndjson instead
+
+Group commit: a write returns only once its op is on disk, but ops are not
+fsynced one at a time. A flusher thread writes everything queued since its
+last fsync and fsyncs once, so the writes that arrive during one fsync
+share the next (after waiting `window` seconds for more to join, if set).
+
+Compaction: once the journal since the last snapshot passes compact_bytes,
+the write that crossed it starts a new segment at its version and takes
+the row list (one pass under the write lock); a background thread writes
+the snapshot (temp file, fsync, rename) and only then deletes the older
+snapshot and segments. Recovery loads the latest snapshot and replays the
+segments from its version on, so a crash at any point finds either the
+old snapshot with every segment after it, or the new one with its own.
+"""
+import json
+import os
+import re
+import threading
+import time
+from itertools import islice
+
+from columnar import load_columns, fits_columns
+from mapped_store import MappedStore
+from parse_xml import save_to_json, save_to_ndjson, save_to_binary, iter_ndjson
+from store import TransactionStore
+
+SYNC_MODES = ('group', 'write', 'none')
+DEFAULT_WINDOW = 0.0                    # seconds the flusher waits for more writes to share an fsync
+DEFAULT_COMPACT_BYTES = 64 * 2**20
+REPLAY_BATCH = 10000                    # ops decoded per json.loads call during recovery
+SNAPSHOT_FORMATS = {'.json': save_to_json, '.ndjson': save_to_ndjson, '.col': save_to_binary}
+FALLBACK_FORMAT = '.ndjson'             # for rows a .col snapshot would not return unchanged
+FILE_NAME = re.compile(r'^(journal|snapshot)-(\d+)(\.\w+)$')
+
+
+def encode_ops(events):
+    """NDJSON op lines for the (version, 'add' | 'remove', transaction) events of whole writes"""
+    lines = []
+    i = 0
+    while i < len(events):
+        version, event, transaction = events[i]
+        if event == 'remove' and i + 1 < len(events) and events[i + 1][0] == version:
+            # on_remove(old) + on_add(new) at one version: an update
+            op = {'v': version, 'op': 'update', 'tx': events[i + 1][2]}
+            i += 2
+        elif event == 'remove':
+            op = {'v': version, 'op': 'delete', 'id': transaction['id']}
+            i += 1
+        else:
+            op = {'v': version, 'op': 'add', 'tx': transaction}
+            i += 1
+        lines.append(json.dumps(op, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b'\n')
+    return lines
+
+
+def apply_op(store, op):
+    """Apply a decoded op; it must be the store's next version"""
+    version = op['v']
+    if version != store.version + 1:
+        raise ValueError(f"op for version {version}, store at {store.version}")
+    kind = op['op']
+    if kind == 'add':
+        store.add(op['tx'])
+    elif kind == 'update':
+        store.update(op['tx']['id'], op['tx'])
+    else:
+        store.delete(op['id'])
+
+
+class Recorder:
+    """Store listener holding the events of writes until take() turns them into op lines"""
+
+    def __init__(self, store):
+        self.store = store
+        self._events = []               # (version, event, transaction) since the last take
+        store.subscribe(self, replay=False)
+
+    def on_add(self, transaction):
+        self._events.append((self.store.version, 'add', transaction))
+
+    def on_remove(self, transaction):
+        self._events.append((self.store.version, 'remove', transaction))
+
+    def take(self):
+        """(version reached, op lines) for the writes since the last call; (None, []) if none"""
+        events, self._events = self._events, []
+        return (events[-1][0] if events else None), encode_ops(events)
+
+
+class LoggedStore:
+    """
+    Store whose writes reach its logs (Journal, prefork Replicator) as they commit
+    Writes run one at a time; after each, every log's flush() runs under
+    the write lock (so logs see writes in version order) and returns a
+    ticket or None; sync(ticket) then runs outside it, where concurrent
+    writers can share a Journal's fsync. Callers holding a lock of their
+    own around a write use apply() under it and sync() after releasing it,
+    so the wait is shared there too. Everything else goes straight to the
+    wrapped store.
+    """
+
+    WRITES = frozenset(('add', 'create', 'update', 'delete', 'create_many', 'update_many', 'delete_many'))
+
+    def __init__(self, store, *logs):
+        self._store = store
+        self._logs = logs
+        self._write_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._store)
+
+    def __iter__(self):
+        return iter(self._store)
+
+    def __getattr__(self, name):
+        method = getattr(self._store, name)
+        if name not in self.WRITES:
+            return method
+
+        def write(*args):
+            result, tickets = self.apply(name, *args)
+            self.sync(tickets)
+            return result
+        return write
+
+    def apply(self, name, *args):
+        """Run the write `name` and hand its ops to the logs without waiting: (result, tickets for sync())"""
+        if name not in self.WRITES:
+            raise AttributeError(f"{name} is not a store write")
+        method = getattr(self._store, name)
+        with self._write_lock:
+            try:
+                result = method(*args)
+            finally:
+                tickets = [log.flush() for log in self._logs]
+        return result, tickets
+
+    def sync(self, tickets):
+        """Wait until every log made the write apply() returned tickets for durable / replicated"""
+        for log, ticket in zip(self._logs, tickets):
+            if ticket is not None:
+                log.sync(ticket)
+
+
+# ========== FILES AND RECOVERY ==========
+
+def journal_files(directory):
+    """{'journal': {base version: path}, 'snapshot': {version: path}} of a journal directory"""
+    files = {'journal': {}, 'snapshot': {}}
+    for name in os.listdir(directory) if os.path.isdir(directory) else ():
+        match = FILE_NAME.match(name)
+        if match:
+            files[match.group(1)][int(match.group(2))] = os.path.join(directory, name)
+    return files
+
+
+def load_snapshot(path):
+    """Store of a snapshot file, by extension like app.py --data (.col is mmapped)"""
+    if path.endswith('.col'):
+        return MappedStore(load_columns(path))
+    if path.endswith('.ndjson'):
+        return TransactionStore(iter_ndjson(path))
+    with open(path, 'r', encoding='utf-8') as f:
+        return TransactionStore(json.load(f))
+
+
+def recover(directory, store=None):
+    """
+    The store as of its last durable write: (store, ops replayed)
+    Loads the latest snapshot in directory, or starts from `store` (the
+    data the journal was started on) while there is none yet, then replays
+    the segments from there. A torn last line (a crash mid-append) is cut
+    off the last segment; damage anywhere else raises ValueError.
+    """
+    files = journal_files(directory)
+    segments = files['journal']
+    if files['snapshot']:
+        version = max(files['snapshot'])
+        if version not in segments:
+            raise ValueError(f"{directory}: no journal segment for snapshot version {version}")
+        store = load_snapshot(files['snapshot'][version])
+        with open(segments[version], 'rb') as f:
+            store.resume(version, json.loads(f.readline())['next_id'])
+        bases = sorted(base for base in segments if base >= version)
+    else:
+        store = store if store is not None else TransactionStore()
+        bases = sorted(segments)
+    replayed = 0
+    for i, base in enumerate(bases):
+        if base != store.version:
+            raise ValueError(f"{segments[base]} starts at version {base}, the store is at {store.version}")
+        replayed += _replay(segments[base], store, last=i == len(bases) - 1)
+    return store, replayed
+
+
+def _replay(path, store, last):
+    """Apply a segment's ops to store; returns how many"""
+    count = 0
+    with open(path, 'r+b') as f:
+        header = f.readline()
+        good = len(header)
+        if not header.endswith(b'\n') and not last:
+            raise ValueError(f"{path}: damaged header")
+        for batch in iter(lambda: list(islice(f, REPLAY_BATCH)), []):
+            ops = _decode(batch)
+            for op, line in zip(ops, batch):
+                apply_op(store, op)
+                good += len(line)
+            count += len(ops)
+            if len(ops) < len(batch):
+                # Only the very last line may be torn: the write it belonged to never returned
+                if not last or len(ops) + 1 < len(batch) or f.read(1):
+                    raise ValueError(f"{path}: damaged op after version {store.version}")
+                f.truncate(good)
+                break
+    if not header.endswith(b'\n'):
+        # Cut short while the segment was being created: it holds no op
+        os.remove(path)
+    return count
+
+
+def _decode(lines):
+    """The ops of complete, valid lines, stopping at the first other one"""
+    try:
+        if lines[-1].endswith(b'\n'):
+            # One C-level decode per batch, as iter_ndjson reads the ETL output
+            return json.loads(b'[' + b','.join(lines) + b']')
+    except ValueError:
+        pass
+    ops = []
+    for line in lines:
+        if not line.endswith(b'\n'):
+            break
+        try:
+            ops.append(json.loads(line))
+        except ValueError:
+            break
+    return ops
+
+
+def _fsync_dir(directory):
+    """Make a create / rename / delete in directory durable"""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# ========== JOURNAL ==========
+
+class Journal(Recorder):
+    """
+    Append-only op log of a store, made durable by group commit
+    Wrap the store in LoggedStore(store, journal) so every write goes
+    through flush() and sync(). sync: 'group' (one fsync per batch, the
+    default), 'write' (fsync each write before the next can start) or
+    'none' (written to the OS only: survives a process crash, not a power
+    cut). snapshot_format is the ETL extension snapshots are written in.
+    """
+
+    def __init__(self, directory, store, sync='group', window=DEFAULT_WINDOW,
+                 compact_bytes=DEFAULT_COMPACT_BYTES, snapshot_format='.json'):
+        if sync not in SYNC_MODES:
+            raise ValueError(f"sync must be one of {', '.join(SYNC_MODES)}")
+        if snapshot_format not in SNAPSHOT_FORMATS:
+            raise ValueError(f"snapshot format must be one of {', '.join(SNAPSHOT_FORMATS)}")
+        super().__init__(store)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.sync_mode = sync
+        self.window = window
+        self.compact_bytes = compact_bytes
+        self.snapshot_format = snapshot_format
+        self.ops = 0
+        self.commits = 0                # fsyncs (or writes, with sync='none')
+        self.compactions = 0
+        self._buffer = []               # encoded ops waiting for the flusher
+        self._appended = self._durable = store.version
+        self._error = None
+        self._closing = False
+        self._changed = threading.Condition()
+        self._compactor = None
+
+        for name in os.listdir(directory):
+            if name.endswith('.tmp'):
+                os.remove(os.path.join(directory, name))    # a snapshot cut short by a crash
+        self._file = self._open_segment(store.version)
+        files = journal_files(directory)
+        snapshot = max(files['snapshot'], default=None)
+        self.bytes = sum(os.path.getsize(path) for base, path in files['journal'].items()
+                         if snapshot is None or base >= snapshot)      # journal since the last snapshot
+        self._flusher = None
+        if sync == 'group':
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True, name='journal')
+            self._flusher.start()
+        if snapshot is None or self.bytes >= compact_bytes:
+            self._compact()
+
+    def flush(self):
+        """Queue the ops of the write that just returned (under LoggedStore's write lock): the version to sync on"""
+        version, lines = self.take()
+        if not lines:
+            return None
+        data = b''.join(lines)
+        self.ops += len(lines)
+        self.bytes += len(data)
+        if self.sync_mode == 'group':
+            with self._changed:
+                if self._error is not None:
+                    raise OSError(f"journal write failed: {self._error}")
+                self._buffer.append(data)
+                self._appended = version
+                self._changed.notify_all()
+        else:
+            self._write(data)
+            self._appended = self._durable = version
+            self.commits += 1
+        if self.bytes >= self.compact_bytes:
+            self._compact()
+        return version if self.sync_mode == 'group' else None
+
+    def sync(self, version):
+        """Block until the ops up to version are on disk"""
+        with self._changed:
+            self._changed.wait_for(lambda: self._durable >= version or self._error is not None)
+            if self._durable < version:
+                raise OSError(f"journal write failed: {self._error}")
+
+    def close(self):
+        """Write out the queued ops, stop the flusher and wait for a snapshot in progress"""
+        with self._changed:
+            self._closing = True
+            self._changed.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        if self._compactor is not None:
+            self._compactor.join()
+        self._file.close()
+
+    @property
+    def compacting(self):
+        return self._compactor is not None and self._compactor.is_alive()
+
+    def _flush_loop(self):
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._buffer or self._closing)
+                if not self._buffer:
+                    return
+            if self.window:
+                time.sleep(self.window)
+            with self._changed:
+                data = b''.join(self._buffer)
+                self._buffer = []
+                version = self._appended
+            try:
+                self._write(data)
+            except OSError as e:
+                with self._changed:
+                    self._error = e
+                    self._changed.notify_all()
+                return
+            with self._changed:
+                self._durable = version
+                self.commits += 1
+                self._changed.notify_all()
+
+    def _write(self, data):
+        self._file.write(data)
+        self._file.flush()
+        if self.sync_mode != 'none':
+            os.fsync(self._file.fileno())
+
+    def _open_segment(self, version):
+        """Append to journal-<version>, creating it (with its header) if needed"""
+        path = os.path.join(self.directory, f'journal-{version:012d}.ndjson')
+        if os.path.exists(path):
+            return open(path, 'ab')
+        f = open(path, 'ab')
+        header = {'base': version, 'next_id': self.store.next_id}
+        f.write(json.dumps(header, separators=(',', ':')).encode('utf-8') + b'\n')
+        f.flush()
+        os.fsync(f.fileno())
+        _fsync_dir(self.directory)
+        return f
+
+    # ========== COMPACTION ==========
+
+    def _compact(self):
+        """Start a new segment at the current version and snapshot the rows into it in the background"""
+        if self.compacting:
+            return
+        version = self.store.version
+        rows = self.store.all()
+        if os.path.basename(self._file.name) != f'journal-{version:012d}.ndjson':
+            # Everything queued belongs to the old segment
+            with self._changed:
+                self._changed.wait_for(lambda: self._durable >= self._appended or self._error is not None)
+            self._file.close()
+            self._file = self._open_segment(version)
+        self.bytes = self._file.tell()
+        self._compactor = threading.Thread(target=self._write_snapshot, args=(rows, version),
+                                           daemon=True, name='journal-compactor')
+        self._compactor.start()
+
+    def _write_snapshot(self, rows, version):
+        snapshot_format = self.snapshot_format
+        if snapshot_format == '.col' and not all(map(fits_columns, rows)):
+            snapshot_format = FALLBACK_FORMAT
+        path = os.path.join(self.directory, f'snapshot-{version:012d}{snapshot_format}')
+        temp = path + '.tmp'
+        try:
+            SNAPSHOT_FORMATS[snapshot_format](rows, temp, quiet=True)
+            with open(temp, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(temp, path)
+            _fsync_dir(self.directory)
+        except (OSError, ValueError) as e:
+            print(f"✗ Snapshot at version {version} failed: {e}")
+            if os.path.exists(temp):
+                os.remove(temp)
+            return
+        # The new snapshot covers every older file
+        for files in journal_files(self.directory).values():
+            for base, old in files.items():
+                if base < version:
+                    os.remove(old)
+        _fsync_dir(self.directory)
+        self.compactions += 1
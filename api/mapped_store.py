@@ -0,0 +1,269 @@
+"""
+MappedStore: Serve transactions straight from an mmapped binary column file
+
+Drop-in replacement for TransactionStore over a read-only TransactionColumns
+(columnar.load_columns), so the API starts without deserializing the file:
+  - get():   binary search on the id column, one row decoded per lookup
+  - query(): equality and range filters run as column masks; only the
+             requested page is decoded into dicts
+  - writes:  copy-on-write overlay (id -> transaction, None = deleted) on
+             top of the mapped base; like the JSON mode they are not saved
+
+Listeners, version and locking follow TransactionStore.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+from datetime import datetime
+from itertools import compress
+
+from columnar import iso_to_ms
+from store import FIELDS, UPDATEABLE, filter_checks
+
+# Bounds in this shape order the same as strings and as epoch ms
+ISO_BOUND = re.compile(r'^\d{4}-\d{2}-\d{2}(T\d{2}(:\d{2}(:\d{2}(\.\d{1,6})?)?)?)?$')
+
+
+class MappedStore:
+    """TransactionStore interface over an mmapped TransactionColumns base"""
+
+    def __init__(self, columns):
+        self._base = columns
+        self._lock = threading.RLock()
+        self._changed = {}
+        self._size = len(columns)
+        if not len(columns):
+            self._next_id = 1
+        else:
+            self._next_id = (columns.ids[-1] if columns.ids_sorted else max(columns.ids)) + 1
+        self._version = 0
+        self._listeners = []
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return iter(self.all())
+
+    @property
+    def version(self):
+        """Mutation counter: changes whenever any transaction changes"""
+        return self._version
+
+    @property
+    def next_id(self):
+        """Id the next create will get"""
+        return self._next_id
+
+    def resume(self, version, next_id):
+        """Continue from a snapshot: its version, and ids deleted before it are not handed out again"""
+        with self._lock:
+            self._version = version
+            self._next_id = max(self._next_id, next_id)
+
+    def snapshot(self):
+        """(version, next_id, rows) read together, as a follower or a snapshot file needs them"""
+        with self._lock:
+            return self._version, self._next_id, self.all()
+
+    def subscribe(self, listener, replay=True):
+        """
+        Register an object with on_add(tx) / on_remove(tx) methods
+        Same contract as TransactionStore.subscribe.
+        """
+        with self._lock:
+            if replay:
+                for transaction in self.all():
+                    listener.on_add(transaction)
+            self._listeners.append(listener)
+
+    # ========== READS ==========
+
+    def get(self, tx_id):
+        """Return transaction by id, or None"""
+        with self._lock:
+            if tx_id in self._changed:
+                return self._changed[tx_id]
+            i = self._base.find(tx_id)
+            return None if i is None else self._base.row(i)
+
+    def all(self):
+        """Return all transactions in id order"""
+        return self.query()[1]
+
+    def by_type(self, tx_type):
+        """Return transactions of one transaction_type"""
+        return self.query(transaction_type=tx_type)[1]
+
+    def by_counterparty(self, name):
+        """Return transactions where name is the sender or receiver"""
+        return self.query(counterparty=name)[1]
+
+    def between(self, start=None, end=None):
+        """Return transactions with start <= timestamp < end (ISO strings)"""
+        return self.query(start=start, end=end)[1]
+
+    def query(self, transaction_type=None, sender=None, receiver=None, counterparty=None,
+              min_amount=None, max_amount=None, start=None, end=None,
+              after=None, offset=0, limit=None):
+        """
+        Filter and paginate transactions, ordered by id
+        Same semantics as TransactionStore.query.
+        Returns (total matches ignoring after/offset/limit, page).
+        """
+        filters = dict(transaction_type=transaction_type, sender=sender, receiver=receiver,
+                       counterparty=counterparty, min_amount=min_amount, max_amount=max_amount,
+                       start=start, end=end)
+        checks = filter_checks(**filters)
+        with self._lock:
+            base = self._base
+            changed = self._changed
+            positions = self._base_positions(**filters)
+            row_checks = [] if positions is not None else checks
+            if positions is None:
+                first = 0
+                if not checks and after is not None and base.ids_sorted:
+                    first = bisect.bisect_right(base.ids, after)
+                positions = range(first, len(base))
+
+            def base_rows():
+                for i in positions:
+                    tx_id = base.ids[i]
+                    if tx_id in changed:
+                        continue
+                    if row_checks:
+                        tx = base.row(i)
+                        if not all(check(tx) for check in row_checks):
+                            continue
+                        yield tx_id, i, tx
+                    else:
+                        yield tx_id, i, None
+
+            overlay = sorted((tx_id, -1, tx) for tx_id, tx in changed.items()
+                             if tx is not None and all(check(tx) for check in checks))
+            merged = base_rows() if base.ids_sorted else iter(sorted(base_rows(), key=lambda r: r[0]))
+            merged = heapq.merge(merged, overlay, key=lambda r: r[0])
+
+            # With no filters the total is known, so stop once the page is full
+            known_total = self._size if not any(v is not None for v in filters.values()) else None
+            total = 0
+            page = []
+            skip = offset
+            for tx_id, i, tx in merged:
+                total += 1
+                if after is not None and tx_id <= after:
+                    continue
+                if skip:
+                    skip -= 1
+                elif limit is None or len(page) < limit:
+                    page.append(tx if tx is not None else base.row(i))
+                elif known_total is not None:
+                    break
+            return (known_total if known_total is not None else total), page
+
+    def _base_positions(self, transaction_type=None, sender=None, receiver=None, counterparty=None,
+                        min_amount=None, max_amount=None, start=None, end=None):
+        """Base row positions matching every filter via column masks (None = no filters)"""
+        base = self._base
+        masks = []
+        for name, value in (('transaction_type', transaction_type), ('sender', sender),
+                            ('receiver', receiver)):
+            if value is not None:
+                masks.append(base.mask_eq(name, value))
+        if counterparty is not None:
+            masks.append(base.mask_or(base.mask_eq('sender', counterparty),
+                                      base.mask_eq('receiver', counterparty)))
+        if min_amount is not None or max_amount is not None:
+            # Amounts are integers, so amount <= max is amount < floor(max) + 1
+            hi = None if max_amount is None else math.floor(max_amount) + 1
+            masks.append(base.mask_range('amount', min_amount, hi))
+        if start is not None or end is not None:
+            if not all(bound is None or ISO_BOUND.match(bound) for bound in (start, end)):
+                return None     # other bounds fall back to per-row string checks
+            try:
+                lo = None if start is None else iso_to_ms(start)
+                hi = None if end is None else iso_to_ms(end)
+            except ValueError:
+                return None
+            masks.append(base.mask_range('timestamp', lo, hi))
+        if not masks:
+            return None
+        mask = base.mask_and(*masks) if len(masks) > 1 else masks[0]
+        return compress(range(len(base)), mask)
+
+    # ========== WRITES ==========
+
+    def add(self, transaction):
+        """Add a transaction that already has an id"""
+        with self._lock:
+            tx_id = transaction['id']
+            if self.get(tx_id) is not None:
+                raise KeyError(f"Transaction {tx_id} already exists")
+            self._changed[tx_id] = transaction
+            self._size += 1
+            if tx_id >= self._next_id:
+                self._next_id = tx_id + 1
+            self._version += 1
+            for listener in self._listeners:
+                listener.on_add(transaction)
+            return transaction
+
+    def create(self, fields):
+        """Create a transaction with the next id; timestamp defaults to now"""
+        with self._lock:
+            transaction = {'id': self._next_id}
+            for field in FIELDS:
+                transaction[field] = fields.get(field)
+            if not transaction['timestamp']:
+                transaction['timestamp'] = datetime.now().isoformat()
+            return self.add(transaction)
+
+    def update(self, tx_id, changes):
+        """Update updateable fields; returns the new transaction or None"""
+        with self._lock:
+            old = self.get(tx_id)
+            if old is None:
+                return None
+            transaction = dict(old)
+            for field in UPDATEABLE:
+                if field in changes:
+                    transaction[field] = changes[field]
+            self._changed[tx_id] = transaction
+            self._version += 1
+            for listener in self._listeners:
+                listener.on_remove(old)
+                listener.on_add(transaction)
+            return transaction
+
+    def delete(self, tx_id):
+        """Remove and return a transaction, or None"""
+        with self._lock:
+            transaction = self.get(tx_id)
+            if transaction is None:
+                return None
+            if self._base.find(tx_id) is None:
+                del self._changed[tx_id]
+            else:
+                self._changed[tx_id] = None
+            self._size -= 1
+            self._version += 1
+            for listener in self._listeners:
+                listener.on_remove(transaction)
+            return transaction
+
+    def create_many(self, items):
+        """Create transactions from field dicts under one lock; returns them in order"""
+        with self._lock:
+            return [self.create(fields) for fields in items]
+
+    def update_many(self, changes):
+        """Apply (tx_id, changes) pairs; returns the new rows, None where an id is missing"""
+        with self._lock:
+            return [self.update(tx_id, fields) for tx_id, fields in changes]
+
+    def delete_many(self, ids):
+        """Remove several transactions; returns the removed rows, None where an id is missing"""
+        with self._lock:
+            return [self.delete(tx_id) for tx_id in ids]
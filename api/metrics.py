@@ -0,0 +1,260 @@
+"""
+Metrics: Request instrumentation for the REST API
+
+  - Metrics:         counters, gauges and histograms keyed by label tuples,
+                     rendered in the Prometheus text exposition format
+                     (served by GET /metrics)
+  - AccessLog:       access log written by a background thread; request
+                     threads only append a tuple to a deque
+  - RequestProfiler: cProfile one request in every N and keep a merged
+                     .prof dump on disk (pstats / snakeviz)
+
+All of it is stdlib. Recording a request costs a handful of dict updates
+under one lock; formatting happens at scrape or write time.
+"""
+import bisect
+import cProfile
+import itertools
+import pstats
+import sys
+import threading
+from collections import deque
+
+# Histogram upper bounds (le); +Inf is implicit
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=None):
+    """Render (name, value) pairs as {name="value",...}"""
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Histogram:
+    """Bucket counts, sum and count of observations (the registry holds the lock)"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        # le is inclusive: value == bound lands in that bound's bucket
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            cumulative += count
+            yield f"{name}_bucket{_labels(labels, ('le', _number(float(bound))))} {cumulative}"
+        yield f"{name}_sum{_labels(labels)} {_number(self.sum)}"
+        yield f"{name}_count{_labels(labels)} {self.count}"
+
+
+class Metrics:
+    """
+    Thread-safe metric registry
+    Series are identified by (metric name, label tuple); labels are a tuple
+    of (name, value) pairs in a fixed order. Counters and gauges registered
+    with a function are unlabelled and evaluated on every render.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}             # name -> (type, help), in registration order
+        self._counters = {}         # name -> {labels: value}
+        self._gauges = {}           # name -> {labels: value}
+        self._histograms = {}       # name -> {labels: Histogram}
+        self._buckets = {}          # histogram name -> bounds
+        self._functions = {}        # name -> callable returning the current value
+
+    def counter(self, name, help, function=None):
+        self._register(name, 'counter', help, self._counters, function)
+
+    def gauge(self, name, help, function=None):
+        self._register(name, 'gauge', help, self._gauges, function)
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        self._register(name, 'histogram', help, self._histograms)
+        self._buckets[name] = tuple(buckets)
+
+    def _register(self, name, kind, help, table, function=None):
+        with self._lock:
+            if name not in self._meta:
+                self._meta[name] = (kind, help)
+                table[name] = {}
+            if function is not None:
+                self._functions[name] = function
+
+    # ========== RECORDING ==========
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            series = self._counters[name]
+            series[labels] = series.get(labels, 0) + value
+
+    def set(self, name, labels=(), value=0):
+        with self._lock:
+            self._gauges[name][labels] = value
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            series = self._histograms[name]
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(self._buckets[name])
+            histogram.observe(value)
+
+    def value(self, name, labels=()):
+        """Current value of a counter or gauge series (0 if never recorded)"""
+        with self._lock:
+            table = self._counters if name in self._counters else self._gauges
+            return table[name].get(labels, 0)
+
+    def reset(self):
+        """Drop every recorded series, keeping registrations"""
+        with self._lock:
+            for table in (self._counters, self._gauges, self._histograms):
+                for name in table:
+                    table[name] = {}
+
+    # ========== EXPOSITION ==========
+
+    def render(self, extra=()):
+        """Prometheus text format; `extra` is preformatted lines appended as-is"""
+        functions = {name: function() for name, function in self._functions.items()}
+        lines = []
+        with self._lock:
+            for name, (kind, help) in self._meta.items():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == 'histogram':
+                    for labels, histogram in sorted(self._histograms[name].items()):
+                        lines.extend(histogram.lines(name, labels))
+                    continue
+                series = self._counters[name] if kind == 'counter' else self._gauges[name]
+                if name in functions:
+                    series = {**series, (): functions[name]}
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        lines.extend(extra)
+        return '\n'.join(lines) + '\n'
+
+
+class AccessLog:
+    """
+    Access log written off the request path
+    log() appends one tuple to a deque (atomic, no lock); a daemon thread
+    wakes every `interval` seconds, formats what has queued up and writes
+    it in one call. If more than `max_pending` entries are waiting, new
+    ones are dropped and counted instead of slowing requests down.
+    """
+
+    def __init__(self, formatter, stream=None, interval=0.25, max_pending=100000):
+        self.formatter = formatter
+        self.stream = stream
+        self.interval = interval
+        self.max_pending = max_pending
+        self.dropped = 0
+        self.written = 0
+        self._pending = deque()
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def log(self, entry):
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending.append(entry)
+        if self._thread is None:
+            self._start()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='access-log', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """Format and write everything queued so far"""
+        with self._flush_lock:
+            pending = self._pending
+            lines = []
+            while pending:
+                lines.append(self.formatter(pending.popleft()))
+            if lines:
+                stream = self.stream or sys.stdout
+                stream.write('\n'.join(lines) + '\n')
+                stream.flush()
+                self.written += len(lines)
+
+    def close(self):
+        """Stop the writer thread and write what is left"""
+        self._stop.set()
+        self.flush()
+
+
+class RequestProfiler:
+    """
+    cProfile one request in every `every`
+    Samples are merged into one pstats.Stats and dumped to `path` after
+    each sample, so the file always holds the profile so far. Only one
+    request is profiled at a time; a sample that would overlap another
+    is skipped (cProfile cannot profile two threads at once).
+    """
+
+    def __init__(self, every, path):
+        self.every = max(1, every)
+        self.path = path
+        self.samples = 0
+        self._counter = itertools.count(1)
+        self._busy = threading.Lock()
+        self._stats = None
+
+    def run(self, function):
+        if next(self._counter) % self.every or not self._busy.acquire(blocking=False):
+            return function()
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(function)
+        finally:
+            try:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+                self.samples += 1
+                self._stats.dump_stats(self.path)
+            finally:
+                self._busy.release()
@@ -0,0 +1,535 @@
+"""
+Prefork: Several API processes on one port, with a single writer
+
+Threads in one process share a GIL, and encoding JSON is most of what a
+request costs, so a single server tops out at one core. Prefork splits it:
+  - master:   loads the store once (or maps a .col snapshot), opens the
+              listening socket, freezes the heap (gc.freeze) and forks;
+              afterwards it only supervises, restarting workers that exit
+  - workers:  N forked copies accepting on the inherited socket. Reads are
+              served from the master's memory, shared copy-on-write;
+              writes are forwarded to the writer
+  - writer:   the one process that mutates the store. It serves forwarded
+              writes as HTTP on a Unix socket and broadcasts each committed
+              write as an op on a second one (Replicator)
+
+Ops are the journal's NDJSON lines (see journal.py), exactly one per store
+version, so a worker applying them in order (Follower) ends up with the
+writer's rows, versions (ETags) and listener state (rollups, indexes,
+response cache). Followers report each version they applied, and the
+writer answers a write (with the version it reached, X-Store-Version)
+only once every follower has it, so a client reads its own writes on
+whichever worker it lands next. The writer keeps
+the latest ops (up to max_log_bytes): a restarted worker, forked again
+from the master's snapshot, replays what it missed before it serves, or,
+once the ops it needs were dropped, is sent the writer's rows instead and
+serves from its own copy of them.
+"""
+import gc
+import http.client
+import json
+import os
+import queue
+import shutil
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from itertools import islice
+
+from journal import Recorder, apply_op
+from server import PooledHTTPServer
+from store import TransactionStore
+
+VERSION_HEADER = 'X-Store-Version'
+HOP_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'te', 'trailer', 'upgrade', 'expect',
+               'proxy-authenticate', 'proxy-authorization'}
+WRITER_CONNECTIONS = 4          # pooled connections from each worker to the writer
+CONNECT_TIMEOUT = 10.0          # seconds a worker waits for the writer's sockets to appear
+STOP_TIMEOUT = 5.0              # seconds children get to exit on SIGTERM before SIGKILL
+REPLICA_LOG_BYTES = 64 * 2**20  # ops the writer keeps for restarted workers
+RESYNC_BATCH = 1000             # rows per send / json.loads when a worker is sent the rows
+
+
+def listen(address, backlog=PooledHTTPServer.request_queue_size):
+    """Listening TCP socket shared by the workers (non-blocking: a worker losing the accept race moves on)"""
+    sock = socket.socket(socket.AF_INET6 if ':' in address[0] else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(address)
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+def adopt(server_class, listener, handler_class, **kwargs):
+    """A socketserver of server_class accepting on an already listening socket"""
+    server = server_class(listener.getsockname()[:2], handler_class, bind_and_activate=False, **kwargs)
+    server.socket.close()
+    server.socket = listener
+    server.server_address = listener.getsockname()
+    server.server_name, server.server_port = socket.getfqdn(server.server_address[0]), server.server_address[1]
+    return server
+
+
+def _connect(path, timeout=CONNECT_TIMEOUT):
+    """Connect to a Unix socket, waiting up to timeout for it to be created"""
+    deadline = time.monotonic() + timeout
+    while True:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+            return sock
+        except (FileNotFoundError, ConnectionRefusedError):
+            sock.close()
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+# ========== WRITER ==========
+
+class Replicator(Recorder):
+    """
+    Store listener sending committed writes to followers as versioned ops
+    Wrap the store in LoggedStore(store, replicator): its flush() after
+    each write sends that write's ops, and sync() waits until every
+    follower reports it applied them, so the write is visible on every
+    worker once it returns. A follower that has not within CONNECT_TIMEOUT
+    is cut off (its worker exits and is restarted). The ops are also kept,
+    up to max_log_bytes, for followers that connect later; when the log
+    passes that, its older half is dropped.
+    """
+
+    def __init__(self, store, max_log_bytes=REPLICA_LOG_BYTES):
+        super().__init__(store)
+        self.base = store.version
+        self.log = []                   # encoded ops; log[i] brings the store to version base + i + 1
+        self.log_bytes = 0
+        self.max_log_bytes = max_log_bytes
+        self.resyncs = 0                # followers sent the rows because the log no longer reached back
+        self._followers = []
+        self._pending = {}              # follower being caught up -> ops committed meanwhile
+        self._applied = {}              # follower -> last version it reported applied
+        self._lock = threading.Lock()
+        self._acked = threading.Condition(self._lock)
+        self._listener = None
+
+    @property
+    def version(self):
+        return self.base + len(self.log)
+
+    def flush(self):
+        """Send the ops of the write that just returned to every follower; the ticket is the version reached"""
+        with self._lock:
+            version, lines = self.take()
+            if not lines:
+                return None
+            self._keep(lines)
+            data = b''.join(lines)
+            for conn in list(self._followers):
+                try:
+                    conn.sendall(data)
+                except OSError:
+                    # Gone or stuck: it exits on the closed socket and is restarted
+                    self._drop(conn)
+            for queued in self._pending.values():
+                queued.append(data)
+        return version
+
+    def sync(self, version):
+        """Wait until every follower applied version; cut off the ones that do not within CONNECT_TIMEOUT"""
+        def lagging():
+            return [conn for conn in self._followers if self._applied[conn] < version]
+        with self._acked:
+            if not self._acked.wait_for(lambda: not lagging(), CONNECT_TIMEOUT):
+                for conn in lagging():
+                    print(f"✗ Replica still before version {version}, disconnected", file=sys.stderr)
+                    self._drop(conn)
+
+    def _drop(self, conn):
+        """Forget a follower (lock held)"""
+        if conn in self._followers:
+            self._followers.remove(conn)
+            self._applied.pop(conn, None)
+            conn.close()
+            self._acked.notify_all()
+
+    def _read_acks(self, conn):
+        """Record the versions a follower reports applying, until it disconnects"""
+        buffered = b''
+        while True:
+            try:
+                data = conn.recv(4096)
+            except TimeoutError:
+                # The timeout bounds sends to a stuck follower; an idle one just has nothing to report
+                continue
+            except OSError:
+                data = b''
+            if not data:
+                with self._lock:
+                    self._drop(conn)
+                return
+            *lines, buffered = (buffered + data).split(b'\n')
+            if lines:
+                with self._lock:
+                    if conn in self._applied:
+                        self._applied[conn] = int(lines[-1])
+                        self._acked.notify_all()
+
+    def _keep(self, lines):
+        self.log += lines
+        self.log_bytes += sum(map(len, lines))
+        if self.log_bytes > self.max_log_bytes:
+            dropped = len(self.log) - len(self.log) // 2
+            self.log_bytes -= sum(map(len, self.log[:dropped]))
+            del self.log[:dropped]
+            self.base += dropped
+
+    def serve(self, path):
+        """Accept followers on a Unix socket in a background thread"""
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(path)
+        self._listener.listen(64)
+        threading.Thread(target=self._accept, daemon=True, name='replicator').start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return
+            try:
+                # The follower sends its version; it gets the ops after it (or the
+                # rows, when the log no longer goes back that far), then live ones
+                conn.settimeout(CONNECT_TIMEOUT)
+                line = conn.makefile('rb').readline()
+                version = int(line)
+                with self._lock:
+                    if version > self.version:
+                        raise ValueError(f"follower at version {version}, the writer at {self.version}")
+                    if version >= self.base:
+                        catch_up = [b'{"version":%d}\n' % self.version] + self.log[version - self.base:]
+                    else:
+                        catch_up = _row_lines(*self.store.snapshot())
+                        self.resyncs += 1
+                    self._pending[conn] = []
+                for data in catch_up:
+                    conn.sendall(data)
+                with self._lock:
+                    conn.sendall(b''.join(self._pending.pop(conn)))
+                    self._followers.append(conn)
+                    self._applied[conn] = version
+                threading.Thread(target=self._read_acks, args=(conn,), daemon=True, name='replica-acks').start()
+            except (OSError, ValueError) as e:
+                print(f"✗ Replica rejected: {e}", file=sys.stderr)
+                with self._lock:
+                    self._pending.pop(conn, None)
+                conn.close()
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.close()
+        with self._lock:
+            for conn in self._followers:
+                conn.close()
+            self._followers = []
+            self._applied = {}
+            self._acked.notify_all()
+
+
+def _row_lines(version, next_id, rows):
+    """Header and row lines bringing a follower to a store snapshot (encoded as they are sent)"""
+    yield json.dumps({'version': version, 'next_id': next_id, 'rows': len(rows)}).encode('utf-8') + b'\n'
+    for start in range(0, len(rows), RESYNC_BATCH):
+        yield b''.join(json.dumps(row, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b'\n'
+                       for row in rows[start:start + RESYNC_BATCH])
+
+
+class UnixHTTPServer(PooledHTTPServer):
+    """PooledHTTPServer on a Unix socket path (handlers must not set TCP_NODELAY)"""
+
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        # HTTPServer.server_bind expects (host, port)
+        socketserver.TCPServer.server_bind(self)
+        self.server_name, self.server_port = 'localhost', 0
+
+    def get_request(self):
+        request, _ = self.socket.accept()
+        return request, ('local', 0)
+
+
+# ========== WORKER ==========
+
+class Follower:
+    """
+    Applies the writer's ops to this process's copy of the store
+    start() catches up with the writer before returning, then follows in
+    a background thread; on_lost is called if the writer goes away.
+    """
+
+    def __init__(self, store, path, on_lost=None):
+        self.store = store
+        self.path = path
+        self.on_lost = on_lost
+        self.applied = 0
+        self._changed = threading.Condition()
+        self._sock = None
+        self._file = None
+
+    def start(self):
+        self._sock = sock = _connect(self.path)
+        sock.sendall(b'%d\n' % self.store.version)
+        self._file = sock.makefile('rb')
+        target = json.loads(self._file.readline() or b'null')
+        if target is None:
+            raise ConnectionError("writer closed the replication socket")
+        if 'rows' in target:
+            # The writer no longer has the ops after our version: start from its rows
+            self.store = self._load(target)
+        while self.store.version < target['version']:
+            line = self._file.readline()
+            if not line:
+                raise ConnectionError("writer closed the replication socket during catch-up")
+            self.apply(json.loads(line))
+        threading.Thread(target=self._follow, daemon=True, name='follower').start()
+        threading.Thread(target=self._ack, daemon=True, name='follower-acks').start()
+
+    def _load(self, target):
+        """Store of the rows the writer sent instead of ops"""
+        count = target['rows']
+        rows = []
+        for batch in iter(lambda: list(islice(self._file, min(RESYNC_BATCH, count - len(rows)))), []):
+            rows += json.loads(b'[' + b','.join(batch) + b']')
+        if len(rows) < count:
+            raise ConnectionError("writer closed the replication socket during catch-up")
+        store = TransactionStore(rows)
+        store.resume(target['version'], target['next_id'])
+        return store
+
+    def apply(self, op):
+        """Apply one op; it must be the next version (older ones, sent while the rows were, are skipped)"""
+        if op['v'] <= self.store.version:
+            return
+        apply_op(self.store, op)
+        self.applied += 1
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait_for(self, version, timeout=CONNECT_TIMEOUT):
+        """Block until the replica reached version; False on timeout"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.store.version >= version, timeout)
+
+    def _ack(self):
+        """Report each version reached to the writer, which holds a write's answer until every replica has it"""
+        sent = None
+        try:
+            while True:
+                with self._changed:
+                    self._changed.wait_for(lambda: self.store.version != sent)
+                    sent = self.store.version
+                self._sock.sendall(b'%d\n' % sent)
+        except OSError:
+            # Writer gone: _follow sees it too and calls on_lost
+            return
+
+    def _follow(self):
+        try:
+            for line in self._file:
+                self.apply(json.loads(line))
+        except (OSError, ValueError) as e:
+            print(f"✗ Replication failed: {e}", file=sys.stderr)
+        if self.on_lost:
+            self.on_lost()
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection to a server on a Unix socket path"""
+
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class WriterClient:
+    """Pool of keep-alive connections from a worker to the writer"""
+
+    def __init__(self, path, connections=WRITER_CONNECTIONS, timeout=None):
+        self.path = path
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(connections)
+
+    def request(self, method, target, headers, body=None):
+        """
+        Send a request, returning (status, headers, body bytes)
+        headers is a list of (name, value); hop-by-hop ones are dropped, so
+        an iterable body without Content-Length goes out chunked. Raises
+        OSError / HTTPException if the writer is unreachable, and whatever
+        the body iterable raises.
+        """
+        headers = {name: value for name, value in headers if name.lower() not in HOP_HEADERS}
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = UnixHTTPConnection(self.path, self.timeout)
+            try:
+                conn.request(method, target, body, headers)
+                response = conn.getresponse()
+                data = response.read()
+            except BaseException:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._idle.put(conn)
+        return response.status, response.getheaders(), data
+
+
+def relayed_headers(headers):
+    """Response headers of the writer worth passing on (framing and identity are the worker's)"""
+    skip = HOP_HEADERS | {'content-length', 'date', 'server', VERSION_HEADER.lower()}
+    return [(name, value) for name, value in headers if name.lower() not in skip]
+
+
+# ========== MASTER ==========
+
+class Prefork:
+    """
+    Forks the writer and `workers` workers, and keeps them running
+    The listening socket and the Unix socket paths (in run_dir) are
+    created here so that every child, including restarted workers,
+    inherits the same ones.
+    """
+
+    def __init__(self, address, workers):
+        self.workers = workers
+        self.listener = listen(address)
+        self.address = self.listener.getsockname()
+        self.run_dir = tempfile.mkdtemp(prefix='momo-prefork-')
+        self.writer_path = os.path.join(self.run_dir, 'writer.sock')
+        self.replica_path = os.path.join(self.run_dir, 'replica.sock')
+        self.writer_pid = None
+        self.worker_pids = {}           # pid -> (slot, started)
+        self.restarts = 0
+
+    def run(self, writer, worker):
+        """
+        Start writer(self) and worker(self, slot) in child processes and supervise them
+        Returns when interrupted (Ctrl+C / SIGTERM) or when the writer
+        exits, after stopping every child: the exit status (0 or 1).
+        """
+        # Objects loaded so far are never freed: keep the collector from
+        # touching (and so copying) every page of them in each child
+        gc.collect()
+        gc.freeze()
+        previous = signal.signal(signal.SIGTERM, _interrupt)
+        status = 0
+        try:
+            self.writer_pid = self._fork(writer, self)
+            for slot in range(self.workers):
+                self._spawn(worker, slot)
+            status = self._supervise(worker)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # A SIGTERM sent to the whole process group arrives here too: finish stopping first
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+            self.stop()
+            self.listener.close()
+            shutil.rmtree(self.run_dir, ignore_errors=True)
+            signal.signal(signal.SIGTERM, previous)
+        return status
+
+    def _spawn(self, worker, slot):
+        self.worker_pids[self._fork(worker, self, slot)] = (slot, time.monotonic())
+
+    def _fork(self, main, *args):
+        pid = os.fork()
+        if pid:
+            return pid
+        code = 1
+        try:
+            # Ctrl+C reaches the whole process group: the master stops children with SIGTERM
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, _exit)
+            main(*args)
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def _supervise(self, worker):
+        while True:
+            pid, status = os.wait()
+            if pid == self.writer_pid:
+                self.writer_pid = None
+                print(f"✗ Writer exited (status {os.waitstatus_to_exitcode(status)}), stopping",
+                      file=sys.stderr)
+                return 1
+            if pid not in self.worker_pids:
+                continue
+            slot, started = self.worker_pids.pop(pid)
+            print(f"✗ Worker {slot} exited (status {os.waitstatus_to_exitcode(status)}), restarting",
+                  file=sys.stderr)
+            if time.monotonic() - started < 1:
+                time.sleep(1)           # crashing on start: do not spin
+            self.restarts += 1
+            self._spawn(worker, slot)
+
+    def stop(self):
+        """SIGTERM every child, SIGKILL what is left after STOP_TIMEOUT"""
+        pids = set(self.worker_pids) | ({self.writer_pid} if self.writer_pid else set())
+        for pid in pids:
+            _signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + STOP_TIMEOUT
+        while pids:
+            for pid in list(pids):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    pids.discard(pid)
+            if pids and time.monotonic() > deadline:
+                for pid in pids:
+                    _signal(pid, signal.SIGKILL)
+                deadline = float('inf')
+            if pids:
+                time.sleep(0.02)
+        self.worker_pids = {}
+        self.writer_pid = None
+
+
+def _signal(pid, signum):
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _exit(signum, frame):
+    sys.exit(0)
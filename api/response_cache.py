@@ -0,0 +1,161 @@
+"""
+ResponseCache: Serialized bodies of hot GET responses, invalidated per write
+
+Dashboards poll the same GET /transactions/{id} and list pages over and
+over; each was rebuilt and re-encoded (json.dumps, then gzip) every time
+although the answer only changes when the store does. Bodies are kept by
+request target (path + query) in an LRU bounded by total bytes, and the
+cache subscribes to the store (without replay) to evict precisely:
+  - item:    /transactions/{id} depends on one id; only a write to that id
+             evicts it
+  - filter:  a list page depends on its query filters; a write evicts the
+             pages whose filters match the old or the new row (their count
+             or rows may change), pages of other filters survive
+  - any:     aggregates and search results; evicted by every write
+Every invalidation bumps `generation`. Callers read it before reading the
+store and pass it to put(); a body built while a write landed is not
+stored, so a page built from pre-write rows can never outlive the write.
+"""
+import threading
+from collections import OrderedDict
+
+from store import filter_checks
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+MAX_ENTRY_BYTES = 1024 * 1024           # bigger bodies are streamed, never cached
+
+ITEM, FILTER, ANY = 'item', 'filter', 'any'
+
+
+class Entry:
+    """One cached body and, once a client asked for it, its gzip encoding"""
+
+    __slots__ = ('key', 'body', 'gzipped', 'kind', 'depends', 'size')
+
+    def __init__(self, key, body, kind, depends):
+        self.key = key
+        self.body = body
+        self.gzipped = None
+        self.kind = kind
+        self.depends = depends          # tx id (item), filter signature (filter) or None
+        self.size = len(key) + len(body)
+
+
+class ResponseCache:
+    """Byte-bounded LRU of response bodies kept consistent with a store"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entry=MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry = max_entry
+        self.generation = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0              # dropped to stay under max_bytes
+        self.invalidations = 0          # dropped because a write changed them
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> Entry, least recently used first
+        self._items = {}                # tx id -> keys of its /transactions/{id} entries
+        self._filters = {}              # filter signature -> (checks, keys)
+        self._any = set()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ========== LOOKUP ==========
+
+    def get(self, key):
+        """Entry for key (marked recently used), or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, generation, tx_id=None, filters=None):
+        """
+        Cache body for key; returns the Entry, or None if it was not kept
+        Depends on one transaction (tx_id), on the rows matching `filters`
+        (query() keyword arguments), or on every write (neither given).
+        Not kept if a write happened since `generation` was read.
+        """
+        if len(key) + len(body) > self.max_entry:
+            return None
+        if tx_id is not None:
+            kind, depends = ITEM, tx_id
+        elif filters:
+            kind, depends = FILTER, tuple(sorted(filters.items()))
+        else:
+            kind, depends = ANY, None
+        entry = Entry(key, body, kind, depends)
+        with self._lock:
+            if generation != self.generation:
+                return None
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self.bytes += entry.size
+            if kind == ITEM:
+                self._items.setdefault(depends, set()).add(key)
+            elif kind == FILTER:
+                group = self._filters.get(depends)
+                if group is None:
+                    group = self._filters[depends] = (filter_checks(**filters), set())
+                group[1].add(key)
+            else:
+                self._any.add(key)
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+            return entry
+
+    def set_gzipped(self, entry, gzipped):
+        """Keep the gzip encoding of an entry alongside its body; returns it"""
+        with self._lock:
+            if entry.gzipped is None:
+                entry.gzipped = gzipped
+                if self._entries.get(entry.key) is entry:
+                    entry.size += len(gzipped)
+                    self.bytes += len(gzipped)
+            return entry.gzipped
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        if entry.kind == ITEM:
+            keys = self._items[entry.depends]
+            keys.discard(key)
+            if not keys:
+                del self._items[entry.depends]
+        elif entry.kind == FILTER:
+            keys = self._filters[entry.depends][1]
+            keys.discard(key)
+            if not keys:
+                del self._filters[entry.depends]
+        else:
+            self._any.discard(key)
+
+    # ========== STORE LISTENER ==========
+
+    def on_add(self, transaction):
+        self._invalidate(transaction)
+
+    def on_remove(self, transaction):
+        self._invalidate(transaction)
+
+    def _invalidate(self, transaction):
+        with self._lock:
+            self.generation += 1
+            if not self._entries:
+                return
+            stale = list(self._any)
+            stale.extend(self._items.get(transaction['id'], ()))
+            for checks, keys in self._filters.values():
+                if all(check(transaction) for check in checks):
+                    stale.extend(keys)
+            for key in stale:
+                self._drop(key)
+            self.invalidations += len(stale)
@@ -0,0 +1,270 @@
+"""
+SearchIndex: Inverted index for counterparty and SMS body search
+
+Subscribed to the store like the /stats rollups, so creates, updates and
+deletes are indexed as they happen instead of rescanning on each query.
+
+Counterparty strings from the ETL are noisy ("Jane Smith 12845 has been
+completed at 2024"), so names are normalized before indexing: the SMS tail
+("has been completed ...", "with token ...") and a trailing merchant code
+are cut, leaving "Jane Smith". The code stays searchable as a term of the
+transaction.
+
+Two vocabularies, each term -> posting set:
+  - names:         terms of normalized counterparty names -> names; each
+                   name -> ids of its transactions. Few distinct names, so
+                   typeahead over them is cheap at any row count.
+  - transactions:  terms of the names, merchant code and raw SMS body (when
+                   the records carry one, see run.py --keep-body) -> ids.
+
+Each query token matches vocabulary terms by:
+  - prefix:  bisect on the sorted term list (typeahead)
+  - fuzzy:   character bigram overlap (Dice coefficient), only when a
+             token has no prefix match, so "smtih" still finds "smith"
+Tokens are ANDed; the matches of one token are ORed.
+"""
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+TERM = re.compile(r'[0-9a-z]+')
+NAME_TAIL = re.compile(r'\s+(?:with token\b|has (?:been|failed)\b).*$', re.IGNORECASE | re.DOTALL)
+CODE_TAIL = re.compile(r'\s+\d+$')
+CODE = re.compile(r'\s(\d+)$')
+
+MAX_EXPANSIONS = 256        # vocabulary terms one query token may match
+NGRAM = 2
+FUZZY_MIN_SCORE = 0.5       # Dice coefficient over padded n-grams
+FUZZY_MAX_TERMS = 8
+PENDING_MERGE = 1024        # minimum size of the recent-terms run before a merge
+
+# Ranking weight of a query token by how it matched a term
+EXACT, PREFIX, FUZZY = 3.0, 2.0, 1.0
+
+
+def fold(text):
+    """Lowercase and strip accents"""
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def terms(text):
+    return TERM.findall(fold(text))
+
+
+def normalize_name(raw):
+    """Counterparty name without the SMS tail or merchant code"""
+    name = NAME_TAIL.sub('', raw.strip())
+    name = CODE_TAIL.sub('', name)
+    return ' '.join(name.split()) or ' '.join(raw.split())
+
+
+def ngrams(term, n=NGRAM):
+    padded = f" {term} "
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class Vocabulary:
+    """Term -> posting set, with prefix and n-gram lookup of terms"""
+
+    def __init__(self):
+        self.postings = {}
+        # Terms sorted in two runs: a large one, which may hold removed terms
+        # until the next merge, and a small one of recent terms (insort)
+        self._sorted = []
+        self._pending = []
+        self._grams = {}            # n-gram -> terms (not for numbers)
+
+    def __len__(self):
+        return len(self.postings)
+
+    def add(self, term, key):
+        keys = self.postings.get(term)
+        if keys is None:
+            keys = self.postings[term] = set()
+            bisect.insort(self._pending, term)
+            if len(self._pending) > PENDING_MERGE + len(self._sorted) // 8:
+                self._merge()
+            if not term.isdigit():
+                for gram in ngrams(term):
+                    self._grams.setdefault(gram, set()).add(term)
+        keys.add(key)
+
+    def remove(self, term, key):
+        keys = self.postings.get(term)
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del self.postings[term]
+            i = bisect.bisect_left(self._pending, term)
+            if i < len(self._pending) and self._pending[i] == term:
+                del self._pending[i]
+            if not term.isdigit():
+                for gram in ngrams(term):
+                    grams = self._grams[gram]
+                    grams.discard(term)
+                    if not grams:
+                        del self._grams[gram]
+
+    def _merge(self):
+        # Both runs are sorted, so timsort merges them in linear time; the
+        # recent run grows with the vocabulary, so merges stay amortized O(1)
+        self._sorted = sorted([t for t in self._sorted if t in self.postings] + self._pending)
+        self._pending = []
+
+    def prefixed(self, prefix, limit=MAX_EXPANSIONS):
+        """Live terms starting with prefix, in order"""
+        found = []
+        for run in (self._sorted, self._pending):
+            i = bisect.bisect_left(run, prefix)
+            stop = len(found) + limit
+            while i < len(run) and len(found) < stop and run[i].startswith(prefix):
+                if run[i] in self.postings:
+                    found.append(run[i])
+                i += 1
+        return sorted(found)[:limit]
+
+    def similar(self, token, limit=FUZZY_MAX_TERMS):
+        """[(term, score)] sharing enough n-grams with token, best first"""
+        if len(token) < 3 or token.isdigit():
+            return []
+        grams = ngrams(token)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+        scored = []
+        for term, count in shared.items():
+            score = 2 * count / (len(grams) + len(ngrams(term)))
+            if score >= FUZZY_MIN_SCORE:
+                scored.append((score, term))
+        return [(term, score) for score, term in heapq.nlargest(limit, scored)]
+
+    def expand(self, token, fuzzy=True):
+        """{term: weight} for the terms a query token matches"""
+        matched = {term: EXACT if term == token else PREFIX for term in self.prefixed(token)}
+        if not matched and fuzzy:
+            matched = {term: FUZZY * score for term, score in self.similar(token)}
+        return matched
+
+
+class SearchIndex:
+    """Counterparty and body search kept in step with a store"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.names = Vocabulary()           # name term -> normalized names
+        self.transactions = Vocabulary()    # name / code / body term -> transaction ids
+        self.members = {}               # normalized name -> transaction ids
+
+    # ========== STORE LISTENER ==========
+
+    def on_add(self, transaction):
+        with self._lock:
+            tx_id = transaction['id']
+            for name in self._names(transaction):
+                ids = self.members.get(name)
+                if ids is None:
+                    ids = self.members[name] = set()
+                    for term in set(terms(name)):
+                        self.names.add(term, name)
+                ids.add(tx_id)
+            for term in self._terms(transaction):
+                self.transactions.add(term, tx_id)
+
+    def on_remove(self, transaction):
+        with self._lock:
+            tx_id = transaction['id']
+            for name in self._names(transaction):
+                ids = self.members.get(name)
+                if ids is None:
+                    continue
+                ids.discard(tx_id)
+                if not ids:
+                    del self.members[name]
+                    for term in set(terms(name)):
+                        self.names.remove(term, name)
+            for term in self._terms(transaction):
+                self.transactions.remove(term, tx_id)
+
+    @staticmethod
+    def _names(transaction):
+        names = set()
+        for role in ('sender', 'receiver'):
+            value = transaction.get(role)
+            if isinstance(value, str) and value.strip():
+                names.add(normalize_name(value))
+        return names
+
+    @staticmethod
+    def _terms(transaction):
+        """Every searchable term of one transaction"""
+        found = set()
+        for role in ('sender', 'receiver'):
+            value = transaction.get(role)
+            if isinstance(value, str):
+                name = NAME_TAIL.sub('', value.strip())
+                found.update(terms(CODE_TAIL.sub('', name)))
+                code = CODE.search(name)
+                if code:
+                    found.add(code.group(1))
+        body = transaction.get('body')
+        if isinstance(body, str):
+            found.update(terms(body))
+        return found
+
+    # ========== QUERIES ==========
+
+    def counterparties(self, query, limit=10, fuzzy=True):
+        """[{"name", "transactions", "score"}] for names matching every query token, best first"""
+        with self._lock:
+            scores = self._match(self.names, terms(query), fuzzy)
+            ranked = heapq.nsmallest(limit, scores, key=lambda name: (-scores[name], -len(self.members[name]), name))
+            return [{'name': name, 'transactions': len(self.members[name]), 'score': round(scores[name], 3)}
+                    for name in ranked]
+
+    def transaction_ids(self, query, limit=10, fuzzy=True):
+        """(total, newest `limit` ids) of transactions with a term matching every query word"""
+        with self._lock:
+            ids = self._match_ids(self.transactions, terms(query), fuzzy)
+            return len(ids), heapq.nlargest(limit, ids)
+
+    @staticmethod
+    def _match_ids(vocabulary, tokens, fuzzy):
+        """Keys matching every token, with C-level set union/intersection (no scores)"""
+        matches = []
+        for token in dict.fromkeys(tokens):
+            postings = [vocabulary.postings[term] for term in vocabulary.expand(token, fuzzy)]
+            if not postings:
+                return set()
+            matches.append(postings[0] if len(postings) == 1 else set().union(*postings))
+        if not matches:
+            return set()
+        matches.sort(key=len)
+        return matches[0].intersection(*matches[1:])
+
+    @staticmethod
+    def _match(vocabulary, tokens, fuzzy):
+        """{key: score} for keys whose postings match every token"""
+        expanded = [vocabulary.expand(token, fuzzy) for token in dict.fromkeys(tokens)]
+        if not expanded or not all(expanded):
+            return {}
+        # Rarest token first, so later tokens only probe the surviving keys
+        sizes = [sum(len(vocabulary.postings[term]) for term in matched) for matched in expanded]
+        scores = None
+        for _, matched in sorted(zip(sizes, expanded), key=lambda pair: pair[0]):
+            # Best weight first, so each key keeps the weight of its best term
+            postings = sorted(((weight, vocabulary.postings[term]) for term, weight in matched.items()),
+                              key=lambda pair: -pair[0])
+            narrowed = {}
+            for weight, keys in postings:
+                for key in (keys if scores is None else scores.keys() & keys):
+                    if key not in narrowed:
+                        narrowed[key] = weight if scores is None else scores[key] + weight
+            scores = narrowed
+            if not scores:
+                break
+        return scores
@@ -0,0 +1,171 @@
+"""
+PooledHTTPServer: HTTPServer that handles connections on a bounded thread pool
+
+The plain HTTPServer serves one connection at a time, so a slow client or
+a large response blocks everyone else. Here each accepted connection is
+handed to a ThreadPoolExecutor. A semaphore caps in-flight requests at
+the pool size: when every worker is busy the accept loop waits instead of
+queueing unbounded work, and new clients back up in the listen backlog.
+
+With HTTP/1.1 keep-alive a worker serves one request, then parks the
+connection on a selector watched by a single thread and goes back to the
+pool. The connection gets a worker again when its next request arrives,
+and is closed once it idles past the handler timeout, so idle clients
+cost a file descriptor each, not a worker.
+"""
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer
+
+DEFAULT_THREADS = 64
+SWEEP_INTERVAL = 1.0    # seconds between checks for parked connections past their idle timeout
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer with a bounded worker pool"""
+
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, max_workers=DEFAULT_THREADS, bind_and_activate=True):
+        super().__init__(server_address, handler_class, bind_and_activate)
+        self.max_workers = max_workers
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='api-worker')
+        # Idle keep-alive connections: parked by workers, registered and watched by the idle thread
+        self._idle = selectors.DefaultSelector()
+        self._parked = []
+        self._parked_lock = threading.Lock()
+        self._closing = False
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._idle.register(self._wake_r, selectors.EVENT_READ)
+        self._idle_thread = threading.Thread(target=self._watch_idle, name='api-idle', daemon=True)
+        self._idle_thread.start()
+
+    def process_request(self, request, client_address):
+        """Hand the connection to a worker, waiting for a free slot"""
+        self._dispatch(request, client_address)
+
+    def _dispatch(self, request, client_address, handler=None):
+        self._slots.acquire()
+        try:
+            self._pool.submit(self._process_in_worker, request, client_address, handler)
+        except RuntimeError:
+            # Pool already shut down
+            self._slots.release()
+            self._close(request, handler)
+
+    def _process_in_worker(self, request, client_address, handler=None):
+        keep = False
+        try:
+            if handler is None:
+                handler = self._open(request, client_address)
+            handler.handle_one_request()
+            # Pipelined requests are already in rfile's buffer, where the selector cannot see them
+            while not handler.close_connection and _buffered(handler):
+                handler.handle_one_request()
+            keep = not handler.close_connection
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            if keep:
+                self._park(handler)
+            else:
+                self._close(request, handler)
+            self._slots.release()
+
+    def _open(self, request, client_address):
+        """The connection's handler, set up but not run (its __init__ would serve the whole connection)"""
+        handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+        handler.request, handler.client_address, handler.server = request, client_address, self
+        handler.setup()
+        # As BaseHTTPRequestHandler.handle: a request that does not ask for keep-alive ends the connection
+        handler.close_connection = True
+        return handler
+
+    def _close(self, request, handler=None):
+        if handler is not None:
+            handler.finish()
+        self.shutdown_request(request)
+
+    def _park(self, handler):
+        """Leave the connection to the idle thread until its next request"""
+        deadline = None if handler.timeout is None else time.monotonic() + handler.timeout
+        with self._parked_lock:
+            closing = self._closing
+            if not closing:
+                self._parked.append((handler, deadline))
+        if closing:
+            self._close(handler.request, handler)
+        else:
+            self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            # A wake-up is already pending, or the idle thread has exited
+            pass
+
+    def _watch_idle(self):
+        """Hand parked connections back to the pool when readable, close them past their deadline"""
+        sweep = time.monotonic() + SWEEP_INTERVAL
+        while not self._closing:
+            for key, _ in self._idle.select(max(0.0, sweep - time.monotonic())):
+                if key.data is None:
+                    while True:
+                        try:
+                            if not self._wake_r.recv(4096):
+                                break
+                        except BlockingIOError:
+                            break
+                    continue
+                # Next request (or the client closing): a worker reads it
+                self._idle.unregister(key.fileobj)
+                handler = key.data[0]
+                self._dispatch(handler.request, handler.client_address, handler)
+            with self._parked_lock:
+                parked, self._parked = self._parked, []
+                for handler, deadline in parked:
+                    self._idle.register(handler.connection, selectors.EVENT_READ, (handler, deadline))
+            now = time.monotonic()
+            if now >= sweep:
+                expired = [key for key in self._idle.get_map().values()
+                           if key.data is not None and key.data[1] is not None and key.data[1] <= now]
+                for key in expired:
+                    self._idle.unregister(key.fileobj)
+                    self._close(key.data[0].request, key.data[0])
+                sweep = now + SWEEP_INTERVAL
+        with self._parked_lock:
+            parked = [key.data[0] for key in self._idle.get_map().values() if key.data is not None]
+            parked += [handler for handler, _ in self._parked]
+            self._parked = []
+        for handler in parked:
+            self._close(handler.request, handler)
+        self._idle.close()
+        self._wake_r.close()
+        self._wake_w.close()
+
+    def server_close(self):
+        super().server_close()
+        with self._parked_lock:
+            self._closing = True
+        self._wake()
+        self._pool.shutdown(wait=False)
+
+
+def _buffered(handler):
+    """Whether the client's next request is already readable without blocking"""
+    sock = handler.connection
+    timeout = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        return bool(handler.rfile.peek(1))
+    except OSError:
+        return False
+    finally:
+        sock.settimeout(timeout)
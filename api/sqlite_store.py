@@ -0,0 +1,377 @@
+"""
+SQLiteStore: Persistent transaction storage for the REST API (stdlib sqlite3)
+
+Drop-in replacement for TransactionStore (same methods, same return
+values) that writes every change through to a SQLite database, so POST,
+PUT and DELETE survive restarts and startup cost no longer depends on the
+dataset size:
+  - WAL journal mode: readers never block the writer and vice versa
+  - synchronous=NORMAL: commits append to the WAL without an fsync; a
+    power loss can only drop the latest commits, never corrupt the file
+  - indexes on id (primary key), transaction_type, timestamp, sender,
+    receiver and amount back the same filters as the in-memory indexes;
+    the txid index answers duplicate checks (see dedup.py)
+  - one connection per thread (thread-local, reused by pooled workers)
+  - writes go through a single lock in short BEGIN IMMEDIATE transactions;
+    add_many() batches rows into one transaction per BATCH_SIZE rows
+
+`version` is persisted in a meta table so ETags stay valid across restarts.
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from parse_xml import load_records
+from store import FIELDS, UPDATEABLE
+
+COLUMNS = ('id',) + FIELDS
+TIMESTAMP = FIELDS.index('timestamp')
+BATCH_SIZE = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    transaction_type,
+    amount,
+    sender,
+    receiver,
+    timestamp,
+    txid,
+    fee,
+    balance
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+INSERT OR IGNORE INTO meta VALUES ('version', 0);
+"""
+
+INDEXES = {
+    'idx_type': 'transaction_type',
+    'idx_timestamp': 'timestamp',
+    'idx_sender': 'sender',
+    'idx_receiver': 'receiver',
+    'idx_amount': 'amount',
+    'idx_txid': 'txid',
+}
+
+SELECT = f"SELECT {', '.join(COLUMNS)} FROM transactions"
+AMOUNT_IS_NUMBER = "typeof(amount) IN ('integer', 'real')"
+
+
+class SQLiteStore:
+    """SQLite-backed transaction storage with the TransactionStore interface"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._lock = threading.RLock()
+        self._listeners = []
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(transactions)")]
+        for column in COLUMNS:
+            if column not in columns:
+                # Databases created before the column was kept (txid, fee, balance)
+                conn.execute(f"ALTER TABLE transactions ADD COLUMN {column}")
+        self._create_indexes(conn)
+        self._version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def _conn(self):
+        """This thread's connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """Close every thread's connection"""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    def __iter__(self):
+        return iter(self.all())
+
+    @property
+    def version(self):
+        """Mutation counter: changes whenever any transaction changes"""
+        return self._version
+
+    def subscribe(self, listener, replay=True):
+        """
+        Register an object with on_add(tx) / on_remove(tx) methods
+        Same contract as TransactionStore.subscribe: existing rows are
+        replayed first (unless replay is False), callbacks run under the
+        write lock once the write has committed.
+        """
+        with self._lock:
+            if replay:
+                for transaction in self._fetch(SELECT + " ORDER BY id"):
+                    listener.on_add(transaction)
+            self._listeners.append(listener)
+
+    # ========== READS ==========
+
+    def _fetch(self, sql, params=()):
+        return [dict(zip(COLUMNS, row)) for row in self._conn().execute(sql, params)]
+
+    def get(self, tx_id):
+        """Return transaction by id, or None"""
+        rows = self._fetch(SELECT + " WHERE id = ?", (tx_id,))
+        return rows[0] if rows else None
+
+    def all(self):
+        """Return all transactions in id order"""
+        return self._fetch(SELECT + " ORDER BY id")
+
+    def find_txid(self, txid):
+        """Id of a transaction with this provider txid, or None (uses idx_txid)"""
+        row = self._conn().execute("SELECT id FROM transactions WHERE txid = ? LIMIT 1", (txid,)).fetchone()
+        return row[0] if row else None
+
+    def txids(self):
+        """Iterate the provider txids in the table (to build a Bloom filter over them)"""
+        for row in self._conn().execute("SELECT txid FROM transactions WHERE txid IS NOT NULL"):
+            yield row[0]
+
+    def by_type(self, tx_type):
+        """Return transactions of one transaction_type"""
+        return self._fetch(SELECT + " WHERE transaction_type = ? ORDER BY id", (tx_type,))
+
+    def by_counterparty(self, name):
+        """Return transactions where name is the sender or receiver"""
+        return self._fetch(SELECT + " WHERE sender = ? OR receiver = ? ORDER BY id", (name, name))
+
+    def between(self, start=None, end=None):
+        """Return transactions with start <= timestamp < end (ISO strings)"""
+        return self.query(start=start, end=end)[1]
+
+    def query(self, transaction_type=None, sender=None, receiver=None, counterparty=None,
+              min_amount=None, max_amount=None, start=None, end=None,
+              after=None, offset=0, limit=None):
+        """
+        Filter and paginate transactions, ordered by id
+        Same semantics as TransactionStore.query; SQLite picks the index.
+        Returns (total matches ignoring after/offset/limit, page).
+        """
+        where = []
+        params = []
+        for column, value in (('transaction_type', transaction_type), ('sender', sender),
+                              ('receiver', receiver)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if counterparty is not None:
+            where.append("(sender = ? OR receiver = ?)")
+            params += [counterparty, counterparty]
+        if start is not None:
+            where.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("timestamp < ?")
+            params.append(end)
+        if min_amount is not None or max_amount is not None:
+            where.append(AMOUNT_IS_NUMBER)
+        if min_amount is not None:
+            where.append("amount >= ?")
+            params.append(min_amount)
+        if max_amount is not None:
+            where.append("amount <= ?")
+            params.append(max_amount)
+
+        page_where = where + (["id > ?"] if after is not None else [])
+        page_params = params + ([after] if after is not None else [])
+        conn = self._conn()
+        # One read transaction so the count and the page see the same snapshot
+        conn.execute("BEGIN")
+        try:
+            total = conn.execute("SELECT COUNT(*) FROM transactions" + _where(where), params).fetchone()[0]
+            page = self._fetch(SELECT + _where(page_where) + " ORDER BY id LIMIT ? OFFSET ?",
+                               page_params + [-1 if limit is None else limit, offset])
+        finally:
+            conn.execute("COMMIT")
+        return total, page
+
+    # ========== WRITES ==========
+
+    def _write(self, work):
+        """
+        Run work(conn, events) in one write transaction and bump the version
+        work appends (method, transaction) pairs to events; listeners get
+        them only after COMMIT, so a rolled back write never reaches them
+        and no listener acts on rows other connections cannot read yet.
+        """
+        with self._lock:
+            conn = self._conn()
+            events = []
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(conn, events)
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._version += 1
+            for method, transaction in events:
+                for listener in self._listeners:
+                    getattr(listener, method)(transaction)
+            return result
+
+    def add(self, transaction):
+        """Add a transaction that already has an id (e.g. loaded from JSON)"""
+        return self.add_many([transaction])[0]
+
+    def add_many(self, transactions, batch_size=BATCH_SIZE):
+        """Insert transactions that already have ids, one transaction per batch"""
+        added = []
+        batch = []
+        for transaction in transactions:
+            batch.append(transaction)
+            if len(batch) >= batch_size:
+                added += self._insert(batch)
+                batch = []
+        if batch:
+            added += self._insert(batch)
+        return added
+
+    def _insert(self, batch):
+        def work(conn, events):
+            try:
+                conn.executemany(f"INSERT INTO transactions VALUES ({', '.join('?' * len(COLUMNS))})",
+                                 [tuple(tx.get(column) for column in COLUMNS) for tx in batch])
+            except sqlite3.IntegrityError:
+                raise KeyError("Transaction already exists")
+            events.extend(('on_add', transaction) for transaction in batch)
+            return batch
+        return self._write(work)
+
+    def create(self, fields):
+        """Create a transaction with the next id; timestamp defaults to now"""
+        return self.create_many([fields])[0]
+
+    def create_many(self, items):
+        """Create transactions from field dicts in one write transaction; returns them in order"""
+        def work(conn, events):
+            created = []
+            insert = f"INSERT INTO transactions ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})"
+            for fields in items:
+                values = [fields.get(field) for field in FIELDS]
+                if not values[TIMESTAMP]:
+                    values[TIMESTAMP] = datetime.now().isoformat()
+                cursor = conn.execute(insert, values)
+                transaction = dict(zip(COLUMNS, [cursor.lastrowid] + values))
+                events.append(('on_add', transaction))
+                created.append(transaction)
+            return created
+        return self._write(work)
+
+    def update(self, tx_id, changes):
+        """Update updateable fields; returns the new transaction or None"""
+        return self.update_many([(tx_id, changes)])[0]
+
+    def update_many(self, changes):
+        """Apply (tx_id, changes) pairs in one write transaction; None where an id is missing"""
+        with self._lock:
+            pairs = []
+            latest = {}                 # an id changed twice in one batch builds on the first change
+            for tx_id, fields in changes:
+                old = latest[tx_id] if tx_id in latest else self.get(tx_id)
+                if old is None:
+                    pairs.append((None, None))
+                    continue
+                transaction = dict(old)
+                for field in UPDATEABLE:
+                    if field in fields:
+                        transaction[field] = fields[field]
+                latest[tx_id] = transaction
+                pairs.append((old, transaction))
+            if not any(old for old, _ in pairs):
+                return [None] * len(pairs)
+
+            def work(conn, events):
+                conn.executemany(f"UPDATE transactions SET {', '.join(f'{f} = ?' for f in UPDATEABLE)} WHERE id = ?",
+                                 [[new[f] for f in UPDATEABLE] + [new['id']] for old, new in pairs if old])
+                for old, new in pairs:
+                    if old:
+                        events.append(('on_remove', old))
+                        events.append(('on_add', new))
+                return [new for _, new in pairs]
+            return self._write(work)
+
+    def delete(self, tx_id):
+        """Remove and return a transaction, or None"""
+        return self.delete_many([tx_id])[0]
+
+    def delete_many(self, ids):
+        """Remove several transactions in one write transaction; None where an id is missing"""
+        with self._lock:
+            seen = set()
+            removed = []
+            for tx_id in ids:
+                removed.append(None if tx_id in seen else self.get(tx_id))
+                seen.add(tx_id)
+            if not any(removed):
+                return removed
+
+            def work(conn, events):
+                conn.executemany("DELETE FROM transactions WHERE id = ?",
+                                 [(tx['id'],) for tx in removed if tx])
+                events.extend(('on_remove', transaction) for transaction in removed if transaction)
+                return removed
+            return self._write(work)
+
+    # ========== BULK IMPORT ==========
+
+    def import_json(self, json_file, batch_size=BATCH_SIZE):
+        """
+        One-time bulk import of the ETL's output (.json, .ndjson or .col)
+        Into an empty table the secondary indexes are dropped and rebuilt
+        once at the end, which is much faster than maintaining them per row.
+        Returns the number of rows imported.
+        """
+        transactions = load_records(json_file)
+        with self._lock:
+            conn = self._conn()
+            empty = len(self) == 0
+            if empty:
+                for name in INDEXES:
+                    conn.execute(f"DROP INDEX IF EXISTS {name}")
+            try:
+                added = self.add_many(transactions, batch_size)
+            finally:
+                if empty:
+                    self._create_indexes(conn)
+                    conn.execute("ANALYZE")
+        return len(added)
+
+    def _create_indexes(self, conn):
+        for name, column in INDEXES.items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON transactions ({column})")
+
+
+def _where(clauses):
+    return " WHERE " + " AND ".join(clauses) if clauses else ""
+
+
+def open_store(db_file, json_file=None):
+    """Open db_file, importing json_file once if the database is new"""
+    is_new = not os.path.exists(db_file)
+    store = SQLiteStore(db_file)
+    if is_new and json_file and os.path.exists(json_file):
+        count = store.import_json(json_file)
+        print(f"✓ Imported {count} transactions from {json_file} into {db_file}")
+    return store
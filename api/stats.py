@@ -0,0 +1,125 @@
+"""
+Rollups: Incrementally maintained aggregates behind the /stats endpoints
+
+Subscribed to the TransactionStore, so every create/update/delete adjusts
+the aggregates in O(1) instead of rescanning the dataset per query:
+  - count and amount total per transaction_type
+  - daily and monthly volume (from the ISO timestamp prefix)
+  - count and amount per sender and per receiver (top-N via heapq)
+  - amount histogram over fixed bucket edges
+
+Non-numeric amounts are counted but contribute 0 to totals and fall
+outside the histogram.
+"""
+import bisect
+import heapq
+import threading
+from numbers import Number
+
+HISTOGRAM_EDGES = (0, 100, 500, 1000, 5000, 10000, 50000, 100000, 500000, 1000000)
+
+
+def _amount(transaction):
+    amount = transaction.get('amount')
+    if isinstance(amount, Number) and not isinstance(amount, bool):
+        return amount
+    return None
+
+
+class Rollups:
+    """Aggregates kept in step with a TransactionStore"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0
+        self.by_type = {}
+        self.daily = {}
+        self.monthly = {}
+        self.senders = {}
+        self.receivers = {}
+        self.histogram = [0] * len(HISTOGRAM_EDGES)
+
+    # ========== STORE LISTENER ==========
+
+    def on_add(self, transaction):
+        with self._lock:
+            self._apply(transaction, 1)
+
+    def on_remove(self, transaction):
+        with self._lock:
+            self._apply(transaction, -1)
+
+    def _apply(self, transaction, sign):
+        amount = _amount(transaction)
+        value = amount if amount is not None else 0
+        self.count += sign
+        self.total += sign * value
+
+        _bump(self.by_type, transaction['transaction_type'], sign, value)
+        _bump(self.senders, transaction['sender'], sign, value)
+        _bump(self.receivers, transaction['receiver'], sign, value)
+
+        timestamp = transaction['timestamp']
+        if isinstance(timestamp, str) and len(timestamp) >= 10:
+            _bump(self.daily, timestamp[:10], sign, value)
+            _bump(self.monthly, timestamp[:7], sign, value)
+
+        if amount is not None and amount >= 0:
+            self.histogram[bisect.bisect_right(HISTOGRAM_EDGES, amount) - 1] += sign
+
+    # ========== QUERIES ==========
+
+    def summary(self):
+        """Overall totals plus per-type breakdown"""
+        with self._lock:
+            return {
+                'count': self.count,
+                'total_amount': self.total,
+                'by_type': _table(self.by_type, 'transaction_type'),
+            }
+
+    def timeseries(self, interval='day', start=None, end=None):
+        """Volume per day or month, with start <= period < end (prefix strings)"""
+        with self._lock:
+            buckets = self.daily if interval == 'day' else self.monthly
+            keys = sorted(buckets)
+            lo = 0 if start is None else bisect.bisect_left(keys, start)
+            hi = len(keys) if end is None else bisect.bisect_left(keys, end)
+            return [{'period': k, 'count': buckets[k][0], 'total_amount': buckets[k][1]}
+                    for k in keys[lo:hi]]
+
+    def top(self, role='receiver', metric='amount', limit=10):
+        """Top counterparties by amount or count"""
+        index = 1 if metric == 'amount' else 0
+        with self._lock:
+            parties = self.senders if role == 'sender' else self.receivers
+            # Ties are broken by name so results do not depend on insertion order
+            best = heapq.nsmallest(limit, parties.items(),
+                                   key=lambda item: (-item[1][index], str(item[0])))
+            return [{'name': name, 'count': count, 'total_amount': total}
+                    for name, (count, total) in best]
+
+    def amount_histogram(self):
+        """Count per amount bucket [edge, next edge)"""
+        with self._lock:
+            counts = list(self.histogram)
+        uppers = HISTOGRAM_EDGES[1:] + (None,)
+        return [{'min': lo, 'max': hi, 'count': n}
+                for lo, hi, n in zip(HISTOGRAM_EDGES, uppers, counts)]
+
+
+def _bump(table, key, sign, value):
+    """Adjust [count, total] for key, dropping it when the count reaches 0"""
+    entry = table.get(key)
+    if entry is None:
+        entry = table[key] = [0, 0]
+    entry[0] += sign
+    entry[1] += sign * value
+    if entry[0] <= 0:
+        del table[key]
+
+
+def _table(table, label):
+    return [{label: key, 'count': count, 'total_amount': total}
+            for key, (count, total) in sorted(table.items(), key=lambda item: str(item[0]))]
@@ -0,0 +1,412 @@
+"""
+TransactionStore: Indexed in-memory transaction storage for the REST API
+
+Replaces linear scans over a global list with hash indexes:
+  - primary index:   id -> transaction (dict, O(1) get/insert/delete)
+  - next-id counter:  O(1), ids are never reused after a delete
+  - secondary:       transaction_type -> ids, counterparty -> ids
+  - sorted indexes:  id, timestamp and amount, bisect for ranges/cursors
+
+Hash indexes map keys to insertion-ordered id dicts, so deletes are O(1).
+Sorted indexes leave tombstones on delete which are compacted once they
+make up half of the index.
+
+The store is thread-safe: every public method holds one lock, and updates
+are copy-on-write, so a transaction dict handed to a reader is never
+modified afterwards (serializing it needs no lock). `version` increases on
+every mutation, so it can back ETags and caches.
+
+Listeners (see subscribe) are told about every row that enters or leaves
+the store, which lets derived structures such as rollups stay in step
+without rescanning.
+"""
+import bisect
+import threading
+from datetime import datetime
+from numbers import Number
+
+FIELDS = ('transaction_type', 'amount', 'sender', 'receiver', 'timestamp', 'txid', 'fee', 'balance')
+UPDATEABLE = ('transaction_type', 'amount', 'sender', 'receiver')
+
+
+class SortedIndex:
+    """Sorted (key, id) pairs in parallel lists with tombstone deletes"""
+
+    def __init__(self):
+        self._keys = []
+        self._ids = []
+        self._dead = set()
+
+    def __len__(self):
+        return len(self._keys) - len(self._dead)
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Build from (key, id) pairs with one sort instead of n inserts"""
+        index = cls()
+        ordered = sorted(pairs)
+        index._keys = [k for k, _ in ordered]
+        index._ids = [i for _, i in ordered]
+        return index
+
+    def insert(self, key, tx_id):
+        if (key, tx_id) in self._dead:
+            # Entry is still physically present; revive it
+            self._dead.discard((key, tx_id))
+            return
+        if not self._keys or self._keys[-1] <= key:
+            self._keys.append(key)
+            self._ids.append(tx_id)
+        else:
+            i = bisect.bisect_right(self._keys, key)
+            self._keys.insert(i, key)
+            self._ids.insert(i, tx_id)
+
+    def remove(self, key, tx_id):
+        self._dead.add((key, tx_id))
+        if len(self._dead) * 2 > len(self._keys):
+            self._compact()
+
+    def _compact(self):
+        dead = self._dead
+        pairs = [(k, i) for k, i in zip(self._keys, self._ids) if (k, i) not in dead]
+        self._keys = [k for k, _ in pairs]
+        self._ids = [i for _, i in pairs]
+        self._dead = set()
+
+    def bounds(self, lo=None, hi=None, hi_inclusive=False):
+        """Positions [start, stop) covering lo <= key < hi (or <= hi)"""
+        start = 0 if lo is None else bisect.bisect_left(self._keys, lo)
+        if hi is None:
+            stop = len(self._keys)
+        elif hi_inclusive:
+            stop = bisect.bisect_right(self._keys, hi)
+        else:
+            stop = bisect.bisect_left(self._keys, hi)
+        return start, max(start, stop)
+
+    def ids(self, start, stop, skip=0, limit=None):
+        """Live ids between two positions in key order, after skipping `skip`"""
+        if not self._dead:
+            start += skip
+            if limit is not None:
+                stop = min(stop, start + limit)
+            return self._ids[start:stop]
+        dead = self._dead
+        result = []
+        for k, i in zip(self._keys[start:stop], self._ids[start:stop]):
+            if (k, i) in dead:
+                continue
+            if skip:
+                skip -= 1
+                continue
+            if limit is not None and len(result) >= limit:
+                break
+            result.append(i)
+        return result
+
+    def range(self, lo=None, hi=None, hi_inclusive=False):
+        return self.ids(*self.bounds(lo, hi, hi_inclusive))
+
+
+class TransactionStore:
+    """In-memory transaction storage with O(1) id lookups"""
+
+    def __init__(self, transactions=()):
+        self._lock = threading.RLock()
+        self._rows = {}
+        self._by_type = {}
+        self._by_party = {}
+        self._by_id = SortedIndex()
+        self._by_time = SortedIndex()
+        self._by_amount = SortedIndex()
+        self._next_id = 1
+        self._version = 0
+        self._listeners = []
+        self._load(transactions)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self.all())
+
+    @property
+    def version(self):
+        """Mutation counter: changes whenever any transaction changes"""
+        return self._version
+
+    @property
+    def next_id(self):
+        """Id the next create will get"""
+        return self._next_id
+
+    def resume(self, version, next_id):
+        """Continue from a snapshot: its version, and ids deleted before it are not handed out again"""
+        with self._lock:
+            self._version = version
+            self._next_id = max(self._next_id, next_id)
+
+    def snapshot(self):
+        """(version, next_id, rows) read together, as a follower or a snapshot file needs them"""
+        with self._lock:
+            return self._version, self._next_id, self.all()
+
+    def subscribe(self, listener, replay=True):
+        """
+        Register an object with on_add(tx) / on_remove(tx) methods
+        Existing rows are replayed through on_add first (unless replay is
+        False, for listeners that only care about changes). Updates arrive
+        as on_remove(old) + on_add(new). Callbacks run under the store lock.
+        """
+        with self._lock:
+            if replay:
+                for transaction in self._rows.values():
+                    listener.on_add(transaction)
+            self._listeners.append(listener)
+
+    # ========== READS ==========
+
+    def get(self, tx_id):
+        """Return transaction by id, or None"""
+        with self._lock:
+            return self._rows.get(tx_id)
+
+    def all(self):
+        """Return all transactions in insertion order"""
+        with self._lock:
+            return list(self._rows.values())
+
+    def by_type(self, tx_type):
+        """Return transactions of one transaction_type"""
+        with self._lock:
+            return [self._rows[i] for i in self._by_type.get(tx_type, ())]
+
+    def by_counterparty(self, name):
+        """Return transactions where name is the sender or receiver"""
+        with self._lock:
+            return [self._rows[i] for i in self._by_party.get(name, ())]
+
+    def between(self, start=None, end=None):
+        """Return transactions with start <= timestamp < end (ISO strings)"""
+        with self._lock:
+            return [self._rows[i] for i in self._by_time.range(start, end)]
+
+    def query(self, transaction_type=None, sender=None, receiver=None, counterparty=None,
+              min_amount=None, max_amount=None, start=None, end=None,
+              after=None, offset=0, limit=None):
+        """
+        Filter and paginate transactions, ordered by id
+        Candidates come from the most selective index; the remaining
+        predicates are checked on those rows only.
+        `after` is a cursor (the last id of the previous page).
+        Returns (total matches ignoring after/offset/limit, page).
+        """
+        with self._lock:
+            rows = self._rows
+            sources = []
+            if transaction_type is not None:
+                sources.append(self._by_type.get(transaction_type, {}))
+            for name in (sender, receiver, counterparty):
+                if name is not None:
+                    sources.append(self._by_party.get(name, {}))
+            if start is not None or end is not None:
+                sources.append(self._by_time.range(start, end))
+            if min_amount is not None or max_amount is not None:
+                sources.append(self._by_amount.range(min_amount, max_amount, hi_inclusive=True))
+
+            if not sources:
+                lo = None if after is None else after + 1
+                ids = self._by_id.ids(*self._by_id.bounds(lo), skip=offset, limit=limit)
+                return len(rows), [rows[i] for i in ids]
+
+            checks = filter_checks(transaction_type, sender, receiver, counterparty,
+                                   min_amount, max_amount, start, end)
+
+            total = 0
+            page = []
+            skip = offset
+            for tx_id in sorted(min(sources, key=len)):
+                tx = rows[tx_id]
+                if not all(check(tx) for check in checks):
+                    continue
+                total += 1
+                if after is not None and tx_id <= after:
+                    continue
+                if skip:
+                    skip -= 1
+                elif limit is None or len(page) < limit:
+                    page.append(tx)
+            return total, page
+
+    # ========== WRITES ==========
+
+    def add(self, transaction):
+        """Add a transaction that already has an id (e.g. loaded from JSON)"""
+        with self._lock:
+            tx_id = transaction['id']
+            if tx_id in self._rows:
+                raise KeyError(f"Transaction {tx_id} already exists")
+            _check_keys(transaction)
+            self._rows[tx_id] = transaction
+            self._index(transaction)
+            self._by_id.insert(tx_id, tx_id)
+            self._by_time.insert(_time_key(transaction), tx_id)
+            if tx_id >= self._next_id:
+                self._next_id = tx_id + 1
+            self._version += 1
+            for listener in self._listeners:
+                listener.on_add(transaction)
+            return transaction
+
+    def create(self, fields):
+        """Create a transaction with the next id; timestamp defaults to now"""
+        with self._lock:
+            transaction = {'id': self._next_id}
+            for field in FIELDS:
+                transaction[field] = fields.get(field)
+            if not transaction['timestamp']:
+                transaction['timestamp'] = datetime.now().isoformat()
+            return self.add(transaction)
+
+    def update(self, tx_id, changes):
+        """Update updateable fields; returns the new transaction or None"""
+        with self._lock:
+            old = self._rows.get(tx_id)
+            if old is None:
+                return None
+            transaction = dict(old)
+            for field in UPDATEABLE:
+                if field in changes:
+                    transaction[field] = changes[field]
+            _check_keys(transaction)
+            self._unindex(old)
+            self._rows[tx_id] = transaction
+            self._index(transaction)
+            self._version += 1
+            for listener in self._listeners:
+                listener.on_remove(old)
+                listener.on_add(transaction)
+            return transaction
+
+    def delete(self, tx_id):
+        """Remove and return a transaction, or None"""
+        with self._lock:
+            transaction = self._rows.pop(tx_id, None)
+            if transaction is not None:
+                self._unindex(transaction)
+                self._by_id.remove(tx_id, tx_id)
+                self._by_time.remove(_time_key(transaction), tx_id)
+                self._version += 1
+                for listener in self._listeners:
+                    listener.on_remove(transaction)
+            return transaction
+
+    def create_many(self, items):
+        """Create transactions from field dicts under one lock; returns them in order"""
+        with self._lock:
+            return [self.create(fields) for fields in items]
+
+    def update_many(self, changes):
+        """Apply (tx_id, changes) pairs; returns the new rows, None where an id is missing"""
+        with self._lock:
+            return [self.update(tx_id, fields) for tx_id, fields in changes]
+
+    def delete_many(self, ids):
+        """Remove several transactions; returns the removed rows, None where an id is missing"""
+        with self._lock:
+            return [self.delete(tx_id) for tx_id in ids]
+
+    # ========== INDEX MAINTENANCE ==========
+
+    def _load(self, transactions):
+        """Bulk add for the constructor: hash-index rows, sort each SortedIndex once"""
+        times = []
+        amounts = []
+        for transaction in transactions:
+            tx_id = transaction['id']
+            if tx_id in self._rows:
+                raise KeyError(f"Transaction {tx_id} already exists")
+            self._rows[tx_id] = transaction
+            self._by_type.setdefault(transaction['transaction_type'], {})[tx_id] = None
+            for name in (transaction['sender'], transaction['receiver']):
+                self._by_party.setdefault(name, {})[tx_id] = None
+            times.append((_time_key(transaction), tx_id))
+            amount = _amount_key(transaction)
+            if amount is not None:
+                amounts.append((amount, tx_id))
+        self._by_id = SortedIndex.from_pairs((tx_id, tx_id) for tx_id in self._rows)
+        self._by_time = SortedIndex.from_pairs(times)
+        self._by_amount = SortedIndex.from_pairs(amounts)
+        if self._rows:
+            self._next_id = max(self._rows) + 1
+        self._version = len(self._rows)
+
+    def _index(self, transaction):
+        """Index the updateable fields (id and timestamp never change)"""
+        tx_id = transaction['id']
+        self._by_type.setdefault(transaction['transaction_type'], {})[tx_id] = None
+        for name in (transaction['sender'], transaction['receiver']):
+            self._by_party.setdefault(name, {})[tx_id] = None
+        amount = _amount_key(transaction)
+        if amount is not None:
+            self._by_amount.insert(amount, tx_id)
+
+    def _unindex(self, transaction):
+        tx_id = transaction['id']
+        _discard(self._by_type, transaction['transaction_type'], tx_id)
+        for name in (transaction['sender'], transaction['receiver']):
+            _discard(self._by_party, name, tx_id)
+        amount = _amount_key(transaction)
+        if amount is not None:
+            self._by_amount.remove(amount, tx_id)
+
+
+def filter_checks(transaction_type=None, sender=None, receiver=None, counterparty=None,
+                  min_amount=None, max_amount=None, start=None, end=None):
+    """Predicates implementing the query() filters on a single transaction"""
+    checks = []
+    if transaction_type is not None:
+        checks.append(lambda tx: tx['transaction_type'] == transaction_type)
+    if sender is not None:
+        checks.append(lambda tx: tx['sender'] == sender)
+    if receiver is not None:
+        checks.append(lambda tx: tx['receiver'] == receiver)
+    if counterparty is not None:
+        checks.append(lambda tx: counterparty in (tx['sender'], tx['receiver']))
+    if start is not None:
+        checks.append(lambda tx: _time_key(tx) >= start)
+    if end is not None:
+        checks.append(lambda tx: _time_key(tx) < end)
+    if min_amount is not None:
+        checks.append(lambda tx: _amount_key(tx) is not None and _amount_key(tx) >= min_amount)
+    if max_amount is not None:
+        checks.append(lambda tx: _amount_key(tx) is not None and _amount_key(tx) <= max_amount)
+    return checks
+
+
+def _check_keys(transaction):
+    """Raise TypeError for a row the hash indexes cannot hold, before anything changes"""
+    hash((transaction['transaction_type'], transaction['sender'], transaction['receiver']))
+
+
+def _time_key(transaction):
+    timestamp = transaction['timestamp']
+    return timestamp if isinstance(timestamp, str) else ''
+
+
+def _amount_key(transaction):
+    """Numeric amount, or None (non-numeric amounts are not range-indexed)"""
+    amount = transaction['amount']
+    if isinstance(amount, Number) and not isinstance(amount, bool):
+        return amount
+    return None
+
+
+def _discard(index, key, tx_id):
+    """Remove tx_id from index[key], dropping the key once empty"""
+    ids = index.get(key)
+    if ids is not None:
+        ids.pop(tx_id, None)
+        if not ids:
+            del index[key]
@@ -0,0 +1,246 @@
+"""
+TimeIndex: Epoch-ms index over transaction timestamps, in day blocks
+
+Subscribed to the store like the /stats rollups. ISO strings are parsed
+once, on insert, into epoch milliseconds; everything after that is integer
+comparison:
+  - blocks:   one per local calendar day, each with time-sorted epoch-ms
+              and id arrays (array('q')) plus the day's count and total
+  - days:     sorted day ordinals, bisected to find the first block of a
+              range, so locating a range is O(log days + log block)
+  - buckets:  day / week / month aggregates come from the block totals,
+              only the partial blocks at either end of a range are
+              scanned; hour buckets scan the rows in range
+
+Rows whose timestamp does not parse are counted in `undated` and left out
+of the time order instead of being guessed.
+"""
+import bisect
+import threading
+from array import array
+from datetime import date, datetime, timedelta
+from numbers import Number
+
+from columnar import iso_to_ms, ms_to_iso
+
+DAY_MS = 86_400_000
+INTERVALS = ('hour', 'day', 'week', 'month')
+
+
+def to_ms(value):
+    """Epoch ms from an ISO timestamp or a date prefix ('2024', '2024-05', '2024-05-10T14'...)"""
+    if isinstance(value, Number) and not isinstance(value, bool):
+        return int(value)
+    text = value.strip()
+    if len(text) == 4 and text.isdigit():
+        text += '-01-01'
+    elif len(text) == 7 and text[4] == '-':
+        text += '-01'
+    elif len(text) == 13 and text[10] == 'T':
+        text += ':00'
+    return iso_to_ms(text)
+
+
+def _amount(transaction):
+    amount = transaction.get('amount')
+    if isinstance(amount, Number) and not isinstance(amount, bool):
+        return amount
+    return 0
+
+
+def _day(ms):
+    return datetime.fromtimestamp(ms / 1000).date().toordinal()
+
+
+def in_range(ms):
+    """Whether ms falls on a calendar day datetime can hold (years 1 to 9999)"""
+    try:
+        _day(ms)
+    except (ValueError, OverflowError, OSError):
+        return False
+    return True
+
+
+class DayBlock:
+    """Transactions of one calendar day, sorted by (ms, id)"""
+
+    __slots__ = ('ms', 'ids', 'amounts', 'count', 'total')
+
+    def __init__(self):
+        self.ms = array('q')
+        self.ids = array('q')
+        self.amounts = []
+        self.count = 0
+        self.total = 0
+
+    def insert(self, ms, tx_id, amount):
+        if not self.ms or (self.ms[-1], self.ids[-1]) <= (ms, tx_id):
+            i = len(self.ms)
+        else:
+            i = bisect.bisect_right(self.ms, ms)
+            while i > 0 and self.ms[i - 1] == ms and self.ids[i - 1] > tx_id:
+                i -= 1
+        self.ms.insert(i, ms)
+        self.ids.insert(i, tx_id)
+        self.amounts.insert(i, amount)
+        self.count += 1
+        self.total += amount
+
+    def remove(self, ms, tx_id):
+        i = bisect.bisect_left(self.ms, ms)
+        while i < len(self.ms) and self.ms[i] == ms:
+            if self.ids[i] == tx_id:
+                self.total -= self.amounts[i]
+                self.count -= 1
+                del self.ms[i], self.ids[i], self.amounts[i]
+                return True
+            i += 1
+        return False
+
+    def span(self, lo=None, hi=None):
+        """Positions [start, stop) with lo <= ms < hi"""
+        start = 0 if lo is None else bisect.bisect_left(self.ms, lo)
+        stop = len(self.ms) if hi is None else bisect.bisect_left(self.ms, hi)
+        return start, max(start, stop)
+
+
+class TimeIndex:
+    """Epoch-ms range index kept in step with a store"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._days = []             # sorted day ordinals with a block
+        self._blocks = {}           # day ordinal -> DayBlock
+        self._keys = {}             # id -> (ms, day) as indexed
+        self.undated = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    # ========== STORE LISTENER ==========
+
+    def on_add(self, transaction):
+        try:
+            ms = to_ms(transaction['timestamp'])
+        except (AttributeError, TypeError, ValueError, OverflowError):
+            with self._lock:
+                self.undated += 1
+            return
+        day = _day(ms)
+        with self._lock:
+            block = self._blocks.get(day)
+            if block is None:
+                block = self._blocks[day] = DayBlock()
+                if not self._days or self._days[-1] < day:
+                    self._days.append(day)
+                else:
+                    bisect.insort(self._days, day)
+            block.insert(ms, transaction['id'], _amount(transaction))
+            self._keys[transaction['id']] = (ms, day)
+
+    def on_remove(self, transaction):
+        with self._lock:
+            key = self._keys.pop(transaction['id'], None)
+            if key is None:
+                self.undated -= 1
+                return
+            ms, day = key
+            block = self._blocks[day]
+            block.remove(ms, transaction['id'])
+            if not block.count:
+                del self._blocks[day]
+                del self._days[bisect.bisect_left(self._days, day)]
+
+    # ========== QUERIES ==========
+
+    def _covering(self, lo, hi):
+        """(block, start, stop) for every block overlapping [lo, hi), in time order"""
+        first = 0 if lo is None else bisect.bisect_left(self._days, _day(lo))
+        last = len(self._days) if hi is None else bisect.bisect_right(self._days, _day(hi - 1))
+        for day in self._days[first:last]:
+            block = self._blocks[day]
+            start, stop = block.span(lo, hi)
+            if start < stop:
+                yield block, start, stop
+
+    def ids(self, start=None, end=None, limit=None, newest=False):
+        """Ids with start <= timestamp < end (epoch ms), oldest first (or newest first)"""
+        with self._lock:
+            covering = list(self._covering(start, end))
+            result = []
+            for block, first, stop in (reversed(covering) if newest else covering):
+                if limit is not None:
+                    # Only slice the part of the block the page needs
+                    need = limit - len(result)
+                    if newest:
+                        first = max(first, stop - need)
+                    else:
+                        stop = min(stop, first + need)
+                chunk = block.ids[first:stop]
+                result.extend(reversed(chunk) if newest else chunk)
+                if limit is not None and len(result) >= limit:
+                    break
+            return result
+
+    def count(self, start=None, end=None):
+        """(count, total amount) with start <= timestamp < end; whole days use the block totals"""
+        with self._lock:
+            count = 0
+            total = 0
+            for block, first, stop in self._covering(start, end):
+                if first == 0 and stop == block.count:
+                    count += block.count
+                    total += block.total
+                else:
+                    count += stop - first
+                    total += sum(block.amounts[first:stop])
+            return count, total
+
+    def bounds(self):
+        """(oldest, newest) epoch ms, or (None, None) when empty"""
+        with self._lock:
+            if not self._days:
+                return None, None
+            return self._blocks[self._days[0]].ms[0], self._blocks[self._days[-1]].ms[-1]
+
+    def buckets(self, interval='day', start=None, end=None):
+        """[{"period", "count", "total_amount"}] per hour/day/week/month with start <= timestamp < end"""
+        if interval not in INTERVALS:
+            raise ValueError(f"interval must be one of {', '.join(INTERVALS)}")
+        with self._lock:
+            periods = {}
+            for block, first, stop in self._covering(start, end):
+                if interval == 'hour':
+                    for ms, amount in zip(block.ms[first:stop], block.amounts[first:stop]):
+                        _add(periods, ms_to_iso(ms - ms % 1000)[:13], 1, amount)
+                    continue
+                label = _label(date.fromordinal(_day(block.ms[first])), interval)
+                if first == 0 and stop == block.count:
+                    _add(periods, label, block.count, block.total)
+                else:
+                    _add(periods, label, stop - first, sum(block.amounts[first:stop]))
+            return [{'period': period, 'count': count, 'total_amount': total}
+                    for period, (count, total) in periods.items()]
+
+
+def window(days, until=None):
+    """(start, end) epoch ms for the `days` days up to `until` (epoch ms, default now)"""
+    end = until if until is not None else int(datetime.now().timestamp() * 1000) + 1
+    return end - days * DAY_MS, end
+
+
+def _label(day, interval):
+    if interval == 'day':
+        return day.isoformat()
+    if interval == 'week':
+        return (day - timedelta(days=day.weekday())).isoformat()
+    return day.isoformat()[:7]
+
+
+def _add(periods, label, count, total):
+    # Blocks are visited in time order, so dict order is period order
+    entry = periods.get(label)
+    if entry is None:
+        periods[label] = (count, total)
+    else:
+        periods[label] = (entry[0] + count, entry[1] + total)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Authentication cost per request with hashed passwords
+
+1. Correctness (fake clock): cached credentials expire after the TTL, the
+   LRU evicts the oldest entry, wrong passwords are never cached, changing
+   a user drops its cached logins and tokens, and tokens expire/revoke.
+2. Cost of one authenticate() call: the old plaintext comparison, PBKDF2
+   and scrypt without the cache, a cache hit, and a bearer token lookup.
+3. GET /transactions/{id} throughput over HTTP with keep-alive clients for
+   Basic auth with the cache, Basic auth hashing every request, and Bearer.
+
+Usage:
+    python3 benchmarks/bench_auth.py [--rows 10000] [--clients 4] [--duration 2]
+"""
+
+import argparse
+import base64
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+
+from common import make_transactions, start_server, AUTH_HEADER
+
+import app
+from auth import Authenticator, AuthError, hash_password
+from server import PooledHTTPServer
+from store import TransactionStore
+
+
+def basic(username, password):
+    return 'Basic ' + base64.b64encode(f"{username}:{password}".encode()).decode()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def rejected(auth, header):
+    try:
+        auth.authenticate(header)
+    except AuthError:
+        return True
+    return False
+
+
+def verify():
+    clock = FakeClock()
+    users = {name: hash_password('secret', 'scrypt') for name in ('ann', 'bob', 'cyd')}
+    auth = Authenticator(users, cache_size=2, cache_ttl=10, sessions=True, token_ttl=60, clock=clock)
+    checks = []
+
+    checks.append(('login', auth.authenticate(basic('ann', 'secret')) == 'ann' and auth.cache.misses == 1))
+    auth.authenticate(basic('ann', 'secret'))
+    checks.append(('cache hit', auth.cache.hits == 1))
+    checks.append(('wrong password', rejected(auth, basic('ann', 'nope')) and rejected(auth, basic('ann', 'nope'))
+                   and auth.cache.misses == 3))
+    checks.append(('unknown user', rejected(auth, basic('zed', 'secret'))))
+    clock.now = 11
+    auth.authenticate(basic('ann', 'secret'))
+    checks.append(('ttl expiry', auth.cache.misses == 5))
+    auth.authenticate(basic('bob', 'secret'))
+    auth.authenticate(basic('cyd', 'secret'))
+    misses = auth.cache.misses
+    auth.authenticate(basic('ann', 'secret'))
+    checks.append(('lru eviction', auth.cache.misses == misses + 1 and len(auth.cache) == 2))
+
+    token, _ = auth.issue_token('bob')
+    checks.append(('token', auth.authenticate(f'Bearer {token}') == 'bob'))
+    auth.set_user('bob', hash_password('changed', 'scrypt'))
+    checks.append(('password change', rejected(auth, f'Bearer {token}') and rejected(auth, basic('bob', 'secret'))
+                   and auth.authenticate(basic('bob', 'changed')) == 'bob'))
+    token, _ = auth.issue_token('ann')
+    clock.now += 61
+    checks.append(('token expiry', rejected(auth, f'Bearer {token}')))
+    token, _ = auth.issue_token('ann')
+    auth.revoke_token(token)
+    checks.append(('token revoke', rejected(auth, f'Bearer {token}')))
+    auth.sessions = False
+    token, _ = auth.issue_token('ann')
+    checks.append(('sessions off', rejected(auth, f'Bearer {token}')))
+
+    failed = [name for name, ok in checks if not ok]
+    if failed:
+        print(f"✗ Auth checks failed: {', '.join(failed)}")
+        return False
+    print(f"✓ {len(checks)} cache/session checks passed (TTL, LRU, invalidation, expiry, revoke)")
+    return True
+
+
+def plaintext_check(header, username='admin', password='admin123'):
+    """The previous _check_auth: decode and compare against hardcoded values"""
+    decoded = base64.b64decode(header[6:]).decode('utf-8')
+    user, secret = decoded.split(':', 1)
+    return user == username and secret == password
+
+
+def per_call(function, min_time=0.5, max_calls=1_000_000):
+    """Mean µs per call, calibrated to run at least min_time"""
+    calls = 0
+    start = time.perf_counter()
+    while calls < max_calls:
+        function()
+        calls += 1
+        if calls & 63 == 0 or calls < 64:
+            if time.perf_counter() - start >= min_time:
+                break
+    return (time.perf_counter() - start) / calls * 1e6, calls
+
+
+def bench_calls():
+    header = basic('admin', 'admin123')
+    rows = [('plaintext compare (before)', lambda: plaintext_check(header))]
+    for algorithm in ('pbkdf2_sha256', 'scrypt'):
+        auth = Authenticator({'admin': hash_password('admin123', algorithm)}, cache_size=0)
+        rows.append((f"{algorithm}, no cache", lambda auth=auth: auth.authenticate(header)))
+    cached = Authenticator({'admin': hash_password('admin123')})
+    cached.authenticate(header)
+    rows.append(('pbkdf2_sha256, cache hit', lambda: cached.authenticate(header)))
+    sessions = Authenticator({'admin': hash_password('admin123')}, sessions=True)
+    bearer = f'Bearer {sessions.issue_token("admin")[0]}'
+    rows.append(('bearer token', lambda: sessions.authenticate(bearer)))
+    return [(name, *per_call(function)) for name, function in rows]
+
+
+def throughput(port, size, header, clients, duration):
+    deadline = time.perf_counter() + duration
+    counts = []
+
+    def client(seed):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        done = 0
+        while time.perf_counter() < deadline:
+            conn.request('GET', f'/transactions/{rng.randint(1, size)}', headers={'Authorization': header})
+            conn.getresponse().read()
+            done += 1
+        conn.close()
+        counts.append(done)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / duration
+
+
+def bench_http(size, clients, duration):
+    app.use_store(TransactionStore(make_transactions(size)))
+    cache_size = app.AUTH.cache.size
+    app.AUTH.sessions = True
+    httpd = start_server(app.TransactionHandler, PooledHTTPServer)
+    port = httpd.server_address[1]
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.request('POST', '/auth/token', headers={'Authorization': AUTH_HEADER})
+    bearer = 'Bearer ' + json.loads(conn.getresponse().read())['token']
+    conn.close()
+
+    results = []
+    for name, header, size_limit in (('Basic, cached', AUTH_HEADER, cache_size),
+                                     ('Basic, hash every request', AUTH_HEADER, 0),
+                                     ('Bearer token', bearer, cache_size)):
+        app.AUTH.cache.size = size_limit
+        app.AUTH.cache.clear()
+        # One request first, so concurrent clients do not all miss the cold cache
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        conn.request('GET', '/transactions/1', headers={'Authorization': header})
+        conn.getresponse().read()
+        conn.close()
+        results.append((name, throughput(port, size, header, clients, duration)))
+    app.AUTH.cache.size = cache_size
+    app.AUTH.sessions = False
+    httpd.shutdown()
+    httpd.server_close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=2)
+    args = parser.parse_args()
+
+    print()
+    if not verify():
+        return 1
+
+    print("\n" + "="*64)
+    print(f"{'authenticate() per call':<32} | {'µs':>12} | {'calls':>9}")
+    print("-"*64)
+    for name, us, calls in bench_calls():
+        print(f"{name:<32} | {us:>12,.2f} | {calls:>9,}")
+    print("="*64)
+
+    print(f"\nGET /transactions/{{id}}: {args.clients} clients, {args.duration:g}s each")
+    print("-"*64)
+    for name, rate in bench_http(args.rows, args.clients, args.duration):
+        print(f"{name:<32} | {rate:>12,.1f} req/s")
+    print("="*64 + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
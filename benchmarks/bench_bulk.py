@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Bulk ingest over HTTP vs one POST per transaction
+
+1. Correctness: the body decoder yields the same items for a JSON array and
+   NDJSON split at every block size, a bad NDJSON line or a missing field
+   is reported by index without stopping the rest, chunked uploads work,
+   bulk PUT/DELETE report missing ids, and create/update/delete_many give
+   the same rows on TransactionStore, SQLiteStore and MappedStore.
+2. Rows/sec loading N transactions into a running server: one POST per
+   row (keep-alive) vs POST /transactions/bulk as a JSON array, NDJSON,
+   and chunked NDJSON, for the in-memory and SQLite stores.
+
+Usage:
+    python3 benchmarks/bench_bulk.py [--rows 20000] [--single 2000]
+"""
+
+import argparse
+import http.client
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from common import make_transactions, start_server, request, AUTH_HEADER
+
+import app
+from bulk import iter_items, BodyReader
+from columnar import TransactionColumns
+from mapped_store import MappedStore
+from server import PooledHTTPServer
+from sqlite_store import SQLiteStore
+from store import TransactionStore
+
+
+def new_items(count, seed=7):
+    """Transactions without ids, as a client would send them"""
+    return [{key: value for key, value in tx.items() if key != 'id'} for tx in make_transactions(count, seed=seed)]
+
+
+def as_blocks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def check_decoder(items):
+    array = json.dumps(items).encode('utf-8')
+    ndjson = ('\n'.join(json.dumps(item) for item in items) + '\n').encode('utf-8')
+    for body in (array, ndjson, b'  ' + array + b'\n'):
+        for size in (1, 3, 17, 64, len(body)):
+            decoded = [item for _, item, error in iter_items(as_blocks(body, size)) if error is None]
+            if decoded != items:
+                return f"decode with {size}-byte blocks"
+    errors = [(index, error) for index, item, error in iter_items([b'{"a": 1}\n{bad\n[2]\n'])]
+    if [index for index, error in errors if error] != [1]:
+        return "bad NDJSON line"
+    chunked = b''.join(b'%x\r\n%s\r\n' % (len(block), block) for block in as_blocks(ndjson, 5)) + b'0\r\n\r\n'
+    reader = BodyReader(io.BytesIO(chunked), chunked=True)
+    decoded = [item for _, item, _ in iter_items(reader)]
+    if decoded != items or not reader.done or reader.bytes_read != len(ndjson):
+        return "chunked reader"
+    return None
+
+
+def check_http(items):
+    app.use_store(TransactionStore())
+    httpd = start_server(app.TransactionHandler, PooledHTTPServer)
+    port = httpd.server_address[1]
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    try:
+        mixed = items[:3] + [{'amount': 1}, 'nope'] + items[3:5]
+        status, body = request(port, 'POST', '/transactions/bulk', json.dumps(mixed), conn=conn)
+        result = json.loads(body)
+        if status != 200 or result['created'] != 5 or [e['index'] for e in result['errors']] != [3, 4]:
+            return "array with invalid items"
+        lines = [json.dumps(item) for item in items[5:8]]
+        lines.insert(1, '{"transaction_type": ')
+        status, body = request(port, 'POST', '/transactions/bulk', '\n'.join(lines), conn=conn)
+        result = json.loads(body)
+        if result['created'] != 3 or [e['index'] for e in result['errors']] != [1]:
+            return "NDJSON with a bad line"
+        conn.request('POST', '/transactions/bulk', body=iter(json.dumps(item).encode() + b'\n' for item in items[8:]),
+                     headers={'Authorization': AUTH_HEADER}, encode_chunked=True)
+        response = conn.getresponse()
+        if response.status != 201 or json.loads(response.read())['created'] != len(items) - 8:
+            return "chunked upload"
+        if len(app.STORE) != len(items) or [tx['amount'] for tx in app.STORE] != [tx['amount'] for tx in items]:
+            return "stored rows"
+        status, body = request(port, 'PUT', '/transactions/bulk',
+                               json.dumps([{'id': 1, 'amount': 5}, {'id': 10**9, 'amount': 5}]), conn=conn)
+        result = json.loads(body)
+        if result['ids'] != [1] or app.STORE.get(1)['amount'] != 5 or len(result['errors']) != 1:
+            return "bulk update"
+        status, body = request(port, 'DELETE', '/transactions/bulk?ids=1,2,999999', conn=conn)
+        result = json.loads(body)
+        if result['ids'] != [1, 2] or len(result['errors']) != 1 or app.STORE.get(2) is not None:
+            return "bulk delete"
+        # The connection must still be usable after every bulk response
+        status, _ = request(port, 'GET', '/transactions/3', conn=conn)
+        if status != 200:
+            return "keep-alive after bulk"
+    finally:
+        conn.close()
+        httpd.shutdown()
+        httpd.server_close()
+    return None
+
+
+def check_stores(items, tmp):
+    stores = [TransactionStore(), SQLiteStore(os.path.join(tmp, 'verify.db')),
+              MappedStore(TransactionColumns())]
+    results = []
+    for store in stores:
+        created = store.create_many(items)
+        updated = store.update_many([(2, {'amount': 1}), (2, {'receiver': 'Z'}), (10**9, {'amount': 1})])
+        deleted = store.delete_many([3, 3, 10**9])
+        results.append((created, updated, deleted, store.all(), len(store)))
+    if any(result != results[0] for result in results[1:]):
+        return "create/update/delete_many differ between stores"
+    stores[1].close()
+    return None
+
+
+def verify(tmp):
+    items = new_items(40)
+    for name, check in (('decoder', lambda: check_decoder(items)), ('HTTP', lambda: check_http(items)),
+                        ('stores', lambda: check_stores(items, tmp))):
+        problem = check()
+        if problem:
+            print(f"✗ Bulk {name} check failed: {problem}")
+            return False
+    print("✓ Array/NDJSON/chunked bodies decode at any block size, errors are per item, stores agree")
+    return True
+
+
+def load_single(port, items):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    headers = {'Authorization': AUTH_HEADER, 'Content-Type': 'application/json'}
+    for item in items:
+        conn.request('POST', '/transactions', body=json.dumps(item), headers=headers)
+        response = conn.getresponse()
+        response.read()
+        if response.status != 201:
+            raise RuntimeError(f"POST /transactions returned {response.status}")
+    conn.close()
+    return len(items)
+
+
+def load_bulk(port, items, mode):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+    headers = {'Authorization': AUTH_HEADER}
+    if mode == 'JSON array':
+        body = json.dumps(items).encode('utf-8')
+    else:
+        lines = (json.dumps(item).encode('utf-8') + b'\n' for item in items)
+        body = b''.join(lines) if mode == 'NDJSON' else lines
+    conn.request('POST', '/transactions/bulk', body=body, headers=headers, encode_chunked=mode == 'chunked NDJSON')
+    response = conn.getresponse()
+    result = json.loads(response.read())
+    conn.close()
+    if response.status != 201:
+        raise RuntimeError(f"POST /transactions/bulk returned {response.status}: {result['errors'][:3]}")
+    return result['created']
+
+
+def bench(rows, single, tmp):
+    items = new_items(rows)
+    modes = [('single POSTs', lambda port: load_single(port, items[:single]))]
+    for mode in ('JSON array', 'NDJSON', 'chunked NDJSON'):
+        modes.append((mode, lambda port, mode=mode: load_bulk(port, items, mode)))
+    results = []
+    for store_name in ('memory', 'sqlite'):
+        for mode, load in modes:
+            if store_name == 'memory':
+                store = TransactionStore()
+            else:
+                path = os.path.join(tmp, 'bulk.db')
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+                store = SQLiteStore(path)
+            app.use_store(store)
+            httpd = start_server(app.TransactionHandler, PooledHTTPServer)
+            start = time.perf_counter()
+            loaded = load(httpd.server_address[1])
+            elapsed = time.perf_counter() - start
+            httpd.shutdown()
+            httpd.server_close()
+            if len(store) != loaded:
+                raise RuntimeError(f"{mode}: store has {len(store)} rows, expected {loaded}")
+            if store_name == 'sqlite':
+                store.close()
+            results.append((store_name, mode, loaded, loaded / elapsed))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000, help="rows per bulk upload")
+    parser.add_argument('--single', type=int, default=2000, help="rows sent as single POSTs")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print()
+        if not verify(tmp):
+            return 1
+
+        print("\n" + "="*64)
+        print(f"{'Store':<8} | {'Mode':<16} | {'rows':>8} | {'rows/s':>10} | {'vs single':>9}")
+        print("-"*64)
+        baseline = {}
+        for store_name, mode, loaded, rate in bench(args.rows, args.single, tmp):
+            baseline.setdefault(store_name, rate)
+            print(f"{store_name:<8} | {mode:<16} | {loaded:>8,} | {rate:>10,.0f} | {rate / baseline[store_name]:>8.1f}x")
+        print("="*64 + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
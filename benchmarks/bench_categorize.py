@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Per-field extractors vs precompiled categorize() engine
+
+Checks that both paths agree on every message, then reports messages/sec.
+
+Usage:
+    python3 benchmarks/bench_categorize.py [--xml raw/momo.xml] [--repeat 50]
+"""
+
+import argparse
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repo_root, 'dsa'))
+
+from categorize import categorize
+from parse_xml import extract_amount, get_transaction_type, extract_sender, extract_receiver
+
+
+def legacy_categorize(body):
+    """Original hot path: four separate extractor calls"""
+    amount = extract_amount(body)
+    tx_type = get_transaction_type(body)
+    return tx_type, amount, extract_sender(body, tx_type), extract_receiver(body, tx_type)
+
+
+def messages_per_sec(func, bodies, repeat):
+    """Run func over all bodies `repeat` times and return throughput"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for body in bodies:
+            func(body)
+    elapsed = time.perf_counter() - start
+    return len(bodies) * repeat / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--xml', default=os.path.join(repo_root, 'raw', 'momo.xml'))
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    bodies = [sms.get('body', '') for sms in ET.parse(args.xml).getroot().iter('sms')]
+
+    mismatches = [b for b in bodies if legacy_categorize(b) != categorize(b)]
+    if mismatches:
+        print(f"✗ {len(mismatches)} messages differ, e.g.: {mismatches[0][:80]}")
+        return 1
+    print(f"\n✓ Outputs match on all {len(bodies)} messages")
+
+    old = messages_per_sec(legacy_categorize, bodies, args.repeat)
+    new = messages_per_sec(categorize, bodies, args.repeat)
+
+    print(f"\n   Legacy extractors: {old:>12,.0f} msg/s")
+    print(f"   categorize():      {new:>12,.0f} msg/s")
+    print(f"   Speedup:           {new / old:>12.2f}x\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Columnar TransactionColumns vs the list-of-dicts representation
+
+1. Correctness: the table round-trips to the original dicts and every
+   filter/group-by matches the same computation over the dicts.
+2. Memory: bytes per row (tracemalloc for the dicts, nbytes() for columns).
+3. Speed: group-by type, group-by receiver and a filtered sum.
+
+Usage:
+    python3 benchmarks/bench_columnar.py [--sizes 10000,100000,1000000] [--repeat 5]
+"""
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+from common import make_transactions
+
+from columnar import TransactionColumns, iso_to_ms
+
+
+def dict_group_by(transactions, key):
+    result = {}
+    for tx in transactions:
+        entry = result.get(tx[key])
+        if entry is None:
+            result[tx[key]] = (1, tx['amount'])
+        else:
+            result[tx[key]] = (entry[0] + 1, entry[1] + tx['amount'])
+    return result
+
+
+def dict_filtered_sum(transactions, tx_type, lo, hi):
+    return sum(tx['amount'] for tx in transactions
+               if tx['transaction_type'] == tx_type and lo <= tx['amount'] < hi)
+
+
+def column_filtered_sum(columns, tx_type, lo, hi):
+    mask = columns.mask_eq('transaction_type', tx_type)
+    return columns.sum('amount', columns.mask_range('amount', lo, hi, within=mask))
+
+
+def measure_dicts(count):
+    """Bytes allocated to build `count` transaction dicts"""
+    gc.collect()
+    tracemalloc.start()
+    transactions = make_transactions(count)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return transactions, size
+
+
+def verify(transactions, columns):
+    if list(columns.to_records()) != transactions:
+        print("✗ Round-trip through TransactionColumns changed the records")
+        return False
+    for key in ('transaction_type', 'receiver'):
+        if columns.group_by(key) != dict_group_by(transactions, key):
+            print(f"✗ group_by({key}) differs from the dict computation")
+            return False
+    if column_filtered_sum(columns, 'payment', 1000, 20000) != dict_filtered_sum(transactions, 'payment', 1000, 20000):
+        print("✗ Filtered sum differs from the dict computation")
+        return False
+    start = iso_to_ms('2024-05-11T00:00:00')
+    day = columns.mask_and(columns.mask_range('timestamp', start, start + 86400000),
+                           columns.mask_eq('receiver', transactions[0]['receiver']))
+    if day.count(1) != sum(1 for tx in transactions if tx['timestamp'].startswith('2024-05-11')
+                           and tx['receiver'] == transactions[0]['receiver']):
+        print("✗ Timestamp range mask differs from the dict computation")
+        return False
+    return True
+
+
+def best_ms(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    print()
+    transactions = make_transactions(min(sizes[0], 20000))
+    if not verify(transactions, TransactionColumns.from_records(transactions)):
+        return 1
+    print("✓ Columns round-trip and match list-of-dicts for filters and group-bys")
+
+    print("\n" + "="*95)
+    print(f"{'Rows':>10} | {'dicts B/row':>11} | {'cols B/row':>10} | {'Operation':<17} | "
+          f"{'dicts (ms)':>10} | {'cols (ms)':>9} | {'Speedup':>7}")
+    print("-"*95)
+    for size in sizes:
+        transactions, dict_bytes = measure_dicts(size)
+        columns = TransactionColumns.from_records(transactions)
+        cases = [
+            ('group by type', lambda: dict_group_by(transactions, 'transaction_type'),
+             lambda: columns.group_by('transaction_type')),
+            ('group by receiver', lambda: dict_group_by(transactions, 'receiver'),
+             lambda: columns.group_by('receiver')),
+            ('filtered sum', lambda: dict_filtered_sum(transactions, 'payment', 1000, 20000),
+             lambda: column_filtered_sum(columns, 'payment', 1000, 20000)),
+        ]
+        for n, (label, slow, fast) in enumerate(cases):
+            slow_ms = best_ms(slow, args.repeat)
+            fast_ms = best_ms(fast, args.repeat)
+            memory = (f"{dict_bytes / size:>11.0f} | {columns.nbytes() / size:>10.1f}" if n == 0
+                      else f"{'':>11} | {'':>10}")
+            rows = f"{size:,}" if n == 0 else ''
+            print(f"{rows:>10} | {memory} | {label:<17} | "
+                  f"{slow_ms:>10.1f} | {fast_ms:>9.1f} | {slow_ms / fast_ms:>6.1f}x")
+        del transactions, columns
+    print("="*95 + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
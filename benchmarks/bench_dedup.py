@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Provider-txid dedup (exact hash map + Bloom-fronted archive) at 10M ids
+
+1. Correctness: the parser keeps the operator's TxId / Financial
+   Transaction Id of every template that has one; the Bloom filter has no
+   false negatives and about its target false-positive rate; the sorted id
+   archive round-trips and grows. The ETL drops messages repeated across
+   overlapping backups (and, in an incremental run, ones another device
+   exported with a different date); the API answers a repeated txid with
+   409 / per-item bulk errors pointing at the original, on the in-memory
+   store and on SQLite (also after a reopen, through the Bloom filter).
+2. Memory and throughput of each layer at --ids: building the exact map,
+   the Bloom filter and the archive file, then checking new and repeated
+   ids against each.
+3. What the dedup stage adds to the ETL's per-message cost.
+
+Usage:
+    python3 benchmarks/bench_dedup.py [--ids 10000000] [--checks 1000000] [--messages 50000]
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+
+from common import start_server, request, repo_root
+
+import app
+from categorize import extract_txid
+from dedup import BloomFilter, DedupIndex, TxIdArchive, drop_duplicates, txid_archive_path, txid_key
+from parse_xml import iter_parse_xml
+from server import PooledHTTPServer
+from sqlite_store import SQLiteStore
+from store import TransactionStore
+from synthetic import generate, write_corpus, TEMPLATES
+
+
+def rss():
+    """Resident set size in bytes (Linux), or None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def check_extraction():
+    for kind, template in TEMPLATES.items():
+        body = template.replace('{txid}', '12345678901')
+        want = '12345678901' if '{txid}' in template else None
+        if extract_txid(body) != want:
+            return f"{kind} template"
+    for *_, body, expected in generate(3000, seed=5):
+        if expected is not None and expected[5] is not None and expected[5] not in body:
+            return "generator txid not in body"
+    return None
+
+
+def check_structures(tmp):
+    rng = random.Random(1)
+    keys = rng.sample(range(10**10, 10**11), 40000)
+    bloom = BloomFilter(20000)
+    bloom.update(keys[:20000])
+    if not all(key in bloom for key in keys[:20000]):
+        return "Bloom false negative"
+    rate = sum(key in bloom for key in keys[20000:]) / 20000
+    if not 0.002 < rate < 0.02:
+        return f"Bloom false-positive rate {rate:.3%}"
+    if txid_key('0123') == 123 or txid_key('ABC') >= 0 or txid_key('98765') != 98765:
+        return "txid keys"
+
+    path = os.path.join(tmp, 'check.txids')
+    TxIdArchive().save(path, keys[:100])
+    archive = TxIdArchive.load(path)
+    archive.save(path, keys[100:35000])             # still within capacity: Bloom extended in place
+    archive = TxIdArchive.load(path)
+    more = rng.sample(range(10**11, 10**12), 70000)
+    archive.save(path, more)                        # past capacity: Bloom rebuilt larger
+    archive = TxIdArchive.load(path)
+    archived = keys[:35000] + more
+    if len(archive) != len(archived) or list(archive.keys) != sorted(archived):
+        return "archive merge"
+    if archive.bloom.capacity < len(archive) or not all(key in archive.bloom for key in archived):
+        return "archive Bloom after growth"
+    index = DedupIndex(archive.bloom, archive.find)
+    if index.find(str(more[5])) is not True or index.find(str(keys[-1])) is not None:
+        return "archive lookup"
+    return None
+
+
+def sms_lines(path):
+    with open(path, encoding='utf-8') as f:
+        lines = f.readlines()
+    return lines[:2], lines[2:-1], lines[-1:]
+
+
+def etl(*args):
+    subprocess.run([sys.executable, os.path.join(repo_root, 'dsa', 'run.py'), *args],
+                   check=True, stdout=subprocess.DEVNULL)
+
+
+def check_etl(tmp):
+    corpus = os.path.join(tmp, 'phone.xml')
+    write_corpus(corpus, 1200, seed=7)
+    head, sms, tail = sms_lines(corpus)
+    first, second = os.path.join(tmp, 'phone-a.xml'), os.path.join(tmp, 'phone-b.xml')
+    with open(first, 'w', encoding='utf-8') as f:
+        f.writelines(head + sms[:800] + tail)
+    with open(second, 'w', encoding='utf-8') as f:
+        f.writelines(head + sms[400:1000] + tail)
+    output = os.path.join(tmp, 'etl.json')
+    etl(first, second, '-o', output)
+    with open(output) as f:
+        rows = json.load(f)
+    # Messages without a txid (transfers, deposits) cannot be told apart; every txid must appear once
+    merged = os.path.join(tmp, 'phone-ab.xml')
+    with open(merged, 'w', encoding='utf-8') as f:
+        f.writelines(head + sms[:1000] + tail)
+    want = [tx['txid'] for tx in iter_parse_xml(merged) if tx['txid']]
+    if [tx['txid'] for tx in rows if tx['txid']] != want or [tx['id'] for tx in rows] != list(range(1, len(rows) + 1)):
+        return "overlapping backups"
+
+    # Another device: the last 100 SMS again with later receive dates (new to
+    # the checkpoint, known to the txid archive), then new messages
+    third = os.path.join(tmp, 'phone-c.xml')
+    with open(third, 'w', encoding='utf-8') as f:
+        f.writelines(head + [_later(line) for line in sms[900:1000]] + sms[1000:] + tail)
+    etl('--incremental', third, '-o', output)
+    with open(output) as f:
+        rows = json.load(f)
+    txids = [tx['txid'] for tx in rows if tx['txid']]
+    if txids != [tx['txid'] for tx in iter_parse_xml(corpus) if tx['txid']]:
+        return "incremental run against the archive"
+    if len(TxIdArchive.load(txid_archive_path(output))) != len(txids):
+        return "archive not saved"
+    return None
+
+
+def _later(line):
+    """The same SMS as received on another phone an hour later"""
+    start = line.index(' date="') + 7
+    end = line.index('"', start)
+    return line[:start] + str(int(line[start:end]) + 3600 * 1000) + line[end:]
+
+
+def check_api(store):
+    app.use_store(store)
+    httpd = start_server(app.TransactionHandler, PooledHTTPServer)
+    port = httpd.server_address[1]
+    item = {'transaction_type': 'payment', 'amount': 500, 'sender': 'You', 'receiver': 'Shop', 'txid': '70000000001'}
+    try:
+        status, body = request(port, 'POST', '/transactions', json.dumps(item))
+        original = json.loads(body)['data']['id']
+        status, body = request(port, 'POST', '/transactions', json.dumps(item))
+        if status != 409 or json.loads(body).get('duplicate_of') != original:
+            return f"repeated POST answered {status}"
+        items = [dict(item, txid='70000000002'), item, dict(item, txid='70000000002'), dict(item, txid=None)]
+        status, body = request(port, 'POST', '/transactions/bulk', json.dumps(items))
+        result = json.loads(body)
+        duplicates = {error['index']: error['duplicate_of'] for error in result['errors']}
+        if result['created'] != 2 or duplicates != {1: original, 2: result['ids'][0]}:
+            return f"bulk: {result}"
+        request(port, 'DELETE', f"/transactions/{original}")
+        status, _ = request(port, 'POST', '/transactions', json.dumps(item))
+        if status != 201:
+            return "txid not released by DELETE"
+        if isinstance(store, SQLiteStore):
+            # A fresh process: the Bloom filter is built from the table
+            app.use_store(SQLiteStore(store.path))
+            status, _ = request(port, 'POST', '/transactions', json.dumps(dict(item, amount=1)))
+            if status != 409 or not app.TXIDS.lookups:
+                return "duplicate after reopen"
+            status, _ = request(port, 'POST', '/transactions', json.dumps(dict(item, txid='70000000009')))
+            if status != 201:
+                return "new txid after reopen"
+        _, metrics = request(port, 'GET', '/metrics')
+        if b'momo_dedup_duplicates_total' not in metrics:
+            return "metrics"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    return None
+
+
+def verify(tmp):
+    checks = (('extraction', check_extraction), ('structures', lambda: check_structures(tmp)),
+              ('ETL', lambda: check_etl(tmp)), ('memory API', lambda: check_api(TransactionStore())),
+              ('SQLite API', lambda: check_api(SQLiteStore(os.path.join(tmp, 'dedup.db')))))
+    for name, check in checks:
+        problem = check()
+        if problem:
+            print(f"✗ Dedup {name} check failed: {problem}")
+            return False
+    print("✓ TxIds extracted, Bloom has no false negatives, ETL and API reject repeats across backups and restarts")
+    return True
+
+
+def make_keys(count, seed=42):
+    """count distinct increasing-ish 11-digit ids, like an operator's"""
+    rng = random.Random(seed)
+    return array('q', (10**10 + i * 1000 + rng.randrange(1000) for i in range(count)))
+
+
+def timed(work):
+    started = time.perf_counter()
+    result = work()
+    return result, time.perf_counter() - started
+
+
+def bench_layers(tmp, ids, checks):
+    """Rows of (layer, memory bytes, build ids/s, new-id checks/s, repeat checks/s, note)"""
+    keys = make_keys(ids)
+    rng = random.Random(3)
+    new = [10**12 + rng.randrange(10**11) for _ in range(checks)]
+    repeats = [keys[rng.randrange(ids)] for _ in range(checks)]
+    rows = []
+
+    # Exact hash map: what the API keeps for the in-memory store
+    before = rss()
+    index = DedupIndex()
+    _, build = timed(lambda: [index.add(key, i) for i, key in enumerate(keys)] and None)
+    memory = rss() - before if before is not None else None
+    _, fresh = timed(lambda: [index.find(key) for key in new])
+    _, seen = timed(lambda: [index.find(key) for key in repeats])
+    rows.append(('exact map (dict)', memory, ids / build, checks / fresh, checks / seen, ''))
+    del index
+
+    # Bloom filter alone
+    bloom = BloomFilter(ids)
+    _, build = timed(lambda: bloom.update(keys))
+    _, fresh = timed(lambda: sum(key in bloom for key in new))
+    positives = sum(key in bloom for key in new)
+    _, seen = timed(lambda: [key in bloom for key in repeats])
+    rows.append(('Bloom filter (1%)', bloom.nbytes(), ids / build, checks / fresh, checks / seen,
+                 f"{positives / checks:.2%} false positives"))
+
+    # Archive on disk: Bloom in front of the sorted mmapped ids (incremental ETL)
+    path = os.path.join(tmp, 'bench.txids')
+    _, build = timed(lambda: TxIdArchive().save(path, keys))
+    before = rss()
+    archive, opened = timed(lambda: TxIdArchive.load(path))
+    memory = rss() - before if before is not None else None
+    index = DedupIndex(archive.bloom, archive.find)
+    _, fresh = timed(lambda: [index.find(key) for key in new])
+    _, seen = timed(lambda: [index.find(key) for key in repeats])
+    rows.append(('archive (Bloom + sorted)', memory, ids / build, checks / fresh, checks / seen,
+                 f"{os.path.getsize(path) / 2**20:,.0f} MiB file, opens in {opened * 1000:,.0f} ms"))
+    return rows
+
+
+def bench_etl(tmp, messages):
+    """(parse msgs/s, parse + dedup msgs/s)"""
+    corpus = os.path.join(tmp, 'etl.xml')
+    write_corpus(corpus, messages)
+    _, plain = timed(lambda: sum(1 for _ in iter_parse_xml(corpus)))
+    count, deduped = timed(lambda: sum(1 for _ in drop_duplicates(iter_parse_xml(corpus), DedupIndex())))
+    return count / plain, count / deduped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ids', type=int, default=10_000_000, help="provider ids already taken")
+    parser.add_argument('--checks', type=int, default=1_000_000, help="new and repeated ids checked against them")
+    parser.add_argument('--messages', type=int, default=50_000, help="SMS in the ETL cost comparison")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print()
+        if not verify(tmp):
+            return 1
+
+        rows = bench_layers(tmp, args.ids, args.checks)
+        print("\n" + "="*100)
+        print(f"{'Layer':<25} | {'memory':>10} | {'B/id':>6} | {'build ids/s':>11} | {'new ids/s':>10} | "
+              f"{'repeats/s':>10} | note")
+        print("-"*100)
+        for name, memory, build, fresh, seen, note in rows:
+            size = f"{memory / 2**20:,.0f} MiB" if memory is not None else 'n/a'
+            per_id = f"{memory / args.ids:,.1f}" if memory is not None else 'n/a'
+            print(f"{name:<25} | {size:>10} | {per_id:>6} | {build:>11,.0f} | {fresh:>10,.0f} | {seen:>10,.0f} | {note}")
+        print("-"*100)
+        print(f"{args.ids:,} ids; checks: {args.checks:,} new and {args.checks:,} repeated ids. Memory is the RSS growth")
+        print("(archive: after opening it, i.e. the Bloom bits; the sorted ids stay in the page cache).")
+        print("="*100)
+
+        plain, deduped = bench_etl(tmp, args.messages)
+        print(f"\nETL over {args.messages:,} SMS: parse {plain:,.0f} msgs/s, parse + dedup {deduped:,.0f} msgs/s "
+              f"({(1 / deduped - 1 / plain) * 1e6:+.1f} µs per message)\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
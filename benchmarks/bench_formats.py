@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Loading ETL output as JSON, NDJSON and binary columns
+
+Writes N synthetic transactions in each format, then in a fresh process
+per format measures what the API pays before it can serve: time to build
+its store (TransactionStore for JSON/NDJSON, MappedStore over the mmapped
+column file), peak RSS, and the cost of random GET-by-id lookups.
+
+Usage:
+    python3 benchmarks/bench_formats.py [--sizes 100000,1000000] [--lookups 10000]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from common import make_transactions
+
+from parse_xml import save_to_json, save_to_ndjson, save_to_binary, load_records
+
+FORMATS = (('json', '.json'), ('ndjson', '.ndjson'), ('binary', '.col'))
+
+
+def _run(path, lookups, queue):
+    """Child process: build the API store from one file and time lookups"""
+    import app
+    base_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            start = time.perf_counter()
+            app.load_transactions(path)
+            loaded = time.perf_counter() - start
+        finally:
+            sys.stdout = stdout
+    size = len(app.STORE)
+    rng = random.Random(1)
+    ids = [rng.randint(1, size) for _ in range(lookups)]
+    start = time.perf_counter()
+    for tx_id in ids:
+        app.STORE.get(tx_id)
+    lookup_us = (time.perf_counter() - start) / lookups * 1e6
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((size, loaded, lookup_us, (peak_kb - base_kb) / 1024))
+
+
+def measure(path, lookups):
+    """Run one format in a fresh interpreter so peak RSS is isolated"""
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run, args=(path, lookups, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def write_formats(transactions, directory, stem):
+    """Save transactions in every format; returns {format: path}"""
+    paths = {}
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            for name, extension in FORMATS:
+                paths[name] = os.path.join(directory, stem + extension)
+                save = {'json': save_to_json, 'ndjson': save_to_ndjson, 'binary': save_to_binary}[name]
+                save(transactions, paths[name])
+        finally:
+            sys.stdout = stdout
+    return paths
+
+
+def verify(directory):
+    transactions = make_transactions(5000)
+    for name, path in write_formats(transactions, directory, 'verify').items():
+        if list(load_records(path)) != transactions:
+            print(f"✗ {name} round-trip changed the records")
+            return False
+    print("✓ JSON, NDJSON and binary column files round-trip the same records")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='100000,1000000')
+    parser.add_argument('--lookups', type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print()
+        if not verify(tmp):
+            return 1
+
+        print("\n" + "="*84)
+        print(f"{'Rows':>10} | {'Format':<7} | {'File (MB)':>9} | {'Load (s)':>9} | "
+              f"{'RSS +MB':>9} | {'GET (µs)':>9} | {'vs JSON':>8}")
+        print("-"*84)
+        for size in (int(s) for s in args.sizes.split(',')):
+            paths = write_formats(make_transactions(size), tmp, str(size))
+            baseline = None
+            for name, _ in FORMATS:
+                count, loaded, lookup_us, rss_mb = measure(paths[name], args.lookups)
+                baseline = baseline or loaded
+                file_mb = os.path.getsize(paths[name]) / (1024 * 1024)
+                print(f"{count:>10,} | {name:<7} | {file_mb:>9.1f} | {loaded:>9.3f} | "
+                      f"{rss_mb:>9.1f} | {lookup_us:>9.2f} | {baseline / loaded:>7.1f}x")
+                os.remove(paths[name])
+        print("="*84 + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
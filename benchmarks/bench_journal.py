@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Journal write throughput (group commit vs per-write fsync) and recovery time
+
+1. Correctness: random creates, updates, deletes and batches go through a
+   journaled store with a small compaction threshold (several snapshots
+   in .json, .ndjson and .col); recovering the directory gives the same
+   rows, version and next id, also after a torn last line and a snapshot
+   left half written. api/app.py --journal keeps every acknowledged write
+   across kill -9, single process and with --workers.
+2. Writes/s and latency for 1..N writer threads creating rows the way
+   POST does (app.create_unique): no fsync, an fsync per write, and group
+   commit with several windows (writes per fsync shows how many writers
+   shared each one).
+3. Recovery time against journal length on top of a --rows snapshot, and
+   after compaction folded the journal into the snapshot.
+
+fsync cost depends on the disk: run with --dir on the volume the API uses.
+
+Usage:
+    python3 benchmarks/bench_journal.py [--rows 100000] [--threads 1,16,64] [--ops 10000,100000,1000000]
+"""
+
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import random
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+from common import AUTH_HEADER, make_transactions, percentile
+from loadgen import start_app
+
+import app
+
+from journal import Journal, LoggedStore, recover, journal_files
+from store import TransactionStore
+
+HEADERS = {'Authorization': AUTH_HEADER, 'Content-Type': 'application/json'}
+ITEM = {'transaction_type': 'payment', 'amount': 500, 'sender': 'You', 'receiver': 'Journal',
+        'timestamp': '2024-06-01T12:00:00'}
+
+
+def state(store):
+    return store.version, store.next_id, sorted(json.dumps(tx, sort_keys=True) for tx in store.all())
+
+
+def random_writes(store, raw, count, seed=1):
+    """Creates, updates, deletes (the newest row, so ids must not be reused) and batches"""
+    rng = random.Random(seed)
+    for i in range(count):
+        r = rng.random()
+        ids = raw.query(limit=50)[1] if r < 0.6 else None
+        if r < 0.4:
+            store.create(dict(ITEM, amount=i))
+        elif r < 0.6:
+            store.update(rng.choice(ids)['id'], {'amount': i, 'receiver': f'R{i}'})
+        elif r < 0.8:
+            store.delete(raw.next_id - 1)
+        elif r < 0.9:
+            store.create_many([dict(ITEM, amount=i, transaction_type='deposit')] * 3)
+        else:
+            store.delete_many([raw.next_id - 1, raw.next_id - 2, 10 ** 9])
+
+
+def check_recovery(tmp):
+    for fmt in ('.json', '.ndjson', '.col'):
+        for sync in ('group', 'write'):
+            directory = os.path.join(tmp, f'recovery{fmt}-{sync}')
+            raw = TransactionStore(make_transactions(300))
+            journal = Journal(directory, raw, sync, compact_bytes=16_000, snapshot_format=fmt)
+            random_writes(LoggedStore(raw, journal), raw, 400)
+            want = state(raw)
+            if journal.compacting:
+                journal._compactor.join()
+            # Not closed: everything a write returned from is on disk already
+            store, replayed = recover(directory)
+            if state(store) != want:
+                return f"{fmt} / {sync}: recovered state differs ({replayed} ops replayed)"
+            if journal.compactions < 2 or len(journal_files(directory)['snapshot']) != 1:
+                return f"{fmt}: compaction did not run or left old snapshots"
+            journal.close()
+
+            # Crash mid-append and mid-snapshot
+            segments = journal_files(directory)['journal']
+            with open(segments[max(segments)], 'ab') as f:
+                f.write(b'{"v":%d,"op":"add","tx":{"id"' % (want[0] + 1))
+            with open(os.path.join(directory, f'snapshot-{want[0] + 7:012d}{fmt}.tmp'), 'wb') as f:
+                f.write(b'[{"id": 1')
+            store, _ = recover(directory)
+            if state(store) != want:
+                return f"{fmt}: torn journal tail or half-written snapshot changed the recovered state"
+            journal = Journal(directory, store, compact_bytes=10 ** 9, snapshot_format=fmt)
+            created = LoggedStore(store, journal).create(ITEM)
+            journal.close()
+            if created['id'] != want[1] or recover(directory)[0].get(created['id']) != created:
+                return f"{fmt}: write after recovery got id {created['id']}, expected {want[1]}"
+    return None
+
+
+def call(port, method, path, body=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        conn.request(method, path, body, HEADERS)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def kill_tree(pid):
+    """SIGKILL a process and (with --workers) its writer and workers"""
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            pids = [int(child) for child in f.read().split()]
+    except FileNotFoundError:
+        pids = []
+    for victim in pids + [pid]:
+        with contextlib.suppress(ProcessLookupError):
+            os.kill(victim, signal.SIGKILL)
+
+
+def check_server(tmp, workers):
+    data = os.path.join(tmp, 'seed.json')
+    with open(data, 'w') as f:
+        json.dump(make_transactions(1000), f)
+    directory = os.path.join(tmp, f'api-journal-{workers}')
+    extra = ['--data', data, '--journal', directory] + (['--workers', str(workers)] if workers else [])
+    proc, port = start_app(4, extra)
+    try:
+        created = []
+        for i in range(30):
+            status, body = call(port, 'POST', '/transactions', json.dumps(dict(ITEM, amount=i + 1)))
+            if status != 201:
+                return f"create answered {status}"
+            created.append(json.loads(body)['data'])
+        status, _ = call(port, 'POST', '/transactions/bulk', json.dumps([dict(ITEM, amount=1000 + i) for i in range(200)]))
+        if status != 201:
+            return f"bulk create answered {status}"
+        call(port, 'PUT', f"/transactions/{created[0]['id']}", json.dumps({'amount': 4242}))
+        call(port, 'DELETE', f"/transactions/{created[-1]['id']}")
+        _, before = call(port, 'GET', '/stats')
+    finally:
+        # No clean shutdown: the journal is all there is
+        kill_tree(proc.pid)
+        proc.wait()
+    proc, port = start_app(4, ['--data', data, '--journal', directory])
+    try:
+        _, after = call(port, 'GET', '/stats')
+        if json.loads(after) != json.loads(before) or json.loads(after)['count'] != 1229:
+            return f"stats after kill -9 differ: {after[:80]} vs {before[:80]}"
+        _, body = call(port, 'GET', f"/transactions/{created[0]['id']}")
+        if json.loads(body)['amount'] != 4242:
+            return "update lost"
+        if call(port, 'GET', f"/transactions/{created[-1]['id']}")[0] != 404:
+            return "delete lost"
+        status, body = call(port, 'POST', '/transactions', json.dumps(ITEM))
+        if json.loads(body)['data']['id'] <= created[-1]['id'] + 200:
+            return "id reused after recovery"
+    finally:
+        proc.terminate()
+        proc.wait()
+    return None
+
+
+def snapshotted(directory, store, *args, **kwargs):
+    """A Journal whose first snapshot is already written (so it is not what gets measured)"""
+    journal = Journal(directory, store, *args, **kwargs)
+    if journal.compacting:
+        journal._compactor.join()
+    return journal
+
+
+def verify(tmp):
+    checks = (('recovery', lambda: check_recovery(tmp)), ('API', lambda: check_server(tmp, 0)),
+              ('API --workers', lambda: check_server(tmp, 2)))
+    for name, check in checks:
+        problem = check()
+        if problem:
+            print(f"✗ Journal {name} check failed: {problem}")
+            return False
+    print("✓ Recovery reproduces rows, version and next id after compaction, torn tails and kill -9")
+    return True
+
+
+def write_load(store, threads, duration):
+    """
+    `threads` writers creating rows for `duration` seconds: (writes/s, latencies)
+    Rows go through the API's create path (app.create_unique: the txid check
+    and its lock), so fsyncs are shared exactly as much as POST shares them.
+    """
+    previous = app.STORE
+    app.use_store(store)
+    latencies = [[] for _ in range(threads)]
+    deadline = time.perf_counter() + duration
+
+    def writer(mine):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            app.create_unique([ITEM])
+            mine.append(time.perf_counter() - started)
+
+    workers = [threading.Thread(target=writer, args=(mine,)) for mine in latencies]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    app.use_store(previous)
+    merged = [latency for mine in latencies for latency in mine]
+    return len(merged) / (time.perf_counter() - started), merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000, help="rows in the store / snapshot")
+    parser.add_argument('--threads', default='1,16,64', help="concurrent writers")
+    parser.add_argument('--windows', default='0,1,5', help="group commit windows to compare, ms")
+    parser.add_argument('--duration', type=float, default=3.0, help="seconds per write run")
+    parser.add_argument('--ops', default='10000,100000,1000000', help="journal lengths to recover")
+    parser.add_argument('--dir', help="directory for the journals (default: a temporary one)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        print()
+        if not verify(tmp):
+            return 1
+        rows = make_transactions(args.rows)
+        modes = [('no fsync', 'none', 0), ('fsync per write', 'write', 0)]
+        modes += [(f'group commit {ms}ms', 'group', float(ms) / 1000) for ms in args.windows.split(',')]
+
+        print("\n" + "="*86)
+        print(f"{'Journal':<20} | {'Writers':>7} | {'Writes/s':>9} | {'fsyncs/s':>8} | {'per fsync':>9} | "
+              f"{'p50 (ms)':>8} | {'p99 (ms)':>8}")
+        print("-"*86)
+        for threads in (int(t) for t in args.threads.split(',')):
+            for run, (label, sync, window) in enumerate(modes):
+                raw = TransactionStore(rows)
+                directory = os.path.join(tmp, f'writes-{threads}-{run}')
+                journal = snapshotted(directory, raw, sync, window, compact_bytes=10 ** 12)
+                store = LoggedStore(raw, journal)
+                commits = journal.commits
+                rps, latencies = write_load(store, threads, args.duration)
+                syncs = (journal.commits - commits) / args.duration if sync != 'none' else 0
+                journal.close()
+                shared = f"{rps / syncs:.1f}" if syncs else '-'
+                print(f"{label:<20} | {threads:>7} | {rps:>9,.0f} | {syncs:>8,.0f} | "
+                      f"{shared:>9} | {percentile(latencies, 50) * 1000:>8.2f} | "
+                      f"{percentile(latencies, 99) * 1000:>8.2f}")
+            print("-"*86)
+        print("="*86)
+
+        print("\n" + "="*70)
+        print(f"{'Recovery':<34} | {'ops':>10} | {'time':>8} | {'ops/s':>10}")
+        print("-"*70)
+        for count in (int(n) for n in args.ops.split(',')):
+            directory = os.path.join(tmp, f'recover-{count}')
+            raw = TransactionStore(rows)
+            journal = snapshotted(directory, raw, 'none', compact_bytes=10 ** 12)
+            random_writes(LoggedStore(raw, journal), raw, count)
+            journal.close()
+            replays = journal.ops
+            started = time.perf_counter()
+            store, _ = recover(directory)
+            seconds = time.perf_counter() - started
+            print(f"{f'snapshot {args.rows:,} rows + journal':<34} | {replays:>10,} | {seconds:>7.2f}s | "
+                  f"{replays / seconds:>10,.0f}")
+            if state(store) != state(raw):
+                print("✗ recovered state differs")
+                return 1
+            snapshotted(directory, store, 'none', compact_bytes=0).close()     # fold the journal into a snapshot
+            started = time.perf_counter()
+            recover(directory)
+            print(f"{'  after compaction':<34} | {0:>10,} | {time.perf_counter() - started:>7.2f}s |")
+        print("="*70 + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
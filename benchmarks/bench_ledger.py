@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Ledger reconstruction with array prefix sums vs a per-row loop
+
+1. Correctness: the parser extracts the fee and stated balance of every
+   synthetic template. On a consistent generated history the ledger finds
+   no divergence and its balance after each row equals the stated one;
+   with SMS dropped and duplicated it flags exactly what a per-row loop
+   flags, with the same gaps, whatever the input order. from_columns
+   (also over a saved column file) and from_records agree, balance_at
+   matches a linear scan, and /stats/ledger and /stats/balance follow
+   writes on the in-memory and SQLite stores.
+2. Rebuild time at --rows (time-ordered and shuffled columns) against the
+   same reconstruction written as a per-row Python loop, and from dicts.
+3. balance_at queries/s: bisect over the checkpoints vs a linear scan.
+
+Usage:
+    python3 benchmarks/bench_ledger.py [--rows 2000000] [--queries 100000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from array import array
+from datetime import datetime
+
+from common import start_server, request
+
+import app
+from columnar import TransactionColumns, StringDictionary, save_columns, load_columns, iso_to_ms, NO_VALUE
+from ledger import Ledger, transaction_delta
+from parse_xml import iter_parse_xml
+from server import PooledHTTPServer
+from sqlite_store import SQLiteStore
+from store import TransactionStore
+from synthetic import write_corpus, generate
+
+TYPES = ['payment', 'transfer', 'deposit', 'receive', 'withdrawal', 'airtime', 'unknown']
+WEIGHTS = [43, 35, 15, 4, 1, 2, 1]
+
+
+def naive_ledger(rows):
+    """
+    The reconstruction as a per-row loop: (balances after each row, flagged)
+    rows are (ms, id, transaction_type, amount, fee, balance) tuples.
+    """
+    balances = []
+    flagged = []
+    carried = None
+    running = 0
+    for ms, tx_id, transaction_type, amount, fee, balance in sorted(rows, key=lambda row: row[:2]):
+        delta = transaction_delta(transaction_type, amount, fee)
+        running += delta
+        if carried is not None:
+            carried += delta
+        if balance is not None:
+            if carried is not None and carried != balance:
+                flagged.append((tx_id, balance, carried, balance - carried))
+            carried = balance
+        balances.append(carried)
+    return balances, flagged
+
+
+def naive_balance_at(times, balances, ms):
+    """Linear scan: balance after the last row at or before ms"""
+    result = None
+    for t, balance in zip(times, balances):
+        if t > ms:
+            break
+        result = balance
+    return result
+
+
+def as_tuples(transactions):
+    return [(iso_to_ms(tx['timestamp']), tx['id'], tx['transaction_type'], tx['amount'],
+             tx['fee'] or 0, tx['balance']) for tx in transactions]
+
+
+def column_tuples(columns):
+    types = columns.types.values
+    return list(zip(columns.timestamps, columns.ids, (types[code] for code in columns.type_codes),
+                    columns.amounts, (max(fee, 0) for fee in columns.fees),
+                    (None if balance == NO_VALUE else balance for balance in columns.balances)))
+
+
+def flagged(ledger):
+    return [(d.id, d.reported, d.expected, d.gap) for d in ledger.divergences()]
+
+
+def check_history(tmp):
+    xml_file = os.path.join(tmp, 'ledger.xml')
+    write_corpus(xml_file, 3000, seed=9)
+    rows = list(iter_parse_xml(xml_file))
+    want = [e for *_, e in generate(3000, seed=9) if e is not None]
+    if [(tx['fee'], tx['balance']) for tx in rows] != [e[6:] for e in want]:
+        return "fee / balance extraction"
+    ledger = Ledger.from_records(rows)
+    if ledger.divergences() or ledger.opening != 0:
+        return f"consistent history flagged {len(ledger.divergences())}"
+    if [ledger.balance(i) for i in range(len(ledger))] != [tx['balance'] for tx in rows]:
+        return "balance after each row"
+
+    # Missed SMS, an SMS delivered twice, shuffled input
+    rng = random.Random(4)
+    damaged = [tx for tx in rows if rng.random() > 0.02]
+    for tx in rng.sample(damaged, 20):
+        damaged.append(dict(tx, id=len(rows) + len(damaged)))
+    rng.shuffle(damaged)
+    ledger = Ledger.from_records(damaged)
+    _, want = naive_ledger(as_tuples(damaged))
+    if not want or flagged(ledger) != want:
+        return f"divergences: {len(flagged(ledger))} flagged, naive loop {len(want)}"
+    if ledger.summary()['unexplained'] != sum(gap for *_, gap in want):
+        return "unexplained total"
+
+    columns = TransactionColumns.from_records(damaged)
+    path = os.path.join(tmp, 'ledger.col')
+    save_columns(columns, path)
+    for other in (Ledger.from_columns(columns), Ledger.from_columns(load_columns(path))):
+        if other.summary(None) != ledger.summary(None):
+            return "from_columns != from_records"
+    balances, _ = naive_ledger(column_tuples(columns))
+    times = sorted(iso_to_ms(tx['timestamp']) for tx in damaged)
+    for ms in [times[0] - 1] + [rng.randint(times[0], times[-1]) for _ in range(300)]:
+        got = ledger.balance_at(ms)['balance']
+        expected = naive_balance_at(times, balances, ms)
+        if got != (ledger.opening if expected is None else expected):
+            return f"balance_at({ms})"
+    return None
+
+
+def check_api(store):
+    app.use_store(store)
+    httpd = start_server(app.TransactionHandler, PooledHTTPServer)
+    port = httpd.server_address[1]
+    item = {'transaction_type': 'deposit', 'amount': 1000, 'sender': 'Bank', 'receiver': 'You',
+            'timestamp': '2024-05-01T10:00:00', 'balance': 1000}
+    try:
+        request(port, 'POST', '/transactions', json.dumps(item))
+        request(port, 'POST', '/transactions', json.dumps(dict(item, transaction_type='payment', amount=300,
+                                                              fee=0, timestamp='2024-05-02T10:00:00', balance=700)))
+        _, body = request(port, 'GET', '/stats/ledger')
+        report = json.loads(body)
+        if report['balance'] != 700 or report['divergences'] != 0:
+            return f"ledger {report}"
+        # A withdrawal whose SMS never arrived: the next statement is 500 short
+        request(port, 'POST', '/transactions', json.dumps(dict(item, transaction_type='receive', amount=100,
+                                                              timestamp='2024-05-03T10:00:00', balance=300)))
+        _, body = request(port, 'GET', '/stats/ledger')
+        report = json.loads(body)
+        if report['divergences'] != 1 or report['flagged'][0]['gap'] != -500 or report['closing_balance'] != 800:
+            return f"ledger after a write {report}"
+        status, body = request(port, 'GET', '/stats/balance?at=2024-05-02T12:00:00')
+        if status != 200 or json.loads(body)['balance'] != 700:
+            return f"balance_at answered {status} {body[:100]}"
+        _, body = request(port, 'GET', '/stats/balance')
+        if json.loads(body)['balance'] != 300:
+            return "latest balance"
+        status, _ = request(port, 'GET', '/stats/balance?at=yesterday')
+        if status != 400:
+            return f"bad at answered {status}"
+        status, _ = request(port, 'POST', '/transactions', json.dumps(dict(item, fee=-5)))
+        if status != 400:
+            return f"negative fee answered {status}"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    return None
+
+
+def verify(tmp):
+    checks = (('history', lambda: check_history(tmp)), ('memory API', lambda: check_api(TransactionStore())),
+              ('SQLite API', lambda: check_api(SQLiteStore(os.path.join(tmp, 'ledger.db')))))
+    for name, check in checks:
+        problem = check()
+        if problem:
+            print(f"✗ Ledger {name} check failed: {problem}")
+            return False
+    print("✓ Fees and balances extracted, ledger flags exactly the missed / repeated SMS, balance_at == linear scan")
+    return True
+
+
+def make_columns(count, seed=42, missed=0.001):
+    """A consistent account history of `count` rows with a share of SMS missed"""
+    rng = random.Random(seed)
+    columns = TransactionColumns(StringDictionary(TYPES), StringDictionary(['You']))
+    start = int(datetime(2024, 5, 10).timestamp() * 1000)
+    codes = rng.choices(range(len(TYPES)), WEIGHTS, k=count)
+    balance = 0
+    ms = start
+    for i, code in enumerate(codes):
+        ms += rng.randrange(60_000)
+        amount = rng.randint(1, 250) * 100
+        fee = 100 if code in (1, 4) else 0
+        delta = transaction_delta(TYPES[code], amount, fee)
+        if balance + delta < 0:
+            code, delta, fee = 2, amount, 0
+        balance += delta
+        if rng.random() < missed:
+            continue
+        columns.ids.append(i + 1)
+        columns.timestamps.append(ms)
+        columns.type_codes.append(code)
+        columns.amounts.append(amount)
+        columns.fees.append(fee if code in (0, 1, 4, 5) else NO_VALUE)
+        columns.balances.append(balance if code != 6 else NO_VALUE)
+        columns.sender_codes.append(0)
+        columns.receiver_codes.append(0)
+        columns.txids.append(NO_VALUE)
+    return columns
+
+
+def shuffled(columns, seed=7):
+    order = list(range(len(columns)))
+    random.Random(seed).shuffle(order)
+    result = TransactionColumns(columns.types, columns.parties)
+    for name in ('ids', 'timestamps', 'type_codes', 'amounts', 'fees', 'balances',
+                 'sender_codes', 'receiver_codes', 'txids'):
+        column = getattr(columns, name)
+        setattr(result, name, array(column.typecode, map(column.__getitem__, order)))
+    result.ids_sorted = False
+    return result
+
+
+def timed(work, repeat=1):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = work()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--queries', type=int, default=100_000, help="balance_at queries timed")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print()
+        if not verify(tmp):
+            return 1
+
+        columns = make_columns(args.rows)
+        (balances, naive_flags), naive = timed(lambda: naive_ledger(column_tuples(columns)))
+        ledger, ordered = timed(lambda: Ledger.from_columns(columns), repeat=3)
+        mixed = shuffled(columns)
+        _, unordered = timed(lambda: Ledger.from_columns(mixed))
+        sample = [columns.row(i) for i in range(min(len(columns), 500_000))]
+        _, records = timed(lambda: Ledger.from_records(sample))
+        if flagged(ledger) != naive_flags:
+            print("✗ vectorized and per-row ledgers disagree")
+            return 1
+
+        n = len(columns)
+        print("\n" + "="*78)
+        print(f"{'Rebuild':<40} | {'time':>9} | {'rows/s':>12} | {'speedup':>7}")
+        print("-"*78)
+        for name, seconds, rows in (('per-row Python loop', naive, n),
+                                    ('from_columns, time-ordered', ordered, n),
+                                    ('from_columns, shuffled (sort first)', unordered, n),
+                                    ('from_records (dicts, ISO timestamps)', records, len(sample))):
+            print(f"{name:<40} | {seconds:>8.2f}s | {rows / seconds:>12,.0f} | "
+                  f"{(rows / seconds) / (n / naive):>6.1f}x")
+        print("-"*78)
+        arrays = (ledger.times, ledger.ids, ledger.prefix, ledger.balances, ledger.checkpoints, ledger.offsets)
+        size = sum(len(column) * column.itemsize for column in arrays if isinstance(column, array))
+        print(f"{n:,} rows, {len(ledger.checkpoints):,} stated balances, {len(naive_flags):,} divergences flagged; "
+              f"ledger arrays {size / 2**20:,.0f} MiB")
+        print("="*78)
+
+        rng = random.Random(3)
+        times = ledger.times
+        moments = [rng.randint(times[0], times[-1]) for _ in range(args.queries)]
+        _, indexed = timed(lambda: [ledger.balance_at(ms) for ms in moments])
+        scans = moments[:20]
+        _, scanned = timed(lambda: [naive_balance_at(times, balances, ms) for ms in scans])
+        for ms in scans:
+            if ledger.balance_at(ms)['balance'] != naive_balance_at(times, balances, ms):
+                print("✗ balance_at disagrees with the scan")
+                return 1
+        print(f"\nbalance_at over {n:,} rows: {args.queries / indexed:,.0f} queries/s with bisect, "
+              f"{len(scans) / scanned:,.1f} queries/s scanning\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
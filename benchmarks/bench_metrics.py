@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Cost of request instrumentation, access logging and profiling
+
+1. Correctness: after a known mix of requests, GET /metrics must parse as
+   Prometheus text, count every request under the right endpoint/status,
+   and have consistent histograms; the access log must hold one line per
+   request once flushed.
+2. Throughput and latency of GET /transactions/{id} with several keep-alive
+   clients, for: no access log, the old synchronous print per request,
+   the buffered AccessLog, and buffered + cProfile of 1 in 100 requests.
+   Metrics are recorded in every mode.
+3. ETL: streaming parse of a synthetic corpus with and without stage
+   timings, plus the per-stage breakdown.
+
+Usage:
+    python3 benchmarks/bench_metrics.py [--rows 100000] [--clients 8] [--duration 3] [--sms 100000]
+"""
+
+import argparse
+import http.client
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+from common import make_transactions, request, percentile, AUTH_HEADER
+
+import app
+from server import PooledHTTPServer
+from store import TransactionStore
+from bench_parse_xml import generate_xml
+from parse_xml import iter_parse_xml
+from timings import StageTimings
+
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="([^"\\]|\\.)*",?)*\})? '
+                         r'(-?[0-9.e+-]+|\+Inf)$')
+
+
+class QuietHandler(app.TransactionHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class SyncLogHandler(app.TransactionHandler):
+    """The pre-AccessLog behaviour: one formatted, flushed print per request"""
+    stream = None
+
+    def log_message(self, format, *args):
+        auth = self.headers.get('Authorization', 'No Auth')
+        if auth.startswith('Basic '):
+            auth = '[Auth]'
+        print(f"[{self.log_date_time_string()}] {self.client_address[0]} {self.command} {self.path} - {auth}",
+              file=self.stream, flush=True)
+
+
+def serve(handler_class):
+    httpd = PooledHTTPServer(('127.0.0.1', 0), handler_class, max_workers=16)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def parse_metrics(text):
+    """{(name, labels string): value} from exposition text; raises on a malformed line"""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        if not SAMPLE_LINE.match(line):
+            raise ValueError(f"malformed line: {line}")
+        series, value = line.rsplit(' ', 1)
+        name, _, labels = series.partition('{')
+        samples[(name, '{' + labels if labels else '')] = float(value)
+    return samples
+
+
+def verify():
+    app.use_store(TransactionStore(make_transactions(500)))
+    app.METRICS.reset()
+    log = io.StringIO()
+    app.ACCESS_LOG.stream = log
+    httpd = serve(app.TransactionHandler)
+    port = httpd.server_address[1]
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    sent = 0
+    for i in range(1, 41):
+        request(port, 'GET', f'/transactions/{i}', conn=conn)
+        sent += 1
+    for path in ('/transactions?limit=10', '/stats', '/missing', '/transactions/99999'):
+        request(port, 'GET', path, conn=conn)
+        sent += 1
+    request(port, 'POST', '/transactions', body='{"transaction_type": "payment", "amount": 1, '
+                                                '"sender": "You", "receiver": "Jane"}', conn=conn)
+    sent += 1
+    status, body = request(port, 'GET', '/metrics', conn=conn)
+    conn.close()
+    httpd.shutdown()
+    httpd.server_close()
+    app.ACCESS_LOG.flush()
+    app.ACCESS_LOG.stream = None
+
+    try:
+        samples = parse_metrics(body.decode('utf-8'))
+    except ValueError as e:
+        print(f"✗ /metrics: {e}")
+        return False
+    requests = {key: value for key, value in samples.items() if key[0] == 'momo_http_requests_total'}
+    expected = {
+        '{method="GET",endpoint="/transactions/{id}",status="200"}': 40,
+        '{method="GET",endpoint="/transactions/{id}",status="404"}': 1,
+        '{method="GET",endpoint="/transactions",status="200"}': 1,
+        '{method="GET",endpoint="/stats",status="200"}': 1,
+        '{method="GET",endpoint="other",status="404"}': 1,
+        '{method="POST",endpoint="/transactions",status="201"}': 1,
+    }
+    got = {labels: value for (_, labels), value in requests.items()}
+    if status != 200 or got != expected:
+        print(f"✗ Request counters differ: {got}")
+        return False
+    counts = sum(value for (name, _), value in samples.items()
+                 if name == 'momo_http_request_duration_seconds_count')
+    infs = sum(value for (name, labels), value in samples.items()
+               if name == 'momo_http_request_duration_seconds_bucket' and 'le="+Inf"' in labels)
+    if counts != sent or infs != sent or samples[('momo_http_errors_total', '{method="GET",endpoint="other"}')] != 1:
+        print(f"✗ Histogram counts {counts}/{infs} do not match {sent} requests")
+        return False
+    lines = log.getvalue().splitlines()
+    if len(lines) != sent + 1:
+        print(f"✗ Access log has {len(lines)} lines for {sent + 1} requests")
+        return False
+    print(f"✓ /metrics parses, counts {sent} requests by endpoint/status, access log has every line")
+    return True
+
+
+def load(port, size, clients, duration):
+    """Requests/sec and latency samples for random GET by id on keep-alive connections"""
+    deadline = time.perf_counter() + duration
+    counts = []
+    samples = []
+
+    def client(seed):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        headers = {'Authorization': AUTH_HEADER}
+        done = 0
+        mine = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            conn.request('GET', f'/transactions/{rng.randint(1, size)}', headers=headers)
+            conn.getresponse().read()
+            mine.append(time.perf_counter() - start)
+            done += 1
+        conn.close()
+        counts.append(done)
+        samples.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / duration, samples
+
+
+def bench_api(size, clients, duration, tmp):
+    app.use_store(TransactionStore(make_transactions(size)))
+    log_path = os.path.join(tmp, 'access.log')
+    results = []
+    for mode in ('no log', 'sync print', 'buffered', 'buffered+profile'):
+        app.METRICS.reset()
+        with open(log_path, 'w') as stream:
+            SyncLogHandler.stream = stream
+            app.ACCESS_LOG.stream = stream
+            app.enable_profiling(100 if mode == 'buffered+profile' else 0, os.path.join(tmp, 'api.prof'))
+            handler = {'no log': QuietHandler, 'sync print': SyncLogHandler}.get(mode, app.TransactionHandler)
+            httpd = serve(handler)
+            rate, samples = load(httpd.server_address[1], size, clients, duration)
+            httpd.shutdown()
+            httpd.server_close()
+            app.ACCESS_LOG.flush()
+            app.ACCESS_LOG.stream = None
+        app.enable_profiling(0, None)
+        results.append((mode, rate, percentile(samples, 50) * 1e6, percentile(samples, 99) * 1e6))
+    return results
+
+
+def bench_record(iterations=200000):
+    """µs spent recording one request's metrics (4 registry updates)"""
+    metrics = app.METRICS
+    labels = (('method', 'GET'), ('endpoint', '/transactions/{id}'))
+    status = labels + (('status', '200'),)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        metrics.inc('momo_http_requests_total', status)
+        metrics.observe('momo_http_request_duration_seconds', labels, 0.0004)
+        metrics.observe('momo_http_response_size_bytes', labels, 150)
+        app.endpoint_label('/transactions/123')
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bench_etl(count, tmp):
+    xml_file = os.path.join(tmp, 'corpus.xml')
+    generate_xml(xml_file, count)
+    runs = {}
+    for mode in ('untimed', 'timed'):
+        best = None
+        timings = None
+        for _ in range(3):
+            timings = StageTimings() if mode == 'timed' else None
+            start = time.perf_counter()
+            parsed = sum(1 for _ in iter_parse_xml(xml_file, timings=timings))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        runs[mode] = (best, timings, parsed)
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=3)
+    parser.add_argument('--sms', type=int, default=100000, help="messages in the ETL corpus")
+    args = parser.parse_args()
+
+    print()
+    if not verify():
+        return 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print("\n" + "="*72)
+        print(f"GET /transactions/{{id}}: {args.rows:,} rows, {args.clients} clients, {args.duration:g}s per mode")
+        print("-"*72)
+        print(f"{'Mode':<18} | {'req/s':>9} | {'p50 (µs)':>9} | {'p99 (µs)':>9} | {'vs no log':>9}")
+        print("-"*72)
+        results = bench_api(args.rows, args.clients, args.duration, tmp)
+        baseline = results[0][1]
+        for mode, rate, p50, p99 in results:
+            print(f"{mode:<18} | {rate:>9.0f} | {p50:>9.0f} | {p99:>9.0f} | {rate / baseline:>8.2f}x")
+        print("-"*72)
+        print(f"Recording one request's metrics: {bench_record():.2f} µs")
+        print("="*72)
+
+        runs = bench_etl(args.sms, tmp)
+        untimed, _, parsed = runs['untimed']
+        timed, timings, _ = runs['timed']
+        print(f"\nETL stream parse of {args.sms:,} SMS ({parsed:,} transactions): "
+              f"{untimed:.2f}s untimed, {timed:.2f}s with stage timings ({timed / untimed - 1:+.1%})")
+        print('\n'.join(timings.report(timed)))
+        print("="*72 + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
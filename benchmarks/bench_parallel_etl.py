@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Serial vs sharded multiprocess ETL scaling
+
+Parses a synthetic backup with 1, 2, 4, ... worker processes (up to the
+core count), checks every run yields the same transactions as the serial
+path, and reports throughput and speedup.
+
+Usage:
+    python3 benchmarks/bench_parallel_etl.py [--count 1000000] [--max-workers N]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repo_root, 'dsa'))
+sys.path.insert(0, os.path.join(repo_root, 'benchmarks'))
+
+from bench_parse_xml import generate_xml
+from parse_xml import iter_parse_xml
+from parallel import parallel_parse
+
+
+def digest(transactions):
+    """Consume transactions and return (count, content hash)"""
+    h = hashlib.sha256()
+    count = 0
+    for tx in transactions:
+        h.update(repr(sorted(tx.items())).encode())
+        count += 1
+    return count, h.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=1_000_000, help="number of synthetic SMS")
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--shard-size', type=int, default=4 * 1024 * 1024)
+    args = parser.parse_args()
+
+    xml_file = os.path.join(tempfile.mkdtemp(), 'synthetic.xml')
+    print(f"\nGenerating {args.count:,} synthetic SMS...")
+    generate_xml(xml_file, args.count)
+
+    start = time.perf_counter()
+    count, expected = digest(iter_parse_xml(xml_file))
+    serial = time.perf_counter() - start
+
+    print("\n" + "="*70)
+    print(f"{'Workers':<10} | {'Wall (s)':>10} | {'Tx/s':>14} | {'Speedup':>8} | Output")
+    print("-"*70)
+    print(f"{'serial':<10} | {serial:>10.2f} | {count / serial:>14,.0f} | {1.0:>7.2f}x | reference")
+
+    workers = 1
+    while workers <= args.max_workers:
+        start = time.perf_counter()
+        got_count, got = digest(parallel_parse([xml_file], workers, args.shard_size))
+        elapsed = time.perf_counter() - start
+        status = "✓ identical" if (got_count, got) == (count, expected) else "✗ MISMATCH"
+        print(f"{workers:<10} | {elapsed:>10.2f} | {got_count / elapsed:>14,.0f} | "
+              f"{serial / elapsed:>7.2f}x | {status}")
+        workers *= 2
+
+    print("="*70 + "\n")
+    os.remove(xml_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Tree-based parse_xml vs streaming iter_parse_xml
+
+Generates a synthetic SMS backup and runs the full parse + save_to_json
+path with each parser in a fresh process, reporting wall time and peak RSS.
+
+Usage:
+    python3 benchmarks/bench_parse_xml.py [--count 1000000] [--keep FILE]
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repo_root, 'dsa'))
+
+from synthetic import write_corpus
+
+
+def generate_xml(path, count, seed=42):
+    """Write a synthetic <smses> backup with `count` messages (dsa/synthetic.py corpus)"""
+    write_corpus(path, count, seed=seed)
+
+
+def _run(mode, xml_file, queue):
+    """Child process: run one parse path and report (count, seconds, peak RSS KB)"""
+    from parse_xml import parse_xml, iter_parse_xml, save_to_json
+
+    start = time.perf_counter()
+    if mode == 'tree':
+        transactions = parse_xml(xml_file)
+    else:
+        transactions = iter_parse_xml(xml_file)
+
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            count = save_to_json(transactions, os.devnull)
+        finally:
+            sys.stdout = stdout
+    elapsed = time.perf_counter() - start
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((count, elapsed, peak_kb))
+
+
+def measure(mode, xml_file):
+    """Run a parse path in a fresh interpreter so peak RSS is isolated"""
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run, args=(mode, xml_file, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=1_000_000, help="number of synthetic SMS")
+    parser.add_argument('--keep', help="write the synthetic XML here and keep it")
+    args = parser.parse_args()
+
+    xml_file = args.keep or os.path.join(tempfile.mkdtemp(), 'synthetic.xml')
+
+    print(f"\nGenerating {args.count:,} synthetic SMS...")
+    generate_xml(xml_file, args.count)
+    size_mb = os.path.getsize(xml_file) / (1024 * 1024)
+    print(f"✓ {xml_file} ({size_mb:.1f} MB)")
+
+    print("\n" + "="*70)
+    print(f"{'Mode':<12} | {'Transactions':>12} | {'Wall (s)':>10} | {'Peak RSS (MB)':>14}")
+    print("-"*70)
+
+    for mode in ('tree', 'stream'):
+        count, elapsed, peak_kb = measure(mode, xml_file)
+        print(f"{mode:<12} | {count:>12,} | {elapsed:>10.2f} | {peak_kb / 1024:>14.1f}")
+
+    print("="*70 + "\n")
+
+    if not args.keep:
+        os.remove(xml_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Read throughput and memory of the pre-fork API (--workers N)
+
+1. Correctness: api/app.py --workers N is started as a subprocess. Writes
+   (single, bulk NDJSON streamed chunked, update, delete) sent to any
+   worker are visible on every connection that follows, ETags and /stats
+   agree across workers, a killed worker is restarted and catches up with
+   the writes it missed, the .col mapped snapshot serves the same way and
+   --workers is refused with --db / --sessions.
+2. Read requests/s and p50/p99 latency with 1..N workers against the
+   single-process server, driven by a load generator running in several
+   client processes (one Python process of client threads would be
+   GIL-bound long before the server is).
+3. Memory per process (RSS, PSS, private) after the load, for the JSON
+   store and the mmapped .col snapshot: what copy-on-write sharing saves.
+
+On a machine with fewer cores than workers the extra processes only take
+turns on the same cores; the throughput table says how many there are.
+
+Usage:
+    python3 benchmarks/bench_prefork.py [--rows 100000] [--workers 1,2,4] [--duration 5]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from common import AUTH_HEADER, make_transactions, percentile
+from loadgen import run_load, start_app
+
+from columnar import TransactionColumns, save_columns
+
+HEADERS = {'Authorization': AUTH_HEADER, 'Content-Type': 'application/json'}
+
+
+def call(port, method, path, body=None, headers=None):
+    """One request on a fresh connection (the kernel picks the worker): (status, headers, body)"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        conn.request(method, path, body, dict(HEADERS, **(headers or {})))
+        response = conn.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        conn.close()
+
+
+def children(pid):
+    """Child pids of a process (the writer is forked first, so it has the lowest pid)"""
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return sorted(int(child) for child in f.read().split())
+    except FileNotFoundError:
+        return []
+
+
+def wait_for_children(pid, count, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        pids = children(pid)
+        if len(pids) == count:
+            return pids
+        time.sleep(0.1)
+    raise RuntimeError(f"expected {count} children of {pid}, found {children(pid)}")
+
+
+def memory(pid):
+    """RSS, PSS and private (unshared) bytes of a process from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[name] = int(value.split()[0]) * 1024
+    return fields['Rss'], fields['Pss'], fields['Private_Clean'] + fields['Private_Dirty']
+
+
+def stop(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def agree(port, path, connections=12):
+    """Statuses, bodies and ETags of path seen on fresh connections; None if any differs"""
+    seen = set()
+    for _ in range(connections):
+        status, headers, body = call(port, 'GET', path)
+        seen.add((status, headers.get('ETag'), body))
+    return seen.pop() if len(seen) == 1 else None
+
+
+def check_cluster(data, workers, expected):
+    proc, port = start_app(4, ['--data', data, '--workers', str(workers)])
+    try:
+        pids = wait_for_children(proc.pid, workers + 1)
+        item = {'transaction_type': 'payment', 'amount': 500, 'sender': 'You', 'receiver': 'Prefork'}
+        for i in range(20):
+            status, _, body = call(port, 'POST', '/transactions', json.dumps(dict(item, amount=100 + i)))
+            if status != 201:
+                return f"create answered {status} {body[:100]}"
+            tx_id = json.loads(body)['data']['id']
+            # Read-your-writes: the next connection may land on any worker
+            status, _, body = call(port, 'GET', f'/transactions/{tx_id}')
+            if status != 200 or json.loads(body)['amount'] != 100 + i:
+                return f"created {tx_id}, next read answered {status}"
+        expected += 20
+
+        def ndjson():
+            for i in range(300):
+                yield (json.dumps(dict(item, amount=i + 1)) + '\n').encode()
+        status, _, body = call(port, 'POST', '/transactions/bulk', ndjson(), {'Content-Type': 'application/x-ndjson'})
+        if status != 201 or json.loads(body)['created'] != 300:
+            return f"chunked bulk create answered {status} {body[:100]}"
+        expected += 300
+        last = json.loads(body)['ids'][-1]
+        status, _, _ = call(port, 'PUT', f'/transactions/{last}', json.dumps({'amount': 777}))
+        if status != 200 or json.loads(call(port, 'GET', f'/transactions/{last}')[2])['amount'] != 777:
+            return "update not visible"
+        if call(port, 'DELETE', f'/transactions/{last - 1}')[0] != 200 or \
+                call(port, 'GET', f'/transactions/{last - 1}')[0] != 404:
+            return "delete not visible"
+        expected -= 1
+        if call(port, 'POST', '/transactions', b'{"amount": 1')[0] != 400:
+            return "invalid JSON not rejected"
+
+        seen = agree(port, '/stats')
+        if seen is None or seen[0] != 200 or json.loads(seen[2])['count'] != expected:
+            return f"/stats differs between workers or misses writes: {seen and seen[2][:80]}"
+        if agree(port, f'/transactions/{last}') is None:
+            return "ETag / body of one row differs between workers"
+
+        # A restarted worker is forked from the startup snapshot and replays the writes
+        os.kill(pids[-1], signal.SIGKILL)
+        deadline = time.monotonic() + 15
+        while pids[-1] in children(proc.pid) or len(children(proc.pid)) != workers + 1:
+            if time.monotonic() > deadline:
+                return "killed worker was not restarted"
+            time.sleep(0.1)
+        for _ in range(3 * workers):
+            if call(port, 'GET', f'/transactions/{last}')[0] != 200:
+                return "restarted worker misses writes"
+        seen = agree(port, '/stats')
+        if seen is None or json.loads(seen[2])['count'] != expected:
+            return "stats differ after a worker restart"
+    finally:
+        stop(proc)
+    return None
+
+
+def check_options(tmp):
+    app = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api', 'app.py')
+    for extra in (['--db', os.path.join(tmp, 'x.db')], ['--sessions']):
+        result = subprocess.run([sys.executable, app, '--workers', '2', *extra], capture_output=True)
+        if result.returncode != 2:
+            return f"--workers with {extra[0]} exited {result.returncode}"
+    return None
+
+
+def write_data(tmp, rows):
+    """The same transactions as ETL JSON and as a .col snapshot"""
+    transactions = make_transactions(rows, parties=max(100, rows // 50))
+    json_file = os.path.join(tmp, 'transactions.json')
+    with open(json_file, 'w') as f:
+        json.dump(transactions, f)
+    col_file = os.path.join(tmp, 'transactions.col')
+    save_columns(TransactionColumns.from_records(transactions), col_file)
+    return json_file, col_file
+
+
+def verify(tmp):
+    json_file, col_file = write_data(tmp, 2000)
+    checks = (('JSON store', lambda: check_cluster(json_file, 3, 2000)),
+              ('mapped .col', lambda: check_cluster(col_file, 2, 2000)),
+              ('options', lambda: check_options(tmp)))
+    for name, check in checks:
+        problem = check()
+        if problem:
+            print(f"✗ Prefork {name} check failed: {problem}")
+            return False
+    print("✓ Writes via any worker are read back on every worker, ETags agree, restarted workers catch up")
+    return True
+
+
+def load_process(port, paths, clients, duration):
+    """One client process: `clients` threads; returns (requests, latencies, errors)"""
+    rps, latencies, errors = run_load(port, paths, clients, duration)
+    return len(latencies), latencies, len(errors)
+
+
+def measure(port, paths, processes, clients, duration):
+    """Drive the server from `processes` client processes for `duration` seconds"""
+    with ProcessPoolExecutor(processes) as pool:
+        started = time.perf_counter()
+        results = list(pool.map(load_process, [port] * processes, [paths] * processes,
+                                [clients] * processes, [duration] * processes))
+        elapsed = time.perf_counter() - started
+    latencies = [latency for _, sample, _ in results for latency in sample]
+    return (sum(count for count, _, _ in results) / min(elapsed, duration + 1), latencies,
+            sum(errors for *_, errors in results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--workers', default='1,2,4', help="worker counts to compare")
+    parser.add_argument('--threads', type=int, default=16, help="threads per worker process")
+    parser.add_argument('--processes', type=int, default=4, help="load generator processes")
+    parser.add_argument('--clients', type=int, default=8, help="client threads per load generator process")
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds per run")
+    args = parser.parse_args()
+    counts = [int(n) for n in args.workers.split(',')]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print()
+        if not verify(tmp):
+            return 1
+
+        json_file, col_file = write_data(tmp, args.rows)
+        paths = [f'/transactions/{i}' for i in range(1, args.rows + 1, max(1, args.rows // 1000))]
+        paths += [f'/transactions?limit=20&offset={i}' for i in range(0, args.rows, max(1, args.rows // 100))]
+        print(f"\n{args.rows:,} transactions, {os.cpu_count()} CPU(s); {args.processes} load processes x "
+              f"{args.clients} clients, half id lookups / half 20-row pages")
+        print("\n" + "="*78)
+        print(f"{'Server':<26} | {'Req/s':>10} | {'p50 (ms)':>9} | {'p99 (ms)':>9} | {'Errors':>6} | {'scale':>6}")
+        print("-"*78)
+        base = None
+        footprints = {}
+        runs = [('single process', [])] + [(f'--workers {n}', ['--workers', str(n)]) for n in counts]
+        for label, extra in runs:
+            proc, port = start_app(args.threads, ['--data', json_file, *extra])
+            try:
+                if extra:
+                    wait_for_children(proc.pid, int(extra[1]) + 1)
+                measure(port, paths, args.processes, args.clients, 1.0)         # warm auth caches
+                rps, latencies, errors = measure(port, paths, args.processes, args.clients, args.duration)
+                base = base or rps
+                print(f"{label:<26} | {rps:>10,.0f} | {percentile(latencies, 50) * 1000:>9.2f} | "
+                      f"{percentile(latencies, 99) * 1000:>9.2f} | {errors:>6} | {rps / base:>5.2f}x")
+                if extra and int(extra[1]) == max(counts):
+                    footprints['.json store'] = [memory(proc.pid)] + [memory(pid) for pid in children(proc.pid)]
+            finally:
+                stop(proc)
+        print("="*78)
+
+        proc, port = start_app(args.threads, ['--data', col_file, '--workers', str(max(counts))])
+        try:
+            wait_for_children(proc.pid, max(counts) + 1)
+            measure(port, paths, args.processes, args.clients, args.duration)
+            footprints['.col mapped'] = [memory(proc.pid)] + [memory(pid) for pid in children(proc.pid)]
+        finally:
+            stop(proc)
+
+        print(f"\nMemory after the load, --workers {max(counts)} (MiB)")
+        print("="*78)
+        print(f"{'Data':<14} | {'Process':<10} | {'RSS':>8} | {'PSS':>8} | {'Private':>8}")
+        print("-"*78)
+        for data, processes in footprints.items():
+            names = ['master', 'writer'] + [f'worker {i}' for i in range(1, len(processes) - 1)]
+            for name, (rss, pss, private) in zip(names, processes):
+                print(f"{data:<14} | {name:<10} | {rss / 2**20:>8.1f} | {pss / 2**20:>8.1f} | {private / 2**20:>8.1f}")
+            rss, pss, private = (sum(column) for column in zip(*processes))
+            print(f"{data:<14} | {'total':<10} | {rss / 2**20:>8.1f} | {pss / 2**20:>8.1f} | {private / 2**20:>8.1f}")
+            print("-"*78)
+        print("RSS counts shared pages in every process, PSS splits them between the processes sharing them")
+        print("="*78 + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
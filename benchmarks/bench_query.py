@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Full GET /transactions vs paginated, filtered and projected queries
+
+Reports response size and latency for typical dashboard queries.
+
+Usage:
+    python3 benchmarks/bench_query.py [--rows 100000] [--repeat 20]
+"""
+
+import argparse
+import time
+
+from common import make_transactions, start_server, request, percentile
+
+import app
+from store import TransactionStore
+
+QUERIES = [
+    ('full dump', '/transactions'),
+    ('first page', '/transactions?limit=50'),
+    ('cursor page', '/transactions?limit=50&after={mid}'),
+    ('type + projection', '/transactions?transaction_type=deposit&limit=100&fields=id,amount,timestamp'),
+    ('amount range', '/transactions?min_amount=10000&max_amount=10500&limit=100'),
+    ('one day', '/transactions?start=2024-05-11T00:00:00&end=2024-05-12T00:00:00&fields=amount,timestamp'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app.use_store(TransactionStore(make_transactions(args.rows)))
+    httpd = start_server(app.TransactionHandler)
+    port = httpd.server_address[1]
+
+    print("\n" + "="*72)
+    print(f"{'Query':<20} | {'Bytes':>12} | {'p50 (ms)':>10} | {'vs full dump':>12}")
+    print("-"*72)
+
+    baseline = None
+    for label, path in QUERIES:
+        path = path.format(mid=args.rows // 2)
+        samples = []
+        for _ in range(args.repeat if label != 'full dump' else max(3, args.repeat // 5)):
+            start = time.perf_counter()
+            status, body = request(port, 'GET', path)
+            samples.append(time.perf_counter() - start)
+        p50 = percentile(samples, 50) * 1000
+        baseline = baseline or (len(body), p50)
+        print(f"{label:<20} | {len(body):>12,} | {p50:>10.2f} | "
+              f"{baseline[1] / p50:>11.0f}x")
+
+    print("="*72 + "\n")
+    httpd.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Response byte cache on a read-heavy mixed workload
+
+1. Correctness: the LRU stays under its byte limit; a write to transaction X
+   evicts X's entry and the list pages whose filters match X, and nothing
+   else; a body built while a write landed is not stored. Over HTTP, with
+   random writes between reads and with a writer running concurrently,
+   every cached response (plain and gzip) equals the one built with the
+   cache off, on the in-memory and SQLite stores.
+2. Requests/sec with the cache on and off for keep-alive clients sending
+   a dashboard-like mix: hot GET /transactions/{id}, list pages with
+   filters, /stats reports and search, plus a share of PUT writes.
+
+Usage:
+    python3 benchmarks/bench_response_cache.py [--rows 100000] [--clients 4] [--seconds 3]
+"""
+
+import argparse
+import gzip
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+from common import make_transactions, start_server, request, AUTH_HEADER, TX_TYPES, NAMES
+
+import app
+from response_cache import ResponseCache
+from server import PooledHTTPServer
+from sqlite_store import SQLiteStore
+from store import TransactionStore
+
+DEFAULT_BYTES = app.RESPONSE_CACHE_BYTES
+
+
+def check_cache():
+    cache = ResponseCache(max_bytes=1000)
+    for i in range(20):
+        cache.put(f"/transactions/{i}", b'x' * 90, cache.generation, tx_id=i)
+    if cache.bytes > 1000 or len(cache) >= 20 or cache.get('/transactions/0') or not cache.get('/transactions/19'):
+        return "LRU byte limit"
+
+    cache = ResponseCache()
+    rows = make_transactions(10)
+    pages = {'/transactions/1': {'tx_id': 1}, '/transactions/2': {'tx_id': 2},
+             '/transactions?transaction_type=' + rows[0]['transaction_type']:
+                 {'filters': {'transaction_type': rows[0]['transaction_type']}},
+             '/transactions?transaction_type=none': {'filters': {'transaction_type': 'none'}},
+             '/transactions?min_amount=999999': {'filters': {'min_amount': 999999}},
+             '/stats': {}}
+    for key, depends in pages.items():
+        cache.put(key, b'{}', cache.generation, **depends)
+    cache.on_remove(rows[0])
+    left = {key for key in pages if cache.get(key)}
+    if left != {'/transactions/2', '/transactions?transaction_type=none', '/transactions?min_amount=999999'}:
+        return f"precise invalidation kept {sorted(left)}"
+    generation = cache.generation
+    cache.on_add(rows[1])
+    if cache.put('/transactions/5', b'{}', generation, tx_id=5) is not None:
+        return "stale put was stored"
+    return None
+
+
+def urls(rows, rng, count=60):
+    """GET targets covering every cached route"""
+    targets = ['/stats', '/stats/top?role=sender&limit=5', '/stats/histogram', '/stats/timeseries?interval=month',
+               '/stats/buckets?interval=day&days=30&until=2024-06-01', '/search?q=jane', '/search?q=smi&scope=all']
+    for _ in range(count):
+        pick = rng.random()
+        if pick < 0.4:
+            targets.append(f"/transactions/{rng.randint(1, len(rows) + 20)}")
+        elif pick < 0.6:
+            targets.append(f"/transactions?transaction_type={rng.choice(TX_TYPES)}&limit={rng.randint(1, 30)}")
+        elif pick < 0.75:
+            targets.append(f"/transactions?counterparty={quote(rng.choice(rows)['receiver'])}&limit=10&fields=id,amount")
+        elif pick < 0.9:
+            targets.append(f"/transactions?min_amount={rng.randint(0, 400) * 100}&limit=5"
+                           f"&offset={rng.randint(0, 10)}")
+        else:
+            targets.append(f"/transactions?limit=20&after={rng.randint(0, len(rows))}")
+    return list(dict.fromkeys(targets))
+
+
+def fetch(port, conn, path, zipped):
+    headers = {'Authorization': AUTH_HEADER}
+    if zipped:
+        headers['Accept-Encoding'] = 'gzip'
+    conn.request('GET', path, headers=headers)
+    response = conn.getresponse()
+    body = response.read()
+    if response.getheader('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    return response.status, body
+
+
+def uncached(port, conn, path):
+    """The response as it would be built with the cache off"""
+    app.RESPONSE_CACHE_BYTES = 0
+    try:
+        return fetch(port, conn, path, False)
+    finally:
+        app.RESPONSE_CACHE_BYTES = DEFAULT_BYTES
+
+
+def mutate(port, conn, rng, rows):
+    pick = rng.random()
+    tx_id = rng.randint(1, len(rows))
+    if pick < 0.4:
+        body = json.dumps({'amount': rng.randint(1, 500) * 100, 'transaction_type': rng.choice(TX_TYPES)})
+        request(port, 'PUT', f"/transactions/{tx_id}", body, conn=conn)
+    elif pick < 0.7:
+        item = {key: value for key, value in rng.choice(rows).items() if key != 'id'}
+        request(port, 'POST', '/transactions', json.dumps(item), conn=conn)
+    elif pick < 0.85:
+        request(port, 'DELETE', f"/transactions/{tx_id}", conn=conn)
+    else:
+        items = [{key: value for key, value in rng.choice(rows).items() if key != 'id'} for _ in range(5)]
+        request(port, 'POST', '/transactions/bulk', json.dumps(items), conn=conn)
+
+
+def check_http(store, rows):
+    rng = random.Random(3)
+    app.use_store(store)
+    httpd = start_server(app.TransactionHandler, PooledHTTPServer)
+    port = httpd.server_address[1]
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    targets = urls(rows, rng)
+    try:
+        # Random writes between reads
+        for _ in range(400):
+            path = rng.choice(targets)
+            got = fetch(port, conn, path, rng.random() < 0.5)
+            if got != uncached(port, conn, path):
+                return f"GET {path}"
+            if rng.random() < 0.3:
+                mutate(port, conn, rng, rows)
+        if not app.RESPONSES.hits or not app.RESPONSES.invalidations:
+            return "cache was not exercised"
+
+        # A writer racing the readers: nothing stale may be left behind
+        stop = threading.Event()
+
+        def writer():
+            own = http.client.HTTPConnection('127.0.0.1', port)
+            local = random.Random(4)
+            while not stop.is_set():
+                mutate(port, own, local, rows)
+            own.close()
+
+        def reader(seed):
+            own = http.client.HTTPConnection('127.0.0.1', port)
+            local = random.Random(seed)
+            while not stop.is_set():
+                fetch(port, own, local.choice(targets), local.random() < 0.5)
+            own.close()
+
+        threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader, args=(i,)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(1.5)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        for path in targets:
+            if fetch(port, conn, path, False) != uncached(port, conn, path):
+                return f"stale after concurrent writes: GET {path}"
+    finally:
+        conn.close()
+        httpd.shutdown()
+        httpd.server_close()
+    return None
+
+
+def verify(tmp):
+    problem = check_cache()
+    if not problem:
+        rows = make_transactions(2000)
+        for store in (TransactionStore(rows), SQLiteStore(os.path.join(tmp, 'verify.db'))):
+            if isinstance(store, SQLiteStore):
+                store.add_many(rows)
+            problem = check_http(store, rows)
+            if problem:
+                problem = f"{type(store).__name__}: {problem}"
+                break
+    if problem:
+        print(f"✗ Response cache check failed: {problem}")
+        return False
+    print("✓ LRU bounded, writes evict exactly the dependent pages, cached == uncached under concurrent writes")
+    return True
+
+
+def workload(rows, rng, count=5000):
+    """(method, path) mix of a dashboard: hot items, filtered pages, reports"""
+    hot = [rng.randint(1, len(rows)) for _ in range(1000)]
+    parties = sorted({tx['receiver'] for tx in rows[:2000]})[:50]
+    mix = []
+    for _ in range(count):
+        pick = rng.random()
+        if pick < 0.5:
+            mix.append(f"/transactions/{hot[int(len(hot) ** rng.random()) - 1]}")
+        elif pick < 0.7:
+            mix.append(f"/transactions?transaction_type={rng.choice(TX_TYPES)}&limit=20&offset={rng.randrange(3) * 20}")
+        elif pick < 0.8:
+            mix.append(f"/transactions?counterparty={quote(rng.choice(parties))}&limit=20")
+        elif pick < 0.9:
+            mix.append(f"/transactions?limit=50&after={rng.choice(hot)}")
+        elif pick < 0.97:
+            mix.append(rng.choice(['/stats', '/stats/top?role=receiver&limit=10', '/stats/timeseries?interval=month',
+                                   '/stats/buckets?interval=week&start=2024-05&end=2024-06']))
+        else:
+            mix.append(f"/search?q={rng.choice(NAMES).split()[0].lower()}")
+    return mix
+
+
+def client(port, mix, writes, stop, counts, seed):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    headers = {'Authorization': AUTH_HEADER, 'Accept-Encoding': 'gzip'}
+    done = 0
+    i = seed * 997
+    while not stop.is_set():
+        if rng.random() < writes:
+            body = json.dumps({'amount': rng.randint(1, 500) * 100})
+            conn.request('PUT', f"/transactions/{rng.randint(1, 10000)}", body=body,
+                         headers={**headers, 'Content-Type': 'application/json'})
+        else:
+            conn.request('GET', mix[i % len(mix)], headers=headers)
+            i += 1
+        response = conn.getresponse()
+        response.read()
+        done += 1
+    conn.close()
+    counts.append(done)
+
+
+def bench(store, rows, clients, seconds, writes, cache_bytes):
+    app.RESPONSE_CACHE_BYTES = cache_bytes
+    app.use_store(store)
+    app.get_rollups()
+    app.get_search_index()
+    app.get_time_index()
+    httpd = start_server(app.TransactionHandler, PooledHTTPServer)
+    port = httpd.server_address[1]
+    mix = workload(rows, random.Random(11))
+    stop = threading.Event()
+    counts = []
+    threads = [threading.Thread(target=client, args=(port, mix, writes, stop, counts, n)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    httpd.shutdown()
+    httpd.server_close()
+    cache = app.RESPONSES
+    hit_rate = cache.hits / max(1, cache.hits + cache.misses) if cache else None
+    return sum(counts) / seconds, hit_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--clients', type=int, default=4, help="keep-alive client threads")
+    parser.add_argument('--seconds', type=float, default=3.0, help="duration of each run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print()
+        if not verify(tmp):
+            return 1
+
+        rows = make_transactions(args.rows)
+        sqlite = SQLiteStore(os.path.join(tmp, 'bench.db'))
+        sqlite.add_many(rows)
+        print("\n" + "="*74)
+        print(f"{'Store':<8} | {'writes':>6} | {'no cache (req/s)':>16} | {'cache (req/s)':>13} | {'hit rate':>8} | "
+              f"{'speedup':>7}")
+        print("-"*74)
+        for name, store in (('memory', TransactionStore(rows)), ('sqlite', sqlite)):
+            for writes in (0.0, 0.01, 0.1):
+                off, _ = bench(store, rows, args.clients, args.seconds, writes, 0)
+                on, hit_rate = bench(store, rows, args.clients, args.seconds, writes, DEFAULT_BYTES)
+                print(f"{name:<8} | {writes:>6.0%} | {off:>16,.0f} | {on:>13,.0f} | {hit_rate:>8.0%} | "
+                      f"{on / off:>6.2f}x")
+        print("-"*74)
+        print(f"{args.clients} keep-alive clients, gzip accepted, {args.rows:,} rows; client and server share the CPU.")
+        print("="*74 + "\n")
+        sqlite.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Counterparty / SMS text search index vs a substring scan
+
+Transactions come from the synthetic SMS generator (dsa/synthetic.py) with
+the raw body kept, so names carry the real ETL noise ("Jane Smith 12845 has
+been completed at 2024") and bodies are realistic.
+
+1. Correctness: for a set of queries the index returns exactly the
+   transactions whose normalized names / body terms start with every query
+   word (brute force over all rows); misspelled names find the right
+   counterparty; after random creates/updates/deletes through the store the
+   incrementally maintained index equals one rebuilt from scratch.
+2. Query latency: typeahead over counterparties, the newest matching
+   transactions, and a naive lowercase substring scan over names + bodies.
+3. Build time, and the cost the subscribed index adds to each store write.
+
+Usage:
+    python3 benchmarks/bench_search.py [--rows 100000] [--name-rows 1000000] [--parties 5000]
+"""
+
+import argparse
+import heapq
+import random
+import sys
+import time
+
+import common  # noqa: F401  (sys.path for dsa/ and api/)
+
+from search_index import SearchIndex, terms, normalize_name
+from store import TransactionStore
+from synthetic import generate, party_name
+
+
+def make_rows(count, parties, body=True, seed=42):
+    """Transactions as the ETL would emit them with --keep-body"""
+    rows = []
+    for _, _, text, expected in generate(int(count * 1.06) + 10, parties=parties, seed=seed):
+        if expected is None:
+            continue
+        tx_type, amount, sender, receiver, timestamp, txid, fee, balance = expected
+        row = {'id': len(rows) + 1, 'transaction_type': tx_type, 'amount': amount,
+               'sender': sender, 'receiver': receiver, 'timestamp': timestamp, 'txid': txid,
+               'fee': fee, 'balance': balance}
+        if body:
+            row['body'] = text
+        rows.append(row)
+        if len(rows) == count:
+            break
+    return rows
+
+
+def reference_ids(rows, query):
+    """Brute force: ids where every query word prefixes a name or body term"""
+    words = terms(query)
+    ids = set()
+    for tx in rows:
+        vocabulary = set(terms(tx.get('body', '')))
+        for role in ('sender', 'receiver'):
+            vocabulary.update(terms(normalize_name(tx[role])))
+            code = tx[role].split(' has been')[0].split()[-1]
+            if code.isdigit():
+                vocabulary.add(code)
+        if all(any(term.startswith(word) for term in vocabulary) for word in words):
+            ids.add(tx['id'])
+    return ids
+
+
+def substring_scan(haystacks, query, limit=10):
+    """The naive way: every word as a substring of lowercase name + body text"""
+    words = query.lower().split()
+    matches = [tx_id for tx_id, text in haystacks if all(word in text for word in words)]
+    return len(matches), heapq.nlargest(limit, matches)
+
+
+def snapshot(index):
+    vocabularies = [(dict(v.postings), set(v._sorted + v._pending) & set(v.postings))
+                    for v in (index.names, index.transactions)]
+    return index.members, vocabularies
+
+
+def verify(parties):
+    rows = make_rows(3000, parties=50)
+    store = TransactionStore(rows)
+    index = SearchIndex()
+    store.subscribe(index)
+    checks = []
+
+    for query in ('jane', 'jane smi', 'SMITH', 'samuel u', 'airtime', 'bundles', 'bank', 'financial transaction',
+                  'poromosiyo', 'kanda', 'zzz', 'account holder'):
+        expected = reference_ids(rows, query)
+        total, newest = index.transaction_ids(query, limit=20, fuzzy=False)
+        checks.append((f"query {query!r}", total == len(expected) and newest == heapq.nlargest(20, expected)))
+
+    name = party_name(3)
+    typo = name.split()[-1]
+    typo = typo[0] + typo[2] + typo[1] + typo[3:]        # swap two letters
+    found = index.counterparties(f"{name.split()[0]} {typo}", limit=3)
+    checks.append(('fuzzy name', bool(found) and found[0]['name'] == name))
+    noisy = index.counterparties(normalize_name(rows[next(i for i, tx in enumerate(rows)
+                                                          if 'has been' in tx['receiver'])]['receiver']))
+    checks.append(('normalized names', bool(noisy) and 'has been' not in noisy[0]['name']))
+
+    rng = random.Random(1)
+    for _ in range(2000):
+        op = rng.random()
+        if op < 0.4:
+            source = rng.choice(rows)
+            store.create({**source, 'receiver': f"{party_name(rng.randrange(500))} {rng.randrange(10**5)}"})
+        elif op < 0.8:
+            store.update(rng.randrange(1, len(rows)), {'sender': party_name(rng.randrange(500)),
+                                                       'receiver': rng.choice(['You', 'Unknown', 'Zed Q'])})
+        else:
+            store.delete(rng.randrange(1, len(rows)))
+    # Store.create keeps only the schema fields, so created rows have no body
+    rebuilt = SearchIndex()
+    store.subscribe(rebuilt)
+    checks.append(('incremental == rebuilt', snapshot(index) == snapshot(rebuilt)))
+    checks.append(('after mutations', all(index.transaction_ids(q, 50) == rebuilt.transaction_ids(q, 50)
+                                          for q in ('jane', 'zed', 'you', 'kanda'))))
+
+    failed = [name for name, ok in checks if not ok]
+    if failed:
+        print(f"✗ Search checks failed: {', '.join(failed)}")
+        return False
+    print(f"✓ {len(checks)} checks passed (prefix results match brute force, fuzzy, incremental updates)")
+    return True
+
+
+def per_query(function, queries, min_time=0.3):
+    """Mean µs per call, cycling through queries"""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for query in queries:
+            function(query)
+        calls += len(queries)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls * 1e6
+
+
+def queries_for(parties):
+    name = party_name(2)
+    first, last = name.split()[0].lower(), name.split()[-1].lower()
+    rare = party_name(parties - 7).lower()
+    typo = last[0] + last[2] + last[1] + last[3:]
+    return {
+        'typeahead': [first[:n] for n in range(1, len(first) + 1)] + [f"{first} {last[:n]}" for n in range(1, 4)],
+        'full name': [f"{first} {last}"],
+        'rare name': [rare],
+        'misspelled': [f"{first} {typo}"],
+        'body word': ['poromosiyo'],
+    }
+
+
+def bench(rows, parties, with_body):
+    start = time.perf_counter()
+    store = TransactionStore(rows)
+    index = SearchIndex()
+    store.subscribe(index)
+    build = time.perf_counter() - start
+    haystacks = [(tx['id'], ' '.join((tx['sender'], tx['receiver'], tx.get('body', ''))).lower()) for tx in rows]
+
+    results = []
+    for name, queries in queries_for(parties).items():
+        if name == 'body word' and not with_body:
+            continue
+        names_us = per_query(lambda q: index.counterparties(q, 10), queries)
+        ids_us = per_query(lambda q: index.transaction_ids(q, 10), queries)
+        scan_us = per_query(lambda q: substring_scan(haystacks, q), queries[-1:], min_time=0.1)
+        results.append((name, len(queries), names_us, ids_us, scan_us))
+
+    # Store write cost with and without the index subscribed
+    writes = []
+    for subscribed in (False, True):
+        target = TransactionStore(rows[:1000])
+        if subscribed:
+            target.subscribe(SearchIndex())
+        start = time.perf_counter()
+        for i in range(5000):
+            tx = target.create(rows[i % len(rows)])
+            target.update(tx['id'], {'receiver': 'Someone Else'})
+        writes.append((time.perf_counter() - start) / 10000 * 1e6)
+    return build, index, results, writes
+
+
+def report(title, rows, parties, with_body):
+    build, index, results, writes = bench(rows, parties, with_body)
+    print("\n" + "="*84)
+    print(f"{title}: {len(rows):,} rows, {len(index.members):,} counterparties, "
+          f"{len(index.names):,} name terms, {len(index.transactions):,} transaction terms; built in {build:.2f}s")
+    print("-"*84)
+    print(f"{'Query':<12} | {'queries':>7} | {'names (µs)':>11} | {'tx ids (µs)':>11} | {'scan (µs)':>12} | {'vs scan':>8}")
+    print("-"*84)
+    for name, count, names_us, ids_us, scan_us in results:
+        print(f"{name:<12} | {count:>7} | {names_us:>11,.1f} | {ids_us:>11,.1f} | {scan_us:>12,.0f} | "
+              f"{scan_us / names_us:>7,.0f}x")
+    print("-"*84)
+    print(f"Store create+update: {writes[0]:.1f} µs without the index, {writes[1]:.1f} µs with it")
+    print("="*84)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000, help="rows with SMS bodies indexed")
+    parser.add_argument('--name-rows', type=int, default=1000000, help="rows for the names-only run")
+    parser.add_argument('--parties', type=int, default=5000)
+    args = parser.parse_args()
+
+    print()
+    if not verify(args.parties):
+        return 1
+    report("Names + bodies", make_rows(args.rows, args.parties), args.parties, True)
+    report("Names only", make_rows(args.name_rows, args.parties, body=False), args.parties, False)
+    print("'vs scan' compares the substring scan with the counterparty typeahead query.\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
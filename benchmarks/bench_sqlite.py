@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Benchmark: SQLite write-through storage vs the JSON-in-memory store
+
+1. Correctness: random create/update/delete sequences are applied to a
+   TransactionStore and a SQLiteStore; queries, rows and the version must
+   agree, also after reopening the database.
+2. Cold start: time from launching api/app.py until it accepts connections,
+   with --data (JSON loaded into memory) and --db (existing database).
+3. Point lookups and mixed read/write throughput over HTTP (90% GET by id,
+   5% POST, 5% PUT) with several keep-alive clients on the pooled server.
+
+Usage:
+    python3 benchmarks/bench_sqlite.py [--sizes 10000,100000,1000000] [--clients 8] [--duration 3]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from common import make_transactions, start_server, request, percentile, repo_root, TX_TYPES, AUTH_HEADER
+
+import app
+from server import PooledHTTPServer
+from sqlite_store import SQLiteStore, open_store
+from store import TransactionStore
+
+QUERIES = [
+    {},
+    {'transaction_type': 'payment', 'limit': 20},
+    {'counterparty': 'Party 3'},
+    {'receiver': 'Party 7', 'min_amount': 1000, 'max_amount': 900000},
+    {'start': '2024-03-01', 'end': '2024-07-01', 'after': 200, 'limit': 50},
+    {'min_amount': 500000, 'offset': 5, 'limit': 10},
+]
+
+
+def mutate(stores, rng):
+    """Apply one random create/update/delete to every store"""
+    ids = [tx['id'] for tx in stores[0].all()]
+    op = rng.random()
+    if op < 0.4 or not ids:
+        fields = {'transaction_type': rng.choice(TX_TYPES), 'amount': rng.randint(0, 1000000),
+                  'sender': 'You', 'receiver': f"Party {rng.randint(1, 20)}",
+                  'timestamp': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00"}
+        return [store.create(fields) for store in stores]
+    if op < 0.7:
+        tx_id = rng.choice(ids)
+        changes = {'amount': rng.randint(0, 1000000), 'receiver': f"Party {rng.randint(1, 20)}"}
+        return [store.update(tx_id, changes) for store in stores]
+    tx_id = rng.choice(ids)
+    return [store.delete(tx_id) for store in stores]
+
+
+def verify(path, mutations, seed=3):
+    rng = random.Random(seed)
+    initial = make_transactions(300, seed=seed, parties=20)
+    for tx in initial:
+        tx['receiver'] = f"Party {tx['id'] % 20}"
+    memory = TransactionStore(initial)
+    sqlite = SQLiteStore(path)
+    sqlite.add_many(initial, batch_size=64)
+    for step in range(mutations):
+        results = mutate([memory, sqlite], rng)
+        if results[0] != results[1]:
+            print(f"✗ Mutation {step} returned different rows")
+            return False
+        for query in QUERIES:
+            if memory.query(**query) != sqlite.query(**query):
+                print(f"✗ Query {query} differs after mutation {step}")
+                return False
+    version = sqlite.version
+    sqlite.close()
+    reopened = SQLiteStore(path)
+    if reopened.all() != memory.all() or reopened.version != version:
+        print("✗ Reopened database lost changes")
+        return False
+    reopened.close()
+    print(f"✓ SQLiteStore matches TransactionStore over {mutations} mutations and survives a reopen")
+    return True
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def time_startup(args):
+    """Seconds from launching api/app.py until it accepts a connection"""
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.join(repo_root, 'api', 'app.py'),
+                             '--host', '127.0.0.1', '--port', str(port)] + args,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return time.perf_counter() - start
+            except OSError:
+                if proc.poll() is not None:
+                    raise RuntimeError("server exited during startup")
+                time.sleep(0.002)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def mixed_load(port, size, clients, duration):
+    """Requests/sec for 90% GET, 5% POST, 5% PUT on keep-alive connections"""
+    body = json.dumps({'transaction_type': 'payment', 'amount': 500, 'sender': 'You', 'receiver': 'Jane Smith'})
+    counts = []
+    deadline = time.perf_counter() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        headers = {'Authorization': AUTH_HEADER, 'Content-Type': 'application/json'}
+        done = 0
+        while time.perf_counter() < deadline:
+            op = rng.random()
+            if op < 0.9:
+                conn.request('GET', f'/transactions/{rng.randint(1, size)}', headers=headers)
+            elif op < 0.95:
+                conn.request('POST', '/transactions', body=body, headers=headers)
+            else:
+                conn.request('PUT', f'/transactions/{rng.randint(1, size)}', body=body, headers=headers)
+            conn.getresponse().read()
+            done += 1
+        conn.close()
+        counts.append(done)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / duration
+
+
+def lookup_p50(port, size, repeat=300):
+    rng = random.Random(5)
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        request(port, 'GET', f'/transactions/{rng.randint(1, size)}', conn=conn)
+        samples.append(time.perf_counter() - start)
+    conn.close()
+    return percentile(samples, 50) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--mutations', type=int, default=400)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print()
+        if not verify(os.path.join(tmp, 'verify.db'), args.mutations):
+            return 1
+
+        print("\n" + "="*104)
+        print(f"{'Rows':>10} | {'Import (s)':>10} | {'Start JSON (ms)':>15} | {'Start DB (ms)':>13} | "
+              f"{'GET p50 JSON/DB (µs)':>20} | {'Mixed req/s JSON/DB':>20}")
+        print("-"*104)
+        for size in (int(s) for s in args.sizes.split(',')):
+            json_file = os.path.join(tmp, f'{size}.json')
+            db_file = os.path.join(tmp, f'{size}.db')
+            transactions = make_transactions(size)
+            with open(json_file, 'w') as f:
+                json.dump(transactions, f)
+
+            start = time.perf_counter()
+            open_store(db_file).import_json(json_file)
+            imported = time.perf_counter() - start
+
+            json_start = time_startup(['--data', json_file]) * 1000
+            db_start = time_startup(['--db', db_file]) * 1000
+
+            results = []
+            for store in (TransactionStore(transactions), SQLiteStore(db_file)):
+                app.use_store(store)
+                httpd = start_server(app.TransactionHandler, PooledHTTPServer)
+                port = httpd.server_address[1]
+                results.append((lookup_p50(port, size), mixed_load(port, size, args.clients, args.duration)))
+                httpd.shutdown()
+                httpd.server_close()
+                if isinstance(store, SQLiteStore):
+                    store.close()
+            del transactions
+
+            print(f"{size:>10,} | {imported:>10.2f} | {json_start:>15.0f} | {db_start:>13.0f} | "
+                  f"{results[0][0]:>9.0f} / {results[1][0]:<8.0f} | {results[0][1]:>9.0f} / {results[1][1]:<8.0f}")
+        print("="*104 + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Incremental rollups vs brute-force aggregation
+
+Times each /stats report from the rollups against computing it by scanning
+all transactions, for growing dataset sizes. That the rollups equal the
+scans after random mutations is checked in tests/test_stats.py.
+
+Usage:
+    python3 benchmarks/bench_stats.py [--sizes 1000,10000,100000,1000000]
+"""
+
+import argparse
+import bisect
+import heapq
+import sys
+import time
+
+from common import make_transactions
+
+from stats import Rollups, HISTOGRAM_EDGES
+from store import TransactionStore
+
+
+def brute_summary(transactions):
+    """The summary report by one scan over all transactions"""
+    by_type = {}
+    for tx in transactions:
+        entry = by_type.setdefault(tx['transaction_type'], [0, 0])
+        entry[0] += 1
+        entry[1] += tx['amount']
+    return {'count': len(transactions), 'total_amount': sum(tx['amount'] for tx in transactions),
+            'by_type': [{'transaction_type': t, 'count': c, 'total_amount': a}
+                        for t, (c, a) in sorted(by_type.items(), key=lambda item: str(item[0]))]}
+
+
+def brute_timeseries(transactions, width=10):
+    """Volume per day (width 10) or month (width 7) by one scan"""
+    periods = {}
+    for tx in transactions:
+        entry = periods.setdefault(tx['timestamp'][:width], [0, 0])
+        entry[0] += 1
+        entry[1] += tx['amount']
+    return [{'period': p, 'count': c, 'total_amount': a} for p, (c, a) in sorted(periods.items())]
+
+
+def brute_top(transactions, role, metric, limit):
+    totals = {}
+    for tx in transactions:
+        entry = totals.setdefault(tx[role], [0, 0])
+        entry[0] += 1
+        entry[1] += tx['amount']
+    index = 1 if metric == 'amount' else 0
+    best = heapq.nsmallest(limit, totals.items(), key=lambda item: (-item[1][index], str(item[0])))
+    return [{'name': n, 'count': c, 'total_amount': t} for n, (c, t) in best]
+
+
+def brute_histogram(transactions):
+    counts = [0] * len(HISTOGRAM_EDGES)
+    for tx in transactions:
+        counts[bisect.bisect_right(HISTOGRAM_EDGES, tx['amount']) - 1] += 1
+    return counts
+
+
+def per_call_us(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    args = parser.parse_args()
+
+    print("\n" + "="*78)
+    print(f"{'Rows':>10} | {'Report':<12} | {'Rollup (µs)':>12} | {'Brute (µs)':>14} | {'Speedup':>9}")
+    print("-"*78)
+    for size in (int(s) for s in args.sizes.split(',')):
+        transactions = make_transactions(size)
+        store = TransactionStore(transactions)
+        rollups = Rollups()
+        store.subscribe(rollups)
+        cases = [
+            ('summary', rollups.summary, lambda: brute_summary(transactions)),
+            ('daily', lambda: rollups.timeseries('day'), lambda: brute_timeseries(transactions)),
+            ('top 10', lambda: rollups.top('receiver', 'amount', 10),
+             lambda: brute_top(transactions, 'receiver', 'amount', 10)),
+            ('histogram', rollups.amount_histogram, lambda: brute_histogram(transactions)),
+        ]
+        brute_repeat = max(1, 100000 // size)
+        for label, fast, slow in cases:
+            fast_us = per_call_us(fast, 200)
+            slow_us = per_call_us(slow, brute_repeat)
+            print(f"{size:>10,} | {label:<12} | {fast_us:>12.1f} | {slow_us:>14.1f} | {slow_us / fast_us:>8.0f}x")
+    print("="*78 + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Load test: Per-request API latency from 1k to 1M transactions
+
+Loads the TransactionStore with N synthetic transactions, then times
+GET /transactions/{id}, POST, PUT and DELETE over HTTP. Latency should
+stay flat as N grows; the legacy list scan is timed alongside for contrast.
+
+Usage:
+    python3 benchmarks/bench_store.py [--sizes 1000,10000,100000,1000000] [--requests 200]
+"""
+
+import argparse
+import json
+import random
+import time
+
+from common import make_transactions, start_server, request, percentile
+
+import app
+from store import TransactionStore
+
+
+def legacy_get(transactions, tx_id):
+    """Original _get_transaction: linear scan over the global list"""
+    for tx in transactions:
+        if tx['id'] == tx_id:
+            return tx
+    return None
+
+
+def time_requests(port, method, paths, body=None):
+    """Return p50 latency in µs for a list of requests"""
+    samples = []
+    for path in paths:
+        start = time.perf_counter()
+        request(port, method, path, body)
+        samples.append(time.perf_counter() - start)
+    return percentile(samples, 50) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    rng = random.Random(7)
+    payload = json.dumps({'transaction_type': 'payment', 'amount': 500,
+                          'sender': 'You', 'receiver': 'Jane Smith'})
+
+    print("\n" + "="*86)
+    print(f"{'Rows':>10} | {'GET p50':>10} | {'POST p50':>10} | {'PUT p50':>10} | "
+          f"{'DELETE p50':>10} | {'legacy scan p50':>16}   (µs)")
+    print("-"*86)
+
+    for size in sizes:
+        transactions = make_transactions(size)
+        app.use_store(TransactionStore(transactions))
+        httpd = start_server(app.TransactionHandler)
+        port = httpd.server_address[1]
+
+        ids = [rng.randint(1, size) for _ in range(args.requests)]
+        get = time_requests(port, 'GET', [f'/transactions/{i}' for i in ids])
+        post = time_requests(port, 'POST', ['/transactions'] * args.requests, payload)
+        put = time_requests(port, 'PUT', [f'/transactions/{i}' for i in ids], payload)
+        delete = time_requests(port, 'DELETE', [f'/transactions/{i}' for i in ids])
+
+        samples = []
+        for tx_id in ids[:50]:
+            start = time.perf_counter()
+            legacy_get(transactions, tx_id)
+            samples.append(time.perf_counter() - start)
+        legacy = percentile(samples, 50) * 1e6
+
+        print(f"{size:>10,} | {get:>10.0f} | {post:>10.0f} | {put:>10.0f} | "
+              f"{delete:>10.0f} | {legacy:>16.0f}")
+
+        httpd.shutdown()
+        httpd.server_close()
+
+    print("="*86 + "\n")
+
+
+if __name__ == '__main__':
+    main()
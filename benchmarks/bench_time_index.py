@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Epoch-ms time index vs scanning ISO timestamps
+
+1. Correctness: on shuffled timestamps (plus some that do not parse),
+   TimeIndex ids/count/buckets for random ranges and "last N days" windows
+   equal a brute-force scan; after random creates/updates/deletes through
+   the store the index equals a rebuilt one; convert_timestamp no longer
+   falls back to the current time.
+2. Latency per query as the dataset grows, for a 1-day range, a 30-day
+   window and day buckets over 90 days: TimeIndex vs a full scan that
+   parses every ISO string (what answering a date question on the ETL
+   output costs today) and a scan comparing the strings directly.
+
+Usage:
+    python3 benchmarks/bench_time_index.py [--sizes 10000,100000,1000000]
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from common import make_transactions
+
+from parse_xml import convert_timestamp, sms_to_transaction
+from store import TransactionStore
+from time_index import TimeIndex, to_ms, window, DAY_MS
+import xml.etree.ElementTree as ET
+
+START = datetime(2024, 5, 10, 14, 30)
+
+
+def shuffled_rows(count, seed=5, undated=0.01):
+    rng = random.Random(seed)
+    rows = make_transactions(count, seed=seed)
+    for tx in rows:
+        if rng.random() < undated:
+            tx['timestamp'] = rng.choice(['', None, 'not a date'])
+        else:
+            tx['timestamp'] = (START + timedelta(seconds=rng.randrange(200 * 86400),
+                                                 microseconds=rng.randrange(10**6))).isoformat()
+    return rows
+
+
+def parsed(tx):
+    try:
+        return to_ms(tx['timestamp'])
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def scan_ids(rows, lo, hi):
+    """Brute force: ids in time order (ties by id) with lo <= ms < hi"""
+    found = [(ms, tx['id']) for tx in rows for ms in (parsed(tx),)
+             if ms is not None and (lo is None or ms >= lo) and (hi is None or ms < hi)]
+    return [tx_id for _, tx_id in sorted(found)]
+
+
+def scan_buckets(rows, lo, hi):
+    days = {}
+    for tx in rows:
+        ms = parsed(tx)
+        if ms is not None and lo <= ms < hi:
+            day = datetime.fromtimestamp(ms / 1000).date().isoformat()
+            count, total = days.get(day, (0, 0))
+            days[day] = (count + 1, total + tx['amount'])
+    return [{'period': day, 'count': c, 'total_amount': t} for day, (c, t) in sorted(days.items())]
+
+
+def check_ranges(index, rows, rng, rounds=60):
+    base = to_ms(START.isoformat())
+    for _ in range(rounds):
+        lo = base + rng.randrange(-DAY_MS, 210 * DAY_MS)
+        hi = lo + rng.randrange(1, 40 * DAY_MS)
+        expected = scan_ids(rows, lo, hi)
+        if index.ids(lo, hi) != expected or index.ids(lo, hi, limit=5, newest=True) != expected[::-1][:5]:
+            return f"ids [{lo}, {hi})"
+        if index.count(lo, hi) != (len(expected), sum(tx['amount'] for tx in rows if tx['id'] in set(expected))):
+            return f"count [{lo}, {hi})"
+        if index.buckets('day', lo, hi) != scan_buckets(rows, lo, hi):
+            return f"buckets [{lo}, {hi})"
+    if index.ids() != scan_ids(rows, None, None):
+        return "unbounded"
+    lo, hi = window(7, until=base + 100 * DAY_MS)
+    if index.ids(lo, hi) != scan_ids(rows, base + 93 * DAY_MS, base + 100 * DAY_MS):
+        return "last 7 days"
+    return None
+
+
+def verify():
+    rng = random.Random(9)
+    rows = shuffled_rows(4000)
+    store = TransactionStore(rows)
+    index = TimeIndex()
+    store.subscribe(index)
+    problem = check_ranges(index, rows, rng)
+    if index.undated != sum(parsed(tx) is None for tx in rows):
+        problem = problem or "undated count"
+
+    if not problem:
+        for _ in range(3000):
+            op = rng.random()
+            if op < 0.4:
+                store.create({'transaction_type': 'payment', 'amount': rng.randint(1, 999), 'sender': 'You',
+                              'receiver': 'X', 'timestamp': (START + timedelta(seconds=rng.randrange(200 * 86400)))
+                              .isoformat()})
+            elif op < 0.7:
+                store.update(rng.randrange(1, len(rows)), {'amount': rng.randint(1, 999)})
+            else:
+                store.delete(rng.randrange(1, len(rows)))
+        rebuilt = TimeIndex()
+        store.subscribe(rebuilt)
+        if (index._days != rebuilt._days or index._keys != rebuilt._keys or index.undated != rebuilt.undated
+                or index.buckets('month') != rebuilt.buckets('month')):
+            problem = "incremental != rebuilt"
+        else:
+            problem = check_ranges(index, store.all(), rng, rounds=20)
+
+    if not problem:
+        sms = ET.fromstring('<sms address="M-Money" date="garbage" body="*113*R*A bank deposit of 500 RWF has '
+                            'been added to your mobile money account at 2024-05-11 18:43:49."/>')
+        if convert_timestamp('garbage') is not None or convert_timestamp(None) is not None:
+            problem = "convert_timestamp fallback"
+        elif sms_to_transaction(sms, 1) is not None:
+            problem = "undated SMS was kept"
+        else:
+            sms.set('date_sent', '1715445829000')
+            tx = sms_to_transaction(sms, 1)
+            if tx is None or tx['timestamp'] != convert_timestamp(1715445829000):
+                problem = "date_sent fallback"
+
+    if problem:
+        print(f"✗ Time index check failed: {problem}")
+        return False
+    print("✓ Ranges, windows and day buckets match a scan, incremental == rebuilt, no now() fallback")
+    return True
+
+
+def per_call(function, min_time=0.2):
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls * 1e6
+
+
+def parse_scan(rows, lo, hi):
+    """What a date-range question costs without an index: parse every record"""
+    count = 0
+    for tx in rows:
+        ms = round(datetime.fromisoformat(tx['timestamp']).timestamp() * 1000)
+        if lo <= ms < hi:
+            count += 1
+    return count
+
+
+def string_scan(rows, lo, hi):
+    return sum(1 for tx in rows if lo <= tx['timestamp'] < hi)
+
+
+def bench(size):
+    rows = make_transactions(size)
+    store = TransactionStore(rows)
+    start = time.perf_counter()
+    index = TimeIndex()
+    store.subscribe(index)
+    build = time.perf_counter() - start
+    first, last = index.bounds()
+    middle = first + (last - first) // 2
+    one_day = (middle, middle + DAY_MS)
+    month = window(30, until=last + 1)
+    quarter = (max(first, last - 90 * DAY_MS), last + 1)
+    iso = {key: tuple(datetime.fromtimestamp(ms / 1000).isoformat() for ms in bounds)
+           for key, bounds in (('day', one_day), ('month', month))}
+
+    results = []
+    for name, bounds in (('1-day range', one_day), ('last 30 days', month)):
+        lo, hi = bounds
+        indexed = per_call(lambda: index.count(lo, hi))
+        listed = per_call(lambda: index.ids(lo, hi, limit=50, newest=True))
+        key = 'day' if name == '1-day range' else 'month'
+        strings = per_call(lambda: string_scan(rows, *iso[key]), min_time=0.1)
+        parsing = per_call(lambda: parse_scan(rows, lo, hi), min_time=0.1)
+        results.append((name, index.count(lo, hi)[0], indexed, listed, strings, parsing))
+    lo, hi = quarter
+    buckets = per_call(lambda: index.buckets('day', lo, hi))
+    scan = per_call(lambda: scan_buckets(rows, lo, hi), min_time=0.1)
+    results.append(('day buckets, 90d', index.count(lo, hi)[0], buckets, None, None, scan))
+    return build, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    args = parser.parse_args()
+
+    print()
+    if not verify():
+        return 1
+
+    print("\n" + "="*100)
+    print(f"{'Rows':>9} | {'Query':<17} | {'matches':>8} | {'count (µs)':>10} | {'newest 50':>10} | "
+          f"{'str scan':>10} | {'parse scan':>11} | {'speedup':>8}")
+    print("-"*100)
+    for size in [int(s) for s in args.sizes.split(',')]:
+        build, results = bench(size)
+        for name, matches, indexed, listed, strings, parsing in results:
+            listed = f"{listed:>10,.1f}" if listed is not None else f"{'-':>10}"
+            strings = f"{strings:>10,.0f}" if strings is not None else f"{'-':>10}"
+            print(f"{size:>9,} | {name:<17} | {matches:>8,} | {indexed:>10,.1f} | {listed} | "
+                  f"{strings} | {parsing:>11,.0f} | {parsing / indexed:>7,.0f}x")
+        print(f"{'':>9} | index built in {build:.2f}s")
+        print("-"*100)
+    print("Times are µs per query; speedup is the parse scan vs the indexed count/buckets.")
+    print("="*100 + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Shared helpers for the benchmark scripts: synthetic data and a local server
+"""
+
+import base64
+import http.client
+import os
+import random
+import sys
+import threading
+from datetime import datetime, timedelta
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ('dsa', 'api'):
+    path = os.path.join(repo_root, folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+TX_TYPES = ['payment', 'transfer', 'deposit', 'receive', 'withdrawal', 'airtime']
+NAMES = ['Jane Smith', 'Samuel Carter', 'Alex Doe', 'Robert Brown', 'Linda Green']
+AUTH_HEADER = 'Basic ' + base64.b64encode(b'admin:admin123').decode()
+
+
+def make_transactions(count, seed=42, parties=1000):
+    """Build `count` transaction dicts shaped like the ETL output"""
+    rng = random.Random(seed)
+    start = datetime(2024, 5, 10, 14, 30)
+    names = [f"{rng.choice(NAMES)} {i}" for i in range(parties)]
+    transactions = []
+    for i in range(1, count + 1):
+        tx_type = rng.choice(TX_TYPES)
+        name = rng.choice(names)
+        transactions.append({
+            'id': i,
+            'transaction_type': tx_type,
+            'amount': rng.randint(1, 500) * 100,
+            'sender': name if tx_type == 'receive' else 'You',
+            'receiver': 'Account Holder' if tx_type == 'receive' else name,
+            'timestamp': (start + timedelta(seconds=i * 30)).isoformat(),
+            'txid': None,
+            'fee': None,
+            'balance': None,
+        })
+    return transactions
+
+
+def start_server(handler_class, server_class=None):
+    """Start an API server on an ephemeral localhost port in a daemon thread"""
+    from http.server import HTTPServer
+
+    class QuietHandler(handler_class):
+        def log_message(self, format, *args):
+            pass
+
+    httpd = (server_class or HTTPServer)(('127.0.0.1', 0), QuietHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return httpd
+
+
+def request(port, method, path, body=None, conn=None):
+    """Send one authenticated request; returns (status, body bytes)"""
+    own = conn is None
+    if own:
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+    headers = {'Authorization': AUTH_HEADER}
+    if body is not None:
+        headers['Content-Type'] = 'application/json'
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    data = response.read()
+    if own:
+        conn.close()
+    return response.status, data
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness: Scaling curves, JSON results and regression gating
+
+Runs benchmark cases over synthetic datasets of several sizes:
+  search        linear / dict / binary search / TransactionStore.get by id
+  store         TransactionStore queries and create+delete
+  api           HTTP GET by id, list page, filtered query, /stats (keep-alive)
+  aggregations  incremental rollups vs brute force vs columnar group-by
+  etl           streaming XML parse + categorize throughput
+
+Every case is warmed up, calibrated so one sample lasts at least
+--min-time, and sampled --repeat times with the GC disabled; results are
+reported as median and IQR per operation.
+
+--output writes machine-readable JSON. --save-baseline records a run, and
+--baseline compares against one: a hot-path case fails the run (exit 1)
+when its median is more than --threshold slower and its IQR does not
+overlap the baseline's. Baselines are machine specific, so record them on
+the machine that gates.
+
+Large sizes need memory (about 1 GB per million rows for the search
+suite); 10M rows needs roughly 16 GB.
+
+Usage:
+    python3 benchmarks/harness.py [--suites search,store,api,aggregations,etl]
+                                  [--sizes 1000,10000,100000,1000000] [--repeat 7]
+                                  [--output results.json]
+    python3 benchmarks/harness.py --save-baseline baseline.json
+    python3 benchmarks/harness.py --baseline baseline.json [--threshold 0.25]
+"""
+
+import argparse
+import gc
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from common import make_transactions, start_server, request, repo_root, TX_TYPES
+
+from bench_parse_xml import generate_xml
+
+import app
+from columnar import TransactionColumns
+from parse_xml import iter_parse_xml
+from search import (linear_search, dictionary_lookup, create_transaction_dict,
+                    binary_search, create_sorted_index, store_lookup)
+from server import PooledHTTPServer
+from stats import Rollups
+from store import TransactionStore
+
+SUITES = ('search', 'store', 'api', 'aggregations', 'etl')
+ETL_MAX_ROWS = 100_000      # XML generation and parsing above this is slow
+LINEAR_MAX_ROWS = 1_000_000
+
+
+# ========== MEASUREMENT ==========
+
+def measure(func, repeat=7, min_time=0.02, warmup=1):
+    """
+    Seconds per call of func(): warm up, calibrate the number of calls per
+    sample to last at least min_time, then take `repeat` samples
+    """
+    for _ in range(warmup):
+        func()
+    number = 1
+    while True:
+        elapsed = _sample(func, number)
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number = min(1_000_000, max(number * 2, int(number * min_time / max(elapsed, 1e-9))))
+    samples = [_sample(func, number) / number for _ in range(repeat)]
+    return summarize(samples, number)
+
+
+def _sample(func, number):
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - start
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def summarize(samples, number=1):
+    """Median, quartiles and IQR of per-call samples"""
+    if len(samples) > 1:
+        q1, median, q3 = statistics.quantiles(samples, n=4, method='inclusive')
+    else:
+        q1 = median = q3 = samples[0]
+    return {'median': median, 'q1': q1, 'q3': q3, 'iqr': q3 - q1, 'min': min(samples),
+            'samples': len(samples), 'calls_per_sample': number}
+
+
+def cycling(values):
+    """Zero-argument callable returning the next value, round-robin"""
+    return itertools.cycle(values).__next__
+
+
+# ========== SUITES ==========
+# Each suite takes (size, dataset) and returns [(case, func, hot)]; hot cases
+# are the ones gated against the baseline.
+
+def search_cases(size, data):
+    transactions = data.transactions(size)
+    tx_dict = create_transaction_dict(transactions)
+    sorted_ids, sorted_transactions = create_sorted_index(transactions)
+    store = data.store(size)
+    next_id = cycling(data.random_ids(size))
+    cases = [
+        ('search.dict', lambda: dictionary_lookup(tx_dict, next_id()), True),
+        ('search.binary', lambda: binary_search(sorted_ids, sorted_transactions, next_id()), True),
+        ('search.store', lambda: store_lookup(store, next_id()), True),
+    ]
+    if size <= LINEAR_MAX_ROWS:
+        cases.insert(0, ('search.linear', lambda: linear_search(transactions, next_id()), False))
+    return cases
+
+
+def store_cases(size, data):
+    store = data.store(size)
+    next_type = cycling(TX_TYPES)
+    next_id = cycling(data.random_ids(size))
+    fields = {'transaction_type': 'payment', 'amount': 500, 'sender': 'You', 'receiver': 'Jane Smith'}
+
+    def create_delete():
+        store.delete(store.create(fields)['id'])
+
+    return [
+        ('store.get', lambda: store.get(next_id()), True),
+        ('store.query_page', lambda: store.query(limit=50, after=next_id()), True),
+        ('store.query_type', lambda: store.query(transaction_type=next_type(), limit=50), True),
+        ('store.query_amount', lambda: store.query(min_amount=10000, max_amount=10100, limit=50), True),
+        ('store.create_delete', create_delete, True),
+    ]
+
+
+def api_cases(size, data):
+    app.use_store(data.store(size))
+    port = data.server().server_address[1]
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    next_id = cycling(data.random_ids(size))
+    return [
+        ('api.get_by_id', lambda: request(port, 'GET', f'/transactions/{next_id()}', conn=conn), True),
+        ('api.list_page', lambda: request(port, 'GET', '/transactions?limit=50', conn=conn), True),
+        ('api.filtered', lambda: request(port, 'GET', '/transactions?transaction_type=deposit'
+                                         '&min_amount=10000&max_amount=20000&limit=50'
+                                         '&fields=id,amount', conn=conn), True),
+        ('api.stats', lambda: request(port, 'GET', '/stats', conn=conn), True),
+    ]
+
+
+def aggregation_cases(size, data):
+    transactions = data.transactions(size)
+    rollups = Rollups()
+    data.store(size).subscribe(rollups)
+    columns = TransactionColumns.from_records(transactions)
+
+    def brute_by_type():
+        totals = {}
+        for tx in transactions:
+            entry = totals.setdefault(tx['transaction_type'], [0, 0])
+            entry[0] += 1
+            entry[1] += tx['amount']
+        return totals
+
+    return [
+        ('agg.rollups_summary', rollups.summary, True),
+        ('agg.rollups_top', lambda: rollups.top('receiver', 'amount', 10), True),
+        ('agg.brute_by_type', brute_by_type, False),
+        ('agg.columnar_by_type', columns.group_by, True),
+    ]
+
+
+def etl_cases(size, data):
+    if size > ETL_MAX_ROWS:
+        return []
+    xml_file = data.xml(size)
+
+    def parse():
+        for _ in iter_parse_xml(xml_file):
+            pass
+
+    return [('etl.stream_parse', parse, True)]
+
+
+CASES = {
+    'search': search_cases,
+    'store': store_cases,
+    'api': api_cases,
+    'aggregations': aggregation_cases,
+    'etl': etl_cases,
+}
+
+
+class Dataset:
+    """Synthetic data for the current size, shared between suites"""
+
+    def __init__(self, tmp):
+        self.tmp = tmp
+        self._size = None
+        self._cache = {}
+        self._httpd = None
+
+    def _get(self, size, key, build):
+        if size != self._size:
+            self._cache = {}
+            self._size = size
+            gc.collect()
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def transactions(self, size):
+        return self._get(size, 'transactions', lambda: make_transactions(size))
+
+    def store(self, size):
+        return self._get(size, 'store', lambda: TransactionStore(self.transactions(size)))
+
+    def random_ids(self, size):
+        rng = random.Random(size)
+        return self._get(size, 'ids', lambda: [rng.randint(1, size) for _ in range(1000)])
+
+    def xml(self, size):
+        def build():
+            path = os.path.join(self.tmp, f'{size}.xml')
+            generate_xml(path, size)
+            return path
+        return self._get(size, 'xml', build)
+
+    def server(self):
+        if self._httpd is None:
+            self._httpd = start_server(app.TransactionHandler, PooledHTTPServer)
+        return self._httpd
+
+    def close(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+
+# ========== RUN / REPORT ==========
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo_root,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run(suites, sizes, repeat, min_time):
+    results = {}
+    hot = set()
+    with tempfile.TemporaryDirectory() as tmp:
+        data = Dataset(tmp)
+        try:
+            print("\n" + "="*88)
+            print(f"{'Case':<24} | {'Rows':>10} | {'Median':>12} | {'IQR':>12} | {'ops/s':>12}")
+            print("-"*88)
+            for size in sizes:
+                for suite in suites:
+                    for case, func, is_hot in CASES[suite](size, data):
+                        stats = measure(func, repeat, min_time)
+                        results.setdefault(case, {})[str(size)] = stats
+                        if is_hot:
+                            hot.add(case)
+                        print(f"{case:<24} | {size:>10,} | {format_time(stats['median']):>12} | "
+                              f"{format_time(stats['iqr']):>12} | {1 / stats['median']:>12,.0f}")
+            print("="*88)
+        finally:
+            data.close()
+    return {'environment': environment(), 'repeat': repeat, 'hot': sorted(hot), 'results': results}
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('µs', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def compare(current, baseline, threshold):
+    """Print current vs baseline medians; returns the regressed (case, size) pairs"""
+    regressions = []
+    print("\n" + "="*88)
+    print(f"{'Case':<24} | {'Rows':>10} | {'Baseline':>12} | {'Current':>12} | {'Change':>8} | Status")
+    print("-"*88)
+    for case, by_size in current['results'].items():
+        for size, stats in by_size.items():
+            base = baseline['results'].get(case, {}).get(size)
+            if base is None:
+                continue
+            change = stats['median'] / base['median'] - 1
+            # Slower beyond the threshold, and not explained by run-to-run noise
+            regressed = (case in baseline.get('hot', ()) and change > threshold
+                         and stats['q1'] > base['q3'])
+            status = '✗ REGRESSED' if regressed else ('✓' if change <= threshold else '~ noisy')
+            if regressed:
+                regressions.append((case, size))
+            print(f"{case:<24} | {int(size):>10,} | {format_time(base['median']):>12} | "
+                  f"{format_time(stats['median']):>12} | {change:>+7.0%} | {status}")
+    print("="*88)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--suites', default=','.join(SUITES))
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=7, help="samples per case (default: 7)")
+    parser.add_argument('--min-time', type=float, default=0.02, help="seconds per sample (default: 0.02)")
+    parser.add_argument('--output', help="write results as JSON")
+    parser.add_argument('--save-baseline', help="write results as the baseline for later runs")
+    parser.add_argument('--baseline', help="compare against this baseline; exit 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="allowed slowdown of a hot-path median (default: 0.25 = 25%%)")
+    args = parser.parse_args()
+
+    suites = [s for s in args.suites.split(',') if s]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+    sizes = [int(s) for s in args.sizes.split(',')]
+
+    results = run(suites, sizes, args.repeat, args.min_time)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"✓ Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n✗ {len(regressions)} hot path(s) regressed more than {args.threshold:.0%}")
+            return 1
+        print(f"\n✓ No hot path regressed more than {args.threshold:.0%}")
+    print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
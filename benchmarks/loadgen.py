@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Load generator: Requests/sec and p50/p99 latency at several concurrency levels
+
+Each client is a thread with its own keep-alive HTTPConnection issuing
+GET /transactions/{id} for random ids. By default a server is started as a
+subprocess (api/app.py) once per --threads setting, so single-threaded and
+pooled serving can be compared; pass --port to target a running server.
+
+Usage:
+    python3 benchmarks/loadgen.py [--clients 1,16,128] [--duration 5] [--threads 0,128]
+    python3 benchmarks/loadgen.py --port 8000 --path /transactions/1
+"""
+
+import argparse
+import http.client
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from common import AUTH_HEADER, percentile, repo_root
+
+
+def client_loop(port, paths, deadline, latencies, errors):
+    """One client: issue requests on a keep-alive connection until deadline"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Authorization': AUTH_HEADER}
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        path = rng.choice(paths)
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+            if response.will_close:
+                conn.close()
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def run_load(port, paths, clients, duration):
+    """Run `clients` concurrent clients for `duration` seconds"""
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=client_loop, args=(port, paths, deadline, latencies, errors))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, latencies, errors
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_app(threads, extra_args=()):
+    """Start api/app.py as a subprocess and wait until it accepts connections"""
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(repo_root, 'api', 'app.py'),
+         '--host', '127.0.0.1', '--port', str(port), '--threads', str(threads), *extra_args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(300):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return proc, port
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("API server did not start")
+
+
+def report(label, clients, rps, latencies, errors):
+    p50 = percentile(latencies, 50) * 1000 if latencies else 0
+    p99 = percentile(latencies, 99) * 1000 if latencies else 0
+    print(f"{label:<16} | {clients:>7} | {rps:>10,.0f} | {p50:>9.2f} | {p99:>9.2f} | {len(errors):>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', default='1,16,128')
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds per level")
+    parser.add_argument('--threads', default='0,128',
+                        help="server pool sizes to compare (0 = single-threaded HTTPServer)")
+    parser.add_argument('--port', type=int, help="target an already running server instead")
+    parser.add_argument('--path', action='append',
+                        help="request path(s); default: random /transactions/{1..1000}")
+    args = parser.parse_args()
+
+    clients = [int(c) for c in args.clients.split(',')]
+    paths = args.path or [f'/transactions/{i}' for i in range(1, 1001)]
+
+    print("\n" + "="*72)
+    print(f"{'Server':<16} | {'Clients':>7} | {'Req/s':>10} | {'p50 (ms)':>9} | {'p99 (ms)':>9} | {'Errors':>6}")
+    print("-"*72)
+
+    if args.port:
+        for n in clients:
+            report(f"port {args.port}", n, *run_load(args.port, paths, n, args.duration))
+    else:
+        for threads in (int(t) for t in args.threads.split(',')):
+            label = f"pool={threads}" if threads else "single-threaded"
+            proc, port = start_app(threads)
+            try:
+                for n in clients:
+                    report(label, n, *run_load(port, paths, n, args.duration))
+            finally:
+                proc.terminate()
+                proc.wait()
+
+    print("="*72 + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Categorizer: Precompiled rule engine for M-Money SMS bodies
+
+Classifies an SMS and extracts amount, sender and receiver in a single call.
+Produces the same results as extract_amount / get_transaction_type /
+extract_sender / extract_receiver in parse_xml.py, but:
+  - all regexes are compiled once at import time
+  - body.lower() is computed once per message instead of up to four times
+  - sender/receiver extraction only runs the pattern for the matched type
+categorize_full() also returns the operator's transaction id ("TxId: ..."
+/ "Financial Transaction Id: ...") that identifies one SMS across backups,
+and the fee and the balance the operator reports after the transaction
+(see ledger.py). Amount, txid, fee and balance come from one scan of the
+body with a combined pattern (FIELDS_PATTERN); extract_txid(),
+extract_fee() and extract_balance() are the per-field reference.
+"""
+import re
+import time
+
+AMOUNT_PATTERN = re.compile(r'(\d+(?:,\d+)*)\s*RWF')
+
+RECEIVE_FROM = re.compile(r'from\s+([A-Za-z\s]+)\s*\(')
+TRANSFER_TO = re.compile(r'to\s+([A-Za-z\s]+)\s*\(')
+PAYMENT_TO = re.compile(r'to\s+([A-Za-z\s0-9]+)')
+TXID_PATTERN = re.compile(r'(?:TxId|Financial Transaction Id)\s*:\s*(\d+)')
+# "Fee was 0 RWF", "Fee was: 100 RWF", "Fee paid: 350 RWF"
+FEE_PATTERN = re.compile(r'Fee (?:was|paid)\s*:?\s*(\d+(?:,\d+)*)\s*RWF')
+# "Your new balance: 1,200 RWF", "New balance: 800 RWF", "NEW BALANCE :7,200 RWF", "new balance is 5 RWF"
+BALANCE_PATTERN = re.compile(r'new balance\s*(?:is\s*)?:?\s*(\d+(?:,\d+)*)\s*RWF', re.IGNORECASE)
+# The four above as alternatives of one pattern, found in one left-to-right
+# scan. Fee and balance numbers end in "RWF" and a txid may, so whichever
+# number comes first is also the amount (amount_* groups mark those that
+# qualify). The leading lookahead skips positions no alternative can start
+# at, and an amount never starts inside a run of digits.
+FIELDS_PATTERN = re.compile(
+    r'(?=[TFNn\d])(?:'
+    r'(?<!\d)(?P<amount>\d+(?:,\d+)*)\s*RWF'
+    r'|(?:TxId|Financial Transaction Id)\s*:\s*(?:(?=(?P<amount_txid>\d+(?:,\d+)*)\s*RWF))?(?P<txid>\d+)'
+    r'|Fee (?:was|paid)\s*:?\s*(?P<fee>\d+(?:,\d+)*)\s*RWF'
+    r'|(?i:new balance\s*(?:is\s*)?:?\s*)(?P<balance>\d+(?:,\d+)*)\s*(?:(?P<amount_balance>RWF)|(?i:rwf)))')
+
+# Rule table, evaluated in priority order (first match wins):
+#   (transaction_type, markers in body, markers in body.lower(), sender, receiver)
+# sender/receiver are either a fixed string or a compiled pattern whose
+# first group is the name ("Unknown" when it does not match).
+RULES = (
+    ('receive',    (),                        ('received',),   RECEIVE_FROM, 'Account Holder'),
+    ('transfer',   ('*165*S*', 'transferred'), (),              'You',        TRANSFER_TO),
+    ('payment',    ('TxId:',),                ('payment',),    'You',        PAYMENT_TO),
+    ('deposit',    ('*113*R*',),              ('deposit',),    'Bank',       'You'),
+    ('withdrawal', (),                        ('withdrawn',),  'You',        'Unknown'),
+    ('airtime',    ('*162*', 'Airtime'),      (),              'You',        'Unknown'),
+)
+DEFAULT_RULE = ('unknown', (), (), 'You', 'Unknown')
+
+
+def _resolve(field, body):
+    """Return a fixed value, or the first group of a pattern match"""
+    if isinstance(field, str):
+        return field
+    match = field.search(body)
+    return match.group(1).strip() if match else "Unknown"
+
+
+def match_rule(body, lower=None):
+    """Return the first rule whose markers appear in the body"""
+    if lower is None:
+        lower = body.lower()
+    for rule in RULES:
+        for marker in rule[1]:
+            if marker in body:
+                return rule
+        for marker in rule[2]:
+            if marker in lower:
+                return rule
+    return DEFAULT_RULE
+
+
+def extract_txid(body):
+    """Provider transaction id as a string, or None (transfers and deposits carry none)"""
+    match = TXID_PATTERN.search(body)
+    return match.group(1) if match else None
+
+
+def extract_fee(body):
+    """Fee in RWF, or None when the SMS states none"""
+    match = FEE_PATTERN.search(body)
+    return int(match.group(1).replace(',', '')) if match else None
+
+
+def extract_balance(body):
+    """Balance in RWF reported after the transaction, or None"""
+    match = BALANCE_PATTERN.search(body)
+    return int(match.group(1).replace(',', '')) if match else None
+
+
+def categorize(body):
+    """
+    Classify an SMS body and extract its fields
+    Returns (transaction_type, amount, sender, receiver)
+    """
+    match = AMOUNT_PATTERN.search(body)
+    amount = int(match.group(1).replace(',', '')) if match else 0
+
+    tx_type, _, _, sender, receiver = match_rule(body)
+    return tx_type, amount, _resolve(sender, body), _resolve(receiver, body)
+
+
+def scan_fields(body):
+    """(amount, txid, fee, balance) from one pass of FIELDS_PATTERN; amount 0 and the others None when absent"""
+    amount = txid = fee = balance = None
+    for plain, amount_txid, txid_match, fee_match, balance_match, amount_balance in FIELDS_PATTERN.findall(body):
+        if plain:
+            if amount is None:
+                amount = plain
+            continue
+        if txid_match:
+            if txid is None:
+                txid = txid_match
+            if amount is None and amount_txid:
+                amount = amount_txid
+        elif fee_match:
+            if fee is None:
+                fee = int(fee_match.replace(',', ''))
+            if amount is None:
+                amount = fee_match
+        else:
+            if balance is None:
+                balance = int(balance_match.replace(',', ''))
+            if amount is None and amount_balance:
+                amount = balance_match
+    return (int(amount.replace(',', '')) if amount else 0), txid, fee, balance
+
+
+def categorize_full(body):
+    """
+    categorize() plus the operator's fields
+    Returns (transaction_type, amount, sender, receiver, txid, fee, balance)
+    """
+    amount, txid, fee, balance = scan_fields(body)
+    tx_type, _, _, sender, receiver = match_rule(body)
+    return tx_type, amount, _resolve(sender, body), _resolve(receiver, body), txid, fee, balance
+
+
+def categorize_timed(body, timings):
+    """categorize_full() that charges rule matching to 'classify' and field extraction to 'extract'"""
+    start = time.perf_counter()
+    tx_type, _, _, sender, receiver = match_rule(body)
+    matched = time.perf_counter()
+    amount, txid, fee, balance = scan_fields(body)
+    result = tx_type, amount, _resolve(sender, body), _resolve(receiver, body), txid, fee, balance
+    timings.add('classify', matched - start)
+    timings.add('extract', time.perf_counter() - matched)
+    return result
@@ -0,0 +1,120 @@
+"""
+ETL Checkpoint: Watermark + recent-message hashes for incremental runs
+
+Phone backups are cumulative, so each new export repeats everything seen
+before. The checkpoint stores the newest SMS `date` already ingested and
+a content hash of every message within RECENT_WINDOW_MS of it:
+  - date older than the window  -> already ingested, skip
+  - date inside the window      -> skip only if its hash was recorded
+  - date newer than the watermark -> new message
+Only new messages are categorized and appended to the output.
+"""
+import hashlib
+import json
+import os
+
+RECENT_WINDOW_MS = 24 * 60 * 60 * 1000
+PRUNE_THRESHOLD = 100000
+
+
+def checkpoint_path(output_file):
+    """Checkpoint lives next to the output, one per format: data/transactions.json.checkpoint.json"""
+    return output_file + '.checkpoint.json'
+
+
+def sms_digest(sms):
+    """Content hash identifying one SMS across backups"""
+    key = '\x1f'.join((sms.get('date') or '', sms.get('address') or '', sms.get('body') or ''))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def sms_date(sms):
+    """SMS `date` attribute in epoch ms (0 when missing or invalid)"""
+    try:
+        return int(sms.get('date'))
+    except (TypeError, ValueError):
+        return 0
+
+
+class Checkpoint:
+    """Ingestion state from the previous run plus what this run has seen"""
+
+    def __init__(self, watermark=0, last_id=0, recent=None):
+        # State from the previous run (read-only during a run)
+        self.watermark = watermark
+        self.last_id = last_id
+        self.recent = set(recent or ())
+
+        # State accumulated during this run
+        self._max_date = watermark
+        self._seen = {digest: watermark for digest in self.recent}
+        self._prune_at = PRUNE_THRESHOLD
+
+    @classmethod
+    def load(cls, path):
+        """Load a checkpoint, or None if there is no usable one"""
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            return cls(data['watermark'], data['last_id'], data['recent'])
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return None
+
+    def accept(self, sms):
+        """
+        Filter for iter_parse_xml: True if this SMS has not been ingested yet
+        Every message is recorded so the next checkpoint covers it.
+        """
+        date = sms_date(sms)
+        cutoff = self.watermark - RECENT_WINDOW_MS
+        if date < cutoff:
+            return False
+
+        digest = sms_digest(sms)
+        self._record(date, digest)
+        return date > self.watermark or digest not in self.recent
+
+    def _record(self, date, digest):
+        """Remember a message seen in this run, pruning outside the window"""
+        self._seen[digest] = date
+        if date > self._max_date:
+            self._max_date = date
+        if len(self._seen) > self._prune_at:
+            self._prune()
+
+    def _prune(self):
+        cutoff = self._max_date - RECENT_WINDOW_MS
+        self._seen = {d: date for d, date in self._seen.items() if date >= cutoff}
+        self._prune_at = max(PRUNE_THRESHOLD, 2 * len(self._seen))
+
+    def advance(self):
+        """
+        Start the next run from what this one has seen (save + load in memory)
+        For long-running ingestion, where each new backup file is a run.
+        """
+        self._prune()
+        self.watermark = self._max_date
+        self.recent = set(self._seen)
+
+    def discard(self):
+        """
+        Forget what was seen since the last advance()
+        For a file whose rows were not all committed: parsing it again
+        accepts the same messages.
+        """
+        self._max_date = self.watermark
+        self._seen = {digest: self.watermark for digest in self.recent}
+        self._prune_at = PRUNE_THRESHOLD
+
+    def save(self, path, last_id):
+        """Atomically write the checkpoint for the next run"""
+        self._prune()
+        data = {
+            'watermark': self._max_date,
+            'last_id': last_id,
+            'recent': sorted(self._seen),
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,376 @@
+"""
+Columnar Transactions: Array-backed, dictionary-encoded transaction table
+
+A list of dicts costs hundreds of bytes per transaction (dict, ISO string,
+repeated name strings). TransactionColumns stores the same data as:
+  - id, amount, timestamp   -> array('q') int64 columns (timestamp in epoch ms)
+  - transaction_type        -> array('B') codes into a type dictionary
+                               (widened to 'H' past 256 types)
+  - sender, receiver        -> array('I') codes into a shared party dictionary
+  - txid                    -> array('q') of decimal provider ids (-1: none)
+  - fee, balance            -> array('q') RWF as stated in the SMS (-1: none)
+
+Filters produce byte masks (one 0/1 byte per row) that are combined with a
+big-integer AND, and group-bys run over whole columns with C-level
+bytes.translate/compress/sum, stdlib only.
+
+save_columns/load_columns store a table as a binary column file: each
+column is raw fixed-width bytes (8-byte aligned), followed by the string
+dictionaries and a JSON footer with the layout. load_columns mmaps the
+file and exposes the columns as memoryviews, so opening it costs O(size
+of the dictionaries) and rows are only decoded when they are read.
+"""
+import bisect
+import json
+import math
+import mmap
+import struct
+import sys
+from array import array
+from collections import Counter
+from datetime import datetime
+from itertools import compress
+
+COLUMNS = ('id', 'transaction_type', 'amount', 'sender', 'receiver', 'timestamp', 'txid', 'fee', 'balance')
+ARRAYS = ('ids', 'amounts', 'timestamps', 'type_codes', 'sender_codes', 'receiver_codes', 'txids',
+          'fees', 'balances')
+NO_TXID = -1
+NO_VALUE = -1                       # fee / balance the SMS did not state
+
+MAGIC = b'MOMOCOL1'
+TRAILER = struct.Struct('<Q8s')     # footer offset, magic
+
+
+class StringDictionary:
+    """Interned string <-> integer code mapping"""
+
+    def __init__(self, values=()):
+        self.values = []
+        self.codes = {}
+        for value in values:
+            self.encode(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def decode(self, code):
+        return self.values[code]
+
+    def nbytes(self):
+        return (sys.getsizeof(self.values) + sys.getsizeof(self.codes)
+                + sum(sys.getsizeof(v) for v in self.values))
+
+
+def iso_to_ms(timestamp):
+    """ISO timestamp (as written by the ETL, local time) -> epoch ms"""
+    return round(datetime.fromisoformat(timestamp).timestamp() * 1000)
+
+
+def ms_to_iso(ms):
+    """Epoch ms -> ISO timestamp, matching parse_xml.convert_timestamp"""
+    return datetime.fromtimestamp(ms / 1000).isoformat()
+
+
+class TransactionColumns:
+    """Column-oriented transaction table"""
+
+    def __init__(self, types=None, parties=None):
+        self.ids = array('q')
+        self.amounts = array('q')
+        self.timestamps = array('q')
+        self.type_codes = array('B')
+        self.sender_codes = array('I')
+        self.receiver_codes = array('I')
+        self.txids = array('q')
+        self.fees = array('q')
+        self.balances = array('q')
+        self.types = types if types is not None else StringDictionary()
+        self.parties = parties if parties is not None else StringDictionary()
+        self.ids_sorted = True
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_records(cls, transactions):
+        """Build from transaction dicts (list, iter_parse_xml, store, ...)"""
+        columns = cls()
+        for transaction in transactions:
+            columns.append(transaction)
+        return columns
+
+    def append(self, transaction):
+        """Append one transaction dict; amount must be integral"""
+        amount = transaction['amount']
+        if int(amount) != amount:
+            raise ValueError(f"Amount {amount!r} is not integral")
+        if self.ids and transaction['id'] <= self.ids[-1]:
+            self.ids_sorted = False
+        self.ids.append(transaction['id'])
+        self.amounts.append(int(amount))
+        self.timestamps.append(iso_to_ms(transaction['timestamp']))
+        type_code = self.types.encode(transaction['transaction_type'])
+        if type_code > 255 and self.type_codes.typecode == 'B':
+            self.type_codes = array('H', self.type_codes)
+        self.type_codes.append(type_code)
+        self.sender_codes.append(self.parties.encode(transaction['sender']))
+        self.receiver_codes.append(self.parties.encode(transaction['receiver']))
+        self.txids.append(_txid_code(transaction.get('txid')))
+        self.fees.append(_value_code(transaction.get('fee')))
+        self.balances.append(_value_code(transaction.get('balance')))
+
+    def row(self, i):
+        """Materialize row i as a transaction dict"""
+        return {
+            'id': self.ids[i],
+            'transaction_type': self.types.decode(self.type_codes[i]),
+            'amount': self.amounts[i],
+            'sender': self.parties.decode(self.sender_codes[i]),
+            'receiver': self.parties.decode(self.receiver_codes[i]),
+            'timestamp': ms_to_iso(self.timestamps[i]),
+            'txid': self._txid(i),
+            'fee': _optional(self.fees, i),
+            'balance': _optional(self.balances, i),
+        }
+
+    def _txid(self, i):
+        # Files written before the txid column have none
+        code = self.txids[i] if i < len(self.txids) else NO_TXID
+        return None if code == NO_TXID else str(code)
+
+    def find(self, tx_id):
+        """Row position of tx_id, or None (binary search while ids are sorted)"""
+        if self.ids_sorted:
+            i = bisect.bisect_left(self.ids, tx_id)
+            return i if i < len(self.ids) and self.ids[i] == tx_id else None
+        for i, value in enumerate(self.ids):
+            if value == tx_id:
+                return i
+        return None
+
+    def __iter__(self):
+        return self.to_records()
+
+    def to_records(self):
+        """Yield transaction dicts (what the API store and JSON output use)"""
+        for i in range(len(self.ids)):
+            yield self.row(i)
+
+    def nbytes(self):
+        """Approximate memory footprint, including the string dictionaries"""
+        return (sum(len(getattr(self, name)) * getattr(self, name).itemsize for name in ARRAYS)
+                + self.types.nbytes() + self.parties.nbytes())
+
+    # ========== VECTORIZED OPERATIONS ==========
+
+    def _column(self, name):
+        return {
+            'id': self.ids,
+            'amount': self.amounts,
+            'timestamp': self.timestamps,
+            'transaction_type': self.type_codes,
+            'sender': self.sender_codes,
+            'receiver': self.receiver_codes,
+        }[name]
+
+    def _dictionary(self, name):
+        if name == 'transaction_type':
+            return self.types
+        if name in ('sender', 'receiver'):
+            return self.parties
+        return None
+
+    def mask_eq(self, name, value):
+        """Mask (bytes of 0/1) of rows where column == value (strings are encoded)"""
+        column = self._column(name)
+        dictionary = self._dictionary(name)
+        if dictionary is not None:
+            value = dictionary.codes.get(value)
+            if value is None:
+                return bytes(len(column))
+        if column.itemsize == 1:
+            # One-byte codes: a translate table maps the matching code to 1
+            table = bytearray(256)
+            table[value] = 1
+            return column.tobytes().translate(table)
+        return bytes([v == value for v in column])
+
+    def mask_range(self, name, lo=None, hi=None, within=None):
+        """Mask of rows where lo <= column < hi (numeric columns)
+
+        Passing an existing mask as `within` only tests the rows it selects,
+        which is much cheaper after a selective mask_eq.
+        """
+        column = self._column(name)
+        lo = -math.inf if lo is None else lo
+        hi = math.inf if hi is None else hi
+        if within is None:
+            return bytes([lo <= v < hi for v in column])
+        result = bytearray(len(column))
+        for i in compress(range(len(column)), within):
+            if lo <= column[i] < hi:
+                result[i] = 1
+        return bytes(result)
+
+    @staticmethod
+    def mask_and(*masks):
+        """Intersect masks as one big-integer AND"""
+        result = int.from_bytes(masks[0], 'little')
+        for mask in masks[1:]:
+            result &= int.from_bytes(mask, 'little')
+        return result.to_bytes(len(masks[0]), 'little')
+
+    @staticmethod
+    def mask_or(*masks):
+        """Union of masks as one big-integer OR"""
+        result = int.from_bytes(masks[0], 'little')
+        for mask in masks[1:]:
+            result |= int.from_bytes(mask, 'little')
+        return result.to_bytes(len(masks[0]), 'little')
+
+    def select(self, mask):
+        """New table with only the rows where mask is true"""
+        result = TransactionColumns(self.types, self.parties)
+        for name in ARRAYS:
+            source = getattr(self, name)
+            setattr(result, name, array(_typecode(source), compress(source, mask)))
+        result.ids_sorted = self.ids_sorted
+        return result
+
+    def sum(self, name='amount', mask=None):
+        column = self._column(name)
+        return sum(column if mask is None else compress(column, mask))
+
+    def group_by(self, key='transaction_type', value='amount'):
+        """{key: (count, total of value)} over the whole table"""
+        keys = self._column(key)
+        values = self._column(value)
+        dictionary = self._dictionary(key)
+
+        if dictionary is not None and keys.itemsize == 1:
+            # Low cardinality: one translate mask and C-level masked sum per code
+            result = {}
+            for label in dictionary.values:
+                mask = self.mask_eq(key, label)
+                count = mask.count(1)
+                if count:
+                    result[label] = (count, sum(compress(values, mask)))
+            return result
+
+        # High cardinality: C-level Counter for counts, one pass for totals
+        counts = Counter(keys)
+        totals = dict.fromkeys(counts, 0)
+        for k, v in zip(keys, values):
+            totals[k] += v
+        decode = dictionary.decode if dictionary is not None else (lambda k: k)
+        return {decode(k): (counts[k], totals[k]) for k in counts}
+
+
+def fits_columns(transaction):
+    """
+    Whether a transaction comes back from the columns unchanged
+    The ETL's rows always do; rows created through the API may not: a
+    fractional amount, a timestamp with microseconds or a UTC offset, or a
+    txid that is not a decimal provider id.
+    """
+    try:
+        amount = transaction['amount']
+        timestamp = transaction['timestamp']
+        if type(amount) is not int or ms_to_iso(iso_to_ms(timestamp)) != timestamp:
+            return False
+        _txid_code(transaction.get('txid'))
+        for field in ('fee', 'balance'):
+            value = transaction.get(field)
+            if value is not None and type(value) is not int:
+                return False
+            _value_code(value)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return False
+    return True
+
+
+def _txid_code(txid):
+    """txid column value: decimal provider ids only, so the string round-trips"""
+    if txid is None:
+        return NO_TXID
+    if not isinstance(txid, str) or not txid.isdigit() or len(txid) > 18 or str(int(txid)) != txid:
+        raise ValueError(f"Transaction id {txid!r} does not fit the txid column")
+    return int(txid)
+
+
+def _value_code(value):
+    """fee / balance column value: a non-negative integral amount, or NO_VALUE"""
+    if value is None:
+        return NO_VALUE
+    if value < 0 or int(value) != value:
+        raise ValueError(f"Amount {value!r} does not fit an RWF column")
+    return int(value)
+
+
+def _optional(column, i):
+    # Files written before a column was added have none
+    code = column[i] if i < len(column) else NO_VALUE
+    return None if code == NO_VALUE else code
+
+
+def _typecode(column):
+    """array typecode of an array or a cast memoryview"""
+    return getattr(column, 'typecode', None) or column.format
+
+
+# ========== BINARY COLUMN FILE ==========
+
+def save_columns(columns, output_file):
+    """Write a table as a binary column file (see the module docstring)"""
+    layout = {}
+    with open(output_file, 'wb') as f:
+        f.write(MAGIC)
+        for name in ARRAYS + ('types', 'parties'):
+            f.write(b'\0' * (-f.tell() % 8))
+            offset = f.tell()
+            if name in ARRAYS:
+                column = getattr(columns, name)
+                f.write(column.tobytes() if hasattr(column, 'tobytes') else bytes(column))
+                layout[name] = [_typecode(column), offset, f.tell() - offset]
+            else:
+                f.write(json.dumps(getattr(columns, name).values, ensure_ascii=False).encode('utf-8'))
+                layout[name] = [None, offset, f.tell() - offset]
+        footer = {'count': len(columns), 'ids_sorted': columns.ids_sorted,
+                  'byteorder': sys.byteorder, 'layout': layout}
+        footer_offset = f.tell()
+        f.write(json.dumps(footer).encode('utf-8'))
+        f.write(TRAILER.pack(footer_offset, MAGIC))
+    return len(columns)
+
+
+def load_columns(input_file):
+    """
+    Open a binary column file as a read-only TransactionColumns
+    Columns are memoryviews over an mmap; only the dictionaries are decoded.
+    """
+    with open(input_file, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    footer_offset, magic = TRAILER.unpack(mapped[-TRAILER.size:])
+    if mapped[:len(MAGIC)] != MAGIC or magic != MAGIC:
+        raise ValueError(f"{input_file} is not a transaction column file")
+    footer = json.loads(mapped[footer_offset:-TRAILER.size])
+    if footer['byteorder'] != sys.byteorder:
+        raise ValueError(f"{input_file} was written on a {footer['byteorder']}-endian machine")
+
+    view = memoryview(mapped)
+    columns = TransactionColumns()
+    for name, (typecode, offset, length) in footer['layout'].items():
+        if name in ARRAYS:
+            setattr(columns, name, view[offset:offset + length].cast(typecode))
+        else:
+            setattr(columns, name, StringDictionary(json.loads(bytes(view[offset:offset + length]))))
+    columns.ids_sorted = footer['ids_sorted']
+    columns.mapped = mapped
+    return columns
@@ -0,0 +1,236 @@
+"""
+Dedup: Provider transaction ids seen before, checked in O(1) per message
+
+Overlapping backups (several phones, repeated exports) repeat the same SMS,
+and every copy used to become a new transaction. M-Money bodies carry the
+operator's id ("TxId: ...", "Financial Transaction Id: ..."), which the
+parser now keeps as `txid`; a message whose txid was already taken is a
+duplicate. Two layers answer "seen before?":
+  - exact:    a hash map key -> transaction id for the ids taken in this
+              run (ETL) or by this server process (API)
+  - archive:  everything taken before, too big to keep as Python objects
+              (an int in a dict costs ~80 bytes); a Bloom filter in front
+              answers "definitely new" for most messages from a few bytes
+              per id, and only its positives are confirmed by the exact
+              archive (a sorted id file here, the txid index in SQLite)
+
+Keys are txids as 64-bit ints: decimal ids are their own value, anything
+else (other operators, API clients) a blake2b hash in the negative range,
+so both kinds fit one int64 column and never collide with each other.
+"""
+import bisect
+import hashlib
+import heapq
+import math
+import mmap
+import os
+import struct
+from array import array
+
+M64 = (1 << 64) - 1
+GOLDEN = 0x9E3779B97F4A7C15             # Fibonacci hashing: the high bits of key * GOLDEN are well mixed
+DEFAULT_ERROR_RATE = 0.01
+MIN_CAPACITY = 1 << 16
+
+MAGIC = b'MOMOTXID'
+HEADER = struct.Struct('<8sQQQQ')       # magic, id count, capacity, bloom bits, hash count
+
+
+def txid_archive_path(output_file):
+    """Archive lives next to the output, one per format: data/transactions.json.txids"""
+    return output_file + '.txids'
+
+
+def txid_key(txid):
+    """int64 key of a provider txid (a canonical decimal id is its own value)"""
+    if isinstance(txid, int):
+        return txid
+    if txid.isdigit() and len(txid) <= 18 and (txid[0] != '0' or txid == '0'):
+        return int(txid)
+    digest = hashlib.blake2b(txid.encode('utf-8'), digest_size=8).digest()
+    return -1 - (int.from_bytes(digest, 'little') >> 1)
+
+
+class BloomFilter:
+    """
+    Bit array with k hash positions per key: no false negatives
+    Sized for `capacity` keys at `error_rate` false positives
+    (m = -n ln p / ln2^2 bits, k = m/n ln2). The k positions come from one
+    multiplicative hash by double hashing: start at its high 32 bits and
+    step by its (odd) low 32 bits.
+    """
+
+    def __init__(self, capacity, error_rate=DEFAULT_ERROR_RATE, bits=None, hashes=None):
+        self.capacity = max(1, capacity)
+        self.size = bits or max(64, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = hashes or max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        h = (key * GOLDEN) & M64
+        step = (h & 0xFFFFFFFF) | 1
+        position = (h >> 32) % self.size
+        bits = self.bits
+        for _ in range(self.hashes):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+            position = (position + step) % self.size
+        return True
+
+    def add(self, key):
+        h = (key * GOLDEN) & M64
+        step = (h & 0xFFFFFFFF) | 1
+        position = (h >> 32) % self.size
+        bits = self.bits
+        for _ in range(self.hashes):
+            bits[position >> 3] |= 1 << (position & 7)
+            position = (position + step) % self.size
+        self.count += 1
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def nbytes(self):
+        return len(self.bits)
+
+    def error_rate(self):
+        """Expected false-positive rate at the current fill"""
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class TxIdArchive:
+    """
+    Every txid key a previous ETL run produced: sorted int64s plus a Bloom filter
+    The file is mmapped, so opening it reads the Bloom bits only; find()
+    bisects the key column for the few keys the filter lets through.
+    """
+
+    def __init__(self, keys=(), bloom=None, mapped=None):
+        self.keys = keys
+        self.bloom = bloom if bloom is not None else BloomFilter(MIN_CAPACITY)
+        self.mapped = mapped
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def load(cls, path):
+        """Open an archive, or an empty one if the file does not exist"""
+        try:
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return cls()
+        magic, count, capacity, size, hashes = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a txid archive")
+        bloom = BloomFilter(capacity, bits=size, hashes=hashes)
+        start = HEADER.size
+        bloom.bits[:] = mapped[start:start + len(bloom.bits)]
+        bloom.count = count
+        start += len(bloom.bits) + (-len(bloom.bits) % 8)
+        keys = memoryview(mapped)[start:start + count * 8].cast('q')
+        return cls(keys, bloom, mapped)
+
+    def find(self, txid):
+        """True if txid is in the archive, else None (a DedupIndex lookup)"""
+        key = txid_key(txid)
+        i = bisect.bisect_left(self.keys, key)
+        return True if i < len(self.keys) and self.keys[i] == key else None
+
+    def save(self, path, new_keys):
+        """
+        Write this archive plus new_keys (none of them archived yet) to path
+        The Bloom filter is extended in place while it stays within its
+        capacity, and rebuilt at twice the total size once it would not.
+        """
+        new_keys = sorted(new_keys)
+        count = len(self.keys) + len(new_keys)
+        bloom = self.bloom
+        if count > bloom.capacity:
+            bloom = BloomFilter(max(MIN_CAPACITY, 2 * count))
+            bloom.update(self.keys)
+        bloom.update(new_keys)
+        bloom.count = count
+        merged = array('q', heapq.merge(self.keys, new_keys))
+        temp = path + '.tmp'
+        with open(temp, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, count, bloom.capacity, bloom.size, bloom.hashes))
+            f.write(bloom.bits)
+            f.write(b'\0' * (-len(bloom.bits) % 8))
+            merged.tofile(f)
+        os.replace(temp, path)
+        return count
+
+
+class DedupIndex:
+    """
+    Exact map of the txids taken here, in front of an optional archive
+    `lookup(txid)` is the archive's exact check (existing id / True, or
+    None); with a `bloom` over the archive it is only asked about keys the
+    filter cannot rule out. Subscribe it to a store (on_add / on_remove)
+    to follow the API's writes.
+    """
+
+    def __init__(self, bloom=None, lookup=None):
+        self.bloom = bloom
+        self.lookup = lookup
+        self.seen = {}                  # key -> id of the transaction that has it
+        self.duplicates = 0
+        self.lookups = 0                # archive lookups (Bloom positives)
+        self.false_positives = 0        # ... that were not in the archive
+
+    def __len__(self):
+        return len(self.seen)
+
+    def find(self, txid):
+        """Id of the transaction that already has txid (True when only the archive knows), or None"""
+        key = txid_key(txid)
+        tx_id = self.seen.get(key)
+        if tx_id is not None or self.lookup is None:
+            return tx_id
+        if self.bloom is not None and key not in self.bloom:
+            return None
+        self.lookups += 1
+        tx_id = self.lookup(txid)
+        if tx_id is None:
+            self.false_positives += 1
+        return tx_id
+
+    def add(self, txid, tx_id=True):
+        """Record txid as taken by tx_id; returns the earlier owner if it was a duplicate"""
+        existing = self.find(txid)
+        if existing is not None:
+            self.duplicates += 1
+            return existing
+        self.seen[txid_key(txid)] = tx_id
+        return None
+
+    # ========== STORE LISTENER ==========
+
+    def on_add(self, transaction):
+        txid = transaction.get('txid')
+        if txid is not None:
+            self.seen[txid_key(txid)] = transaction['id']
+
+    def on_remove(self, transaction):
+        txid = transaction.get('txid')
+        if txid is not None and self.seen.get(txid_key(txid)) == transaction['id']:
+            del self.seen[txid_key(txid)]
+
+
+def drop_duplicates(transactions, index, start_id=1):
+    """Yield the transactions whose txid is new to index, renumbered from start_id"""
+    tx_id = start_id
+    for transaction in transactions:
+        txid = transaction.get('txid')
+        if txid is not None and index.add(txid, tx_id) is not None:
+            continue
+        transaction['id'] = tx_id
+        tx_id += 1
+        yield transaction
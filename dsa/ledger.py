@@ -0,0 +1,267 @@
+"""
+Ledger: The account's running balance rebuilt from its transactions
+
+Every M-Money SMS moves the balance by a known delta (a credit adds the
+amount, a debit takes the amount plus the fee) and most of them state the
+balance the operator holds afterwards. Replaying the deltas in time order
+reconstructs the balance at any moment; where it stops agreeing with what
+the SMS said, messages are missing (a gap) or counted twice.
+
+The reconstruction works on whole array('q') columns:
+  - deltas:      amount & credit - (amount + fee) & debit, computed on the
+                 columns packed into one big int per column, 64 bits per
+                 row (Lanes); credit / debit lane masks come from the type
+                 codes through bytes.translate
+  - prefix:      itertools.accumulate(deltas), the balance relative to the
+                 opening one
+  - checkpoints: the rows that state a balance, and per checkpoint
+                 `offset` = stated balance - prefix. A consistent history
+                 has one offset (the opening balance); every change of
+                 offset is a divergence, by exactly the money unaccounted for
+  - balance_at:  bisect the time column, bisect the checkpoint before it:
+                 offset + prefix, O(log n) per query
+"""
+import bisect
+from array import array
+from collections import namedtuple
+from itertools import accumulate, compress, islice
+from numbers import Number
+
+from columnar import iso_to_ms, ms_to_iso, NO_VALUE
+
+CREDIT_TYPES = ('receive', 'deposit')
+DEBIT_TYPES = ('payment', 'transfer', 'withdrawal', 'airtime')
+CREDIT, DEBIT = 1, 2                    # type code -> kind table values
+
+LANE = (1 << 64) - 1
+
+Divergence = namedtuple('Divergence', 'id timestamp reported expected gap')
+
+
+def transaction_delta(transaction_type, amount, fee):
+    """Balance change of one transaction (the per-row rule the columns vectorize)"""
+    if transaction_type in CREDIT_TYPES:
+        return amount
+    if transaction_type in DEBIT_TYPES:
+        return -(amount + (fee or 0))
+    return 0
+
+
+def _money(value):
+    """Integral RWF value, or None for missing / non-numeric"""
+    if isinstance(value, Number) and not isinstance(value, bool) and int(value) == value:
+        return int(value)
+    return None
+
+
+class Lanes:
+    """
+    Arithmetic on n int64 values packed into one Python int (64-bit lanes)
+    Adding, masking and shifting a multi-million-digit int runs in C over
+    machine words, so one operation handles a whole column. Lanes wrap
+    mod 2**64 like int64: the add keeps each lane's carry out of its
+    neighbour by adding the low 63 bits and xor-ing the top bits back in.
+    """
+
+    def __init__(self, n):
+        self.n = n
+        self.ones = int.from_bytes(b'\1\0\0\0\0\0\0\0' * n, 'little')   # 1 in every lane
+        self.high = self.ones << 63                                     # top bit of every lane
+        self.full = (1 << 64 * n) - 1
+        self.low = self.full ^ self.high
+
+    def pack(self, column):
+        return int.from_bytes(column, 'little')
+
+    def unpack(self, value):
+        return _unpack(value & self.full, self.n)
+
+    def spread(self, data):
+        """One byte per row -> the row's lane holds that byte"""
+        lanes = bytearray(8 * self.n)
+        lanes[0::8] = data
+        return int.from_bytes(lanes, 'little')
+
+    def add(self, x, y):
+        return ((x & self.low) + (y & self.low)) ^ ((x ^ y) & self.high)
+
+    def neg(self, x):
+        return self.add(x ^ self.full, self.ones)
+
+    def sub(self, x, y):
+        return self.add(x, self.neg(y))
+
+    def negative(self, x):
+        """Mask of all-ones lanes where x is negative"""
+        return ((x & self.high) >> 63) * LANE
+
+    def nonnegative_bytes(self, x):
+        """One byte per row, non-zero where x >= 0 (compress() selectors)"""
+        return ((x & self.high) ^ self.high).to_bytes(8 * self.n, 'little')[7::8]
+
+
+class Ledger:
+    """
+    Reconstructed balance over time-ordered columns
+    Build with from_columns (a TransactionColumns, whole-column arithmetic)
+    or from_records (transaction dicts from any store).
+    """
+
+    def __init__(self, times, ids, deltas, balances, fees=0, undated=0):
+        """times, ids, deltas, balances (NO_VALUE: not stated): array('q') in (time, id) order"""
+        n = len(times)
+        self.times = times
+        self.ids = ids
+        self.balances = balances
+        self.fees = fees
+        self.undated = undated                  # rows left out: no parseable timestamp
+        self.prefix = array('q', accumulate(deltas))
+        lanes = Lanes(n)
+        packed = lanes.pack(balances)
+        offsets = lanes.unpack(lanes.sub(packed, lanes.pack(self.prefix)))
+        stated = lanes.nonnegative_bytes(packed)
+        if stated.count(0):
+            self.checkpoints = array('q', compress(range(n), stated))
+            self.offsets = array('q', compress(offsets, stated))
+        else:
+            # Every row states its balance: each one is a checkpoint
+            self.checkpoints = range(n)
+            self.offsets = offsets
+        self.opening = self.offsets[0] if self.offsets else 0
+        # A divergence is a checkpoint whose offset differs from the previous one
+        m = len(self.offsets)
+        self.flagged = array('q')
+        if m > 1:
+            packed = int.from_bytes(self.offsets, 'little')
+            changes = _unpack(packed ^ (packed >> 64), m)     # lane k: offsets[k] ^ offsets[k + 1]
+            self.flagged = array('q', compress(range(1, m), islice(changes, m - 1)))
+
+    def __len__(self):
+        return len(self.times)
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Ledger of a TransactionColumns (also a load_columns file)"""
+        n = len(columns)
+        lanes = Lanes(n)
+        kinds = lanes.spread(_kinds(columns.type_codes, columns.types.codes))
+        credit = (kinds & lanes.ones) * LANE
+        debit = ((kinds >> 1) & lanes.ones) * LANE
+        amounts = lanes.pack(columns.amounts)
+        # Files written before the fee / balance columns state neither
+        fees = lanes.pack(columns.fees) if len(columns.fees) == n else 0
+        fees &= lanes.full ^ lanes.negative(fees)           # NO_VALUE -> 0
+        costs = lanes.add(amounts, fees) & debit
+        deltas = lanes.unpack((amounts & credit) | lanes.neg(costs))
+        total_fees = sum(lanes.unpack(fees & debit))
+        balances = columns.balances if len(columns.balances) == n else array('q', [NO_VALUE]) * n
+
+        times, ids = columns.timestamps, columns.ids
+        packed = lanes.pack(times)
+        in_order = not lanes.nonnegative_bytes(lanes.sub(packed >> 64, packed))[:-1].count(0)
+        if not columns.ids_sorted or not in_order:
+            order = range(n)
+            if not columns.ids_sorted:
+                order = sorted(order, key=ids.__getitem__)
+            order = sorted(order, key=times.__getitem__)
+            times, ids, deltas, balances = (array('q', map(column.__getitem__, order))
+                                            for column in (times, ids, deltas, balances))
+        return cls(times, ids, deltas, balances, total_fees)
+
+    @classmethod
+    def from_records(cls, transactions):
+        """Ledger of transaction dicts; rows without a parseable timestamp are counted in `undated`"""
+        rows = []
+        undated = 0
+        total_fees = 0
+        for transaction in transactions:
+            try:
+                ms = iso_to_ms(transaction['timestamp'])
+            except (KeyError, TypeError, ValueError):
+                undated += 1
+                continue
+            transaction_type = transaction.get('transaction_type')
+            amount = _money(transaction.get('amount')) or 0
+            fee = _money(transaction.get('fee')) or 0
+            if transaction_type in DEBIT_TYPES:
+                total_fees += fee
+            balance = _money(transaction.get('balance'))
+            rows.append((ms, transaction['id'], transaction_delta(transaction_type, amount, fee),
+                         NO_VALUE if balance is None or balance < 0 else balance))
+        rows.sort()
+        columns = [array('q', column) for column in zip(*rows)] or [array('q') for _ in range(4)]
+        return cls(*columns, fees=total_fees, undated=undated)
+
+    # ========== QUERIES ==========
+
+    def balance(self, i):
+        """Balance after row i, carried from the last stated balance at or before it"""
+        k = bisect.bisect_right(self.checkpoints, i) - 1
+        return (self.offsets[k] if k >= 0 else self.opening) + self.prefix[i]
+
+    def balance_at(self, ms):
+        """
+        Balance at epoch ms: {'balance', 'reconstructed', 'transactions', 'last', 'checkpoint'}
+        balance is carried from the last balance an SMS stated before ms;
+        reconstructed replays every delta from the opening balance.
+        """
+        i = bisect.bisect_right(self.times, ms) - 1
+        if i < 0:
+            return {'balance': self.opening, 'reconstructed': self.opening, 'transactions': 0,
+                    'last': None, 'checkpoint': None}
+        k = bisect.bisect_right(self.checkpoints, i) - 1
+        checkpoint = None
+        if k >= 0:
+            row = self.checkpoints[k]
+            checkpoint = {'id': self.ids[row], 'timestamp': ms_to_iso(self.times[row]),
+                          'reported': self.balances[row]}
+        return {'balance': (self.offsets[k] if k >= 0 else self.opening) + self.prefix[i],
+                'reconstructed': self.opening + self.prefix[i], 'transactions': i + 1,
+                'last': {'id': self.ids[i], 'timestamp': ms_to_iso(self.times[i])},
+                'checkpoint': checkpoint}
+
+    def divergences(self, limit=None):
+        """Rows whose stated balance disagrees with the one carried from the previous statement"""
+        result = []
+        for k in islice(self.flagged, limit):
+            row = self.checkpoints[k]
+            gap = self.offsets[k] - self.offsets[k - 1]
+            reported = self.balances[row]
+            result.append(Divergence(self.ids[row], ms_to_iso(self.times[row]), reported, reported - gap, gap))
+        return result
+
+    def summary(self, limit=20):
+        """Reconciliation report: balances, divergence count and the first `limit` divergences"""
+        closing = self.opening + self.prefix[-1] if self.prefix else self.opening
+        return {
+            'transactions': len(self),
+            'undated': self.undated,
+            'with_balance': len(self.checkpoints),
+            'opening_balance': self.opening,
+            'closing_balance': closing,
+            'balance': self.balance(len(self) - 1) if len(self) else self.opening,
+            'unexplained': self.offsets[-1] - self.opening if self.offsets else 0,
+            'total_fees': self.fees,
+            'divergences': len(self.flagged),
+            'flagged': [d._asdict() for d in self.divergences(limit)],
+        }
+
+
+def _unpack(value, n):
+    """array('q') of the n lanes of a non-negative packed int"""
+    column = array('q')
+    column.frombytes(value.to_bytes(8 * n, 'little'))
+    return column
+
+
+def _kinds(type_codes, codes):
+    """One byte per row: CREDIT, DEBIT or 0 for its transaction type"""
+    byte_codes = (getattr(type_codes, 'typecode', None) or type_codes.format) == 'B'
+    table = bytearray(256 if byte_codes else max(len(codes), 1))
+    for types, kind in ((CREDIT_TYPES, CREDIT), (DEBIT_TYPES, DEBIT)):
+        for name in types:
+            if name in codes:
+                table[codes[name]] = kind
+    if byte_codes:
+        return bytes(type_codes).translate(table)
+    return bytes(map(table.__getitem__, type_codes))
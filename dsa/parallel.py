@@ -0,0 +1,99 @@
+"""
+Parallel ETL: Shard SMS backups by byte range and parse them in a process pool
+
+Attribute values in well-formed XML cannot contain a raw '<', so every
+'<sms' in the file starts an element. Shards are byte ranges snapped to
+those element starts; each worker parses its slice on its own and returns
+compact rows. Shards are merged in file/byte order, so ids come out
+contiguous and identical to the serial tx_id counter.
+"""
+import glob
+import io
+import os
+import re
+from multiprocessing import Pool
+
+from parse_xml import iter_parse_xml
+
+SMS_START = re.compile(rb'<sms[\s/>]')
+SMSES_END = b'</smses>'
+DEFAULT_SHARD_SIZE = 16 * 1024 * 1024
+FIELDS = ('transaction_type', 'amount', 'sender', 'receiver', 'timestamp', 'txid', 'fee', 'balance')
+
+
+def expand_inputs(paths):
+    """Expand files, directories (*.xml inside) and glob patterns, in order"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*.xml'))))
+        elif glob.has_magic(path):
+            files.extend(sorted(glob.glob(path)))
+        else:
+            files.append(path)
+    return files
+
+
+def _snap(f, offset, file_size):
+    """Return the offset of the first <sms element at or after `offset`"""
+    overlap = 64
+    while offset < file_size:
+        f.seek(offset)
+        chunk = f.read(1024 * 1024 + overlap)
+        match = SMS_START.search(chunk)
+        if match:
+            return offset + match.start()
+        if len(chunk) <= overlap:
+            break
+        offset += len(chunk) - overlap
+    return file_size
+
+
+def plan_shards(xml_file, shard_size=DEFAULT_SHARD_SIZE):
+    """Split one file into (path, start, end) byte ranges on <sms boundaries"""
+    file_size = os.path.getsize(xml_file)
+    shards = []
+    with open(xml_file, 'rb') as f:
+        start = _snap(f, 0, file_size)
+        while start < file_size:
+            end = _snap(f, start + shard_size, file_size)
+            shards.append((xml_file, start, end))
+            start = end
+    return shards
+
+
+def parse_shard(shard):
+    """Worker: parse one byte range and return transaction rows without ids"""
+    xml_file, start, end = shard
+    with open(xml_file, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    closing = data.rfind(SMSES_END)
+    if closing != -1:
+        data = data[:closing]
+
+    # Re-wrap the slice so it is a standalone <smses> document
+    document = io.BytesIO(b'<smses>' + data + SMSES_END)
+    return [tuple(tx[field] for field in FIELDS) for tx in iter_parse_xml(document)]
+
+
+def parallel_parse(xml_files, workers, shard_size=DEFAULT_SHARD_SIZE, start_id=1):
+    """
+    Parse many backup files across a process pool
+    Yields transaction dicts in the same order, with the same ids, as
+    parsing the files one after another with iter_parse_xml
+    """
+    shards = []
+    for xml_file in xml_files:
+        shards.extend(plan_shards(xml_file, shard_size))
+
+    tx_id = start_id
+    with Pool(processes=workers) as pool:
+        # imap keeps shard order, so ids are deterministic and contiguous
+        for rows in pool.imap(parse_shard, shards):
+            for row in rows:
+                transaction = {'id': tx_id}
+                transaction.update(zip(FIELDS, row))
+                yield transaction
+                tx_id += 1
@@ -3,9 +3,15 @@ XML Parser: Convert SMS records from XML to JSON
 """
 import xml.etree.ElementTree as ET
 import json
+import os
 import re
+import time
+from itertools import islice
 from datetime import datetime
 
+from categorize import categorize_full, categorize_timed
+from columnar import TransactionColumns, save_columns, load_columns
+
 
 def parse_xml(xml_file):
     """Parse XML and return list of transaction dictionaries"""
@@ -16,39 +22,116 @@ def parse_xml(xml_file):
     tx_id = 1
     
     for sms in root.findall('sms'):
-        body = sms.get('body', '')
-        
-        # Skip OTP and empty messages
-        if "one-time password" in body or not body.strip():
+        transaction = sms_to_transaction(sms, tx_id)
+        if transaction:
+            transactions.append(transaction)
+            tx_id += 1
+    
+    return transactions
+
+
+def iter_parse_xml(xml_file, start_id=1, accept=None, timings=None, keep_body=False):
+    """
+    Stream transactions from XML one at a time
+    Uses iterparse and clears each processed <sms> element, so memory
+    stays flat regardless of the size of the backup file.
+    `accept` is an optional predicate on the raw <sms> element; rejected
+    messages are skipped before categorization (see checkpoint.py).
+    `timings` is an optional StageTimings that gets read/classify/extract
+    time (see timings.py). With keep_body, each record also carries the raw
+    SMS text as "body" (for the API's search index).
+    """
+    context = ET.iterparse(xml_file, events=('start', 'end'))
+    _, root = next(context)
+    tx_id = start_id
+    if timings is not None:
+        context = timings.timed('read', _sms_elements(context))
+    
+    for event, sms in context:
+        if event != 'end' or sms.tag != 'sms':
             continue
         
-        sms_date = sms.get('date')
-        address = sms.get('address', 'Unknown')
+        if accept is None or accept(sms):
+            transaction = sms_to_transaction(sms, tx_id, timings, keep_body)
+        else:
+            transaction = None
+        
+        # Drop the processed element (and its reference from <smses>)
+        sms.clear()
+        root.clear()
         
-        # Process M-Money transactions only
-        if address == 'M-Money':
-            # Extract data from SMS
-            amount = extract_amount(body)
-            tx_type = get_transaction_type(body)
-            sender = extract_sender(body, tx_type)
-            receiver = extract_receiver(body, tx_type)
-            timestamp = convert_timestamp(sms_date)
-            
-            if amount > 0:
-                transaction = {
-                    'id': tx_id,
-                    'transaction_type': tx_type,
-                    'amount': amount,
-                    'sender': sender,
-                    'receiver': receiver,
-                    'timestamp': timestamp
-                }
-                transactions.append(transaction)
-                tx_id += 1
+        if transaction:
+            yield transaction
+            tx_id += 1
+
+
+def _sms_elements(context):
+    """Only the ('end', <sms>) events of an iterparse context"""
+    for event, element in context:
+        if event == 'end' and element.tag == 'sms':
+            yield event, element
+
+
+def parse_xml_columns(xml_file):
+    """Parse XML into a columnar TransactionColumns table (see columnar.py)"""
+    return TransactionColumns.from_records(iter_parse_xml(xml_file))
+
+
+def sms_to_transaction(sms, tx_id, timings=None, keep_body=False):
+    """Convert a single <sms> element to a transaction dict (or None)"""
+    body = sms.get('body', '')
     
-    return transactions
+    # Skip OTP and empty messages
+    if "one-time password" in body or not body.strip():
+        return None
+    
+    sms_date = sms.get('date')
+    address = sms.get('address', 'Unknown')
+    
+    # Process M-Money transactions only
+    if address != 'M-Money':
+        return None
+    
+    # Classify and extract all fields: one rule match, one scan for the numbers (see categorize.py)
+    if timings is None:
+        tx_type, amount, sender, receiver, txid, fee, balance = categorize_full(body)
+    else:
+        tx_type, amount, sender, receiver, txid, fee, balance = categorize_timed(body, timings)
+    
+    if amount <= 0:
+        return None
+    
+    if timings is None:
+        timestamp = convert_timestamp(sms_date) or convert_timestamp(sms.get('date_sent'))
+    else:
+        start = time.perf_counter()
+        timestamp = convert_timestamp(sms_date) or convert_timestamp(sms.get('date_sent'))
+        timings.add('extract', time.perf_counter() - start, 0)
+    
+    # Without a valid date the message cannot be placed in time; stamping it
+    # with the parse time would put it out of order, so it is skipped
+    if timestamp is None:
+        return None
+    
+    transaction = {
+        'id': tx_id,
+        'transaction_type': tx_type,
+        'amount': amount,
+        'sender': sender,
+        'receiver': receiver,
+        'timestamp': timestamp,
+        'txid': txid,
+        'fee': fee,
+        'balance': balance
+    }
+    if keep_body:
+        transaction['body'] = body
+    return transaction
 
 
+# Reference extractors: categorize.categorize must stay equivalent to these
+# (and categorize.categorize_full to them plus extract_txid / extract_fee / extract_balance)
+
 def extract_amount(body):
     """Extract amount from SMS body"""
     matches = re.findall(r'(\d+(?:,\d+)*)\s*RWF', body)
@@ -103,15 +186,117 @@ def extract_receiver(body, tx_type):
 
 
 def convert_timestamp(ms_timestamp):
-    """Convert milliseconds to ISO format"""
+    """Convert milliseconds to ISO format (None if missing or not a valid epoch ms)"""
     try:
         return datetime.fromtimestamp(int(ms_timestamp) / 1000).isoformat()
-    except:
-        return datetime.now().isoformat()
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
 
 
-def save_to_json(transactions, output_file):
-    """Save transactions to JSON file"""
+def save_to_json(transactions, output_file, quiet=False):
+    """
+    Save transactions to JSON file
+    Accepts a list or any iterable (e.g. iter_parse_xml) and writes records
+    one at a time, so a generator is never materialized in memory.
+    Output is identical to json.dump(..., indent=2). quiet=True skips the
+    "Saved" line (for callers writing from a background thread).
+    """
+    count = 0
     with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(transactions, f, indent=2, ensure_ascii=False)
-    print(f"✓ Saved {len(transactions)} transactions to {output_file}")
+        for transaction in transactions:
+            record = json.dumps(transaction, indent=2, ensure_ascii=False)
+            f.write('[\n  ' if count == 0 else ',\n  ')
+            f.write(record.replace('\n', '\n  '))
+            count += 1
+        f.write('\n]' if count else '[]')
+    if not quiet:
+        print(f"✓ Saved {count} transactions to {output_file}")
+    return count
+
+
+def append_to_json(transactions, output_file):
+    """
+    Append transactions to an existing JSON array written by save_to_json
+    Only the closing bracket is rewritten, so the cost is O(new records).
+    """
+    if not os.path.exists(output_file):
+        return save_to_json(transactions, output_file)
+    
+    count = 0
+    with open(output_file, 'r+b') as f:
+        # Locate the end of the last element (or the opening '[') before ']'
+        f.seek(0, os.SEEK_END)
+        tail_start = max(0, f.tell() - 64)
+        f.seek(tail_start)
+        tail = f.read().rstrip()
+        if not tail.endswith(b']'):
+            raise ValueError(f"{output_file} is not a JSON array")
+        body = tail[:-1].rstrip()
+        empty = body.endswith(b'[')
+        
+        f.seek(tail_start + len(body))
+        f.truncate()
+        for transaction in transactions:
+            record = json.dumps(transaction, indent=2, ensure_ascii=False)
+            prefix = '\n  ' if empty and count == 0 else ',\n  '
+            f.write((prefix + record.replace('\n', '\n  ')).encode('utf-8'))
+            count += 1
+        f.write(b']' if empty and count == 0 else b'\n]')
+    print(f"✓ Appended {count} transactions to {output_file}")
+    return count
+
+
+def save_to_ndjson(transactions, output_file, append=False, quiet=False):
+    """
+    Save transactions as NDJSON: one compact JSON object per line
+    Streams like save_to_json; append=True adds to an existing file.
+    """
+    count = 0
+    with open(output_file, 'a' if append else 'w', encoding='utf-8') as f:
+        for transaction in transactions:
+            f.write(json.dumps(transaction, ensure_ascii=False, separators=(',', ':')))
+            f.write('\n')
+            count += 1
+    if not quiet:
+        print(f"✓ {'Appended' if append else 'Saved'} {count} transactions to {output_file}")
+    return count
+
+
+def iter_ndjson(input_file, batch_size=10000):
+    """
+    Yield transactions from an NDJSON file
+    Lines are decoded in batches as one JSON array: a single C-level call
+    per batch, and the decoder shares key strings within a batch instead
+    of allocating six new ones per line.
+    """
+    with open(input_file, 'r', encoding='utf-8') as f:
+        while True:
+            batch = list(islice(f, batch_size))
+            if not batch:
+                return
+            lines = [line for line in batch if line.strip()]
+            if lines:
+                yield from json.loads('[' + ','.join(lines) + ']')
+
+
+def save_to_binary(transactions, output_file, quiet=False):
+    """Save transactions as a binary column file (see columnar.save_columns)"""
+    count = save_columns(TransactionColumns.from_records(transactions), output_file)
+    if not quiet:
+        print(f"✓ Saved {count} transactions to {output_file}")
+    return count
+
+
+def load_records(input_file):
+    """
+    Load transactions from any ETL output format, chosen by extension
+      .ndjson -> generator of dicts
+      .col    -> mmapped TransactionColumns (iterates as dicts)
+      other   -> list from the JSON array
+    """
+    if input_file.endswith('.ndjson'):
+        return iter_ndjson(input_file)
+    if input_file.endswith('.col'):
+        return load_columns(input_file)
+    with open(input_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
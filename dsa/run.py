@@ -1,30 +1,144 @@
 #!/usr/bin/env python3
-"""ETL Pipeline: Parse XML to JSON"""
+"""ETL Pipeline: Parse XML to JSON (or NDJSON / binary columns)"""
 
+import argparse
 import sys
 import os
+import time
 
 # Get parent directory (repo root)
 repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, os.path.join(repo_root, 'dsa'))
+launch_dir = os.getcwd()
 os.chdir(repo_root)
 
-from parse_xml import parse_xml, save_to_json
+from parse_xml import iter_parse_xml, save_to_json, append_to_json, save_to_ndjson, save_to_binary
+from parallel import expand_inputs, parallel_parse, DEFAULT_SHARD_SIZE
+from checkpoint import Checkpoint, checkpoint_path
+from dedup import DedupIndex, TxIdArchive, drop_duplicates, txid_archive_path
+from timings import StageTimings
 
 XML_FILE = "raw/momo.xml"
 JSON_OUTPUT = "data/transactions.json"
+EXTENSIONS = {'json': '.json', 'ndjson': '.ndjson', 'binary': '.col'}
 
-def main():
+
+def serial_parse(xml_files, start_id=1, accept=None, timings=None, keep_body=False):
+    """Stream files one after another, continuing the id sequence"""
+    next_id = start_id
+    for xml_file in xml_files:
+        for transaction in iter_parse_xml(xml_file, start_id=next_id, accept=accept, timings=timings,
+                                          keep_body=keep_body):
+            next_id = transaction['id'] + 1
+            yield transaction
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Parse SMS backup XML into transactions JSON")
+    parser.add_argument('inputs', nargs='*', default=[XML_FILE],
+                        help="XML files, directories or glob patterns (default: raw/momo.xml)")
+    parser.add_argument('-o', '--output', help="output file (default: data/transactions + format extension)")
+    parser.add_argument('--format', choices=sorted(EXTENSIONS), default='json',
+                        help="json array, ndjson lines or binary columns for mmap loading (default: json)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="parser processes; 1 streams serially (default: 1)")
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE,
+                        help="bytes per parallel shard (default: 16 MiB)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="append only SMS not seen by the previous run (uses the checkpoint)")
+    parser.add_argument('--timings', action='store_true',
+                        help="report time per stage: read, classify, extract, serialize")
+    parser.add_argument('--metrics-file',
+                        help="also write the stage timings in Prometheus text format to this file")
+    parser.add_argument('--keep-body', action='store_true',
+                        help="keep the raw SMS text as a \"body\" field, for the API's search index")
+    args = parser.parse_args(argv)
+    if args.incremental and args.workers > 1:
+        parser.error("--incremental runs serially; drop --workers")
+    if args.keep_body and (args.workers > 1 or args.format == 'binary'):
+        parser.error("--keep-body needs a serial run with --format json or ndjson")
+    if args.incremental and args.format == 'binary':
+        parser.error("--incremental appends; use --format json or ndjson")
+    if args.output is None:
+        args.output = os.path.splitext(JSON_OUTPUT)[0] + EXTENSIONS[args.format]
+    
+    # Paths given on the command line are relative to where we were launched
+    args.inputs = [os.path.join(launch_dir, path) for path in args.inputs]
+    args.output = os.path.join(launch_dir, args.output)
+    if args.metrics_file:
+        args.metrics_file = os.path.join(launch_dir, args.metrics_file)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    xml_files = expand_inputs(args.inputs)
+    
     print("ETL Pipeline Starting...\n")
     
-    # Parse XML
-    print(f"1. Parsing: {XML_FILE}")
-    transactions = parse_xml(XML_FILE)
-    print(f"   ✓ {len(transactions)} transactions parsed\n")
+    # Parse XML and save JSON in one streaming pass
+    print(f"1. Parsing: {', '.join(os.path.relpath(f) for f in xml_files)}")
+    print(f"2. Saving: {os.path.relpath(args.output)}")
+    state_file = checkpoint_path(args.output)
+    archive_file = txid_archive_path(args.output)
+    checkpoint = Checkpoint.load(state_file) if args.incremental else None
+    timings = StageTimings() if args.timings or args.metrics_file else None
+    waited = StageTimings()
+    started = time.perf_counter()
+    
+    if checkpoint and os.path.exists(args.output):
+        print(f"   Incremental: after id {checkpoint.last_id}, watermark {checkpoint.watermark}")
+        archive = TxIdArchive.load(archive_file)
+        txids = DedupIndex(archive.bloom, archive.find)
+        transactions = serial_parse(xml_files, checkpoint.last_id + 1, checkpoint.accept, timings, args.keep_body)
+        transactions = drop_duplicates(transactions, txids, checkpoint.last_id + 1)
+        if timings:
+            transactions = waited.timed('parse', transactions)
+        if args.format == 'ndjson':
+            count = save_to_ndjson(transactions, args.output, append=True)
+        else:
+            count = append_to_json(transactions, args.output)
+        last_id = checkpoint.last_id + count
+    else:
+        checkpoint = Checkpoint()
+        archive = TxIdArchive()
+        txids = DedupIndex()
+        if args.workers > 1:
+            print(f"   Using {args.workers} worker processes")
+            transactions = parallel_parse(xml_files, args.workers, args.shard_size)
+        else:
+            transactions = serial_parse(xml_files, accept=checkpoint.accept, timings=timings, keep_body=args.keep_body)
+        transactions = drop_duplicates(transactions, txids)
+        if timings:
+            transactions = waited.timed('parse', transactions)
+        save = {'json': save_to_json, 'ndjson': save_to_ndjson, 'binary': save_to_binary}[args.format]
+        count = save(transactions, args.output)
+        last_id = count
+    print(f"   ✓ {count} transactions parsed")
+    if txids.duplicates:
+        print(f"   ✓ {txids.duplicates} duplicate SMS dropped (provider TxId seen before)")
+    
+    if timings:
+        # Whatever the writer did not spend waiting on the parser is serialization;
+        # worker processes are not instrumented, so parallel runs report parse as one stage
+        wall = time.perf_counter() - started
+        if args.workers > 1:
+            timings.add('parse', waited.seconds['parse'], count)
+        timings.add('serialize', wall - waited.seconds['parse'], count)
+        print(f"\n   Stage timings ({wall:.2f}s wall):")
+        print('\n'.join(timings.report(wall)))
+        if args.metrics_file:
+            with open(args.metrics_file, 'w') as f:
+                f.write('\n'.join(timings.prometheus()) + '\n')
+            print(f"   ✓ Metrics written to {os.path.relpath(args.metrics_file)}")
     
-    # Save JSON
-    print(f"2. Saving: {JSON_OUTPUT}")
-    save_to_json(transactions, JSON_OUTPUT)
+    # Parallel runs do not record message hashes, so they leave no checkpoint
+    if args.workers > 1:
+        if os.path.exists(state_file):
+            os.remove(state_file)
+    else:
+        checkpoint.save(state_file, last_id)
+    archive.save(archive_file, txids.seen)
     
     print("\n✓ Done!")
     return 0
@@ -1,21 +1,36 @@
 """
-DSA Integration: Linear Search vs Dictionary Lookup Performance Comparison
+DSA Integration: Transaction lookup by ID, four approaches compared
 
-This module compares two approaches to finding transactions by ID:
-1. Linear Search - O(n) time complexity, iterate through list
+This module compares approaches to finding transactions by ID:
+1. Linear Search     - O(n) time complexity, iterate through list
 2. Dictionary Lookup - O(1) time complexity, hash table access
+3. Binary Search     - O(log n) time complexity, bisect a sorted id array
+4. Indexed Store     - O(1), the REST API's TransactionStore.get
+
+Each method gets a warm-up pass and several timed repetitions; results
+are reported as median and interquartile range (IQR) per search. For
+scaling curves over synthetic data and regression checks, see
+benchmarks/harness.py.
 """
 
+import argparse
+import bisect
 import json
+import statistics
+import sys
 import time
 import os
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+
+from parse_xml import load_records
+from store import TransactionStore
+
 
 def load_transactions(json_file):
-    """Load transactions from JSON file"""
+    """Load transactions from the ETL output (.json, .ndjson or .col)"""
     try:
-        with open(json_file, 'r') as f:
-            return json.load(f)
+        return list(load_records(json_file))
     except FileNotFoundError:
         print(f"✗ File not found: {json_file}")
         return []
@@ -48,160 +63,160 @@ def create_transaction_dict(transactions):
     return {tx['id']: tx for tx in transactions}
 
 
-def benchmark_search(transactions, test_ids, num_iterations=100):
+def binary_search(sorted_ids, sorted_transactions, target_id):
+    """
+    Binary Search - O(log n) complexity
+    Bisect the sorted id array, then index the parallel transaction list
+    """
+    i = bisect.bisect_left(sorted_ids, target_id)
+    if i < len(sorted_ids) and sorted_ids[i] == target_id:
+        return sorted_transactions[i]
+    return None
+
+
+def create_sorted_index(transactions):
+    """Sort transactions by id; returns (ids, transactions) for binary search"""
+    ordered = sorted(transactions, key=lambda tx: tx['id'])
+    return [tx['id'] for tx in ordered], ordered
+
+
+def store_lookup(store, target_id):
+    """
+    Indexed Store - O(1) complexity
+    TransactionStore.get, as used by the REST API (hash index behind a lock)
+    """
+    return store.get(target_id)
+
+
+def search_methods(transactions):
+    """Build every lookup structure; returns [(name, complexity, search(target_id))]"""
+    tx_dict = create_transaction_dict(transactions)
+    sorted_ids, sorted_transactions = create_sorted_index(transactions)
+    store = TransactionStore(transactions)
+    return [
+        ('Linear Search', 'O(n)', lambda target_id: linear_search(transactions, target_id)),
+        ('Dictionary Lookup', 'O(1)', lambda target_id: dictionary_lookup(tx_dict, target_id)),
+        ('Binary Search', 'O(log n)', lambda target_id: binary_search(sorted_ids, sorted_transactions, target_id)),
+        ('Indexed Store', 'O(1)', lambda target_id: store_lookup(store, target_id)),
+    ]
+
+
+def time_search(search, target_id, num_iterations=100, repeat=5, warmup=1):
     """
-    Benchmark both search methods
+    Seconds per search for one id: `warmup` untimed passes, then `repeat`
+    timed passes of `num_iterations` calls each.
+    Returns (median, iqr, found).
+    """
+    for _ in range(warmup):
+        for _ in range(num_iterations):
+            search(target_id)
+    samples = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        for _ in range(num_iterations):
+            result = search(target_id)
+        samples.append((time.perf_counter() - start_time) / num_iterations)
+    return statistics.median(samples), iqr(samples), result is not None
+
+
+def iqr(samples):
+    """Interquartile range (q3 - q1) of a list of numbers"""
+    if len(samples) < 2:
+        return 0.0
+    q1, _, q3 = statistics.quantiles(samples, n=4, method='inclusive')
+    return q3 - q1
+
+
+def benchmark_search(transactions, test_ids, num_iterations=100, repeat=5):
+    """
+    Benchmark every search method on the same ids
     """
     print("\n" + "="*80)
     print("DSA INTEGRATION: SEARCH ALGORITHM COMPARISON")
     print("="*80)
     
-    # Create dictionary for O(1) lookup
-    tx_dict = create_transaction_dict(transactions)
+    methods = search_methods(transactions)
     
     print(f"\n📊 Test Setup:")
     print(f"   Total Transactions: {len(transactions)}")
     print(f"   Test IDs: {test_ids}")
-    print(f"   Iterations per ID: {num_iterations}")
-    print(f"   Total Searches: {len(test_ids) * num_iterations}")
-    
-    # ========== LINEAR SEARCH BENCHMARK ==========
-    print(f"\n{'─'*80}")
-    print("🔍 METHOD 1: LINEAR SEARCH (O(n) - Sequential Scan)")
-    print(f"{'─'*80}")
-    
-    linear_results = {}
-    linear_total_time = 0
-    
-    for target_id in test_ids:
-        start_time = time.perf_counter()
-        
-        for _ in range(num_iterations):
-            result = linear_search(transactions, target_id)
+    print(f"   Iterations per ID: {num_iterations} x {repeat} repetitions (after 1 warm-up)")
+    print(f"   Total Searches: {len(test_ids) * num_iterations * (repeat + 1) * len(methods)}")
+    
+    # ========== PER-METHOD BENCHMARKS ==========
+    results = {}
+    for number, (name, complexity, search) in enumerate(methods, 1):
+        print(f"\n{'─'*80}")
+        print(f"🔍 METHOD {number}: {name.upper()} ({complexity})")
+        print(f"{'─'*80}")
         
-        elapsed = time.perf_counter() - start_time
-        linear_total_time += elapsed
-        linear_results[target_id] = elapsed
+        per_id = {}
+        for target_id in test_ids:
+            median, spread, found = time_search(search, target_id, num_iterations, repeat)
+            per_id[target_id] = median
+            status = "✓ FOUND" if found else "✗ NOT FOUND"
+            print(f"   ID {target_id}: {median*1000000:.3f}µs ± {spread*1000000:.3f} IQR ({status})")
         
-        status = "✓ FOUND" if result else "✗ NOT FOUND"
-        print(f"   ID {target_id}: {elapsed*1000000:.2f}µs ({status})")
-    
-    avg_linear = linear_total_time / len(test_ids)
-    print(f"\n   Average: {avg_linear*1000000:.2f}µs per search")
-    print(f"   Total:   {linear_total_time*1000000:.2f}µs")
-    
-    # ========== DICTIONARY LOOKUP BENCHMARK ==========
-    print(f"\n{'─'*80}")
-    print("⚡ METHOD 2: DICTIONARY LOOKUP (O(1) - Hash Table Access)")
-    print(f"{'─'*80}")
-    
-    dict_results = {}
-    dict_total_time = 0
-    
-    for target_id in test_ids:
-        start_time = time.perf_counter()
-        
-        for _ in range(num_iterations):
-            result = dictionary_lookup(tx_dict, target_id)
-        
-        elapsed = time.perf_counter() - start_time
-        dict_total_time += elapsed
-        dict_results[target_id] = elapsed
-        
-        status = "✓ FOUND" if result else "✗ NOT FOUND"
-        print(f"   ID {target_id}: {elapsed*1000000:.2f}µs ({status})")
-    
-    avg_dict = dict_total_time / len(test_ids)
-    print(f"\n   Average: {avg_dict*1000000:.2f}µs per search")
-    print(f"   Total:   {dict_total_time*1000000:.2f}µs")
+        medians = list(per_id.values())
+        results[name] = {'complexity': complexity, 'median': statistics.median(medians),
+                         'iqr': iqr(medians), 'per_id': per_id}
+        print(f"\n   Median: {results[name]['median']*1000000:.3f}µs per search "
+              f"(IQR across ids {results[name]['iqr']*1000000:.3f}µs)")
     
     # ========== COMPARISON & ANALYSIS ==========
     print(f"\n{'─'*80}")
     print("📈 PERFORMANCE COMPARISON")
-    print(f"{'─'*80}")
-    
-    speedup = linear_total_time / dict_total_time if dict_total_time > 0 else 0
-    improvement = ((linear_total_time - dict_total_time) / linear_total_time) * 100
-    
-    print(f"\n   Linear Search Total:   {linear_total_time*1000000:.2f}µs")
-    print(f"   Dictionary Lookup Total: {dict_total_time*1000000:.2f}µs")
-    print(f"\n   Speedup Factor: {speedup:.2f}x faster")
-    print(f"   Improvement:   {improvement:.1f}%")
-    
-    # ========== COMPLEXITY ANALYSIS ==========
-    print(f"\n{'─'*80}")
-    print("🔬 COMPLEXITY ANALYSIS")
-    print(f"{'─'*80}")
-    
-    print(f"\n   Linear Search:")
-    print(f"      Time Complexity:  O(n) - proportional to list size")
-    print(f"      Space Complexity: O(1) - no extra space")
-    print(f"      Approach: Sequential iteration until match found")
+    print(f"{'─'*80}\n")
     
-    print(f"\n   Dictionary Lookup:")
-    print(f"      Time Complexity:  O(1) - constant time (average case)")
-    print(f"      Space Complexity: O(n) - stores hash table")
-    print(f"      Approach: Direct hash table access using key")
+    linear = results['Linear Search']['median']
+    print(f"   {'Method':<20} | {'Complexity':<10} | {'Median (µs)':>12} | {'IQR (µs)':>10} | {'vs Linear':>10}")
+    print(f"   {'-'*74}")
+    for name, result in results.items():
+        speedup = linear / result['median'] if result['median'] > 0 else 0
+        print(f"   {name:<20} | {result['complexity']:<10} | {result['median']*1000000:>12.3f} | "
+              f"{result['iqr']*1000000:>10.3f} | {speedup:>9.1f}x")
     
     # ========== PRACTICAL ANALYSIS ==========
     print(f"\n{'─'*80}")
     print("💡 PRACTICAL ANALYSIS")
     print(f"{'─'*80}")
     
-    print(f"\n   When to use Linear Search:")
-    print(f"      • Small datasets (< 100 items)")
-    print(f"      • Memory is critical")
-    print(f"      • Single lookup required")
-    print(f"      • Unsorted data that won't be reused")
-    
-    print(f"\n   When to use Dictionary Lookup:")
-    print(f"      • Large datasets (> 100 items)")
-    print(f"      • Performance critical")
-    print(f"      • Multiple lookups on same data")
-    print(f"      • Need consistent O(1) performance")
-    
-    print(f"\n   Recommendation for {len(transactions)} Transactions:")
-    if len(transactions) > 100:
-        print(f"      ✓ USE DICTIONARY LOOKUP")
-        print(f"        {speedup:.1f}x faster, acceptable memory trade-off")
-    else:
-        print(f"      ✓ EITHER METHOD")
-        print(f"        Small dataset, both perform similarly")
-    
-    # ========== SUMMARY TABLE ==========
-    print(f"\n{'─'*80}")
-    print("📋 SUMMARY TABLE")
-    print(f"{'─'*80}\n")
-    
-    print(f"{'ID':<8} | {'Linear (µs)':<15} | {'Dict (µs)':<15} | {'Speedup':<10}")
-    print(f"{'-'*60}")
+    print(f"\n   Linear Search:     no extra memory, only for tiny or one-off lookups")
+    print(f"   Binary Search:     sorted id array (O(n) extra), O(log n), also serves id ranges")
+    print(f"   Dictionary Lookup: hash table (O(n) extra), fastest single lookups")
+    print(f"   Indexed Store:     dictionary + locking + secondary indexes, what the API uses")
     
-    for target_id in test_ids:
-        lin_time = linear_results[target_id] * 1000000
-        dict_time = dict_results[target_id] * 1000000
-        speedup_val = lin_time / dict_time if dict_time > 0 else 0
-        print(f"{target_id:<8} | {lin_time:<15.2f} | {dict_time:<15.2f} | {speedup_val:<10.2f}x")
+    fastest = min(results, key=lambda name: results[name]['median'])
+    print(f"\n   Fastest for {len(transactions)} Transactions: ✓ {fastest.upper()}")
     
     print(f"\n{'='*80}\n")
     
+    dict_median = results['Dictionary Lookup']['median']
     return {
-        'linear_total': linear_total_time,
-        'dict_total': dict_total_time,
-        'speedup': speedup,
-        'improvement': improvement,
-        'linear_results': linear_results,
-        'dict_results': dict_results
+        'linear_total': linear,
+        'dict_total': dict_median,
+        'speedup': linear / dict_median if dict_median > 0 else 0,
+        'improvement': (linear - dict_median) / linear * 100 if linear > 0 else 0,
+        'linear_results': results['Linear Search']['per_id'],
+        'dict_results': results['Dictionary Lookup']['per_id'],
+        'methods': results,
     }
 
 
 if __name__ == '__main__':
     # Determine file path relative to script location
     script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    json_file = os.path.join(script_dir, 'data', 'transactions.json')
+    
+    parser = argparse.ArgumentParser(description="Compare transaction lookup methods")
+    parser.add_argument('--data', default=os.path.join(script_dir, 'data', 'transactions.json'),
+                        help="ETL output (.json, .ndjson or .col)")
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
     
     # Load transactions
     print("\n📂 Loading transactions...")
-    transactions = load_transactions(json_file)
+    transactions = load_transactions(args.data)
     
     if not transactions:
         print("✗ No transactions loaded. Exiting.")
@@ -214,6 +229,6 @@ if __name__ == '__main__':
     test_ids = [transactions[i]['id'] for i in range(num_test_ids)]
     
     # Run benchmark
-    results = benchmark_search(transactions, test_ids, num_iterations=100)
+    results = benchmark_search(transactions, test_ids, args.iterations, args.repeat)
     
     print("\n✓ Benchmark complete!")
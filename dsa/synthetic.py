@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Synthetic Corpus: MoMo SMS backups of any size for scale testing
+
+Writes XML in the same <smses>/<sms> schema as raw/momo.xml, using the
+real M-Money body templates:
+  received    "You have received ... Financial Transaction Id: ..."
+  payment     "TxId: ... Your payment of ... has been completed ..."
+  transfer    "*165*S*... RWF transferred to ..."
+  deposit     "*113*R*A bank deposit of ..."
+  withdrawal  "You ... have via agent: ..., withdrawn ... RWF ..."
+  airtime     "*162*TxId:...*S*Your payment of ... to Airtime ..."
+plus noise the ETL must drop (one-time password messages and SMS from
+other senders).
+
+Controls: message count or approximate file size, time span, counterparty
+cardinality (names drawn with a long-tail popularity), noise ratio and
+type mix. Messages are generated and written one at a time, so memory is
+constant whatever the size. A running balance is kept, so balances and
+fees in the bodies are consistent.
+
+Every message carries the transaction the extractors should produce, so
+verify() re-parses a written file and checks it against a second,
+identically seeded generator, also in constant memory.
+
+Usage:
+    python dsa/synthetic.py -o raw/synthetic.xml [--count 1000000 | --size 2G]
+                            [--days 365] [--parties 500] [--noise 0.05] [--seed 42] [--verify]
+"""
+
+import argparse
+import os
+import random
+import sys
+from datetime import datetime
+from itertools import islice
+from xml.sax.saxutils import quoteattr
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from parse_xml import iter_parse_xml, convert_timestamp
+
+FIRST_NAMES = ['Jane', 'Samuel', 'Alex', 'Robert', 'Linda', 'Grace', 'Eric', 'Diane', 'Patrick',
+               'Alice', 'Jean', 'Claude', 'Divine', 'Emmanuel', 'Aline', 'Olivier']
+LAST_NAMES = ['Smith', 'Carter', 'Doe', 'Brown', 'Green', 'Mugisha', 'Uwase', 'Habimana',
+              'Niyonzima', 'Ingabire', 'Nshuti', 'Mutesi', 'Kamanzi', 'Iradukunda']
+AGENTS = ['Sophia', 'Kevin', 'Alice', 'Bosco']
+PHONES = ['250788999999', '250791666666', '250790777777', '250788000000']
+
+# Default share of each transaction template among non-noise messages
+MIX = {
+    'payment': 0.43,
+    'transfer': 0.35,
+    'deposit': 0.15,
+    'received': 0.04,
+    'airtime': 0.02,
+    'withdrawal': 0.01,
+}
+
+# Templates copied from real messages; {amount_c}/{balance_c} use thousands separators
+TEMPLATES = {
+    'received': "You have received {amount} RWF from {name} (*********013) on your mobile money account "
+                "at {when}. Message from sender: . Your new balance:{balance} RWF. "
+                "Financial Transaction Id: {txid}.",
+    'payment': "TxId: {txid}. Your payment of {amount_c} RWF to {name} {code} has been completed at {when}. "
+               "Your new balance: {balance_c} RWF. Fee was 0 RWF.Kanda*182*16# wiyandikishe muri poromosiyo "
+               "ya BivaMoMotima, ugire amahirwe yo gutsindira ibihembo bishimishije.",
+    'transfer': "*165*S*{amount} RWF transferred to {name} ({phone}) from 36521838 at {when} . "
+                "Fee was: {fee} RWF. New balance: {balance} RWF. Kugura ama inite cg interineti kuri MoMo, "
+                "Kanda *182*2*1# .*EN#",
+    'deposit': "*113*R*A bank deposit of {amount} RWF has been added to your mobile money account at {when}. "
+               "Your NEW BALANCE :{balance} RWF. Cash Deposit::CASH::::0::250795963036.Thank you for using "
+               "MTN MobileMoney.*EN#",
+    'withdrawal': "You {holder} (*********036) have via agent: Agent {agent} ({phone}), withdrawn {amount} RWF "
+                  "from your mobile money account: 36521838 at {when} and you can now collect your money in "
+                  "cash. Your new balance: {balance} RWF. Fee paid: {fee} RWF. Message from agent: 1. "
+                  "Financial Transaction Id: {txid}.",
+    'airtime': "*162*TxId:{txid}*S*Your payment of {amount} RWF to Airtime with token  has been completed at "
+               "{when}. Fee was 0 RWF. Your new balance: {balance} RWF . Message: - -. *EN#",
+    'otp': "<#> Dear Customer, your MTN MoMo application one-time password is :{code4}.MTN MoMo does not "
+           "recommend that you share or expose your one-time password with anyone. Be Vigilant. "
+           "RdbS6eMOXvx N/RywfrtIZL>.",
+    'other': "Dear customer, your bundle of {amount} MB is active until {when}. Dial *345# for more offers.",
+}
+
+# Fee charged per template (deducted from the balance with the amount)
+FEES = {'transfer': (20, 100), 'withdrawal': (350, 350)}
+
+SMS_ATTRS = ('protocol="0" address="{address}" date="{date}" type="1" subject="null" body={body} '
+             'toa="null" sc_toa="null" service_center="+250788110381" read="1" status="-1" locked="0" '
+             'date_sent="{sent}" sub_id="6" readable_date="{readable}" contact_name="(Unknown)"')
+
+
+def party_name(index):
+    """Unique letters-only name for counterparty `index` (the extractors reject digits)"""
+    first = FIRST_NAMES[index % len(FIRST_NAMES)]
+    rest = index // len(FIRST_NAMES)
+    last = LAST_NAMES[rest % len(LAST_NAMES)]
+    rest //= len(LAST_NAMES)
+    if not rest:
+        return f"{first} {last}"
+    letters = ''
+    while rest:
+        rest, digit = divmod(rest - 1, 26)
+        letters = chr(ord('a') + digit) + letters
+    return f"{first} {letters.capitalize()} {last}"
+
+
+def generate(count, start=datetime(2024, 5, 10, 16, 30), days=365, parties=500,
+             noise=0.05, seed=42, mix=None):
+    """
+    Yield (address, date_ms, body, expected) for `count` messages
+    expected is the (transaction_type, amount, sender, receiver, timestamp,
+    txid, fee, balance) the ETL should extract, or None for noise it should drop.
+    """
+    rng = random.Random(seed)
+    mix = mix or MIX
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    names = [party_name(i) for i in range(min(parties, 100_000))]
+    span_ms = days * 86_400_000
+    step = span_ms / max(count, 1)
+    start_ms = int(start.timestamp() * 1000)
+    balance = 0
+
+    for i in range(count):
+        date_ms = start_ms + int(i * step + rng.random() * step)
+        when = datetime.fromtimestamp(date_ms / 1000).strftime('%Y-%m-%d %H:%M:%S')
+
+        if rng.random() < noise:
+            if rng.random() < 0.8:
+                body = TEMPLATES['otp'].format(code4=f"{rng.randint(0, 9999):04d}")
+                yield 'M-Money', date_ms, body, None
+            else:
+                body = TEMPLATES['other'].format(amount=rng.choice((500, 1024, 2048)), when=when)
+                yield 'MTN', date_ms, body, None
+            continue
+
+        kind = rng.choices(kinds, weights)[0]
+        # Long-tail popularity: a few counterparties get most of the traffic
+        pick = int((parties + 1) ** rng.random()) - 1
+        name = names[pick] if pick < len(names) else party_name(pick)
+
+        if kind in ('deposit', 'received'):
+            amount = rng.randint(1, 400) * 100
+        elif kind == 'airtime':
+            amount = rng.choice((100, 200, 500, 1000, 2000))
+        else:
+            amount = rng.randint(1, 250) * 100
+        fee = rng.choice(FEES[kind]) if kind in FEES else 0
+        if kind not in ('deposit', 'received') and amount + fee > balance:
+            kind, fee = 'deposit', 0      # top up instead of overdrawing
+        balance += amount if kind in ('deposit', 'received') else -(amount + fee)
+
+        # Operator ids increase over time and never repeat
+        txid = 10**10 + i * 1000 + rng.randrange(1000)
+        code = rng.randint(10000, 99999)
+        body = TEMPLATES[kind].format(
+            amount=amount, amount_c=f"{amount:,}", balance=balance, balance_c=f"{balance:,}",
+            name=name, holder=name.upper(), agent=rng.choice(AGENTS), phone=rng.choice(PHONES),
+            fee=fee, txid=txid, code=code, when=when)
+        yield 'M-Money', date_ms, body, _expected(kind, amount, name, code, when, date_ms) + (
+            None if kind in ('transfer', 'deposit') else str(txid),
+            None if kind in ('received', 'deposit') else fee, balance)
+
+
+def _expected(kind, amount, name, code, when, date_ms):
+    """What categorize() extracts from each template (including its quirks)"""
+    timestamp = convert_timestamp(date_ms)
+    if kind == 'received':
+        return ('receive', amount, name, 'Account Holder', timestamp)
+    if kind == 'transfer':
+        return ('transfer', amount, 'You', name, timestamp)
+    if kind == 'deposit':
+        return ('deposit', amount, 'Bank', 'You', timestamp)
+    if kind == 'withdrawal':
+        return ('withdrawal', amount, 'You', 'Unknown', timestamp)
+    # Payment names run on until the '-' in the date; *162* bodies carry
+    # "TxId:", so the rule table files airtime under payment too
+    year = when[:4]
+    if kind == 'payment':
+        return ('payment', amount, 'You', f"{name} {code} has been completed at {year}", timestamp)
+    return ('payment', amount, 'You', f"Airtime with token  has been completed at {year}", timestamp)
+
+
+def write_corpus(output_file, count, batch=1000, **options):
+    """Stream `count` generated messages to output_file; returns bytes written"""
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        f.write(f'<smses count="{count}" backup_set="synthetic" type="full">\n')
+        messages = generate(count, **options)
+        while True:
+            lines = [_sms_line(*message[:3]) for message in islice(messages, batch)]
+            if not lines:
+                break
+            f.write(''.join(lines))
+        f.write('</smses>\n')
+        return f.tell()
+
+
+def _sms_line(address, date_ms, body):
+    moment = datetime.fromtimestamp(date_ms / 1000)
+    readable = f"{moment:%d %b %Y} {moment.hour % 12 or 12}:{moment:%M:%S %p}"
+    attrs = SMS_ATTRS.format(address=address, date=date_ms, body=quoteattr(body),
+                             sent=date_ms - 7000, readable=readable)
+    return f'  <sms {attrs} />\n'
+
+
+def count_for_size(size_bytes, **options):
+    """Message count that gives roughly size_bytes of XML"""
+    sample = 2000
+    average = sum(len(_sms_line(*m[:3])) for m in generate(sample, **options)) / sample
+    return max(1, int(size_bytes / average))
+
+
+def verify(xml_file, count, **options):
+    """Re-parse xml_file and compare with the generator; returns mismatches (0 = ok)"""
+    expected = (e for *_, e in generate(count, **options) if e is not None)
+    mismatches = 0
+    parsed = 0
+    for transaction, want in zip(iter_parse_xml(xml_file), expected):
+        parsed += 1
+        got = (transaction['transaction_type'], transaction['amount'], transaction['sender'],
+               transaction['receiver'], transaction['timestamp'], transaction['txid'],
+               transaction['fee'], transaction['balance'])
+        if got != want:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"✗ id {transaction['id']}: expected {want}, got {got}")
+    remaining = sum(1 for _ in expected)
+    if remaining:
+        print(f"✗ {remaining} expected transactions missing from the parsed output")
+        mismatches += remaining
+    print(f"{'✓' if not mismatches else '✗'} {parsed} transactions checked, {mismatches} mismatches")
+    return mismatches
+
+
+def parse_size(text):
+    """'500M', '2G', '1024' -> bytes"""
+    units = {'K': 1024, 'M': 1024**2, 'G': 1024**3}
+    text = text.strip().upper().rstrip('B')
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic MoMo SMS backup XML")
+    parser.add_argument('-o', '--output', required=True, help="XML file to write")
+    volume = parser.add_mutually_exclusive_group()
+    volume.add_argument('--count', type=int, default=100_000, help="number of SMS (default: 100000)")
+    volume.add_argument('--size', help="approximate file size instead of a count, e.g. 500M or 2G")
+    parser.add_argument('--start', default='2024-05-10T16:30:00', help="first message time (ISO)")
+    parser.add_argument('--days', type=float, default=365, help="time span in days (default: 365)")
+    parser.add_argument('--parties', type=int, default=500, help="distinct counterparties (default: 500)")
+    parser.add_argument('--noise', type=float, default=0.05,
+                        help="share of OTP / non-M-Money messages (default: 0.05)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verify', action='store_true', help="re-parse the output and check every transaction")
+    args = parser.parse_args(argv)
+
+    options = dict(start=datetime.fromisoformat(args.start), days=args.days,
+                   parties=args.parties, noise=args.noise, seed=args.seed)
+    count = count_for_size(parse_size(args.size), **options) if args.size else args.count
+
+    print(f"Generating {count:,} SMS into {args.output}...")
+    written = write_corpus(args.output, count, **options)
+    print(f"✓ Wrote {written / (1024 * 1024):.1f} MB")
+
+    if args.verify:
+        return 1 if verify(args.output, count, **options) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Stage timings: Where the ETL spends its time
+
+A StageTimings accumulates wall seconds and item counts per named stage.
+The ETL records:
+  - read:       iterparse producing <sms> elements (file I/O + XML parsing)
+  - classify:   matching the body against the rule table
+  - extract:    amount, sender/receiver and timestamp extraction
+  - parse:      time waiting on parser worker processes (parallel runs,
+                where the stages above are not visible)
+  - serialize:  the writer (JSON / NDJSON / columns), i.e. wall time not
+                spent waiting on the parser
+
+Timing is opt-in (iter_parse_xml(..., timings=...)): the untimed path does
+no clock reads at all.
+"""
+import time
+from collections import defaultdict
+
+STAGES = ('read', 'classify', 'extract', 'parse', 'serialize')
+
+
+class StageTimings:
+    """Seconds and counts per ETL stage"""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def add(self, stage, seconds, count=1):
+        self.seconds[stage] += seconds
+        self.counts[stage] += count
+
+    def timed(self, stage, iterable):
+        """Yield from iterable, charging the time spent in each next() to stage"""
+        clock = time.perf_counter
+        iterator = iter(iterable)
+        seconds = 0.0
+        count = 0
+        try:
+            while True:
+                start = clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    seconds += clock() - start
+                    return
+                seconds += clock() - start
+                count += 1
+                yield item
+        finally:
+            self.add(stage, seconds, count)
+
+    def stages(self):
+        """Recorded stages, pipeline order first"""
+        return [s for s in STAGES if s in self.seconds] + sorted(set(self.seconds) - set(STAGES))
+
+    def report(self, wall=None):
+        """Table lines: stage, seconds, share of wall (or of the total), µs per item"""
+        total = wall or sum(self.seconds.values()) or 1
+        lines = [f"   {'Stage':<10} {'Seconds':>9} {'Share':>7} {'µs/item':>9}"]
+        for stage in self.stages():
+            seconds = self.seconds[stage]
+            per_item = seconds / self.counts[stage] * 1e6 if self.counts[stage] else 0
+            lines.append(f"   {stage:<10} {seconds:>9.3f} {seconds / total:>7.1%} {per_item:>9.2f}")
+        if wall:
+            # Element handling and dict building between the timed stages
+            other = wall - sum(self.seconds.values())
+            lines.append(f"   {'other':<10} {other:>9.3f} {other / total:>7.1%}")
+        return lines
+
+    def prometheus(self, prefix='momo_etl_stage'):
+        """Prometheus text lines (e.g. for a node_exporter textfile collector)"""
+        lines = [f"# HELP {prefix}_seconds_total Wall seconds spent per ETL stage",
+                 f"# TYPE {prefix}_seconds_total counter"]
+        lines += [f'{prefix}_seconds_total{{stage="{stage}"}} {self.seconds[stage]!r}' for stage in self.stages()]
+        lines += [f"# HELP {prefix}_items_total Items processed per ETL stage",
+                  f"# TYPE {prefix}_items_total counter"]
+        lines += [f'{prefix}_items_total{{stage="{stage}"}} {self.counts[stage]}' for stage in self.stages()]
+        return lines
@@ -10,4 +10,4 @@ echo "Starting API Server..."
 echo "Access at: http://localhost:8000"
 echo ""
 
-python3 api/app.py
+python3 api/app.py "$@"
@@ -0,0 +1,12 @@
+"""
+Shared setup for the tests: the api/ and dsa/ modules import each other by
+flat name, the way app.py and run.py put their folders on sys.path
+"""
+import os
+import sys
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ('dsa', 'api'):
+    path = os.path.join(repo_root, folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,148 @@
+"""Tests for the HTTP API (api/app.py), served in-process over a seeded store"""
+import base64
+import gzip
+import http.client
+import json
+import threading
+
+import pytest
+
+import app
+from server import PooledHTTPServer
+from store import TransactionStore
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'admin:admin123').decode()}
+ITEM = {'transaction_type': 'payment', 'amount': 500, 'sender': 'You', 'receiver': 'Shop',
+        'timestamp': '2024-06-01T12:00:00', 'txid': None, 'fee': None, 'balance': None}
+
+
+class Handler(app.TransactionHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def api():
+    """Port of a server over 1500 rows, installed as app.STORE for the test"""
+    previous = app.STORE
+    app.use_store(TransactionStore([dict(ITEM, id=i, amount=i, receiver=f'Shop {i % 7}') for i in range(1, 1501)]))
+    httpd = PooledHTTPServer(('127.0.0.1', 0), Handler, max_workers=4)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield httpd.server_address[1]
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        app.use_store(previous)
+
+
+def request(port, method, path, body=None, **headers):
+    """(status, headers, raw body bytes as sent)"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        conn.request(method, path, None if body is None else json.dumps(body), dict(AUTH, **headers))
+        response = conn.getresponse()
+        return response.status, response.headers, response.read()
+    finally:
+        conn.close()
+
+
+def test_matching_if_none_match_is_304(api):
+    for path in ('/transactions/5', '/transactions?limit=20', '/transactions'):
+        status, headers, _ = request(api, 'GET', path)
+        etag = headers['ETag']
+        assert status == 200 and etag.startswith('W/"')
+        status, headers, body = request(api, 'GET', path, **{'If-None-Match': etag})
+        assert (status, headers['ETag'], body) == (304, etag, b'')
+        assert request(api, 'GET', path, **{'If-None-Match': f'"other", {etag[2:]}'})[0] == 304
+        assert request(api, 'GET', path, **{'If-None-Match': '"other"'})[0] == 200
+
+
+def test_write_changes_the_etag(api):
+    etag = request(api, 'GET', '/transactions/5')[1]['ETag']
+    assert request(api, 'PUT', '/transactions/5', {'amount': 99})[0] == 200
+    status, headers, body = request(api, 'GET', '/transactions/5', **{'If-None-Match': etag})
+    assert status == 200 and headers['ETag'] != etag
+    assert json.loads(body)['amount'] == 99
+    assert request(api, 'GET', '/transactions/5', **{'If-None-Match': headers['ETag']})[0] == 304
+
+
+@pytest.mark.parametrize('path', ['/transactions?limit=500', '/transactions', '/transactions/5', '/stats'])
+def test_gzip_body_decodes_to_the_plain_body(api, path):
+    plain = request(api, 'GET', path)
+    zipped = request(api, 'GET', path, **{'Accept-Encoding': 'deflate, gzip'})
+    assert plain[0] == zipped[0] == 200
+    assert 'Content-Encoding' not in plain[1]
+    assert zipped[1]['Vary'] == 'Accept-Encoding'
+    if len(plain[2]) >= app.GZIP_MIN_SIZE:
+        assert zipped[1]['Content-Encoding'] == 'gzip'
+        assert len(zipped[2]) < len(plain[2])
+        assert gzip.decompress(zipped[2]) == plain[2]
+    else:
+        assert zipped[2] == plain[2]
+    assert request(api, 'GET', path, **{'Accept-Encoding': 'gzip;q=0'})[2] == plain[2]
+
+
+@pytest.mark.parametrize('encoding', ['identity', 'gzip'])
+def test_chunked_list_parses_to_the_unstreamed_json(api, monkeypatch, encoding):
+    path = '/transactions?transaction_type=payment&limit=1000&fields=id,amount,receiver'
+    whole = request(api, 'GET', path, **{'Accept-Encoding': encoding})
+    assert whole[1]['Content-Length'] and 'Transfer-Encoding' not in whole[1]
+
+    # Past CACHE_MAX_ROWS the same page is streamed, STREAM_BATCH rows per chunk
+    monkeypatch.setattr(app, 'CACHE_MAX_ROWS', 0)
+    monkeypatch.setattr(app, 'STREAM_BATCH', 7)
+    streamed = request(api, 'GET', path, **{'Accept-Encoding': encoding})
+    assert streamed[1]['Transfer-Encoding'] == 'chunked' and 'Content-Length' not in streamed[1]
+    assert streamed[1].get('Content-Encoding') == whole[1].get('Content-Encoding')
+
+    def decode(body):
+        return json.loads(gzip.decompress(body) if encoding == 'gzip' else body)
+    data = decode(streamed[2])
+    assert data == decode(whole[2])
+    assert data['count'] == 1500 and len(data['data']) == 1000 and data['next_cursor'] == 1000
+
+
+def cached(path):
+    cache = app.get_response_cache()
+    return cache is not None and cache.get(path) is not None
+
+
+@pytest.mark.parametrize('write', [('PUT', '/transactions/5', {'amount': 7, 'receiver': 'Changed'}),
+                                   ('DELETE', '/transactions/5', None)])
+@pytest.mark.parametrize('path', ['/transactions/5', '/transactions?limit=10',
+                                  '/transactions?receiver=Shop%205&limit=50', '/transactions?limit=10&after=4'])
+def test_write_invalidates_cached_responses(api, write, path):
+    before = request(api, 'GET', path)
+    assert before[0] == 200 and cached(path)
+
+    assert request(api, *write)[0] == 200
+    status, _, body = request(api, 'GET', path)
+    assert body != before[2]
+    if path == '/transactions/5':
+        transaction = app.STORE.get(5)
+        assert status == (200 if transaction else 404)
+        assert transaction is None or json.loads(body) == transaction
+    else:
+        total, page = app.STORE.query(**app.parse_query(path.partition('?')[2]))
+        assert status == 200 and json.loads(body)['count'] == total and json.loads(body)['data'] == page
+
+
+def test_update_of_a_missing_row_is_404(api):
+    assert request(api, 'PUT', '/transactions/99999', {'amount': 1})[0] == 404
+    assert request(api, 'PUT', '/transactions/5', {'amount': 'x'})[0] == 400
+
+
+def test_update_racing_a_delete_is_404(api, monkeypatch):
+    # The row is there for any lookup, but a DELETE wins the store's lock first
+    store = app.STORE
+    update = store.update
+
+    def deleted_first(tx_id, changes):
+        store.delete(tx_id)
+        return update(tx_id, changes)
+    monkeypatch.setattr(store, 'update', deleted_first)
+    status, _, body = request(api, 'PUT', '/transactions/5', {'amount': 1})
+    assert status == 404 and json.loads(body)['error'] == 'Not Found'
+    assert app.STORE.get(5) is None
@@ -0,0 +1,72 @@
+"""Tests for the batch endpoint helpers and item validation (api/bulk.py)"""
+import io
+import json
+
+import pytest
+
+from bulk import BodyReader, batched, check_id, check_new, check_update, iter_items
+
+VALID = {'transaction_type': 'payment', 'amount': 1500, 'sender': 'You', 'receiver': 'Shop'}
+
+
+def items(body, block_size=7):
+    return list(iter_items(BodyReader(io.BytesIO(body), len(body), block_size=block_size)))
+
+
+def test_valid_item_passes():
+    assert check_new(VALID) is None
+    assert check_new(dict(VALID, amount=12.5, timestamp='2024-05-01T10:00:00', txid='123', fee=0, balance=9)) is None
+
+
+@pytest.mark.parametrize('changes, message', [
+    ({'transaction_type': ['x']}, "transaction_type must be a string"),
+    ({'sender': {'a': 1}}, "sender must be a string"),
+    ({'receiver': None}, "receiver must be a string"),
+    ({'amount': '100'}, "amount must be a number"),
+    ({'amount': True}, "amount must be a number"),
+    ({'amount': float('nan')}, "amount must be a number"),
+    ({'timestamp': 20240501}, "timestamp must be an ISO 8601 string"),
+    ({'txid': ''}, "txid must be a non-empty string"),
+    ({'fee': -1}, "fee must be a non-negative number"),
+    ({'balance': '5'}, "balance must be a non-negative number"),
+])
+def test_wrong_types_are_rejected(changes, message):
+    assert check_new(dict(VALID, **changes)) == message
+    assert check_update(dict(changes, id=1)) == message
+
+
+def test_missing_fields_and_ids():
+    assert check_new({'amount': 1}) == "Missing field: transaction_type"
+    assert check_new([VALID]) == "Item must be a JSON object"
+    assert check_update({'amount': 1}) == "Missing or invalid id"
+    assert check_update({'id': True}) == "Missing or invalid id"
+    assert check_update({'id': 3, 'amount': 1}) is None
+    assert check_id(3) is None and check_id('3') == "Item must be an integer id"
+
+
+def test_json_array_and_ndjson_bodies_decode_alike():
+    array = json.dumps([VALID, {'amount': 12345}, VALID]).encode()
+    ndjson = b'\n'.join(json.dumps(item).encode() for item in (VALID, {'amount': 12345}, VALID)) + b'\n'
+    assert items(array) == items(ndjson) == [(0, VALID, None), (1, {'amount': 12345}, None), (2, VALID, None)]
+
+
+def test_bad_ndjson_line_fails_alone():
+    body = b'{"amount": 1}\n{"amount": \n{"amount": 3}\n'
+    decoded = items(body)
+    assert decoded[0] == (0, {'amount': 1}, None)
+    assert decoded[1][0] == 1 and decoded[1][2].startswith("Invalid JSON")
+    assert decoded[2] == (2, {'amount': 3}, None)
+
+
+def test_chunked_body():
+    body = b'5\r\n[1, 2\r\n4\r\n, 3]\r\n0\r\n\r\n'
+    reader = BodyReader(io.BytesIO(body), chunked=True)
+    assert [item for _, item, _ in iter_items(reader)] == [1, 2, 3] and reader.done
+
+
+def test_batched_reports_errors_by_index():
+    stream = [(0, VALID, None), (1, {'amount': 1}, None), (2, None, "Invalid JSON: x"), (3, VALID, None)]
+    batches = list(batched(stream, check_new, size=1))
+    assert batches == [([(0, VALID)], []),
+                       ([(3, VALID)], [{'index': 1, 'message': "Missing field: transaction_type"},
+                                       {'index': 2, 'message': "Invalid JSON: x"}])]
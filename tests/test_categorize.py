@@ -1 +1,108 @@
-#tests
+"""Tests for the precompiled rule engine against the reference extractors (dsa/categorize.py)"""
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from categorize import (DEFAULT_RULE, RULES, categorize, categorize_full, categorize_timed,
+                        extract_balance, extract_fee, extract_txid, match_rule)
+from parse_xml import extract_amount, extract_receiver, extract_sender, get_transaction_type
+from timings import StageTimings
+
+MOMO_XML = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'raw', 'momo.xml')
+
+
+def legacy_categorize(body):
+    """The original path: four separate extractor calls (as benchmarks/bench_categorize.py)"""
+    amount = extract_amount(body)
+    tx_type = get_transaction_type(body)
+    return tx_type, amount, extract_sender(body, tx_type), extract_receiver(body, tx_type)
+
+
+@pytest.fixture(scope='module')
+def bodies():
+    return [sms.get('body', '') for sms in ET.parse(MOMO_XML).getroot().iter('sms')]
+
+
+def test_categorize_matches_legacy_on_every_message(bodies):
+    assert bodies
+    mismatches = [body for body in bodies if categorize(body) != legacy_categorize(body)]
+    assert mismatches == []
+
+
+def test_categorize_full_matches_per_field_extractors(bodies):
+    mismatches = [body for body in bodies
+                  if categorize_full(body) != legacy_categorize(body) + (extract_txid(body), extract_fee(body),
+                                                                         extract_balance(body))]
+    assert mismatches == []
+
+
+def test_categorize_timed_matches_and_charges_stages(bodies):
+    timings = StageTimings()
+    assert all(categorize_timed(body, timings) == categorize_full(body) for body in bodies[:200])
+    assert timings.stages() == ['classify', 'extract']
+    assert timings.counts['classify'] == timings.counts['extract'] == 200
+
+
+@pytest.mark.parametrize('body, expected', [
+    # receive
+    ('You have received 2000 RWF from Jane Smith (*********013) on your mobile money account.',
+     ('receive', 2000, 'Jane Smith', 'Account Holder')),
+    ('You have RECEIVED 1,500 RWF from Bob (*1)', ('receive', 1500, 'Bob', 'Account Holder')),
+    # transfer
+    ('*165*S*10000 RWF transferred to Samuel Carter (250791666666) from 36521838.',
+     ('transfer', 10000, 'You', 'Samuel Carter')),
+    ('You transferred 300 RWF to nobody.', ('transfer', 300, 'You', 'Unknown')),
+    # payment
+    # (the receiver pattern allows digits, so it runs on to the end of the sentence)
+    ('TxId: 73214484437. Your payment of 1,000 RWF to Jane Smith 12845 has been completed.',
+     ('payment', 1000, 'You', 'Jane Smith 12845 has been completed')),
+    ('Your PAYMENT of 700 RWF to Shop 42.', ('payment', 700, 'You', 'Shop 42')),
+    # deposit
+    ('*113*R*A bank deposit of 40000 RWF has been added to your mobile money account.',
+     ('deposit', 40000, 'Bank', 'You')),
+    ('A Deposit of 5,000 RWF was made.', ('deposit', 5000, 'Bank', 'You')),
+    # withdrawal
+    ('You Abebe have via agent: Agent Sophia (250790777777), withdrawn 20000 RWF from your account.',
+     ('withdrawal', 20000, 'You', 'Unknown')),
+    # airtime (operator airtime receipts say "payment" and match that rule first)
+    ('*162*TxId:13913173274*S*Your payment of 2000 RWF to Airtime with token  has been completed.',
+     ('payment', 2000, 'You', 'Airtime with token  has been completed')),
+    ('*162* 500 RWF of airtime bought.', ('airtime', 500, 'You', 'Unknown')),
+    ('Airtime top-up of 100 RWF.', ('airtime', 100, 'You', 'Unknown')),
+    # no rule
+    ('Your balance is low: 20 RWF', ('unknown', 20, 'You', 'Unknown')),
+    ('Hello there', ('unknown', 0, 'You', 'Unknown')),
+])
+def test_rules(body, expected):
+    assert categorize(body) == expected == legacy_categorize(body)
+
+
+def test_rule_priority():
+    # "received" wins over every later rule's markers
+    assert match_rule('received via *165*S* transferred TxId: deposit')[0] == 'receive'
+    assert match_rule('*165*S* payment deposit withdrawn')[0] == 'transfer'
+    assert match_rule('payment *113*R*')[0] == 'payment'
+    assert match_rule('deposit withdrawn *162*')[0] == 'deposit'
+    assert match_rule('withdrawn Airtime')[0] == 'withdrawal'
+    assert match_rule('nothing to see') is DEFAULT_RULE
+    assert [rule[0] for rule in RULES] == ['receive', 'transfer', 'payment', 'deposit', 'withdrawal', 'airtime']
+
+
+@pytest.mark.parametrize('body, fields', [
+    ('TxId: 123. Your payment of 1,000 RWF to Shop. Fee was 20 RWF. Your new balance: 8,000 RWF',
+     (1000, '123', 20, 8000)),
+    ('Financial Transaction Id: 987. 500 RWF withdrawn. Fee paid: 350 RWF. NEW BALANCE :7,200 RWF',
+     (500, '987', 350, 7200)),
+    # The first number ending in RWF is the amount, even a txid or a balance
+    ('TxId: 555 RWF, Fee was: 5 RWF', (555, '555', 5, None)),
+    ('new balance is 42 RWF after 10 RWF', (42, None, None, 42)),
+    # "rwf" in lower case is a balance for BALANCE_PATTERN but not an amount
+    ('New balance: 9 rwf, received 3 RWF', (3, None, None, 9)),
+    ('No numbers here', (0, None, None, None)),
+])
+def test_operator_fields(body, fields):
+    amount, txid, fee, balance = fields
+    assert categorize_full(body)[1] == amount == extract_amount(body)
+    assert categorize_full(body)[4:] == (txid, fee, balance)
+    assert (extract_txid(body), extract_fee(body), extract_balance(body)) == (txid, fee, balance)
@@ -0,0 +1,74 @@
+"""Tests for the ETL checkpoint (dsa/checkpoint.py) and run.py --incremental"""
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+from checkpoint import RECENT_WINDOW_MS, Checkpoint, checkpoint_path
+from dedup import txid_archive_path
+from parse_xml import load_records
+from synthetic import write_corpus
+
+RUN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dsa', 'run.py')
+DAY = 86_400_000
+
+
+def sms(date, body='Paid 100 RWF'):
+    return {'date': str(date), 'address': 'M-Money', 'body': body}
+
+
+def test_accept_skips_what_the_checkpoint_covers(tmp_path):
+    first = Checkpoint()
+    assert first.accept(sms(10 * DAY)) and first.accept(sms(20 * DAY))
+    path = str(tmp_path / 'state.json')
+    first.save(path, last_id=2)
+
+    second = Checkpoint.load(path)
+    assert second.watermark == 20 * DAY and second.last_id == 2
+    assert not second.accept(sms(10 * DAY))                             # before the window
+    assert not second.accept(sms(20 * DAY))                             # recorded in the window
+    assert second.accept(sms(20 * DAY - RECENT_WINDOW_MS // 2, 'late'))  # new, in the window
+    assert second.accept(sms(21 * DAY))                                 # after the watermark
+
+
+def test_discard_forgets_what_was_seen_since_advance():
+    checkpoint = Checkpoint()
+    assert checkpoint.accept(sms(10 * DAY))
+    checkpoint.advance()
+    assert checkpoint.accept(sms(11 * DAY))
+    checkpoint.discard()
+    checkpoint.advance()
+    assert checkpoint.watermark == 10 * DAY
+    assert checkpoint.accept(sms(11 * DAY)) and not checkpoint.accept(sms(10 * DAY))
+
+
+def test_load_ignores_a_missing_or_broken_file(tmp_path):
+    path = tmp_path / 'state.json'
+    assert Checkpoint.load(str(path)) is None
+    path.write_text('{"watermark": 1')
+    assert Checkpoint.load(str(path)) is None
+
+
+def test_each_output_format_has_its_own_checkpoint_and_archive():
+    assert checkpoint_path('data/transactions.json') != checkpoint_path('data/transactions.ndjson')
+    assert txid_archive_path('data/transactions.json') != txid_archive_path('data/transactions.ndjson')
+
+
+def run(*args):
+    subprocess.run([sys.executable, RUN, '--incremental', *args], check=True, capture_output=True)
+
+
+def test_incremental_runs_into_two_formats_do_not_share_state(tmp_path):
+    old, new = str(tmp_path / 'old.xml'), str(tmp_path / 'new.xml')
+    write_corpus(old, 100, start=datetime(2024, 1, 1), days=30)
+    write_corpus(new, 100, start=datetime(2024, 3, 1), days=30, seed=7)
+    as_json, as_ndjson = str(tmp_path / 'out.json'), str(tmp_path / 'out.ndjson')
+
+    run(old, '-o', as_json)
+    run(old, new, '--format', 'ndjson', '-o', as_ndjson)
+    # The NDJSON run saw both files; the JSON output still needs the new one
+    run(old, new, '-o', as_json)
+    assert list(load_records(as_json)) == list(load_records(as_ndjson))
+    with open(checkpoint_path(as_json)) as f:
+        assert json.load(f)['last_id'] == len(list(load_records(as_json)))
@@ -0,0 +1,69 @@
+"""Tests for the columnar table and its binary column file (dsa/columnar.py)"""
+import pytest
+
+from columnar import TransactionColumns, fits_columns, load_columns, save_columns
+from parse_xml import save_to_binary
+from synthetic import generate
+
+FIELDS = ('transaction_type', 'amount', 'sender', 'receiver', 'timestamp', 'txid', 'fee', 'balance')
+
+
+def records(count=300):
+    expected = (m[3] for m in generate(count, noise=0))
+    return [dict(zip(FIELDS, row), id=i) for i, row in enumerate(expected, 1)]
+
+
+def test_save_to_binary_round_trip(tmp_path):
+    rows = records()
+    path = str(tmp_path / 'out.col')
+    assert save_to_binary(iter(rows), path, quiet=True) == len(rows)
+    columns = load_columns(path)
+    assert len(columns) == len(rows)
+    assert columns.ids_sorted
+    assert list(columns) == rows
+    assert all(fits_columns(tx) for tx in rows)
+    assert columns.row(len(rows) - 1) == rows[-1]
+    assert columns.find(rows[57]['id']) == 57 and columns.find(10 ** 9) is None
+
+
+def test_unsorted_ids_and_missing_optionals_round_trip(tmp_path):
+    rows = records(20)[::-1]
+    rows[3].update(txid=None, fee=None, balance=None)
+    path = str(tmp_path / 'out.col')
+    save_columns(TransactionColumns.from_records(rows), path)
+    columns = load_columns(path)
+    assert not columns.ids_sorted
+    assert list(columns) == rows
+    assert columns.find(rows[3]['id']) == 3
+
+
+def test_empty_table_round_trip(tmp_path):
+    path = str(tmp_path / 'out.col')
+    assert save_to_binary([], path, quiet=True) == 0
+    assert list(load_columns(path)) == []
+
+
+def test_masks_and_group_by_match_a_scan(tmp_path):
+    rows = records()
+    path = str(tmp_path / 'out.col')
+    save_to_binary(rows, path, quiet=True)
+    columns = load_columns(path)
+    mask = columns.mask_and(columns.mask_eq('transaction_type', 'payment'), columns.mask_range('amount', 1000, 5000))
+    expected = [tx for tx in rows if tx['transaction_type'] == 'payment' and 1000 <= tx['amount'] < 5000]
+    assert columns.sum('amount', mask) == sum(tx['amount'] for tx in expected)
+    groups = columns.group_by('transaction_type')
+    assert sum(count for count, _ in groups.values()) == len(rows)
+    assert groups['payment'][1] == sum(tx['amount'] for tx in rows if tx['transaction_type'] == 'payment')
+
+
+def test_not_a_column_file(tmp_path):
+    path = tmp_path / 'out.col'
+    path.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        load_columns(str(path))
+
+
+@pytest.mark.parametrize('changes', [{'amount': 10.5}, {'timestamp': '2024-05-01T10:00:00.123456'},
+                                     {'txid': 'ABC123'}, {'fee': -1}])
+def test_rows_that_do_not_fit(changes):
+    assert not fits_columns(dict(records(1)[0], **changes))
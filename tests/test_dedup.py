@@ -0,0 +1,61 @@
+"""Tests for txid deduplication (dsa/dedup.py)"""
+from dedup import MIN_CAPACITY, BloomFilter, DedupIndex, TxIdArchive, drop_duplicates, txid_key
+
+
+def test_txid_key():
+    assert txid_key('12345') == 12345 == txid_key(12345)
+    # Not canonical decimals: hashed into the negative range, stably
+    for txid in ('012345', 'ABC-1', '9' * 19):
+        assert txid_key(txid) < 0 and txid_key(txid) == txid_key(txid)
+    assert txid_key('012345') != txid_key('12345')
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    bloom.update(range(0, 3000, 3))
+    assert all(key in bloom for key in range(0, 3000, 3))
+    false_positives = sum(key in bloom for key in range(1, 3000, 3))
+    assert false_positives < 50
+
+
+def test_archive_round_trip_and_growth(tmp_path):
+    path = str(tmp_path / 'out.json.txids')
+    assert len(TxIdArchive.load(path)) == 0
+    first = TxIdArchive()
+    assert first.save(path, [txid_key(str(k)) for k in range(10, 0, -1)]) == 10
+    archive = TxIdArchive.load(path)
+    assert archive.find('7') and archive.find('11') is None
+    # Past the filter's capacity it is rebuilt larger; every key stays findable
+    more = range(100, 100 + MIN_CAPACITY)
+    assert archive.save(path, list(more)) == 10 + MIN_CAPACITY
+    grown = TxIdArchive.load(path)
+    assert grown.bloom.capacity > MIN_CAPACITY
+    assert all(grown.find(str(k)) for k in (1, 10, 100, 99 + MIN_CAPACITY))
+    assert grown.find('50') is None
+
+
+def test_index_checks_this_run_then_the_archive(tmp_path):
+    path = str(tmp_path / 'out.json.txids')
+    TxIdArchive().save(path, [txid_key('500')])
+    archive = TxIdArchive.load(path)
+    index = DedupIndex(archive.bloom, archive.find)
+    assert index.add('500', 1) is True                  # archived by an earlier run
+    assert index.add('501', 2) is None
+    assert index.add('501', 3) == 2
+    assert index.duplicates == 2 and index.lookups >= 1
+
+
+def test_index_follows_store_writes():
+    index = DedupIndex()
+    index.on_add({'id': 4, 'txid': 'T-1'})
+    assert index.find('T-1') == 4
+    index.on_remove({'id': 5, 'txid': 'T-1'})           # another row: keeps the owner
+    assert index.find('T-1') == 4
+    index.on_remove({'id': 4, 'txid': 'T-1'})
+    assert index.find('T-1') is None
+
+
+def test_drop_duplicates_renumbers():
+    rows = [{'txid': '1'}, {'txid': None}, {'txid': '1'}, {'txid': '2'}, {'txid': None}]
+    kept = list(drop_duplicates(rows, DedupIndex(), start_id=10))
+    assert [(row['id'], row['txid']) for row in kept] == [(10, '1'), (11, None), (12, '2'), (13, None)]
@@ -0,0 +1,102 @@
+"""Tests for watch-mode ingestion (api/ingest.py) and its saved state"""
+import os
+import time
+from datetime import datetime
+
+import app
+import ingest
+from checkpoint import Checkpoint
+from ingest import Ingestor
+from store import TransactionStore
+from synthetic import write_corpus
+
+
+def ingest_once(directory, store, checkpoint, state_file):
+    """Run an Ingestor until it has been through every file in directory once"""
+    ingestor = Ingestor(directory, store.create_many, checkpoint, state_file, interval=0.02, linger=0)
+    ingestor.start()
+    deadline = time.monotonic() + 10
+    while ingestor.files < len(os.listdir(directory)) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    ingestor.stop()
+    return ingestor
+
+
+def test_saved_state_skips_ingested_files_after_a_restart(tmp_path):
+    inbox = tmp_path / 'inbox'
+    inbox.mkdir()
+    write_corpus(str(inbox / 'backup.xml'), 300, start=datetime(2024, 5, 1), days=5, seed=3)
+    state_file = str(tmp_path / 'watch.checkpoint.json')
+    store = TransactionStore()
+
+    first = ingest_once(str(inbox), store, Checkpoint(), state_file)
+    assert first.files == 1 and first.messages == len(store) > 0
+    ingested = len(store)
+
+    # Restart: the same files are still in the directory
+    second = ingest_once(str(inbox), store, Checkpoint.load(state_file), state_file)
+    assert second.files == 1 and second.messages == 0
+    assert len(store) == ingested
+
+
+def test_durable_stores_keep_watch_state_next_to_them():
+    assert app.watch_state_path(db=os.path.join('data', 'tx.db')) == os.path.join('data', 'tx.watch.checkpoint.json')
+    assert app.watch_state_path(journal='journal') == os.path.join('journal', 'watch.checkpoint.json')
+    assert app.watch_state_path() is None
+
+
+def rows(store):
+    return [(tx['timestamp'], tx['amount'], tx['receiver']) for tx in store.all()]
+
+
+def test_failed_commit_leaves_the_file_to_be_retried(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(ingest, 'RETRY_DELAY', 0)
+    inbox = tmp_path / 'inbox'
+    inbox.mkdir()
+    write_corpus(str(inbox / 'backup.xml'), 300, start=datetime(2024, 5, 1), days=5, seed=3)
+    clean = TransactionStore()
+    ingest_once(str(inbox), clean, Checkpoint(), None)
+
+    store = TransactionStore()
+    state_file = str(tmp_path / 'watch.checkpoint.json')
+    calls = []
+
+    def flaky(batch):
+        # The first batch commits, the next one fails past every retry, then the store recovers
+        calls.append(len(batch))
+        if 2 <= len(calls) <= 2 + ingest.COMMIT_RETRIES:
+            raise OSError("disk full")
+        return store.create_many(batch)
+
+    ingestor = Ingestor(str(inbox), flaky, Checkpoint(), state_file, interval=0.02, batch_size=50, linger=0)
+    ingestor.start()
+    deadline = time.monotonic() + 10
+    while ingestor.files < 1 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    ingestor.stop()
+    assert ingestor.files == 1 and ingestor.errors == 1
+    # Every row once: the batch committed before the failure is not repeated
+    assert rows(store) == rows(clean)
+    assert Checkpoint.load(state_file).last_id == len(store)
+    assert 'retried at the next poll' in capsys.readouterr().err
+
+
+def test_checkpoint_is_not_saved_while_a_file_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, 'RETRY_DELAY', 0)
+    inbox = tmp_path / 'inbox'
+    inbox.mkdir()
+    write_corpus(str(inbox / 'backup.xml'), 100, start=datetime(2024, 5, 1), days=5, seed=3)
+    state_file = str(tmp_path / 'watch.checkpoint.json')
+
+    def broken(batch):
+        raise OSError("read-only database")
+
+    ingestor = Ingestor(str(inbox), broken, Checkpoint(), state_file, interval=0.02, linger=0)
+    ingestor.start()
+    deadline = time.monotonic() + 10
+    while ingestor.errors < 2 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    ingestor.stop()
+    assert ingestor.errors >= 2 and ingestor.files == 0
+    assert not os.path.exists(state_file)
+    assert ingestor.checkpoint.watermark == 0
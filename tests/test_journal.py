@@ -0,0 +1,167 @@
+"""Tests for the mutation journal, its compaction and crash recovery (api/journal.py)"""
+import json
+import os
+import threading
+
+import pytest
+
+import app
+from columnar import fits_columns
+from journal import Journal, LoggedStore, recover, journal_files
+from store import TransactionStore
+
+ITEM = {'transaction_type': 'payment', 'amount': 500, 'sender': 'You', 'receiver': 'Shop',
+        'timestamp': '2024-06-01T12:00:00', 'txid': None, 'fee': None, 'balance': None}
+
+
+def state(store):
+    return store.version, store.next_id, sorted(json.dumps(tx, sort_keys=True) for tx in store.all())
+
+
+def seed(count=50):
+    return TransactionStore([dict(ITEM, id=i, amount=i * 10, timestamp=f'2024-05-{i % 28 + 1:02d}T08:00:00')
+                             for i in range(1, count + 1)])
+
+
+def writes(store, raw, rounds):
+    for i in range(rounds):
+        store.create(dict(ITEM, amount=i))
+        store.update(raw.next_id - 1, {'receiver': f'R{i}'})
+        store.create_many([dict(ITEM, transaction_type='deposit')] * 2)
+        store.delete(raw.next_id - 1)           # the newest id: it must not be handed out again
+        store.delete_many([raw.next_id - 2, 10 ** 9])
+
+
+def settle(journal):
+    if journal.compacting:
+        journal._compactor.join()
+
+
+@pytest.mark.parametrize('sync', ['group', 'write', 'none'])
+@pytest.mark.parametrize('fmt', ['.json', '.ndjson', '.col'])
+def test_recovery_equals_the_live_store_across_compactions(tmp_path, sync, fmt):
+    raw = seed()
+    journal = Journal(str(tmp_path), raw, sync, compact_bytes=4000, snapshot_format=fmt)
+    settle(journal)             # the first snapshot; the writes below start at least one more
+    writes(LoggedStore(raw, journal), raw, 60)
+    settle(journal)
+    # Not closed: whatever a write returned from is in the journal already
+    store, _ = recover(str(tmp_path))
+    assert state(store) == state(raw)
+    assert journal.compactions >= 2
+    files = journal_files(str(tmp_path))
+    assert len(files['snapshot']) == 1 and list(files['snapshot'].values())[0].endswith(fmt)
+    journal.close()
+
+
+def test_first_start_without_snapshot_replays_onto_the_data(tmp_path):
+    raw = seed()
+    journal = Journal(str(tmp_path), raw, compact_bytes=10 ** 9)
+    settle(journal)
+    os.remove(journal_files(str(tmp_path))['snapshot'][50])     # crashed before the first snapshot
+    writes(LoggedStore(raw, journal), raw, 5)
+    journal.close()
+    store, replayed = recover(str(tmp_path), seed())
+    assert replayed == 5 * 6 and state(store) == state(raw)
+
+
+def test_torn_tail_and_half_written_snapshot_are_dropped(tmp_path):
+    raw = seed()
+    journal = Journal(str(tmp_path), raw, compact_bytes=10 ** 9)
+    writes(LoggedStore(raw, journal), raw, 3)
+    journal.close()
+    want = state(raw)
+    segments = journal_files(str(tmp_path))['journal']
+    with open(segments[max(segments)], 'ab') as f:
+        f.write(b'{"v":%d,"op":"add","tx":{"id"' % (raw.version + 1))
+    with open(os.path.join(str(tmp_path), f'snapshot-{raw.version + 5:012d}.json.tmp'), 'w') as f:
+        f.write('[{"id": 1')
+
+    store, _ = recover(str(tmp_path))
+    assert state(store) == want
+    journal = Journal(str(tmp_path), store, compact_bytes=10 ** 9)
+    assert not any(name.endswith('.tmp') for name in os.listdir(str(tmp_path)))
+    created = LoggedStore(store, journal).create(ITEM)
+    journal.close()
+    assert created['id'] == want[1]
+    assert recover(str(tmp_path))[0].get(created['id']) == created
+
+
+def test_damage_before_the_tail_is_an_error(tmp_path):
+    raw = seed()
+    journal = Journal(str(tmp_path), raw, 'none', compact_bytes=10 ** 9)
+    writes(LoggedStore(raw, journal), raw, 3)
+    journal.close()
+    segments = journal_files(str(tmp_path))['journal']
+    path = segments[max(segments)]
+    with open(path, 'rb') as f:
+        lines = f.readlines()
+    lines[3] = b'{"v": garbage\n'
+    with open(path, 'wb') as f:
+        f.writelines(lines)
+    with pytest.raises(ValueError):
+        recover(str(tmp_path))
+
+
+def test_col_snapshot_falls_back_for_rows_columns_cannot_hold(tmp_path):
+    raw = seed()
+    journal = Journal(str(tmp_path), raw, compact_bytes=10 ** 9, snapshot_format='.col')
+    settle(journal)
+    store = LoggedStore(raw, journal)
+    store.create(dict(ITEM, amount=12.5))
+    store.create(dict(ITEM, timestamp='2024-06-01T12:00:00.123456', txid='TX-1'))
+    store.create({key: value for key, value in ITEM.items() if key != 'timestamp'})    # now, to the µs
+    journal._compact()
+    settle(journal)
+    journal.close()
+    snapshots = journal_files(str(tmp_path))['snapshot']
+    assert list(snapshots.values())[0].endswith('.ndjson')
+    assert state(recover(str(tmp_path))[0]) == state(raw)
+
+
+def test_fits_columns():
+    assert fits_columns(dict(ITEM, txid='123', fee=100, balance=0))
+    assert fits_columns(dict(ITEM, timestamp='2024-06-01T12:00:00.250000'))
+    assert not fits_columns(dict(ITEM, amount=1.5))
+    assert not fits_columns(dict(ITEM, amount=500.0))
+    assert not fits_columns(dict(ITEM, timestamp='2024-06-01T12:00:00.123456'))
+    assert not fits_columns(dict(ITEM, timestamp='2024-06-01T12:00:00+02:00'))
+    assert not fits_columns(dict(ITEM, txid='0123'))
+    assert not fits_columns(dict(ITEM, fee=2.5))
+
+
+def test_concurrent_creates_share_fsyncs(tmp_path):
+    """create_unique holds its duplicate-check lock for the write only, not for the fsync"""
+    raw = seed()
+    journal = Journal(str(tmp_path / 'journal'), raw, 'group', compact_bytes=10 ** 9)
+    settle(journal)
+    previous = app.STORE
+    app.use_store(LoggedStore(raw, journal))
+    ops, commits = journal.ops, journal.commits
+
+    def client(n):
+        for i in range(40):
+            app.create_unique([dict(ITEM, amount=i, txid=f'{n}-{i}')])
+    try:
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        app.use_store(previous)
+    journal.close()
+    assert journal.ops - ops == 640
+    assert journal.commits - commits < 640
+    assert state(recover(str(tmp_path / 'journal'))[0]) == state(raw)
+
+
+def test_compaction_prints_nothing(tmp_path, capsys):
+    """Snapshots are written from the compactor thread, under the server's output"""
+    raw = seed()
+    journal = Journal(str(tmp_path / 'journal'), raw, 'none', compact_bytes=2000)
+    writes(LoggedStore(raw, journal), raw, 20)
+    settle(journal)
+    journal.close()
+    assert journal.compactions >= 1
+    assert capsys.readouterr().out == ''
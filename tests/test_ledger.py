@@ -0,0 +1,69 @@
+"""Tests for balance reconstruction and reconciliation (dsa/ledger.py)"""
+import pytest
+
+from columnar import TransactionColumns, iso_to_ms
+from ledger import DEBIT_TYPES, Ledger, transaction_delta
+from synthetic import generate
+
+FIELDS = ('transaction_type', 'amount', 'sender', 'receiver', 'timestamp', 'txid', 'fee', 'balance')
+
+
+def history(count=300):
+    """Transactions whose stated balances all agree with their deltas"""
+    expected = (m[3] for m in generate(count, noise=0))
+    return [dict(zip(FIELDS, row), id=i) for i, row in enumerate(expected, 1)]
+
+
+def linear_balance(rows, ms, opening):
+    return opening + sum(transaction_delta(tx['transaction_type'], tx['amount'], tx['fee'])
+                         for tx in rows if iso_to_ms(tx['timestamp']) <= ms)
+
+
+def test_transaction_delta():
+    assert transaction_delta('deposit', 500, None) == 500
+    assert transaction_delta('payment', 500, 20) == -520
+    assert transaction_delta('unknown', 500, 20) == 0
+
+
+@pytest.mark.parametrize('build', [Ledger.from_records,
+                                   lambda rows: Ledger.from_columns(TransactionColumns.from_records(rows))])
+def test_consistent_history_reconciles(build):
+    rows = history()
+    ledger = build(rows)
+    summary = ledger.summary()
+    assert summary['divergences'] == 0 and summary['unexplained'] == 0
+    assert summary['closing_balance'] == rows[-1]['balance'] == summary['balance']
+    assert summary['total_fees'] == sum(tx['fee'] or 0 for tx in rows if tx['transaction_type'] in DEBIT_TYPES)
+    for tx in rows[::37]:
+        ms = iso_to_ms(tx['timestamp'])
+        assert ledger.balance_at(ms)['balance'] == linear_balance(rows, ms, ledger.opening) == tx['balance']
+
+
+def test_missing_message_is_flagged_with_its_amount():
+    rows = history()
+    missing = rows.pop(150)
+    divergences = Ledger.from_records(rows).divergences()
+    assert len(divergences) == 1
+    gap = transaction_delta(missing['transaction_type'], missing['amount'], missing['fee'])
+    assert divergences[0].gap == gap
+    assert divergences[0].id == next(tx['id'] for tx in rows[150:] if tx['balance'] is not None)
+
+
+def test_repeated_message_is_flagged():
+    rows = history()
+    repeated = dict(rows[100], id=len(rows) + 1)
+    divergences = Ledger.from_records(rows + [repeated]).divergences()
+    assert divergences and divergences[0].gap == -transaction_delta(
+        repeated['transaction_type'], repeated['amount'], repeated['fee'])
+
+
+def test_undated_rows_are_counted_not_replayed():
+    rows = history(20)
+    rows[5]['timestamp'] = None
+    ledger = Ledger.from_records(rows)
+    assert ledger.undated == 1 and len(ledger) == 19
+
+
+def test_empty_ledger():
+    summary = Ledger.from_records([]).summary()
+    assert summary['transactions'] == 0 and summary['balance'] == 0 and summary['flagged'] == []
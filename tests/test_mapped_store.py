@@ -0,0 +1,97 @@
+"""Tests for the store served from an mmapped column file (api/mapped_store.py)"""
+import pytest
+
+from columnar import load_columns
+from mapped_store import MappedStore
+from parse_xml import save_to_binary
+from store import TransactionStore
+from synthetic import generate
+
+FIELDS = ('transaction_type', 'amount', 'sender', 'receiver', 'timestamp', 'txid', 'fee', 'balance')
+
+QUERIES = [
+    {},
+    {'transaction_type': 'payment'},
+    {'transaction_type': 'deposit', 'limit': 7},
+    {'transaction_type': 'no-such-type'},
+    {'counterparty': 'You'},
+    {'sender': 'You', 'receiver': 'Unknown'},
+    {'min_amount': 1000},
+    {'max_amount': 2500},
+    {'max_amount': 2500.5},
+    {'min_amount': 500, 'max_amount': 20000, 'transaction_type': 'transfer'},
+    {'start': '2024-08-01'},
+    {'start': '2024-07-01T00:00:00', 'end': '2024-09-15T12:30'},
+    {'end': '2024-06-01T08:00:00.5'},
+    # Not ISO_BOUND-shaped: compared as strings, per row
+    {'start': '2024-08'},
+    {'start': '2024-07-01 00:00:00', 'end': '2024-10'},
+    {'end': '2025'},
+    {'start': '2024-08-11 12:00', 'end': '2024-08-13 23:00'},
+    {'after': 120},
+    {'after': 50, 'limit': 10},
+    {'offset': 30, 'limit': 15},
+    {'transaction_type': 'payment', 'after': 200, 'offset': 3, 'limit': 5},
+    {'counterparty': 'You', 'start': '2024-07-01', 'offset': 10, 'limit': 10},
+    {'limit': 0},
+]
+
+
+def records(count=400):
+    expected = (m[3] for m in generate(count, noise=0))
+    return [dict(zip(FIELDS, row), id=i) for i, row in enumerate(expected, 1)]
+
+
+@pytest.fixture
+def stores(tmp_path):
+    rows = records()
+    path = str(tmp_path / 'out.col')
+    save_to_binary(rows, path, quiet=True)
+    return MappedStore(load_columns(path)), TransactionStore(rows)
+
+
+def assert_same(mapped, reference):
+    assert len(mapped) == len(reference)
+    assert mapped.next_id == reference.next_id
+    for params in QUERIES:
+        assert mapped.query(**params) == reference.query(**params), params
+    counterparty = reference.all()[5]['receiver']
+    assert mapped.by_counterparty(counterparty) == reference.by_counterparty(counterparty)
+
+
+def test_query_matches_transaction_store(stores):
+    mapped, reference = stores
+    assert mapped.query()[0] == 400
+    assert_same(mapped, reference)
+
+
+def test_overlay_writes_and_deletes(stores):
+    mapped, reference = stores
+    for store in (mapped, reference):
+        created = store.create({'transaction_type': 'deposit', 'amount': 12345, 'sender': 'Bank',
+                                'receiver': 'You', 'timestamp': '2024-07-15T09:00:00'})
+        assert created['id'] == 401
+        assert store.update(10, {'amount': 999999, 'receiver': 'Someone New'})['amount'] == 999999
+        store.update(401, {'transaction_type': 'payment'})
+        assert store.delete(20)['id'] == 20
+        assert store.delete(20) is None
+        store.delete(400)                   # the newest base id: not handed out again
+        assert store.update(20, {'amount': 1}) is None
+    assert mapped.get(20) is None and mapped.get(10)['receiver'] == 'Someone New'
+    assert mapped.get(401) == reference.get(401)
+    assert mapped.by_counterparty('Someone New') == reference.by_counterparty('Someone New')
+    assert_same(mapped, reference)
+
+    for store in (mapped, reference):
+        store.delete(401)
+        assert store.create({'amount': 5, 'timestamp': '2024-07-15T09:00:00'})['id'] == 402
+    assert_same(mapped, reference)
+
+
+def test_add_rejects_existing_ids(stores):
+    mapped, _ = stores
+    with pytest.raises(KeyError):
+        mapped.add(dict(mapped.get(1)))
+    mapped.delete(1)
+    assert mapped.add(dict(records(1)[0]))['id'] == 1
+    assert mapped.get(1) == records(1)[0]
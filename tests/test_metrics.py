@@ -0,0 +1,141 @@
+"""Tests for the metric registry, the access log and the request profiler (api/metrics.py)"""
+import io
+import pstats
+import time
+
+import pytest
+
+from metrics import AccessLog, Metrics, RequestProfiler
+
+LABELS = (('method', 'GET'), ('endpoint', '/transactions'))
+
+
+@pytest.fixture
+def metrics():
+    registry = Metrics()
+    registry.counter('requests_total', "Requests")
+    registry.gauge('rows', "Rows", lambda: 42)
+    registry.gauge('queue', "Queued")
+    registry.histogram('size_bytes', "Body size", (64, 256, 1024))
+    return registry
+
+
+def test_render(metrics):
+    metrics.inc('requests_total', LABELS + (('status', '200'),))
+    metrics.inc('requests_total', LABELS + (('status', '200'),), 2)
+    metrics.inc('requests_total', (('method', 'PUT'), ('endpoint', 'say "hi"\n')))
+    metrics.set('queue', value=2.0)
+    metrics.observe('size_bytes', LABELS, 100)
+    assert metrics.value('requests_total', LABELS + (('status', '200'),)) == 3
+    assert metrics.value('queue') == 2.0 and metrics.value('requests_total', (('x', '1'),)) == 0
+    assert metrics.render(extra=['momo_extra 1']) == '\n'.join([
+        '# HELP requests_total Requests',
+        '# TYPE requests_total counter',
+        'requests_total{method="GET",endpoint="/transactions",status="200"} 3',
+        'requests_total{method="PUT",endpoint="say \\"hi\\"\\n"} 1',
+        '# HELP rows Rows',
+        '# TYPE rows gauge',
+        'rows 42',
+        '# HELP queue Queued',
+        '# TYPE queue gauge',
+        'queue 2',
+        '# HELP size_bytes Body size',
+        '# TYPE size_bytes histogram',
+        'size_bytes_bucket{method="GET",endpoint="/transactions",le="64"} 0',
+        'size_bytes_bucket{method="GET",endpoint="/transactions",le="256"} 1',
+        'size_bytes_bucket{method="GET",endpoint="/transactions",le="1024"} 1',
+        'size_bytes_bucket{method="GET",endpoint="/transactions",le="+Inf"} 1',
+        'size_bytes_sum{method="GET",endpoint="/transactions"} 100',
+        'size_bytes_count{method="GET",endpoint="/transactions"} 1',
+        'momo_extra 1',
+    ]) + '\n'
+
+    metrics.reset()
+    assert 'requests_total{' not in metrics.render() and 'rows 42' in metrics.render()
+
+
+def bucket_counts(metrics):
+    return [int(line.rsplit(' ', 1)[1]) for line in metrics.render().splitlines()
+            if line.startswith('size_bytes_bucket')]
+
+
+@pytest.mark.parametrize('value, counts', [
+    (0, [1, 1, 1, 1]),
+    (64, [1, 1, 1, 1]),         # le is inclusive: the boundary lands in its own bucket
+    (64.5, [0, 1, 1, 1]),
+    (256, [0, 1, 1, 1]),
+    (1024, [0, 0, 1, 1]),
+    (1025, [0, 0, 0, 1]),
+])
+def test_histogram_le_buckets_are_inclusive(metrics, value, counts):
+    metrics.observe('size_bytes', (), value)
+    assert bucket_counts(metrics) == counts
+
+
+def test_histogram_buckets_are_cumulative(metrics):
+    for value in (10, 64, 65, 256, 1000, 5000, 6000):
+        metrics.observe('size_bytes', (), value)
+    assert bucket_counts(metrics) == [2, 4, 5, 7]
+    assert 'size_bytes_sum 12395' in metrics.render() and 'size_bytes_count 7' in metrics.render()
+
+
+def test_access_log_drops_past_max_pending_and_flushes():
+    stream = io.StringIO()
+    log = AccessLog(lambda entry: f'line {entry}', stream=stream, interval=60, max_pending=3)
+    try:
+        for i in range(5):
+            log.log(i)
+        assert (len(log), log.dropped, log.written) == (3, 2, 0)
+        assert stream.getvalue() == ''
+
+        log.flush()
+        assert stream.getvalue() == 'line 0\nline 1\nline 2\n'
+        assert (len(log), log.written) == (0, 3)
+        log.flush()
+        assert log.written == 3
+
+        log.log(5)
+        assert log.dropped == 2
+    finally:
+        log.close()
+    assert stream.getvalue().endswith('line 2\nline 5\n') and log.written == 4
+
+
+def test_access_log_thread_writes_on_its_own():
+    stream = io.StringIO()
+    log = AccessLog(str, stream=stream, interval=0.01)
+    log.log('a')
+    deadline = time.monotonic() + 5
+    while not log.written and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert log.written == 1
+    log.close()
+    assert stream.getvalue() == 'a\n'
+
+
+def workload():
+    return sum(range(1000))
+
+
+def test_profiler_samples_one_request_in_every(tmp_path):
+    path = str(tmp_path / 'api.prof')
+    profiler = RequestProfiler(3, path)
+    assert [profiler.run(workload) for _ in range(9)] == [sum(range(1000))] * 9
+    assert profiler.samples == 3
+    stats = pstats.Stats(path)
+    assert sum(calls for (_, _, name), (calls, *_) in stats.stats.items() if name == 'workload') == 3
+
+
+def test_profiler_skips_a_sample_that_would_overlap(tmp_path):
+    profiler = RequestProfiler(1, str(tmp_path / 'api.prof'))
+    assert profiler.run(lambda: profiler.run(workload)) == sum(range(1000))
+    assert profiler.samples == 1
+
+    def fail():
+        raise RuntimeError('boom')
+    with pytest.raises(RuntimeError):
+        profiler.run(fail)
+    # The failed request is still a sample, and the next one is profiled
+    assert profiler.samples == 2
+    profiler.run(workload)
+    assert profiler.samples == 3
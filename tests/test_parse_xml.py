@@ -1,2 +1,96 @@
-#tests
+"""Tests for the streaming XML parser and the JSON writers (dsa/parse_xml.py)"""
+import json
+import os
 
+import pytest
+
+from parse_xml import append_to_json, convert_timestamp, iter_parse_xml, parse_xml, save_to_json
+
+MOMO_XML = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'raw', 'momo.xml')
+
+PAYMENT = 'TxId: 1. Your payment of {amount} RWF to Shop has been completed.'
+
+
+def write_xml(path, messages):
+    """messages: (attributes dict) per <sms>"""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<smses>']
+    for attrs in messages:
+        attrs = dict({'address': 'M-Money'}, **attrs)
+        lines.append('  <sms ' + ' '.join(f'{k}="{v}"' for k, v in attrs.items()) + ' />')
+    lines.append('</smses>')
+    path.write_text('\n'.join(lines), encoding='utf-8')
+    return str(path)
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_iter_parse_xml_matches_parse_xml():
+    expected = parse_xml(MOMO_XML)
+    assert expected
+    assert list(iter_parse_xml(MOMO_XML)) == expected
+
+
+def test_iter_parse_xml_start_id_and_accept(tmp_path):
+    xml = write_xml(tmp_path / 'in.xml', [{'date': 1715351400000 + i, 'body': PAYMENT.format(amount=i)}
+                                          for i in range(1, 6)])
+    assert [tx['id'] for tx in iter_parse_xml(xml, start_id=10)] == [10, 11, 12, 13, 14]
+    odd = list(iter_parse_xml(xml, accept=lambda sms: int(sms.get('date')) % 2))
+    assert [(tx['id'], tx['amount']) for tx in odd] == [(1, 1), (2, 3), (3, 5)]
+
+
+def test_invalid_dates_fall_back_to_date_sent_or_skip(tmp_path):
+    xml = write_xml(tmp_path / 'in.xml', [
+        {'date': 1715351400000, 'body': PAYMENT.format(amount=100)},
+        {'date': 'garbage', 'date_sent': 1715351500000, 'body': PAYMENT.format(amount=200)},
+        {'date': '', 'body': PAYMENT.format(amount=300)},
+        {'date': 10 ** 20, 'date_sent': 'x', 'body': PAYMENT.format(amount=400)},
+        {'body': PAYMENT.format(amount=500)},
+    ])
+    for transactions in (parse_xml(xml), list(iter_parse_xml(xml))):
+        assert [(tx['id'], tx['amount'], tx['timestamp']) for tx in transactions] == [
+            (1, 100, convert_timestamp(1715351400000)),
+            (2, 200, convert_timestamp(1715351500000)),
+        ]
+
+
+@pytest.mark.parametrize('value', [None, '', 'abc', '12.5x', 10 ** 20])
+def test_convert_timestamp_rejects_invalid(value):
+    assert convert_timestamp(value) is None
+
+
+def test_save_and_append_json_round_trip(tmp_path):
+    transactions = parse_xml(MOMO_XML)
+    path = str(tmp_path / 'out.json')
+    head, tail = transactions[:100], transactions[100:]
+
+    assert save_to_json(iter(head), path, quiet=True) == len(head)
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == json.dumps(head, indent=2, ensure_ascii=False)
+
+    assert append_to_json(tail, path) == len(tail)
+    assert append_to_json([], path) == 0
+    assert read_json(path) == transactions
+
+
+def test_append_json_to_empty_or_missing_file(tmp_path):
+    path = str(tmp_path / 'out.json')
+    records = [{'id': 1, 'sender': 'Zoë'}, {'id': 2, 'sender': 'You'}]
+    assert save_to_json([], path, quiet=True) == 0
+    assert read_json(path) == []
+    assert append_to_json(records[:1], path) == 1
+    assert append_to_json(records[1:], path) == 1
+    assert read_json(path) == records
+
+    missing = str(tmp_path / 'new.json')
+    assert append_to_json(records, missing) == 2
+    assert read_json(missing) == records
+
+
+def test_append_json_rejects_non_array(tmp_path):
+    path = tmp_path / 'out.json'
+    path.write_text('{"id": 1}', encoding='utf-8')
+    with pytest.raises(ValueError):
+        append_to_json([{'id': 2}], str(path))
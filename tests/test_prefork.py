@@ -0,0 +1,193 @@
+"""Tests for write replication between the --workers processes (api/prefork.py), within one process"""
+import base64
+import http.client
+import json
+import os
+import socket
+import threading
+import time
+from http.server import HTTPServer
+
+import pytest
+
+import app
+from journal import LoggedStore
+from prefork import Follower, Replicator
+from store import TransactionStore
+
+ITEM = {'transaction_type': 'payment', 'amount': 500, 'sender': 'You', 'receiver': 'Shop',
+        'timestamp': '2024-06-01T12:00:00', 'txid': None, 'fee': None, 'balance': None}
+
+
+def seed():
+    return [dict(ITEM, id=i, amount=i) for i in range(1, 101)]
+
+
+def state(store):
+    return store.version, sorted(json.dumps(tx, sort_keys=True) for tx in store.all())
+
+
+@pytest.fixture
+def writer(tmp_path):
+    """(replicator, store to write through, socket path) around a writer store; max_log_bytes set by the test"""
+    created = []
+
+    def make(max_log_bytes):
+        raw = TransactionStore(seed())
+        replicator = Replicator(raw, max_log_bytes)
+        path = os.path.join(str(tmp_path), f'replica{len(created)}.sock')
+        replicator.serve(path)
+        created.append(replicator)
+        return replicator, LoggedStore(raw, replicator), path
+    yield make
+    for replicator in created:
+        replicator.close()
+
+
+def writes(store, count):
+    for i in range(count):
+        created = store.create(dict(ITEM, amount=i))
+        store.update(created['id'], {'receiver': f'R{i}'})
+        if i % 3 == 0:
+            store.delete(created['id'] - 1)
+
+
+def test_follower_from_the_fork_replays_the_log(writer):
+    replicator, store, path = writer(10 ** 9)
+    writes(store, 50)
+    replica = TransactionStore(seed())
+    follower = Follower(replica, path)
+    follower.start()
+    assert follower.store is replica and state(replica) == state(store)
+    writes(store, 5)
+    assert follower.wait_for(store.version, timeout=5)
+    assert state(replica) == state(store)
+
+
+def test_log_is_bounded_and_old_followers_get_the_rows(writer):
+    replicator, store, path = writer(4000)
+    writes(store, 300)
+    assert replicator.log_bytes <= 4000 and replicator.base > 100
+    follower = Follower(TransactionStore(seed()), path)
+    follower.start()
+    assert replicator.resyncs == 1
+    assert state(follower.store) == state(store)
+    assert follower.store.next_id == store.next_id
+
+
+def test_writes_during_a_resync_are_not_lost_or_applied_twice(writer):
+    replicator, store, path = writer(2000)
+    writes(store, 200)
+    stop = threading.Event()
+
+    def keep_writing():
+        while not stop.is_set():
+            writes(store, 1)
+    thread = threading.Thread(target=keep_writing)
+    thread.start()
+    try:
+        follower = Follower(TransactionStore(seed()), path)
+        follower.start()
+    finally:
+        stop.set()
+        thread.join()
+    assert follower.wait_for(store.version, timeout=5)
+    assert state(follower.store) == state(store)
+
+
+def test_write_returns_once_every_follower_applied_it(writer):
+    replicator, store, path = writer(10 ** 9)
+    followers = [Follower(TransactionStore(seed()), path) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    for i in range(20):
+        created = store.create(dict(ITEM, amount=i))
+        # No wait_for: the write itself waited for the replicas
+        assert all(follower.store.get(created['id']) == created for follower in followers)
+
+
+def slow_follower(path, version, delay):
+    """A replica that reports each batch of ops it receives `delay` seconds late"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    sock.sendall(b'%d\n' % version)
+
+    def run():
+        buffered = b''
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                return
+            *lines, buffered = (buffered + data).split(b'\n')
+            ops = [json.loads(line) for line in lines]
+            reached = max((op.get('v', op.get('version', 0)) for op in ops), default=None)
+            if reached is not None:
+                time.sleep(delay)
+                sock.sendall(b'%d\n' % reached)
+    threading.Thread(target=run, daemon=True).start()
+    return sock
+
+
+def test_creates_wait_for_replicas_outside_the_create_lock(writer):
+    replicator, store, path = writer(10 ** 9)
+    follower = slow_follower(path, store.version, 0.3)
+    previous = app.STORE
+    app.use_store(store)
+    try:
+        threads = [threading.Thread(target=app.create_unique, args=([dict(ITEM, txid=f'T{i}')],))
+                   for i in range(8)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        app.use_store(previous)
+        follower.close()
+    assert len(store) == 108
+    # One replication round trip at a time would take 8 x 0.3 s
+    assert elapsed < 1.5
+
+
+def test_wait_for_times_out(writer):
+    replicator, store, path = writer(10 ** 9)
+    follower = Follower(TransactionStore(seed()), path)
+    follower.start()
+    assert not follower.wait_for(store.version + 1, timeout=0.05)
+
+
+class CommittedWriter:
+    """Writer that commits every forwarded write at version 7"""
+
+    def request(self, method, target, headers, body=None):
+        return 201, [('Content-Type', 'application/json'), ('X-Store-Version', '7')], b'{"message":"ok"}'
+
+
+class LaggingFollower:
+    def wait_for(self, version, timeout=None):
+        return False
+
+
+def test_worker_answers_503_when_its_replica_does_not_catch_up(monkeypatch):
+    monkeypatch.setattr(app, 'WRITER', CommittedWriter())
+    monkeypatch.setattr(app, 'FOLLOWER', LaggingFollower())
+
+    class Handler(app.WorkerHandler):
+        def log_message(self, format, *args):
+            pass
+
+    httpd = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', httpd.server_address[1], timeout=10)
+        conn.request('POST', '/transactions', json.dumps(ITEM),
+                     {'Authorization': 'Basic ' + base64.b64encode(b'admin:admin123').decode(), 'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        body = json.loads(response.read())
+        conn.close()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    assert response.status == 503 and body['version'] == 7
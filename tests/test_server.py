@@ -0,0 +1,67 @@
+"""Tests for PooledHTTPServer (api/server.py): idle keep-alive connections must not hold workers"""
+import http.client
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from server import PooledHTTPServer
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    timeout = 1
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def port():
+    httpd = PooledHTTPServer(('127.0.0.1', 0), Handler, max_workers=2)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get(conn):
+    conn.request('GET', '/')
+    return conn.getresponse().read()
+
+
+def test_idle_keep_alive_connections_do_not_starve_new_clients(port):
+    idle = [http.client.HTTPConnection('127.0.0.1', port, timeout=5) for _ in range(20)]
+    assert all(get(conn) == b'ok' for conn in idle)
+    assert get(http.client.HTTPConnection('127.0.0.1', port, timeout=5)) == b'ok'
+    # The parked connections are served again on their next request
+    assert all(get(conn) == b'ok' for conn in idle)
+    for conn in idle:
+        conn.close()
+
+
+def test_pipelined_requests_are_all_answered(port):
+    with socket.create_connection(('127.0.0.1', port), timeout=5) as sock:
+        sock.sendall(b'GET / HTTP/1.1\r\nHost: x\r\n\r\n' * 3)
+        received = b''
+        while received.count(b'200 OK') < 3:
+            chunk = sock.recv(65536)
+            assert chunk
+            received += chunk
+
+
+def test_idle_connection_is_closed_after_the_handler_timeout(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    assert get(conn) == b'ok'
+    time.sleep(Handler.timeout + 1.5)
+    assert conn.sock.recv(1) == b''
+    conn.close()
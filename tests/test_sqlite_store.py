@@ -0,0 +1,20 @@
+"""Tests for SQLiteStore's one-time import (api/sqlite_store.py)"""
+import pytest
+
+from parse_xml import save_to_binary, save_to_json, save_to_ndjson
+from sqlite_store import open_store
+
+ROWS = [{'id': i, 'transaction_type': 'payment', 'amount': 100 * i, 'sender': 'You', 'receiver': f'Shop {i % 7}',
+         'timestamp': f'2024-06-01T12:{i % 60:02d}:00', 'txid': None, 'fee': None, 'balance': None}
+        for i in range(1, 51)]
+
+
+@pytest.mark.parametrize('ext, save', [('.json', save_to_json), ('.ndjson', save_to_ndjson),
+                                       ('.col', save_to_binary)])
+def test_import_reads_every_etl_format(tmp_path, capsys, ext, save):
+    data = str(tmp_path / f'transactions{ext}')
+    save(ROWS, data)
+    store = open_store(str(tmp_path / 'transactions.db'), data)
+    assert len(store) == len(ROWS)
+    assert [store.get(row['id']) for row in ROWS] == ROWS
+    assert f'Imported {len(ROWS)} transactions' in capsys.readouterr().out
@@ -0,0 +1,99 @@
+"""Tests for the incrementally maintained /stats rollups (api/stats.py)"""
+import random
+
+import pytest
+
+from stats import Rollups, HISTOGRAM_EDGES
+from store import TransactionStore
+
+TYPES = ('payment', 'deposit', 'transfer', 'airtime')
+
+
+def value(tx):
+    """Amount as the reports count it: non-numeric amounts add 0"""
+    amount = tx['amount']
+    return amount if isinstance(amount, (int, float)) and not isinstance(amount, bool) else 0
+
+
+def grouped(transactions, key):
+    groups = {}
+    for tx in transactions:
+        entry = groups.setdefault(key(tx), [0, 0])
+        entry[0] += 1
+        entry[1] += value(tx)
+    return groups
+
+
+def expected_summary(transactions):
+    return {'count': len(transactions), 'total_amount': sum(value(tx) for tx in transactions),
+            'by_type': [{'transaction_type': t, 'count': c, 'total_amount': a}
+                        for t, (c, a) in sorted(grouped(transactions, lambda tx: tx['transaction_type']).items())]}
+
+
+def expected_timeseries(transactions, width):
+    groups = grouped(transactions, lambda tx: tx['timestamp'][:width])
+    return [{'period': p, 'count': c, 'total_amount': a} for p, (c, a) in sorted(groups.items())]
+
+
+def expected_top(transactions, role, metric, limit):
+    groups = grouped(transactions, lambda tx: tx[role])
+    ranked = sorted(groups.items(), key=lambda item: (-item[1][1 if metric == 'amount' else 0], item[0]))
+    return [{'name': n, 'count': c, 'total_amount': a} for n, (c, a) in ranked[:limit]]
+
+
+def expected_histogram(transactions):
+    counts = [0] * len(HISTOGRAM_EDGES)
+    for tx in transactions:
+        amount = tx['amount']
+        if isinstance(amount, int) and amount >= 0:
+            bucket = max(i for i, edge in enumerate(HISTOGRAM_EDGES) if edge <= amount)
+            counts[bucket] += 1
+    return counts
+
+
+def random_fields(rng):
+    return {'transaction_type': rng.choice(TYPES),
+            'amount': rng.choice([rng.randint(0, 2_000_000), rng.randint(0, 900), None]),
+            'sender': f"Party {rng.randint(1, 8)}", 'receiver': f"Party {rng.randint(1, 40)}",
+            'timestamp': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00"}
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_rollups_match_a_scan_after_random_mutations(seed):
+    rng = random.Random(seed)
+    store = TransactionStore()
+    store.create_many(random_fields(rng) for _ in range(200))
+    rollups = Rollups()
+    store.subscribe(rollups)
+    for _ in range(300):
+        op = rng.random()
+        ids = [tx['id'] for tx in store.all()]
+        if op < 0.4 or not ids:
+            store.create(random_fields(rng))
+        elif op < 0.7:
+            changes = random_fields(rng)
+            del changes['timestamp']
+            store.update(rng.choice(ids), changes)
+        else:
+            store.delete(rng.choice(ids))
+
+    rows = store.all()
+    assert rollups.summary() == expected_summary(rows)
+    assert rollups.timeseries('day') == expected_timeseries(rows, 10)
+    assert rollups.timeseries('month') == expected_timeseries(rows, 7)
+    assert rollups.timeseries('month', '2024-03', '2024-06') == \
+        [p for p in expected_timeseries(rows, 7) if '2024-03' <= p['period'] < '2024-06']
+    for role in ('sender', 'receiver'):
+        for metric in ('amount', 'count'):
+            assert rollups.top(role, metric, 5) == expected_top(rows, role, metric, 5)
+    assert [bucket['count'] for bucket in rollups.amount_histogram()] == expected_histogram(rows)
+
+
+def test_empty_groups_disappear():
+    store = TransactionStore()
+    rollups = Rollups()
+    store.subscribe(rollups)
+    tx = store.create({'transaction_type': 'payment', 'amount': 5, 'sender': 'a', 'receiver': 'b'})
+    store.delete(tx['id'])
+    assert rollups.summary() == {'count': 0, 'total_amount': 0, 'by_type': []}
+    assert rollups.top('receiver') == [] and rollups.timeseries() == []
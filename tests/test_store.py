@@ -0,0 +1,86 @@
+"""Tests for the indexed in-memory TransactionStore (api/store.py)"""
+import pytest
+
+from store import TransactionStore
+
+
+def row(tx_id, **fields):
+    transaction = {'id': tx_id, 'transaction_type': 'payment', 'amount': 100, 'sender': 'You',
+                   'receiver': 'Shop', 'timestamp': f'2024-05-{tx_id:02d}T10:00:00',
+                   'txid': None, 'fee': None, 'balance': None}
+    transaction.update(fields)
+    return transaction
+
+
+@pytest.fixture
+def store():
+    return TransactionStore([row(1), row(2, transaction_type='deposit', amount=5000, sender='Bank'), row(3)])
+
+
+def test_create_takes_next_id_and_indexes(store):
+    created = store.create({'transaction_type': 'deposit', 'amount': 20, 'sender': 'Bank', 'receiver': 'You'})
+    assert created['id'] == 4
+    assert store.get(4) is created
+    assert [tx['id'] for tx in store.by_type('deposit')] == [2, 4]
+    assert [tx['id'] for tx in store.by_counterparty('Bank')] == [2, 4]
+    assert created['timestamp']
+    assert store.version == 4
+
+
+def test_ids_are_not_reused_after_delete(store):
+    assert store.delete(3)['id'] == 3
+    assert store.create(row(0))['id'] == 4
+
+
+def test_update_reindexes_and_copies(store):
+    old = store.get(1)
+    new = store.update(1, {'sender': 'Bank', 'amount': 7000, 'id': 99, 'timestamp': 'x'})
+    assert old['sender'] == 'You' and new is not old
+    assert new['id'] == 1 and new['timestamp'] == old['timestamp']
+    assert sorted(tx['id'] for tx in store.by_counterparty('Bank')) == [1, 2]
+    assert [tx['id'] for tx in store.by_counterparty('You')] == [3]
+    assert store.query(min_amount=6000)[0] == 1
+    assert store.update(42, {'amount': 1}) is None
+
+
+def test_query_filters_and_pages(store):
+    total, page = store.query(transaction_type='payment', limit=1)
+    assert total == 2 and [tx['id'] for tx in page] == [1]
+    total, page = store.query(transaction_type='payment', after=1)
+    assert [tx['id'] for tx in page] == [3]
+    assert store.query(start='2024-05-02', end='2024-05-03')[1] == [store.get(2)]
+    assert store.query(min_amount=100, max_amount=100)[0] == 2
+
+
+def test_bad_create_leaves_store_unchanged(store):
+    before = (store.version, store.next_id, store.all())
+    with pytest.raises(TypeError):
+        store.create({'transaction_type': ['x'], 'amount': 1, 'sender': 'a', 'receiver': 'b'})
+    assert (store.version, store.next_id, store.all()) == before
+    assert store.create(row(0))['id'] == 4
+
+
+def test_bad_update_leaves_row_and_indexes_unchanged(store):
+    old = store.get(1)
+    with pytest.raises(TypeError):
+        store.update(1, {'sender': {'a': 1}})
+    assert store.get(1) is old
+    assert [tx['id'] for tx in store.by_counterparty('You')] == [1, 3]
+    assert store.update(1, {'sender': 'Bank'})['sender'] == 'Bank'
+
+
+def test_listeners_see_adds_and_updates_as_remove_add(store):
+    events = []
+
+    class Listener:
+        def on_add(self, tx):
+            events.append(('add', tx['id'], tx['amount']))
+
+        def on_remove(self, tx):
+            events.append(('remove', tx['id'], tx['amount']))
+
+    store.subscribe(Listener(), replay=False)
+    store.create(row(0, amount=1))
+    store.update(4, {'amount': 2})
+    store.delete(4)
+    assert events == [('add', 4, 1), ('remove', 4, 1), ('add', 4, 2), ('remove', 4, 2)]
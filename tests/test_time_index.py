@@ -0,0 +1,70 @@
+"""Tests for the epoch-ms time index (api/time_index.py) and the window parameters"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import app
+from store import TransactionStore
+from time_index import TimeIndex, to_ms
+
+
+def make_rows(count=500, seed=5):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 28)
+    return [{'id': i, 'transaction_type': 'payment', 'amount': rng.randint(1, 900), 'sender': 'You',
+             'receiver': 'Shop', 'timestamp': (start + timedelta(minutes=rng.randint(0, 60 * 24 * 60))).isoformat()}
+            for i in range(1, count + 1)]
+
+
+@pytest.fixture
+def indexed():
+    store = TransactionStore(make_rows())
+    index = TimeIndex()
+    store.subscribe(index)
+    return store, index
+
+
+def scan(store, start, end):
+    return [tx for tx in store.all() if start <= to_ms(tx['timestamp']) < end]
+
+
+def test_ranges_and_buckets_match_a_scan(indexed):
+    store, index = indexed
+    start, end = to_ms('2024-02-03T05:30'), to_ms('2024-03-10')
+    expected = scan(store, start, end)
+    assert sorted(index.ids(start, end)) == sorted(tx['id'] for tx in expected)
+    assert index.count(start, end) == (len(expected), sum(tx['amount'] for tx in expected))
+    for interval, width in (('day', 10), ('month', 7), ('hour', 13)):
+        periods = {}
+        for tx in expected:
+            entry = periods.setdefault(tx['timestamp'][:width], [0, 0])
+            entry[0] += 1
+            entry[1] += tx['amount']
+        assert [(b['period'], b['count'], b['total_amount']) for b in index.buckets(interval, start, end)] == \
+               [(period, count, total) for period, (count, total) in sorted(periods.items())]
+
+
+def test_index_follows_updates_and_deletes(indexed):
+    store, index = indexed
+    store.delete(1)
+    store.update(2, {'amount': 10 ** 6})
+    start, end = index.bounds()
+    assert len(index) == len(store) == 499
+    assert index.count(start, end + 1) == (499, sum(tx['amount'] for tx in store.all()))
+
+
+@pytest.mark.parametrize('params', [
+    {'days': '99999999999'},
+    {'start': '0001-01-01'},
+    {'days': '0'},
+    {'until': '2024-01-01'},
+])
+def test_out_of_range_windows_are_value_errors(params):
+    with pytest.raises(ValueError):
+        app.time_window(params)
+
+
+def test_window_bounds():
+    assert app.time_window({'days': '2', 'until': '2024-05-03'}) == (to_ms('2024-05-01'), to_ms('2024-05-03'))
+    assert app.time_window({'start': '2024'}) == (to_ms('2024-01-01'), None)